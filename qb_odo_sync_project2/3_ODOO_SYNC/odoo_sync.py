@@ -2,6 +2,8 @@ import xmlrpc.client
 import xml.etree.ElementTree as ET
 import os
 import logging
+import importlib.util
+from pathlib import Path
 
 # Configuration for Odoo
 ODOO_URL = 'https://nterra22-sounddecision-odoo-master-8977870.dev.odoo.com/'
@@ -16,15 +18,34 @@ INVENTORY_XML_PATH = 'C:\\SD Code Files\\QB Odoo Sync\\QB_to_Odoo_Sync\\qb_odo_s
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Odoo login cache shared with the sync server; loaded by path so the Flask app is not imported
+AUTH_CACHE_MODULE_PATH = Path(__file__).resolve().parents[2] / 'qb_odoo_sync_project' / 'app' / 'utils' / 'auth_cache.py'
+
+def _load_auth_cache():
+    if not AUTH_CACHE_MODULE_PATH.exists():
+        return None
+    spec = importlib.util.spec_from_file_location('qb_sync_auth_cache', AUTH_CACHE_MODULE_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+auth_cache = _load_auth_cache()
+
 def connect_odoo():
     """Connects to the Odoo database."""
     try:
-        common = xmlrpc.client.ServerProxy(f'{ODOO_URL}xmlrpc/2/common')
-        uid = common.authenticate(ODOO_DB, ODOO_USER, ODOO_API_KEY, {})
-        if not uid:
-            logger.error("Odoo authentication failed.")
-            return None, None
-        logger.info("Odoo authentication successful.")
+        uid = auth_cache.get_cached_uid(ODOO_URL, ODOO_DB, ODOO_USER, ODOO_API_KEY) if auth_cache else None
+        if uid:
+            logger.info("Using cached Odoo login.")
+        else:
+            common = xmlrpc.client.ServerProxy(f'{ODOO_URL}xmlrpc/2/common')
+            uid = common.authenticate(ODOO_DB, ODOO_USER, ODOO_API_KEY, {})
+            if not uid:
+                logger.error("Odoo authentication failed.")
+                return None, None
+            logger.info("Odoo authentication successful.")
+            if auth_cache:
+                auth_cache.store_uid(ODOO_URL, ODOO_DB, ODOO_USER, ODOO_API_KEY, uid)
         models = xmlrpc.client.ServerProxy(f'{ODOO_URL}xmlrpc/2/object')
         return uid, models
     except Exception as e:
@@ -34,17 +55,20 @@ def connect_odoo():
 def get_odoo_inventory(uid, models):
     """Fetches inventory data from Odoo."""
     try:
-        # Search for all products that are storable
-        product_ids = models.execute_kw(ODOO_DB, uid, ODOO_API_KEY,
-            'product.product', 'search', [[('type', '=', 'product')]])
-
-        # Read product data, including inventory fields
+        # Read all storable products with their inventory fields in one call; a separate
+        # search + read would send every product id back up in the read request.
+        # xmlrpc.client asks for a gzip-compressed response, which keeps this large read small on the wire.
         products = models.execute_kw(ODOO_DB, uid, ODOO_API_KEY,
-            'product.product', 'read', [product_ids], {
-                'fields': ['name', 'list_price', 'standard_price', 'description_sale', 'description_purchase', 'qty_available']
+            'product.product', 'search_read', [[('type', '=', 'product')]], {
+                'fields': ['name', 'list_price', 'standard_price', 'description_sale', 'description_purchase', 'qty_available', 'default_code']
             })
         logger.info(f"Fetched {len(products)} products from Odoo.")
         return products
+    except xmlrpc.client.Fault as e:
+        logger.error(f"Error fetching Odoo inventory: {e}")
+        if auth_cache and 'AccessDenied' in str(e.faultString):
+            auth_cache.invalidate(ODOO_URL, ODOO_DB, ODOO_USER, ODOO_API_KEY)
+        return []
     except Exception as e:
         logger.error(f"Error fetching Odoo inventory: {e}")
         return []
@@ -10,11 +10,18 @@ from spyne.protocol.soap import Soap11
 
 from .logging_config import setup_logging
 from .services.qbwc_service import QBWCService
+from .admin import admin_bp
+from .services.dead_letter_retry import start_retry_scheduler
+from .utils.metrics import registry as metrics_registry
 
-def create_app():
+def create_app(production: bool = False):
     """
     Application factory function.
     
+    Args:
+        production: When True, disable Flask debug mode so the app can be
+            served by a multi-threaded/multi-process WSGI server.
+    
     Returns:
         Flask application instance
     """
@@ -23,7 +30,7 @@ def create_app():
     
     # Create Flask application
     flask_app = Flask(__name__)
-    flask_app.config["DEBUG"] = True  # FLASK_DEBUG was True by default
+    flask_app.config["DEBUG"] = not production  # FLASK_DEBUG was True by default
       # Initialize Spyne SOAP application
     soap_app = Application(
         [QBWCService],
@@ -50,6 +57,12 @@ def create_app():
     def health_check():
         """Simple health check endpoint."""
         return {"status": "healthy", "service": "QB Odoo Sync"}, 200
+
+    # Metrics endpoint (Prometheus text format)
+    @flask_app.route('/metrics', methods=['GET'])
+    def metrics():
+        """Export counters, gauges and histograms for scraping."""
+        return Response(metrics_registry.render(), mimetype='text/plain; version=0.0.4')
       # Root endpoint with service info
     @flask_app.route('/', methods=['GET'])
     def service_info():
@@ -59,6 +72,12 @@ def create_app():
             "soap_endpoint": "/quickbooks",
             "status": "running"
         }, 200
+
+    # Runtime operational controls (logging policy, ...)
+    flask_app.register_blueprint(admin_bp)
+
+    # Re-push dead-lettered records while QBWC is idle
+    start_retry_scheduler()
     
     # Log startup
     print("[INFO] Flask app created. /quickbooks POST and GET endpoint registered for Spyne.")
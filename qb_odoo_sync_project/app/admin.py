@@ -0,0 +1,203 @@
+"""
+Admin endpoints for QB Odoo Sync.
+
+Operational controls that must be changeable on a running server without a
+restart. Requests must carry the ``X-Admin-Token`` header matching
+``QB_SYNC_ADMIN_TOKEN``; when no token is configured, only requests from the
+local machine are accepted.
+"""
+import hmac
+import os
+from functools import wraps
+
+from flask import Blueprint, jsonify, request
+
+from .logging_config import apply_logging_policy, get_logging_policy, reload_logging_policy, LOGGING_POLICY_PATH
+from .utils import dead_letters, move_posts, profiling
+from .utils.checkpoints import clear_checkpoints
+from .utils.rpc_stats import get_rpc_stats, reset_rpc_stats
+from .utils.txn_windows import clear_windows, retry_parked
+
+ADMIN_TOKEN = os.getenv("QB_SYNC_ADMIN_TOKEN")
+LOCAL_ADDRESSES = {"127.0.0.1", "::1"}
+
+admin_bp = Blueprint("admin", __name__, url_prefix="/admin")
+
+
+def require_admin(view):
+    """Reject requests that do not carry the admin token (or, without one, are not local)."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if ADMIN_TOKEN:
+            supplied = request.headers.get("X-Admin-Token", "")
+            if not hmac.compare_digest(supplied, ADMIN_TOKEN):
+                return jsonify({"error": "forbidden"}), 403
+        elif request.remote_addr not in LOCAL_ADDRESSES:
+            return jsonify({"error": "forbidden"}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+
+@admin_bp.route("/logging", methods=["GET"])
+@require_admin
+def logging_policy():
+    """Show the logging policy in effect."""
+    return jsonify({"policy_file": LOGGING_POLICY_PATH, "policy": get_logging_policy()})
+
+
+@admin_bp.route("/logging", methods=["POST"])
+@require_admin
+def update_logging_policy():
+    """
+    Change logger levels / sampling in this process, e.g.
+    ``{"levels": {"qb_odoo_sync": "DEBUG"}}``. Not persisted; edit the policy
+    file to change every worker durably.
+    """
+    policy = request.get_json(silent=True)
+    if not isinstance(policy, dict):
+        return jsonify({"error": "expected a JSON object with 'levels' and/or 'sampling'"}), 400
+    try:
+        return jsonify({"policy": apply_logging_policy(policy)})
+    except (ValueError, TypeError, AttributeError) as e:
+        return jsonify({"error": f"invalid logging policy: {e}"}), 400
+
+
+@admin_bp.route("/logging/reload", methods=["POST"])
+@require_admin
+def reload_logging():
+    """Discard runtime overrides and re-read the policy file."""
+    return jsonify({"policy": reload_logging_policy()})
+
+
+@admin_bp.route("/profiling", methods=["GET"])
+@require_admin
+def profiling_status():
+    """Show armed profiling targets and the most recent profiles written."""
+    return jsonify(profiling.get_profiling_status())
+
+
+@admin_bp.route("/profiling", methods=["POST"])
+@require_admin
+def arm_profiling():
+    """
+    Profile the next N calls of a target in this process, e.g.
+    ``{"target": "receiveResponseXML", "calls": 3, "top": 30}``. Targets are
+    ``receiveResponseXML`` (a whole round trip) and ``push`` (one page of
+    records pushed to Odoo).
+    """
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict) or "target" not in body:
+        return jsonify({"error": "expected a JSON object with 'target' and optional 'calls'/'top'"}), 400
+    try:
+        return jsonify(profiling.arm(body["target"], body.get("calls", 1),
+                                     body.get("top", profiling.PROFILE_DEFAULT_TOP_N)))
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": str(e)}), 400
+
+
+@admin_bp.route("/profiling", methods=["DELETE"])
+@require_admin
+def disarm_profiling():
+    """Cancel pending profiling (``?target=`` limits it to one target)."""
+    return jsonify(profiling.disarm(request.args.get("target")))
+
+
+@admin_bp.route("/odoo/rpc-stats", methods=["GET"])
+@require_admin
+def odoo_rpc_stats():
+    """Per ``model.method`` Odoo RPC latency, payload size, retries and faults (``?model=`` filters)."""
+    return jsonify(get_rpc_stats(request.args.get("model")))
+
+
+@admin_bp.route("/odoo/rpc-stats", methods=["DELETE"])
+@require_admin
+def clear_odoo_rpc_stats():
+    """Start a fresh accounting window in this process."""
+    reset_rpc_stats()
+    return jsonify({"status": "reset"})
+
+
+@admin_bp.route("/checkpoints", methods=["DELETE"])
+@require_admin
+def reset_checkpoints():
+    """
+    Forget record checkpoints so records QuickBooks returns again are pushed
+    again instead of skipped (``?entity=`` limits it to one QuickBooks object
+    type, e.g. ``Invoice``). With windowed backfill, transactions in completed
+    date windows are only queried again after ``DELETE /admin/txn-windows``.
+    """
+    return jsonify({"cleared": clear_checkpoints(request.args.get("entity"))})
+
+
+@admin_bp.route("/txn-windows", methods=["DELETE"])
+@require_admin
+def reset_txn_windows():
+    """
+    Forget the windowed backfill's progress (``?entity=`` for one entity,
+    otherwise all), so it starts again from QB_SYNC_HISTORY_START.
+    """
+    return jsonify({"cleared": clear_windows(request.args.get("entity"))})
+
+
+@admin_bp.route("/txn-windows/retry", methods=["POST"])
+@require_admin
+def retry_txn_windows():
+    """Query parked date windows again, e.g. ``{"entity": "InvoiceQuery"}``; an empty body retries all of them."""
+    body = request.get_json(silent=True) or {}
+    return jsonify({"retried": retry_parked(body.get("entity"))})
+
+
+@admin_bp.route("/dead-letters", methods=["GET"])
+@require_admin
+def list_dead_letters():
+    """
+    Records that failed to reach Odoo, newest failure first (``?entity=``,
+    ``?limit=`` and ``?payload=1`` to include the extracted record).
+    """
+    try:
+        limit = int(request.args.get("limit", 100))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    return jsonify(dead_letters.list_dead_letters(request.args.get("entity"), limit,
+                                                  include_payload=request.args.get("payload") == "1"))
+
+
+@admin_bp.route("/dead-letters/retry", methods=["POST"])
+@require_admin
+def retry_dead_letters():
+    """
+    Make dead-lettered records due now, parked ones included, e.g.
+    ``{"entity": "Invoice"}`` or ``{"entity": "Invoice", "record_id": "..."}``;
+    an empty body reschedules all of them. The retry scheduler pushes them on
+    its next run.
+    """
+    body = request.get_json(silent=True) or {}
+    return jsonify({"rescheduled": dead_letters.schedule_retry(body.get("entity"), body.get("record_id"))})
+
+
+@admin_bp.route("/dead-letters", methods=["DELETE"])
+@require_admin
+def discard_dead_letters():
+    """Drop dead-lettered records without retrying them (``?entity=`` and/or ``?record_id=``; required)."""
+    entity, record_id = request.args.get("entity"), request.args.get("record_id")
+    if not entity and not record_id:
+        return jsonify({"error": "give entity and/or record_id"}), 400
+    return jsonify({"discarded": dead_letters.discard(entity, record_id)})
+
+
+@admin_bp.route("/moves/unposted", methods=["GET"])
+@require_admin
+def list_unposted_moves():
+    """Created Odoo moves still in draft waiting to be posted, parked ones first (``?limit=``)."""
+    try:
+        limit = int(request.args.get("limit", 100))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    return jsonify(move_posts.list_unposted(limit))
+
+
+@admin_bp.route("/moves/retry", methods=["POST"])
+@require_admin
+def retry_unposted_moves():
+    """Make every queued move due now, parked ones included; the next flush posts them."""
+    return jsonify({"rescheduled": move_posts.schedule_retry()})
@@ -0,0 +1,12 @@
+"""
+Deployment settings shared across the application.
+
+WORKER_PROCESSES is the number of server processes serving the app. It is read
+from WEB_CONCURRENCY, which gunicorn also uses as its default worker count, so
+one variable sizes the server and tells the app whether state kept in process
+memory (the push pipeline, the rotating debug log) is safe to rely on.
+"""
+import os
+
+WORKER_PROCESSES = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+MULTI_PROCESS = WORKER_PROCESSES > 1
@@ -3,29 +3,326 @@ Logging configuration for QB Odoo Sync application.
 
 Provides comprehensive logging with detailed debugging for SOAP interactions,
 XML processing, and Odoo API calls.
+
+Records are handed to a QueueHandler and written by a QueueListener thread, so
+request threads never block on console or file I/O. The debug log file is
+rotated by size; size rotation is not safe across processes, so when several
+server processes share the logs directory each one writes (and rotates) its
+own ``qbwc_debug-<pid>.log``. Large payloads (XML, RPC results, Odoo payloads) should be
+logged through ``truncated(...)`` with %-style arguments so they are only
+rendered, and only up to a bounded size, when the record is actually emitted.
 """
+import atexit
+import copy
+import json
 import logging
+import logging.handlers
 import os
+import queue
+import reprlib
+import threading
+import time
 from pathlib import Path
 
-# Hardcoded log directory and file path
-LOG_DIR = Path(__file__).parent.parent / "logs"
-LOG_FILE_PATH = LOG_DIR / "qbwc_debug.log"
+from .config import MULTI_PROCESS
+
+# Log directory (QB_SYNC_LOG_DIR overrides it) and file path
+LOG_DIR = Path(os.getenv("QB_SYNC_LOG_DIR", str(Path(__file__).parent.parent / "logs")))
+LOG_FILE_PATH = LOG_DIR / (f"qbwc_debug-{os.getpid()}.log" if MULTI_PROCESS else "qbwc_debug.log")
+
+LOG_MAX_BYTES = int(os.getenv("QB_SYNC_LOG_MAX_BYTES", str(10 * 1024 * 1024)))  # Rotate qbwc_debug.log at 10 MB
+LOG_BACKUP_COUNT = int(os.getenv("QB_SYNC_LOG_BACKUP_COUNT", "5"))
+LOG_QUEUE_MAX_RECORDS = 10000   # Records beyond this are dropped rather than blocking a request
+LOG_PAYLOAD_MAX_CHARS = 500     # Default size bound for truncated() payloads
+
+# Per-logger levels and sampling rules; edits to the file are picked up at runtime
+LOGGING_POLICY_PATH = os.getenv("QB_SYNC_LOGGING_POLICY", str(Path(__file__).parent.parent / "data" / "logging_policy.json"))
+LOGGING_POLICY_CHECK_SECONDS = 5
+
+# Steady-state policy: INFO everywhere and hot DEBUG call sites sampled, so
+# raising a logger to DEBUG during an incident cannot flood the log
+DEFAULT_LOGGING_POLICY = {
+    "levels": {
+        "qb_odoo_sync": "INFO",
+        "app": "INFO",
+        "spyne.protocol.xml": "WARNING",
+    },
+    "sampling": {
+        "qb_odoo_sync": {"max_level": "DEBUG", "per_second": 20},
+        "app.soap_patches": {"max_level": "DEBUG", "per_second": 5},
+        "spyne": {"max_level": "DEBUG", "per_second": 5},
+    },
+}
+
+_listener = None
+_policy = {"levels": {}, "sampling": {}}
+_policy_lock = threading.RLock()
+_policy_mtime = None
+_policy_watcher = None
+
+# reprlib limits each container level and element, so a large payload is
+# never rendered in full just to be cut down afterwards
+_payload_repr = reprlib.Repr()
+_payload_repr.maxlevel = 3
+_payload_repr.maxdict = 20
+_payload_repr.maxlist = 20
+_payload_repr.maxtuple = 20
+_payload_repr.maxstring = 80
+_payload_repr.maxother = 80
+
+
+class _Truncated:
+    """Log argument that renders its object lazily and within a size bound."""
+
+    __slots__ = ("obj", "limit")
+
+    def __init__(self, obj, limit):
+        self.obj = obj
+        self.limit = limit
+
+    def __str__(self):
+        obj = self.obj
+        if isinstance(obj, (bytes, bytearray)):
+            text = bytes(obj[:self.limit]).decode("utf-8", errors="replace")
+            return text if len(obj) <= self.limit else f"{text}... [{len(obj)} bytes]"
+        if isinstance(obj, str):
+            return obj if len(obj) <= self.limit else f"{obj[:self.limit]}... [{len(obj)} chars]"
+        text = _payload_repr.repr(obj)
+        return text if len(text) <= self.limit else f"{text[:self.limit]}..."
+
+    __repr__ = __str__
+
+
+def truncated(obj, limit: int = LOG_PAYLOAD_MAX_CHARS) -> _Truncated:
+    """
+    Wrap a payload for logging, e.g. ``logger.debug("Payload: %s", truncated(payload))``.
+
+    Nothing is rendered unless the record passes the level check, and strings,
+    bytes and containers are cut to roughly ``limit`` characters.
+    """
+    return _Truncated(obj, limit)
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that only merges the message arguments on the calling thread.
+
+    The stock handler runs the full formatter before enqueueing; here the
+    timestamp/location formatting is left to the listener thread. A full queue
+    drops the record instead of stalling the request.
+    """
+
+    _exc_formatter = logging.Formatter()
+    dropped = 0  # Records discarded because the queue was full
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        suppressed = getattr(record, "sampling_suppressed", 0)
+        if suppressed:
+            record.msg = f"{record.msg} [sampled: {suppressed} similar record(s) suppressed]"
+        record.args = None
+        if record.exc_info:
+            record.exc_text = self._exc_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _SamplingFilter(logging.Filter):
+    """
+    Rate-limits high-frequency records per call site.
+
+    A sampling rule applies to a logger name prefix and lets through at most
+    ``per_second`` records per second from each (file, line) at or below
+    ``max_level``. The first record let through after a suppressed burst notes
+    how many similar records were dropped (``record.sampling_suppressed``,
+    appended to the message when the queue handler prepares the record).
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.rules = []  # (prefix, max_levelno, per_second), longest prefix first
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def set_rules(self, sampling):
+        rules = []
+        for prefix, rule in sampling.items():
+            max_level = logging.getLevelName(str(rule.get("max_level", "DEBUG")).upper())
+            rules.append((prefix, max_level if isinstance(max_level, int) else logging.DEBUG,
+                          float(rule.get("per_second", 0))))
+        rules.sort(key=lambda rule: len(rule[0]), reverse=True)
+        with self._lock:
+            self.rules = rules
+            self._windows.clear()
+
+    def _rule_for(self, name):
+        for rule in self.rules:
+            prefix = rule[0]
+            if name == prefix or name.startswith(prefix + "."):
+                return rule
+        return None
+
+    def filter(self, record):
+        rule = self._rule_for(record.name)
+        if rule is None or record.levelno > rule[1]:
+            return True
+        key = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= 1.0:
+                suppressed = window[2] if window else 0
+                self._windows[key] = [now, 1, 0]
+                if suppressed:
+                    record.sampling_suppressed = suppressed
+                return True
+            if window[1] < rule[2]:
+                window[1] += 1
+                return True
+            window[2] += 1
+            return False
+
+
+_sampling_filter = _SamplingFilter()
+
+
+def _read_policy_file():
+    try:
+        with open(LOGGING_POLICY_PATH, 'r', encoding='utf-8') as f:
+            policy = json.load(f)
+        if not isinstance(policy, dict):
+            raise ValueError("policy must be a JSON object")
+        return policy
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logging.getLogger('qb_odoo_sync').error("Ignoring unreadable logging policy %s: %s", LOGGING_POLICY_PATH, e)
+        return {}
+
+
+def apply_logging_policy(policy, replace=False):
+    """
+    Apply a logging policy at runtime.
+
+    ``policy`` may contain ``levels`` (logger name -> level name) and
+    ``sampling`` (logger prefix -> {"max_level", "per_second"}); both are
+    merged over the current policy unless ``replace`` is set. A logger set to
+    null reverts to inheriting its parent's level, and a null sampling rule
+    removes it.
+
+    Raises:
+        ValueError: If a level or sampling rule is invalid; nothing is changed.
+    """
+    global _policy
+    with _policy_lock:
+        base = {"levels": {}, "sampling": {}} if replace else _policy
+        merged = {
+            "levels": {**base["levels"], **policy.get("levels", {})},
+            "sampling": {**base["sampling"], **policy.get("sampling", {})},
+        }
+        merged["levels"] = {name: level for name, level in merged["levels"].items() if level is not None}
+        merged["sampling"] = {prefix: rule for prefix, rule in merged["sampling"].items() if rule is not None}
+        # Validate everything before touching any logger
+        levels = {}
+        for name, level in merged["levels"].items():
+            levels[name] = logging.getLevelName(str(level).upper())
+            if not isinstance(levels[name], int):
+                raise ValueError(f"unknown level {level!r} for logger {name!r}")
+        _sampling_filter.set_rules(merged["sampling"])
+        for name in _policy["levels"].keys() - levels.keys():
+            logging.getLogger(name).setLevel(logging.NOTSET)
+        for name, levelno in levels.items():
+            logging.getLogger(name).setLevel(levelno)
+        _policy = merged
+    return get_logging_policy()
+
+
+def reload_logging_policy():
+    """Reset to the default policy overlaid with the policy file (runtime overrides are discarded)."""
+    global _policy_mtime
+    try:
+        _policy_mtime = os.path.getmtime(LOGGING_POLICY_PATH)
+    except OSError:
+        _policy_mtime = None
+    file_policy = _read_policy_file()
+    policy = {
+        "levels": {**DEFAULT_LOGGING_POLICY["levels"], **file_policy.get("levels", {})},
+        "sampling": {**DEFAULT_LOGGING_POLICY["sampling"], **file_policy.get("sampling", {})},
+    }
+    try:
+        return apply_logging_policy(policy, replace=True)
+    except (ValueError, TypeError, AttributeError) as e:
+        logging.getLogger('qb_odoo_sync').error("Invalid logging policy in %s, using defaults: %s", LOGGING_POLICY_PATH, e)
+        return apply_logging_policy(DEFAULT_LOGGING_POLICY, replace=True)
+
+
+def get_logging_policy():
+    """Return the policy currently in effect."""
+    with _policy_lock:
+        return json.loads(json.dumps(_policy))
+
+
+def _watch_policy_file():
+    # Lets every worker process pick up edits to the policy file without
+    # stat()ing it on the logging path
+    while True:
+        time.sleep(LOGGING_POLICY_CHECK_SECONDS)
+        try:
+            mtime = os.path.getmtime(LOGGING_POLICY_PATH)
+        except OSError:
+            mtime = None
+        if mtime != _policy_mtime:
+            reload_logging_policy()
+
+
+def _start_policy_watcher():
+    global _policy_watcher
+    if _policy_watcher is None:
+        _policy_watcher = threading.Thread(target=_watch_policy_file, name="logging-policy-watcher", daemon=True)
+        _policy_watcher.start()
+
+
+def get_log_queue_stats():
+    """Records waiting for the log listener thread, and records dropped because the queue was full."""
+    for handler in logging.getLogger('qb_odoo_sync').handlers:
+        if isinstance(handler, _DeferredQueueHandler):
+            return {"depth": handler.queue.qsize(), "dropped": handler.dropped}
+    return {"depth": 0, "dropped": 0}
+
+
+def _stop_listener():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
 
 def setup_logging():
     """
     Set up comprehensive logging for the application.
-    
+
     Creates both console and file handlers with detailed formatting
-    to match the debugging capabilities of the original script.
+    to match the debugging capabilities of the original script. Both
+    handlers run behind a queue listener thread.
     """
-    # Create main logger
+    global _listener
+
+    # Create main logger (its level comes from the logging policy)
     logger = logging.getLogger('qb_odoo_sync')
-    logger.setLevel(logging.DEBUG)
     logger.propagate = False
 
-    # Clear any existing handlers to prevent duplicates
+    # Clear any existing handlers (and a previous listener) to prevent duplicates
     logger.handlers.clear()
+    _stop_listener()
 
     # Create log directory if it doesn't exist
     LOG_DIR.mkdir(parents=True, exist_ok=True)
@@ -37,47 +334,54 @@ def setup_logging():
         '%(asctime)s - %(levelname)s - CONSOLE - %(name)s - %(module)s - %(funcName)s - %(lineno)d - %(message)s'
     )
     console_handler.setFormatter(console_formatter)
-    logger.addHandler(console_handler)
+    output_handlers = [console_handler]
 
-    # File Handler with even more detailed formatting
+    # Size-rotated file handler with even more detailed formatting
+    file_error = None
     try:
-        file_handler = logging.FileHandler(LOG_FILE_PATH, mode='a', encoding='utf-8')
+        file_handler = logging.handlers.RotatingFileHandler(
+            LOG_FILE_PATH, mode='a', maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding='utf-8'
+        )
         file_handler.setLevel(logging.DEBUG)
         file_formatter = logging.Formatter(
             '%(asctime)s - %(levelname)s - FILE - %(name)s - %(module)s - %(funcName)s - %(lineno)d - %(message)s'
         )
         file_handler.setFormatter(file_formatter)
-        logger.addHandler(file_handler)
-        
-        logger.info(f"File logging initialized. Debug messages will be written to {LOG_FILE_PATH}")
+        output_handlers.append(file_handler)
     except Exception as e:
-        logger.error(f"Failed to initialize file logging to {LOG_FILE_PATH}: {e}", exc_info=True)
-    
-    # Set up child loggers for specific modules with more detailed debugging
-    
-    # SOAP patches logger - for XML processing debugging
-    soap_logger = logging.getLogger('qb_odoo_sync.soap_patches')
-    soap_logger.setLevel(logging.DEBUG)
-    
-    # QBWC service logger - for QB Web Connector interactions
-    qbwc_logger = logging.getLogger('qb_odoo_sync.services.qbwc_service')
-    qbwc_logger.setLevel(logging.DEBUG)
-    
-    # Odoo service logger - for Odoo API calls
-    odoo_logger = logging.getLogger('qb_odoo_sync.services.odoo_service')
-    odoo_logger.setLevel(logging.DEBUG)
-    
-    # Data loader logger - for crosswalk and configuration
-    data_logger = logging.getLogger('qb_odoo_sync.utils.data_loader')
-    data_logger.setLevel(logging.DEBUG)
-    
-    # Add request/response logging for debugging SOAP interactions
-    spyne_logger = logging.getLogger('spyne.protocol.xml')
-    spyne_logger.setLevel(logging.DEBUG)
-    spyne_logger.addHandler(console_handler)
-    spyne_logger.addHandler(file_handler if 'file_handler' in locals() else console_handler)
-    
+        file_error = e
+
+    # Loggers only enqueue; the listener thread does the formatting and I/O.
+    # Sampling runs before the record is copied or its message merged.
+    queue_handler = _DeferredQueueHandler(queue.Queue(maxsize=LOG_QUEUE_MAX_RECORDS))
+    queue_handler.addFilter(_sampling_filter)
+    logger.addHandler(queue_handler)
+    _listener = logging.handlers.QueueListener(queue_handler.queue, *output_handlers, respect_handler_level=True)
+    _listener.start()
+
+    if file_error is None:
+        logger.info("File logging initialized. Debug messages will be written to %s (rotating at %d bytes, %d backups)",
+                    LOG_FILE_PATH, LOG_MAX_BYTES, LOG_BACKUP_COUNT)
+    else:
+        logger.error("Failed to initialize file logging to %s: %s", LOG_FILE_PATH, file_error)
+
+    # Modules using logging.getLogger(__name__) (QBWC service, SOAP patches)
+    # live under 'app', and spyne logs SOAP request/response details
+    for name in ('app', 'spyne.protocol.xml'):
+        module_logger = logging.getLogger(name)
+        module_logger.handlers.clear()
+        module_logger.addHandler(queue_handler)
+        module_logger.propagate = False
+
+    # Per-logger levels and sampling come from the logging policy instead of
+    # forcing every logger to DEBUG; a watcher thread applies later edits
+    reload_logging_policy()
+    _start_policy_watcher()
+
     return logger
 
+# Flush queued records on interpreter exit
+atexit.register(_stop_listener)
+
 # Initialize and get the logger instance for other modules to import
 logger = setup_logging()
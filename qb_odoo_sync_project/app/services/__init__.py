@@ -3,5 +3,10 @@ Services package for QB Odoo Sync application.
 
 This package contains service modules for interacting with external systems:
 - odoo_service: Handles all Odoo API interactions
+- odoo_transport: XML-RPC / JSON-RPC wire transports used by odoo_service
+- odoo_backfill: Bulk backfill through Odoo's load (import) API
+- dead_letter_retry: Background retries of dead-lettered records
+- lookup_indexes: In-memory key -> id indexes over Odoo reference data
+- push_pipeline: Background per-session pushes overlapping QuickBooks queries
 - qbwc_service: Implements the QuickBooks Web Connector SOAP service
 """
@@ -0,0 +1,100 @@
+"""
+Scheduled retries of dead-lettered records (see utils.dead_letters).
+
+A background thread wakes every DEAD_LETTER_RETRY_INTERVAL_SECONDS and, when
+this process has served no QBWC call for DEAD_LETTER_QUIET_SECONDS and Odoo's
+circuit breaker is closed, re-pushes up to DEAD_LETTER_BATCH_SIZE due records
+through the same query handlers a session uses. Records that succeed are
+checkpointed and leave the queue; the others are rescheduled with a longer
+backoff. This picks up a handful of failures without a full resync.
+"""
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, Optional
+
+from ..logging_config import logger
+from ..utils import dead_letters
+from ..utils.metrics import QB_DEAD_LETTERS
+from .odoo_service import odoo_breaker, odoo_posting_queue, prefetch_external_ids
+from .qbwc_service import QUERY_HANDLERS, push_record, record_version, seconds_since_last_round_trip
+
+DEAD_LETTER_RETRY_ENABLED = os.getenv("QB_SYNC_DEAD_LETTER_RETRY", "1") == "1"
+DEAD_LETTER_RETRY_INTERVAL_SECONDS = 60
+DEAD_LETTER_QUIET_SECONDS = 120  # Retry only after QBWC has been quiet this long
+DEAD_LETTER_BATCH_SIZE = 50
+
+_scheduler: Optional[threading.Thread] = None
+_scheduler_lock = threading.Lock()
+
+
+def retry_dead_letters(limit: int = DEAD_LETTER_BATCH_SIZE) -> Dict[str, Any]:
+    """Re-push up to `limit` due records now. Returns counts of recovered and failed records."""
+    outcome = {"recovered": 0, "failed": 0, "skipped": 0}
+    if odoo_breaker.is_open():
+        return outcome
+    handlers = {handler["object"]: handler for handler in QUERY_HANDLERS.values()}
+    by_entity = defaultdict(list)
+    for row in dead_letters.claim_due(limit):
+        by_entity[row["entity"]].append(row)
+
+    for entity, rows in by_entity.items():
+        handler = handlers.get(entity)
+        if handler is None:
+            logger.warning("No handler to retry dead-lettered %s records; leaving %s queued", entity, len(rows))
+            outcome["skipped"] += len(rows)
+            continue
+        if not handler.get("implemented", True):
+            # Never checkpointed, so the session queries push them once the Odoo side exists
+            logger.info("Dropping %s dead-lettered %s record(s): their Odoo side is not implemented yet",
+                        len(rows), entity)
+            dead_letters.discard(entity)
+            outcome["skipped"] += len(rows)
+            continue
+        if handler.get("external_id"):
+            prefetch_external_ids(*handler["external_id"], [row["record_id"] for row in rows])
+        recovered = []
+        for row in rows:
+            if odoo_breaker.is_open():
+                # Claimed rows come due again after DEAD_LETTER_CLAIM_SECONDS
+                outcome["skipped"] += 1
+                continue
+            data = row["payload"]
+            if push_record(handler, row["record_id"], data, record_version(data)):
+                recovered.append(row["record_id"])
+            else:
+                outcome["failed"] += 1
+        dead_letters.resolve(entity, recovered)
+        QB_DEAD_LETTERS.inc(len(recovered), entity=entity, outcome="recovered")
+        outcome["recovered"] += len(recovered)
+
+    if odoo_posting_queue.pending():
+        odoo_posting_queue.flush()
+    if outcome["recovered"] or outcome["failed"]:
+        logger.info("Dead-letter retry: %s recovered, %s failed again", outcome['recovered'], outcome['failed'])
+    return outcome
+
+
+def _run() -> None:
+    while True:
+        time.sleep(DEAD_LETTER_RETRY_INTERVAL_SECONDS)
+        idle = seconds_since_last_round_trip()
+        if idle is not None and idle < DEAD_LETTER_QUIET_SECONDS:
+            continue
+        try:
+            retry_dead_letters()
+        except Exception as e:
+            logger.error("Dead-letter retry failed: %s", e, exc_info=True)
+
+
+def start_retry_scheduler() -> bool:
+    """Start the background retry thread once per process. Returns whether it is running."""
+    global _scheduler
+    if not DEAD_LETTER_RETRY_ENABLED:
+        return False
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = threading.Thread(target=_run, name="dead-letter-retry", daemon=True)
+            _scheduler.start()
+    return True
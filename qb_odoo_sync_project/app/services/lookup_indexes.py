@@ -0,0 +1,139 @@
+"""
+In-process lookup indexes over Odoo reference data.
+
+Resolving an invoice line's product (or, later, a partner, account or
+journal) by a domain search costs one RPC per lookup. A ``LookupIndex`` loads
+the whole key -> id map once with a bulk read and answers from memory
+afterwards; records created or found by the sync are added as they appear.
+The loader is supplied by the caller (odoo_service), so this module does not
+talk to Odoo itself. Indexes expire after ``ttl`` seconds so changes made
+directly in Odoo are picked up on the next load.
+
+Every index registers itself; ``warm_indexes_in_background`` (called when a
+QBWC session authenticates) loads the cold ones on a small thread pool while
+QuickBooks prepares its first response. Only one load of an index runs at a
+time: a lookup that arrives while a load is in flight waits for it instead of
+starting its own.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Hashable, List, Optional
+
+from ..logging_config import logger
+from ..utils.metrics import record_cache_lookup
+
+LOOKUP_INDEX_TTL_SECONDS = 3600
+LOOKUP_INDEX_RETRY_SECONDS = 60  # After a failed load, lookups fall back to searches for this long
+LOOKUP_WARM_WORKERS = 4  # Indexes loaded in parallel by a background warm-up
+LOOKUP_WARM_WAIT_SECONDS = 30  # Longest a lookup waits for an in-flight load before searching Odoo itself
+
+_registry: List["LookupIndex"] = []
+_warm_pool = ThreadPoolExecutor(max_workers=LOOKUP_WARM_WORKERS, thread_name_prefix="index-warm")
+
+
+class LookupIndex:
+    """A key -> Odoo id map loaded in bulk by `loader` and kept for `ttl` seconds."""
+
+    def __init__(self, name: str, loader: Callable[[], Optional[Dict[Hashable, int]]],
+                 ttl: float = LOOKUP_INDEX_TTL_SECONDS):
+        self.name = name
+        self.ttl = ttl
+        self._loader = loader
+        self._entries: Dict[Hashable, int] = {}
+        self._added_during_load: Dict[Hashable, int] = {}
+        self._loaded_at = None
+        self._failed_at = None
+        self._loading: Optional[threading.Event] = None
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl
+
+    @property
+    def loading(self) -> bool:
+        return self._loading is not None
+
+    def warm(self) -> bool:
+        """
+        (Re)load the index; on failure the previous entries are kept. When a
+        load is already running, wait for it instead. Returns whether the
+        index is loaded afterwards.
+        """
+        with self._lock:
+            in_flight = self._loading
+            if in_flight is None:
+                self._loading = threading.Event()
+                self._added_during_load = {}
+        if in_flight is not None:
+            in_flight.wait(LOOKUP_WARM_WAIT_SECONDS)
+            return self.loaded
+
+        started = time.perf_counter()
+        try:
+            entries = self._loader()
+        except Exception as e:
+            logger.error("Loading the %s lookup index raised: %s", self.name, e, exc_info=True)
+            entries = None
+        with self._lock:
+            if entries is not None:
+                # Records created while the load was running may be missing from its snapshot
+                entries.update(self._added_during_load)
+                self._entries = entries
+                self._loaded_at = time.monotonic()
+            else:
+                self._failed_at = time.monotonic()
+            loading, self._loading = self._loading, None
+        loading.set()
+        if entries is None:
+            logger.warning("Could not load the %s lookup index; lookups fall back to Odoo searches.", self.name)
+            return False
+        logger.info("Loaded %s %s into the lookup index in %.2fs", len(entries), self.name, time.perf_counter() - started)
+        return True
+
+    def get(self, key: Hashable) -> Optional[int]:
+        """
+        Id for `key`, loading the index first if it is cold or expired (or
+        waiting for the load already running); None if unknown.
+        """
+        if not self.loaded and (self.loading or self._failed_at is None
+                                or time.monotonic() - self._failed_at >= LOOKUP_INDEX_RETRY_SECONDS):
+            self.warm()
+        with self._lock:
+            odoo_id = self._entries.get(key)
+        record_cache_lookup(f"index_{self.name}", hit=odoo_id is not None)
+        return odoo_id
+
+    def put(self, key: Hashable, odoo_id: int) -> None:
+        with self._lock:
+            self._entries[key] = odoo_id
+            self._added_during_load[key] = odoo_id
+
+    def discard(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries = {}
+            self._loaded_at = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def warm_indexes_in_background() -> List[str]:
+    """
+    Start loading every registered index that is cold, expired or not already
+    loading, without waiting for the loads. Returns the names started.
+    """
+    started = []
+    for index in _registry:
+        if not index.loaded and not index.loading:
+            _warm_pool.submit(index.warm)
+            started.append(index.name)
+    if started:
+        logger.info("Warming lookup indexes in the background: %s", ', '.join(started))
+    return started
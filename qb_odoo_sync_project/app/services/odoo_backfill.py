@@ -0,0 +1,365 @@
+"""
+Bulk backfill of QuickBooks records into Odoo through the ``load`` (import) API.
+
+The incremental sync pushes one record at a time (several RPCs each), which
+is fine for a session's worth of changes but not for a first migration of
+thousands of partners, products and invoices. With QB_SYNC_BACKFILL enabled,
+``_push_records`` hands whole pages to the functions here instead: records
+are turned into the column/row matrix ``load`` takes and sent in chunks of
+ODOO_LOAD_CHUNK_SIZE rows.
+
+Every row carries an external id (``qb.partner_<ListID>``,
+``qb.product_<item>``, ``qb.invoice_<TxnID>``), so loading a record that is
+already in Odoo updates it instead of creating a duplicate. Partners and
+products created before external ids existed are matched by ``ref`` /
+``default_code`` first and get their external id registered, so the load
+updates them too. Odoo rolls back a whole ``load`` call when any row fails;
+the rows its messages point at are reported as failed and the rest of the
+chunk is loaded again without them.
+"""
+import os
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Tuple
+
+from ..logging_config import logger, truncated
+from .odoo_service import (
+    FIELD_MAPPING,
+    MOVE_LINE_KEY,
+    _odoo_rpc_call,
+    ensure_journal_exists,
+    external_id,
+    move_line_key_supported,
+    odoo_posting_queue,
+    QB_ITEM_PRODUCT_TYPES,
+    prefetch_external_ids,
+    product_index,
+    qb_partner_name,
+    register_external_id,
+)
+
+ODOO_BACKFILL_ENABLED = os.getenv("QB_SYNC_BACKFILL", "").lower() in ("1", "true", "yes")
+ODOO_LOAD_CHUNK_SIZE = int(os.getenv("QB_SYNC_LOAD_CHUNK_SIZE", "500"))  # Rows per load call
+
+# One record: (QB id, external id, rows as column -> value). Records with
+# one2many lines span several rows; only the first carries the record's own columns.
+LoadRecord = Tuple[str, str, List[Dict[str, Any]]]
+
+
+@dataclass
+class LoadResult:
+    """Outcome of a backfill, keyed by QB ListID/TxnID."""
+    ids: Dict[str, int] = field(default_factory=dict)
+    errors: Dict[str, str] = field(default_factory=dict)
+    calls: int = 0
+
+
+def _cell(value: Any) -> str:
+    # load parses every cell from text, as in a spreadsheet import
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    return str(value)
+
+
+def _chunks(records: List[LoadRecord], max_rows: int):
+    chunk, rows = [], 0
+    for record in records:
+        if chunk and rows + len(record[2]) > max_rows:
+            yield chunk
+            chunk, rows = [], 0
+        chunk.append(record)
+        rows += len(record[2])
+    if chunk:
+        yield chunk
+
+
+def _failed_records(messages: List[Dict[str, Any]], row_owner: List[int]) -> Dict[int, str]:
+    """Record index -> error text for the load messages that point at rows."""
+    failed = {}
+    for message in messages:
+        if message.get("type") != "error" or not message.get("rows"):
+            continue
+        first = message["rows"].get("from", 0)
+        if 0 <= first < len(row_owner):
+            text = message.get("message", "")
+            if message.get("field"):
+                text = f"{message['field']}: {text}"
+            failed.setdefault(row_owner[first], text)
+    return failed
+
+
+def load_records(model: str, records: List[LoadRecord], result: LoadResult = None) -> LoadResult:
+    """
+    Send records to ``model.load`` in chunks. A chunk that fails is loaded
+    again without the records Odoo reported errors for; a chunk whose errors
+    cannot be attributed to rows fails as a whole.
+    """
+    result = result or LoadResult()
+    for chunk in _chunks(records, ODOO_LOAD_CHUNK_SIZE):
+        while chunk:
+            columns = ["id"]
+            for _, _, rows in chunk:
+                for row in rows:
+                    columns.extend(column for column in row if column not in columns)
+            matrix, row_owner = [], []
+            for position, (_, xml_id, rows) in enumerate(chunk):
+                for row_number, row in enumerate(rows):
+                    matrix.append([xml_id if row_number == 0 else ""] + [_cell(row.get(c)) for c in columns[1:]])
+                    row_owner.append(position)
+
+            result.calls += 1
+            outcome = _odoo_rpc_call(model, "load", args_list=[columns, matrix])
+            if not isinstance(outcome, dict):
+                for qb_id, _, _ in chunk:
+                    result.errors[qb_id] = "load call failed"
+                logger.error("%s.load of %s record(s) failed; see the Odoo RPC log for the fault.", model, len(chunk))
+                break
+
+            messages = outcome.get("messages") or []
+            if outcome.get("ids"):
+                for (qb_id, _, _), odoo_id in zip(chunk, outcome["ids"]):
+                    result.ids[qb_id] = odoo_id
+                for message in messages:
+                    logger.warning("%s.load: %s", model, message.get('message'))
+                logger.info("Loaded %s %s record(s) (%s rows).", len(chunk), model, len(matrix))
+                break
+
+            failed = _failed_records(messages, row_owner)
+            if not failed:
+                for qb_id, _, _ in chunk:
+                    result.errors[qb_id] = "; ".join(m.get("message", "") for m in messages) or "load rejected the chunk"
+                logger.error("%s.load rejected %d record(s) without row-level errors: %s", model, len(chunk), truncated(messages))
+                break
+            for position, text in failed.items():
+                qb_id = chunk[position][0]
+                result.errors[qb_id] = text
+                logger.error("%s.load: QB record %s rejected: %s", model, qb_id, text)
+            chunk = [record for position, record in enumerate(chunk) if position not in failed]
+    return result
+
+
+def _match_existing(model: str, kind: str, key_field: str, keys: Dict[str, str]) -> Dict[str, int]:
+    """
+    Odoo ids of the records that already exist for ``keys`` (QB id -> value of
+    `key_field`), found by external id or else by `key_field`. Records found
+    the second way get their external id registered, so a load updates them
+    instead of creating a duplicate.
+    """
+    found = prefetch_external_ids(model, kind, list(keys))
+    unmatched = {value: qb_id for qb_id, value in keys.items() if qb_id not in found and value}
+    if unmatched:
+        rows = _odoo_rpc_call(
+            model, "search_read",
+            args_list=[[(key_field, "in", list(unmatched)), ("active", "in", [True, False])]],
+            kwargs_dict={"fields": ["id", key_field]},
+        ) or []
+        for row in rows:
+            qb_id = unmatched.pop(row[key_field], None)
+            if qb_id is not None:
+                register_external_id(model, kind, qb_id, row["id"])
+                found[qb_id] = row["id"]
+    return found
+
+
+def partner_row(qb_data: Dict[str, Any], is_supplier: bool = False) -> Dict[str, Any]:
+    """
+    res.partner load columns for a QB customer/vendor, following the same
+    field_mapping.json rules as create_or_update_odoo_partner. Relational
+    fields are given by name (or by external id for the parent) and resolved
+    by Odoo during the load.
+    """
+    name, is_company = qb_partner_name(qb_data)
+    row = {"name": name, "is_company": is_company, "ref": qb_data.get("ListID")}
+    if not is_company:
+        row["type"] = "contact"
+
+    customer_mapping = (FIELD_MAPPING or {}).get("entities", {}).get("Customers", {})
+    for rule in customer_mapping.get("fields", []):
+        qb_field, odoo_field = rule["qbd_field"], rule["odoo_field"]
+        if odoo_field in ("external_id", "first_name", "last_name", "name") or "." in odoo_field:
+            continue
+        value = qb_data.get(qb_field)
+        if value is None or (isinstance(value, str) and not value.strip()):
+            continue
+        if odoo_field == "parent_id":
+            row["parent_id/id"] = external_id("partner", str(value))
+        else:
+            # country_id, state_id, category_id etc. are matched by name during the load
+            row[odoo_field] = value
+
+    defaults = customer_mapping.get("default_values", {})
+    row.setdefault("active", qb_data.get("IsActive", True))
+    row.setdefault("customer_rank", 0 if is_supplier else defaults.get("customer_rank", 1))
+    row.setdefault("supplier_rank", defaults.get("supplier_rank", 1) if is_supplier else 0)
+    return row
+
+
+def backfill_partners(records: List[Tuple[str, Dict[str, Any]]], is_supplier: bool = False) -> LoadResult:
+    """Upsert a page of QB customers or vendors (``(ListID, data)`` pairs) as res.partner."""
+    load = []
+    result = LoadResult()
+    _match_existing("res.partner", "partner", "ref", {qb_id: qb_id for qb_id, _ in records})
+    for qb_id, data in records:
+        row = partner_row(data, is_supplier)
+        if not row["name"]:
+            result.errors[qb_id] = "has no name"
+            continue
+        load.append((qb_id, external_id("partner", qb_id), [row]))
+    return load_records("res.partner", load, result)
+
+
+def backfill_products(items: Dict[str, Dict[str, Any]], update_existing: bool = True) -> Dict[str, int]:
+    """
+    Upsert product templates keyed by QB item name (used as default_code) and
+    return item name -> product.product id. `items` maps the item name to
+    optional ``description``, ``sales_price``, ``purchase_cost`` and ``type``.
+    With `update_existing` off, products already in Odoo are returned as they
+    are and only the missing ones are loaded.
+    """
+    existing = _match_existing("product.template", "product", "default_code", {name: name for name in items})
+    load = []
+    for item_name, item in items.items():
+        if not update_existing and item_name in existing:
+            continue
+        row = {"name": item.get("description") or item_name, "default_code": item_name,
+               "type": item.get("type") or "product", "sale_ok": True, "purchase_ok": True}
+        if item.get("sales_price") is not None:
+            row["list_price"] = item["sales_price"]
+        if item.get("purchase_cost") is not None:
+            row["standard_price"] = item["purchase_cost"]
+        load.append((item_name, external_id("product", item_name), [row]))
+    template_ids = load_records("product.template", load).ids if load else {}
+    if not update_existing:
+        template_ids = {**existing, **template_ids}
+    if not template_ids:
+        return {}
+
+    variants = _odoo_rpc_call(
+        "product.product", "search_read",
+        args_list=[[("product_tmpl_id", "in", list(template_ids.values())), ("active", "in", [True, False])]],
+        kwargs_dict={"fields": ["id", "product_tmpl_id"]},
+    ) or []
+    variant_by_template = {}
+    for variant in variants:
+        variant_by_template.setdefault(variant["product_tmpl_id"][0], variant["id"])
+    return {item_name: variant_by_template[template_id]
+            for item_name, template_id in template_ids.items() if template_id in variant_by_template}
+
+
+def backfill_items(records: List[Tuple[str, Dict[str, Any]]]) -> LoadResult:
+    """
+    Upsert a page of QB items (``(ListID, data)`` pairs) as products keyed by
+    their full name, with sales price and purchase cost. Income and expense
+    accounts are left to the incremental sync, which resolves them by code.
+    """
+    items, names = {}, {}
+    for qb_id, data in records:
+        item_name = data["FullName"]
+        names[qb_id] = item_name
+        items[item_name] = {"description": data.get("SalesDesc") or data.get("PurchaseDesc"),
+                            "sales_price": data.get("SalesPrice"), "purchase_cost": data.get("PurchaseCost"),
+                            "type": QB_ITEM_PRODUCT_TYPES.get(data.get("item_type"))}
+    products = backfill_products(items)
+    result = LoadResult(calls=1)
+    for qb_id, item_name in names.items():
+        if item_name in products:
+            result.ids[qb_id] = products[item_name]
+            product_index.put(item_name, products[item_name])
+        else:
+            result.errors[qb_id] = "product load failed"
+    return result
+
+
+def _partner_ids_by_name(names: List[str]) -> Dict[str, int]:
+    partners = _odoo_rpc_call(
+        "res.partner", "search_read",
+        args_list=[[("name", "in", names), ("parent_id", "=", False)]],
+        kwargs_dict={"fields": ["id", "name"]},
+    ) or []
+    found = {}
+    for partner in partners:
+        found.setdefault(partner["name"], partner["id"])
+    return found
+
+
+def backfill_invoices(records: List[Tuple[str, Dict[str, Any]]]) -> LoadResult:
+    """
+    Load a page of QB invoices (``(TxnID, data)`` pairs) as account.move and
+    queue them for posting. Customers must already be in Odoo (backfill them
+    first). Line items resolve to existing products (loaded by the item
+    backfill or synced earlier) and are left untouched; only items missing
+    from Odoo are created, from the line description, in one load. Invoices
+    whose external id already exists are left alone: a posted move cannot be
+    rewritten by an import, and re-running a backfill must not duplicate
+    their lines.
+    """
+    result = LoadResult()
+    existing = prefetch_external_ids("account.move", "invoice", [qb_id for qb_id, _ in records])
+    pending = []
+    for qb_id, data in records:
+        if qb_id in existing:
+            result.ids[qb_id] = existing[qb_id]
+        else:
+            pending.append((qb_id, data))
+    if not pending:
+        return result
+
+    invoice_mapping = (FIELD_MAPPING or {}).get("entities", {}).get("Invoices", {})
+    defaults = invoice_mapping.get("default_values", {})
+    journal_id = ensure_journal_exists(defaults.get("journal_name", "Customer Invoices"), ["sale"])
+    partners = _partner_ids_by_name(sorted({data["customer_name"] for _, data in pending}))
+    products, missing = {}, {}
+    for _, data in pending:
+        for line in data.get("lines", []):
+            item_name = line.get("item_name")
+            if not item_name or item_name in products or item_name in missing:
+                continue
+            product_id = product_index.get(item_name)
+            if product_id:
+                products[item_name] = product_id
+            else:
+                missing[item_name] = {"description": line.get("description")}
+    if missing:
+        created = backfill_products(missing, update_existing=False)
+        for item_name, product_id in created.items():
+            product_index.put(item_name, product_id)
+        products.update(created)
+
+    keyed_lines = move_line_key_supported()
+    load = []
+    for qb_id, data in pending:
+        partner_id = partners.get(data["customer_name"])
+        if not partner_id:
+            result.errors[qb_id] = f"customer '{data['customer_name']}' not found in Odoo"
+            continue
+        header = {
+            "move_type": defaults.get("move_type", "out_invoice"),
+            "partner_id/.id": partner_id,
+            "journal_id/.id": journal_id,
+            "invoice_date": data.get("txn_date"),
+            "invoice_date_due": data.get("due_date"),
+            "ref": data.get("ref_number"),
+            "narration": data.get("memo"),
+            "x_qb_txn_id": qb_id,
+        }
+        rows = []
+        for line in data.get("lines", []):
+            row = {
+                "invoice_line_ids/product_id/.id": products.get(line.get("item_name")),
+                "invoice_line_ids/name": line.get("description") or line.get("item_name") or "N/A",
+                "invoice_line_ids/quantity": line.get("quantity", 0.0),
+                "invoice_line_ids/price_unit": line.get("rate", 0.0),
+            }
+            if keyed_lines:
+                row[f"invoice_line_ids/{MOVE_LINE_KEY}"] = line.get("txn_line_id")
+            rows.append(row)
+        rows = rows or [{}]
+        rows[0] = {**header, **rows[0]}
+        load.append((qb_id, external_id("invoice", qb_id), rows))
+
+    loaded = load_records("account.move", load, result)
+    for qb_id, _ in pending:
+        if qb_id in loaded.ids:
+            odoo_posting_queue.add(loaded.ids[qb_id])
+    return loaded
@@ -7,13 +7,24 @@ Handles all interactions with the Odoo ERP system including:
 - Chart of accounts management
 - Journal entry creation
 """
+import hashlib
+import re
+import threading
+import time
 import xmlrpc.client # Added import
 # import requests # Keep for potential future use or other integrations
 from datetime import datetime
 from typing import Optional, Dict, Any, List
-from ..logging_config import logger
+from ..logging_config import logger, truncated
 # Ensure this path is correct based on your project structure
 from ..utils.data_loader import get_field_mapping # Corrected import
+from ..utils import auth_cache, move_posts
+from ..utils.metrics import ODOO_MOVES_POSTED, record_cache_lookup, registry
+from ..utils.resilience import AdaptiveLimiter, CircuitBreaker, RetryPolicy
+from ..utils.rpc_stats import classify_rpc_error, record_rpc_call
+from ..utils.tracing import span
+from .lookup_indexes import LookupIndex
+from .odoo_transport import new_transport
 
 # --- Odoo Connection Configuration ---
 ODOO_URL = "https://nterra22-sounddecision-odoo-develop-20178686.dev.odoo.com"
@@ -32,7 +43,7 @@ def _load_mappings():
     if not FIELD_MAPPING:
         logger.error("Field mapping could not be loaded. Service may not function correctly.")
     else:
-        logger.info(f"Field mapping loaded successfully in odoo_service: {list(FIELD_MAPPING.keys()) if isinstance(FIELD_MAPPING, dict) else 'Not a dict'}")
+        logger.info("Field mapping loaded successfully in odoo_service: %s", list(FIELD_MAPPING.keys()) if isinstance(FIELD_MAPPING, dict) else 'Not a dict')
 
 
 _load_mappings() # Load mappings when the module is imported
@@ -40,69 +51,275 @@ _load_mappings() # Load mappings when the module is imported
 def _get_odoo_uid() -> Optional[int]:
     """Authenticates with Odoo and returns the UID."""
     try:
-        common = xmlrpc.client.ServerProxy(f'{ODOO_URL}/xmlrpc/2/common', allow_none=True)
-        uid = common.login(ODOO_DB, ODOO_USERNAME, ODOO_API_KEY)
+        uid = new_transport(ODOO_URL, ODOO_REQUEST_TIMEOUT).call("common", "login", ODOO_DB, ODOO_USERNAME, ODOO_API_KEY)
         if uid:
-            logger.info(f"Successfully authenticated with Odoo. UID: {uid}")
+            logger.info("Successfully authenticated with Odoo. UID: %s", uid)
             return uid
         else:
             logger.error("Odoo authentication failed. No UID returned. Check credentials and DB name.")
             return None
     except xmlrpc.client.Fault as e:
-        logger.error(f"Odoo RPC Fault during login: {e.faultCode} - {e.faultString}")
+        logger.error("Odoo RPC Fault during login: %s - %s", e.faultCode, e.faultString)
         return None
     except Exception as e:
-        logger.error(f"Unexpected error during Odoo login: {e}")
+        logger.error("Unexpected error during Odoo login: %s", e)
         return None
 
 def get_odoo_uid_cached() -> Optional[int]:
-    """Returns a cached Odoo UID, authenticating if necessary."""
+    """
+    Returns a cached Odoo UID, authenticating if necessary. The in-process
+    value is backed by the persisted auth cache, so restarts skip the login.
+    """
     global _cached_uid
+    record_cache_lookup("odoo_uid", hit=_cached_uid is not None)
     if _cached_uid is None:
-        _cached_uid = _get_odoo_uid()
+        _cached_uid = auth_cache.get_cached_uid(ODOO_URL, ODOO_DB, ODOO_USERNAME, ODOO_API_KEY)
+        record_cache_lookup("odoo_auth_file", hit=_cached_uid is not None)
+        if _cached_uid is None:
+            _cached_uid = _get_odoo_uid()
+            if _cached_uid:
+                auth_cache.store_uid(ODOO_URL, ODOO_DB, ODOO_USERNAME, ODOO_API_KEY, _cached_uid)
     return _cached_uid
 
+def invalidate_odoo_uid() -> None:
+    """Forget the UID in this process and in the persisted auth cache."""
+    global _cached_uid
+    _cached_uid = None
+    auth_cache.invalidate(ODOO_URL, ODOO_DB, ODOO_USERNAME, ODOO_API_KEY)
+
+# Trace span category per Odoo method; anything else is traced as "rpc"
+RPC_SPAN_CATEGORIES = {
+    "search": "lookup", "search_read": "lookup", "read": "lookup", "search_count": "lookup",
+    "name_search": "lookup", "fields_get": "lookup",
+    "create": "write", "write": "write", "unlink": "write", "load": "write",
+    "action_post": "post",
+}
+
+RPC_READ_METHODS = {method for method, category in RPC_SPAN_CATEGORIES.items() if category == "lookup"}
+
+def _rpc_span_category(method: str) -> str:
+    return RPC_SPAN_CATEGORIES.get(method, "rpc")
+
+# Retries for transient Odoo failures, and a breaker that stops calling Odoo while it is down
+ODOO_RETRY_POLICY = RetryPolicy(max_attempts=4, base_delay=0.5, max_delay=10.0)
+odoo_breaker = CircuitBreaker("Odoo", failure_threshold=5, reset_timeout=30.0)
+registry.gauge("odoo_circuit_open", "1 while the Odoo circuit breaker refuses calls",
+               callback=lambda: [({}, 1 if odoo_breaker.is_open() else 0)])
+
+# Fault classes (see utils.rpc_stats) worth another attempt, and those meaning Odoo itself is unreachable
+ODOO_RETRYABLE_FAULTS = {"connection_refused", "network", "timeout", "server_unavailable", "concurrency"}
+ODOO_OUTAGE_FAULTS = {"connection_refused", "network", "timeout", "server_unavailable"}
+# Faults after which the request certainly was not applied (refused connection, rolled-back transaction)
+ODOO_NOT_APPLIED_FAULTS = {"connection_refused", "concurrency"}
+ODOO_IDEMPOTENT_METHODS = {"search", "search_read", "read", "search_count", "name_search", "fields_get",
+                           "write", "unlink", "check_access_rights"}
+
+# In-flight Odoo writes are capped by an AIMD limiter that backs off when Odoo slows down or sheds load
+odoo_write_limiter = AdaptiveLimiter("Odoo writes", initial_limit=4, min_limit=1, max_limit=16)
+ODOO_OVERLOAD_FAULTS = {"timeout", "server_unavailable", "concurrency"}
+registry.gauge("odoo_write_concurrency_limit", "Current adaptive limit on in-flight Odoo writes",
+               callback=lambda: [({}, odoo_write_limiter.limit)])
+registry.gauge("odoo_writes_in_flight", "Odoo write calls currently in flight",
+               callback=lambda: [({}, odoo_write_limiter.in_flight)])
+
+def _should_retry_rpc(method: str, fault_class: str) -> bool:
+    """Retry transient faults, but never re-send a non-idempotent call that may already have been applied."""
+    if fault_class not in ODOO_RETRYABLE_FAULTS:
+        return False
+    return method in ODOO_IDEMPOTENT_METHODS or fault_class in ODOO_NOT_APPLIED_FAULTS
+
 def _odoo_rpc_call(model: str, method: str, args_list: List = None, kwargs_dict: Dict = None) -> Optional[Any]:
     """
-    Make a standardized XML-RPC call to Odoo using 'execute_kw'.
+    Make a standardized RPC call to Odoo using 'execute_kw' over the configured
+    transport (XML-RPC by default, JSON-RPC with QB_SYNC_ODOO_PROTOCOL=jsonrpc).
     Ensures positional arguments are always a list and keyword arguments are always a dict.
+
+    Transient failures are retried with exponential backoff and jitter (see
+    ODOO_RETRY_POLICY). Calls that may have been applied before failing (e.g. a
+    timed-out create) are only retried for idempotent methods. Returns None on
+    failure, including when the Odoo circuit breaker is open.
     """
     uid = get_odoo_uid_cached()
     if not uid:
         logger.error("Cannot perform Odoo RPC call: Authentication failed or UID not available.")
         return None
 
+    params_for_execute_kw = [ODOO_DB, uid, ODOO_API_KEY, model, method]
+    # Ensure positional args is always a list
+    if args_list is None:
+        args_list = []
+    elif isinstance(args_list, tuple):
+        args_list = list(args_list)
+    params_for_execute_kw.append(args_list)
+    # Only add kwargs if present and is a dict
+    if kwargs_dict is not None:
+        if not isinstance(kwargs_dict, dict):
+            logger.error("Odoo RPC call: kwargs_dict must be a dict, got %s. Forcing to empty dict.", type(kwargs_dict))
+            kwargs_dict = {}
+        params_for_execute_kw.append(kwargs_dict)
+    logger.debug("Odoo RPC call: model='%s', method='%s', args='%s', kwargs='%s'", model, method, truncated(args_list), truncated(kwargs_dict))
+
+    rpc_started = time.perf_counter()
+    request_bytes = response_bytes = retries = 0
+    fault_class = fault = None
+    retry_delay = 0.0
     try:
-        models_proxy = xmlrpc.client.ServerProxy(f'{ODOO_URL}/xmlrpc/2/object', allow_none=True)
-        params_for_execute_kw = [ODOO_DB, uid, ODOO_API_KEY, model, method]
-        # Ensure positional args is always a list
-        if args_list is None:
-            args_list = []
-        elif isinstance(args_list, tuple):
-            args_list = list(args_list)
-        params_for_execute_kw.append(args_list)
-        # Only add kwargs if present and is a dict
-        if kwargs_dict is not None:
-            if not isinstance(kwargs_dict, dict):
-                logger.error(f"Odoo RPC call: kwargs_dict must be a dict, got {type(kwargs_dict)}. Forcing to empty dict.")
-                kwargs_dict = {}
-            params_for_execute_kw.append(kwargs_dict)
-        logger.debug(f"Odoo XML-RPC call: model='{model}', method='{method}', args='{args_list}', kwargs='{kwargs_dict}'")
-        result = models_proxy.execute_kw(*params_for_execute_kw)
-        logger.debug(f"Odoo RPC call to {model}.{method} successful. Result snippet: {str(result)[:200]}...")
-        return result
-    except xmlrpc.client.Fault as e:
-        logger.error(f"Odoo RPC Fault for {model}.{method}: {e.faultCode} - {e.faultString}")
-        global _cached_uid
-        if "AccessDenied" in e.faultString or "Session expired" in e.faultString or "Invalid user credentials" in e.faultString:
-             _cached_uid = None
-             logger.info("Cleared cached Odoo UID due to potential session/access issue.")
-        return None
-    except Exception as e: 
-        logger.error(f"Unexpected error during Odoo RPC call for {model}.{method}: {e}", exc_info=True)
+        for attempt in range(ODOO_RETRY_POLICY.max_attempts):
+            if retry_delay:
+                time.sleep(retry_delay)
+            transport = new_transport(ODOO_URL, ODOO_REQUEST_TIMEOUT)
+            limited = method not in RPC_READ_METHODS
+            if limited and not odoo_write_limiter.acquire(timeout=ODOO_REQUEST_TIMEOUT):
+                fault_class, fault = "throttled", f"no Odoo write slot freed within {ODOO_REQUEST_TIMEOUT}s"
+                logger.warning("Skipping Odoo RPC call %s.%s: %s", model, method, fault)
+                return None
+            # Ask the breaker last: a half-open breaker admits a single probe,
+            # which must then actually be sent to report back success or failure
+            if not odoo_breaker.allow():
+                if limited:
+                    odoo_write_limiter.cancel()
+                fault_class, fault = "circuit_open", f"Odoo circuit breaker open for another {odoo_breaker.retry_in():.0f}s"
+                logger.warning("Skipping Odoo RPC call %s.%s: %s", model, method, fault)
+                return None
+            attempt_started = time.perf_counter()
+            overloaded = False
+            try:
+                with span(f"{model}.{method}", _rpc_span_category(method), attempt=attempt + 1) as span_args:
+                    result = transport.call("object", "execute_kw", *params_for_execute_kw)
+                    span_args.update(request_bytes=transport.request_bytes, response_bytes=transport.response_bytes)
+            except Exception as e:
+                fault_class = classify_rpc_error(e)
+                overloaded = fault_class in ODOO_OVERLOAD_FAULTS
+                if isinstance(e, xmlrpc.client.Fault):
+                    fault = f"{e.faultCode} - {e.faultString}"
+                else:
+                    fault = f"{type(e).__name__}: {e}"
+                if fault_class in ODOO_OUTAGE_FAULTS:
+                    odoo_breaker.record_failure()
+                else:
+                    # Odoo answered, so it is up even though the call failed
+                    odoo_breaker.record_success()
+                if _should_retry_rpc(method, fault_class) and attempt + 1 < ODOO_RETRY_POLICY.max_attempts:
+                    retry_delay = ODOO_RETRY_POLICY.delay(attempt)
+                    retries += 1
+                    logger.warning("Odoo RPC %s.%s failed (%s: %s); retry %s in %.2fs",
+                                   model, method, fault_class, fault, retries, retry_delay)
+                    continue
+                if isinstance(e, xmlrpc.client.Fault):
+                    logger.error("Odoo RPC Fault (%s) for %s.%s: %s - %s",
+                                 fault_class, model, method, e.faultCode, e.faultString)
+                    if fault_class == "access_denied":
+                        invalidate_odoo_uid()
+                        logger.info("Cleared cached Odoo UID due to potential session/access issue.")
+                else:
+                    logger.error("Unexpected error (%s) during Odoo RPC call for %s.%s: %s", fault_class, model, method, e,
+                                 exc_info=fault_class == "unexpected")
+                return None
+            finally:
+                if limited:
+                    odoo_write_limiter.release(time.perf_counter() - attempt_started, overloaded=overloaded,
+                                               key=f"{model}.{method}")
+                request_bytes += transport.request_bytes
+                response_bytes += transport.response_bytes
+            odoo_breaker.record_success()
+            fault_class = fault = None
+            logger.debug("Odoo RPC call to %s.%s successful. Result snippet: %s", model, method, truncated(result, 200))
+            return result
         return None
+    finally:
+        record_rpc_call(model, method, time.perf_counter() - rpc_started, request_bytes, response_bytes,
+                        retries=retries, fault_class=fault_class, fault=fault)
 
 # --- Partner (Customer/Vendor) Management ---\r
+# --- External IDs ---
+# QuickBooks ListIDs/TxnIDs are registered as Odoo external ids (ir.model.data,
+# module "qb"), so a record is found by a unique, indexed key instead of a
+# domain search on ref / x_qb_txn_id. _push_records resolves a whole page with
+# one search_read (prefetch_external_ids); resolve_external_id then answers
+# from that page cache. Records synced before external ids existed are still
+# found by the legacy search once and registered then.
+EXTERNAL_ID_MODULE = "qb"
+_external_id_page = threading.local()
+
+def external_id_name(kind: str, qb_id: str) -> str:
+    """ir.model.data name for a QB record, e.g. ``partner_80000001_1234567890``."""
+    name = re.sub(r"[^A-Za-z0-9_]", "_", qb_id.strip())
+    if name != qb_id:
+        # Keep names distinct for ids that only differ in replaced characters ("A:B" vs "A-B")
+        name = f"{name}_{hashlib.sha1(qb_id.encode('utf-8')).hexdigest()[:8]}"
+    return f"{kind}_{name}"
+
+def external_id(kind: str, qb_id: str) -> str:
+    """Fully qualified external id, e.g. ``qb.partner_80000001_1234567890``."""
+    return f"{EXTERNAL_ID_MODULE}.{external_id_name(kind, qb_id)}"
+
+def prefetch_external_ids(model: str, kind: str, qb_ids: List[str]) -> Dict[str, int]:
+    """
+    Resolve the external ids of a page of QB records in one ir.model.data
+    search_read and keep the answer (found or not) for resolve_external_id
+    in this thread until the next prefetch. Returns QB id -> Odoo id.
+    """
+    names = {external_id_name(kind, qb_id): qb_id for qb_id in qb_ids}
+    rows = _odoo_rpc_call(
+        "ir.model.data", "search_read",
+        args_list=[[("module", "=", EXTERNAL_ID_MODULE), ("model", "=", model), ("name", "in", list(names))]],
+        kwargs_dict={"fields": ["name", "res_id"]},
+    ) if names else []
+    if rows is None:
+        _external_id_page.cache = {}
+        return {}
+    found = {row["name"]: row["res_id"] for row in rows}
+    _external_id_page.cache = {(model, name): found.get(name) for name in names}
+    return {names[name]: res_id for name, res_id in found.items()}
+
+def resolve_external_id(model: str, kind: str, qb_id: str) -> Optional[int]:
+    """Odoo id registered for a QB record, or None."""
+    key = (model, external_id_name(kind, qb_id))
+    page = getattr(_external_id_page, "cache", {})
+    if key in page:
+        record_cache_lookup("odoo_external_ids", hit=True)
+        return page[key]
+    record_cache_lookup("odoo_external_ids", hit=False)
+    rows = _odoo_rpc_call(
+        "ir.model.data", "search_read",
+        args_list=[[("module", "=", EXTERNAL_ID_MODULE), ("model", "=", model), ("name", "=", key[1])]],
+        kwargs_dict={"fields": ["res_id"], "limit": 1},
+    )
+    return rows[0]["res_id"] if rows else None
+
+def register_external_id(model: str, kind: str, qb_id: str, res_id: int) -> None:
+    """Register the external id for a QB record that was just created or found by a legacy search."""
+    name = external_id_name(kind, qb_id)
+    created = _odoo_rpc_call("ir.model.data", "create", args_list=[{
+        "module": EXTERNAL_ID_MODULE, "name": name, "model": model, "res_id": res_id, "noupdate": True,
+    }])
+    if created:
+        getattr(_external_id_page, "cache", {})[(model, name)] = res_id
+    else:
+        # Typically another worker registered it first (unique module/name); the next lookup finds it
+        logger.warning("Could not register external id %s.%s for %s %s", EXTERNAL_ID_MODULE, name, model, res_id)
+
+# --- Record diffs ---
+# Compare values read from Odoo with the values about to be written, so unchanged
+# fields (and unchanged records) are not written at all.
+def _odoo_value(value: Any) -> Any:
+    """Normalize a value read from Odoo for comparison: many2one [id, name] -> id, False -> None."""
+    if isinstance(value, list) and len(value) == 2 and isinstance(value[0], int) and isinstance(value[1], str):
+        return value[0]
+    return None if value is False else value
+
+def _values_differ(current: Any, wanted: Any) -> bool:
+    if isinstance(wanted, list) and len(wanted) == 1 and isinstance(wanted[0], (list, tuple)) and wanted[0][0] == 6:
+        # many2many (6, 0, ids) replace command against the ids read from Odoo
+        return set(wanted[0][2]) != set(current or [])
+    current = _odoo_value(current)
+    if isinstance(wanted, float) or isinstance(current, float):
+        try:
+            return abs(float(current or 0.0) - float(wanted or 0.0)) > 1e-6
+        except (TypeError, ValueError):
+            return True
+    return current != (None if wanted is False or wanted == "" else wanted)
+
 def find_partner_by_ref(ref: str, company_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
     """Finds a partner by their 'ref' (QuickBooks ListID)."""
     domain = [('ref', '=', ref)]
@@ -113,12 +330,26 @@ def find_partner_by_ref(ref: str, company_id: Optional[int] = None) -> Optional[
         model='res.partner',
         method='search_read',
         args_list=[domain],
-        kwargs_dict={'fields': ['id', 'name', 'email', 'phone', 'mobile', 'street', 'street2', 'city', 'state_id', 'zip', 'country_id', 'is_company', 'parent_id', 'type', 'vat', 'company_id', 'customer_rank', 'supplier_rank'], 'limit': 1}
+        kwargs_dict={'fields': ['id', 'name', 'email', 'phone', 'mobile', 'street', 'street2', 'city', 'state_id', 'zip', 'country_id', 'is_company', 'parent_id', 'type', 'vat', 'company_id', 'customer_rank', 'supplier_rank', 'ref', 'active'], 'limit': 1}
     )
     if partners:
         return partners[0]
     return None
 
+def _load_partner_index() -> Optional[Dict[str, int]]:
+    """name -> res.partner id for every active partner, first in Odoo's default order like a name search."""
+    partners = _odoo_rpc_call("res.partner", "search_read", args_list=[[]], kwargs_dict={"fields": ["id", "name"]})
+    if partners is None:
+        return None
+    index = {}
+    for partner in partners:
+        if partner.get("name"):
+            index.setdefault(partner["name"], partner["id"])
+    return index
+
+# Partners by name (the CustomerRef/VendorRef FullName transactions carry)
+partner_index = LookupIndex("partners", _load_partner_index)
+
 def ensure_partner_exists(name: str, **kwargs) -> Optional[int]:
     """
     Ensure a partner exists in Odoo, creating if necessary.
@@ -153,6 +384,11 @@ def ensure_partner_exists(name: str, **kwargs) -> Optional[int]:
             last = ' '.join(parts[1:])
             possible_names.append(f"{last}, {first}")
 
+    for test_name in possible_names:
+        partner_id = partner_index.get(test_name)
+        if partner_id:
+            return partner_id
+
     # Search for existing partner by all possible name formats
     for test_name in possible_names:
         partners = _odoo_rpc_call(
@@ -163,11 +399,12 @@ def ensure_partner_exists(name: str, **kwargs) -> Optional[int]:
         )
         if partners:
             partner_id = partners[0]["id"]
-            logger.info(f"Partner '{test_name}' found with ID: {partner_id}")
+            logger.info("Partner '%s' found with ID: %s", test_name, partner_id)
+            partner_index.put(test_name, partner_id)
             return partner_id
 
     # Create new partner
-    logger.info(f"Partner '{name}' not found. Creating...")
+    logger.info("Partner '%s' not found. Creating...", name)
     partner_data = {
         "name": name,
         "is_company": False,  # Assume individual unless specified, QB often doesn't distinguish well for this sync
@@ -188,12 +425,13 @@ def ensure_partner_exists(name: str, **kwargs) -> Optional[int]:
     try:
         new_partner_id = _odoo_rpc_call("res.partner", "create", args_list=[partner_data])
         if new_partner_id:
-            logger.info(f"Partner '{name}' created with ID: {new_partner_id}")
+            logger.info("Partner '%s' created with ID: %s", name, new_partner_id)
+            partner_index.put(name, new_partner_id)
         else:
-            logger.error(f"Failed to create partner '{name}'. Odoo returned no ID.")
+            logger.error("Failed to create partner '%s'. Odoo returned no ID.", name)
         return new_partner_id
     except Exception as e:
-        logger.error(f"Exception while creating partner '{name}': {e}", exc_info=True)
+        logger.error("Exception while creating partner '%s': %s", name, e, exc_info=True)
         return None
 
 # --- START OF REORGANIZED AND FIXED PARTNER AND PRODUCT LOGIC ---
@@ -226,7 +464,7 @@ def get_odoo_country_id(country_identifier: str) -> Optional[int]:
     if countries_by_name:
         return countries_by_name[0]["id"]
     
-    logger.warning(f"Odoo country not found for identifier: {country_identifier}")
+    logger.warning("Odoo country not found for identifier: %s", country_identifier)
     return None
 
 def get_odoo_state_id(state_identifier: str, country_code: Optional[str] = None) -> Optional[int]:
@@ -253,7 +491,7 @@ def get_odoo_state_id(state_identifier: str, country_code: Optional[str] = None)
         if country_id:
             domain.append(("country_id", "=", country_id))
         else:
-            logger.warning(f"Cannot filter state by country code '{country_code}' as country was not found.")
+            logger.warning("Cannot filter state by country code '%s' as country was not found.", country_code)
 
     states = _odoo_rpc_call(
         "res.country.state", "search_read",
@@ -265,7 +503,7 @@ def get_odoo_state_id(state_identifier: str, country_code: Optional[str] = None)
     
     # If initial search failed and we had a country filter, try without it as a fallback
     if country_code and not states:
-        logger.info(f"State '{state_identifier}' not found with country filter '{country_code}'. Retrying without country filter.")
+        logger.info("State '%s' not found with country filter '%s'. Retrying without country filter.", state_identifier, country_code)
         domain_no_country = [item for item in domain if item[0] != "country_id"]
         states_no_country = _odoo_rpc_call(
             "res.country.state", "search_read",
@@ -275,7 +513,7 @@ def get_odoo_state_id(state_identifier: str, country_code: Optional[str] = None)
         if states_no_country:
             return states_no_country[0]["id"]
 
-    logger.warning(f"Odoo state not found for identifier: {state_identifier} (Country: {country_code or 'any'})")
+    logger.warning("Odoo state not found for identifier: %s (Country: %s)", state_identifier, country_code or 'any')
     return None
 
 def get_odoo_partner_category_ids(category_names: List[str]) -> List[int]:
@@ -292,7 +530,7 @@ def get_odoo_partner_category_ids(category_names: List[str]) -> List[int]:
         return []
 
     # Log that we're ignoring categories but don't warn
-    logger.debug(f"Ignoring partner categories as configured: {sanitized_names}")
+    logger.debug("Ignoring partner categories as configured: %s", sanitized_names)
     
     # Always return empty list to skip category assignment
     return []
@@ -314,7 +552,7 @@ def get_odoo_payment_term_id(payment_term_name: str) -> Optional[int]:
     )
     
     if terms:
-        logger.debug(f"Using default payment term '{default_term_name}' (ID: {terms[0]['id']}) instead of '{payment_term_name}'")
+        logger.debug("Using default payment term '%s' (ID: %s) instead of '%s'", default_term_name, terms[0]['id'], payment_term_name)
         return terms[0]["id"]
     
     # If "Due on Receipt" doesn't exist, try case-insensitive search
@@ -325,7 +563,7 @@ def get_odoo_payment_term_id(payment_term_name: str) -> Optional[int]:
     )
     
     if terms_ilike:
-        logger.debug(f"Found default payment term using 'ilike' for '{default_term_name}' (ID: {terms_ilike[0]['id']}) instead of '{payment_term_name}'")
+        logger.debug("Found default payment term using 'ilike' for '%s' (ID: %s) instead of '%s'", default_term_name, terms_ilike[0]['id'], payment_term_name)
         return terms_ilike[0]["id"]
     
     # If we still can't find it, look for "Immediate Payment" as fallback
@@ -336,13 +574,44 @@ def get_odoo_payment_term_id(payment_term_name: str) -> Optional[int]:
     )
     
     if immediate_terms:
-        logger.debug(f"Using 'Immediate Payment' as fallback payment term (ID: {immediate_terms[0]['id']}) instead of '{payment_term_name}'")
+        logger.debug("Using 'Immediate Payment' as fallback payment term (ID: %s) instead of '%s'", immediate_terms[0]['id'], payment_term_name)
         return immediate_terms[0]["id"]
     
     # Last resort: return None and let Odoo use its default
-    logger.warning(f"Could not find default payment term '{default_term_name}' or 'Immediate Payment'. Odoo will use its system default.")
+    logger.warning("Could not find default payment term '%s' or 'Immediate Payment'. Odoo will use its system default.", default_term_name)
     return None
 
+def qb_partner_name(qb_customer_data: Dict[str, Any]) -> tuple:
+    """
+    Odoo partner name and is_company flag for a QB customer/vendor record.
+    "LastName, FirstName" becomes "FirstName LastName" and, unless IsPerson
+    says otherwise, an individual. Returns (None, True) when the name is empty.
+    """
+    raw_name = qb_customer_data.get("Name")
+    if not raw_name or not raw_name.strip():
+        return None, True
+
+    # Determine initial is_company status
+    is_company = True # Default
+    if "IsPerson" in qb_customer_data:
+        is_company = not qb_customer_data["IsPerson"]
+
+    name = raw_name
+    if ',' in raw_name:
+        parts = [p.strip() for p in raw_name.split(',', 1)]
+        if len(parts) == 2:
+            last_name, first_name = parts
+            name = f"{first_name} {last_name}"
+            # If name is "LastName, FirstName", it's usually an individual.
+            # Override is_company only if IsPerson is not present or contradicts.
+            if "IsPerson" not in qb_customer_data: # If IsPerson was not provided, assume individual
+                 is_company = False
+
+    # If ParentRef_ListID exists, this is a contact (child), so it's not a company itself. This overrides previous.
+    if qb_customer_data.get("ParentRef_ListID"):
+        is_company = False
+    return name, is_company
+
 def create_or_update_odoo_partner(qb_customer_data: Dict[str, Any], is_supplier: bool = False) -> Optional[int]:
     """
     Creates or updates a partner in Odoo from QuickBooks customer data.
@@ -353,13 +622,13 @@ def create_or_update_odoo_partner(qb_customer_data: Dict[str, Any], is_supplier:
         qb_customer_data: Dictionary containing data from QB CustomerRet or VendorRet.
         is_supplier: Boolean flag, True if the data is for a vendor.
     """
-    logger.info(f"Processing QB Partner Data: Name='{qb_customer_data.get('Name', 'N/A')}', FullName='{qb_customer_data.get('FullName', 'N/A')}', ListID='{qb_customer_data.get('ListID', 'N/A')}', IsSupplier='{is_supplier}'")
+    logger.info("Processing QB Partner Data: Name='%s', FullName='%s', ListID='%s', IsSupplier='%s'", qb_customer_data.get('Name', 'N/A'), qb_customer_data.get('FullName', 'N/A'), qb_customer_data.get('ListID', 'N/A'), is_supplier)
 
     # Check if this is a job (has a ParentRef_ListID). If so, skip creating/updating it as a partner.
     # This check is primarily for customer records that are jobs.
     # Vendors typically don't have ParentRef_ListID in the same way.
     if not is_supplier and qb_customer_data.get("ParentRef_ListID"):
-        logger.info(f"QB record '{qb_customer_data.get('FullName', qb_customer_data.get('Name', 'N/A'))}' (ListID: {qb_customer_data.get('ListID')}) is a job (has ParentRef_ListID). Skipping partner creation/update in Odoo.")
+        logger.info("QB record '%s' (ListID: %s) is a job (has ParentRef_ListID). Skipping partner creation/update in Odoo.", qb_customer_data.get('FullName', qb_customer_data.get('Name', 'N/A')), qb_customer_data.get('ListID'))
         return None # Indicates skipped
 
     if not FIELD_MAPPING:
@@ -376,49 +645,27 @@ def create_or_update_odoo_partner(qb_customer_data: Dict[str, Any], is_supplier:
         logger.error("QuickBooks ListID missing from customer data. Cannot reliably find or create partner.")
         return None
 
-    odoo_partner_id = None
-    existing_partner_data = find_partner_by_ref(qb_list_id)
+    existing_partner_data = None
+    odoo_partner_id = resolve_external_id("res.partner", "partner", qb_list_id)
+    if not odoo_partner_id:
+        existing_partner_data = find_partner_by_ref(qb_list_id)
+        if existing_partner_data:
+            odoo_partner_id = existing_partner_data["id"]
+            register_external_id("res.partner", "partner", qb_list_id, odoo_partner_id)
 
-    if existing_partner_data:
-        odoo_partner_id = existing_partner_data["id"]
-        logger.info(f"Found existing Odoo partner ID: {odoo_partner_id} for QB ListID: {qb_list_id}")
+    if odoo_partner_id:
+        logger.info("Found existing Odoo partner ID: %s for QB ListID: %s", odoo_partner_id, qb_list_id)
     else:
-        logger.info(f"No existing Odoo partner found for QB ListID: {qb_list_id}. Will attempt to create.")
+        logger.info("No existing Odoo partner found for QB ListID: %s. Will attempt to create.", qb_list_id)
 
     odoo_payload = {}
     
     # 1. Handle Name and Company Type (is_company, type)
-    raw_name = qb_customer_data.get("Name")
-    if not raw_name or not raw_name.strip():
-        logger.error(f"QB Customer data for ListID {qb_list_id} is missing 'Name' or 'Name' is empty. Cannot process partner.")
+    odoo_payload["name"], is_company = qb_partner_name(qb_customer_data)
+    if not odoo_payload["name"]:
+        logger.error("QB Customer data for ListID %s is missing 'Name' or 'Name' is empty. Cannot process partner.", qb_list_id)
         return None
-    
-    # Determine initial is_company status
-    is_company = True # Default
-    if "IsPerson" in qb_customer_data:
-        is_company = not qb_customer_data["IsPerson"]
-
-    if ',' in raw_name:
-        parts = [p.strip() for p in raw_name.split(',', 1)]
-        if len(parts) == 2:
-            last_name, first_name = parts
-            odoo_payload["name"] = f"{first_name} {last_name}"
-            # If name is "LastName, FirstName", it's usually an individual.
-            # Override is_company only if IsPerson is not present or contradicts.
-            if "IsPerson" not in qb_customer_data: # If IsPerson was not provided, assume individual
-                 is_company = False
-            # If IsPerson was provided, its value for is_company is already set.
-        else: # Malformed "LastName, FirstName"
-            odoo_payload["name"] = raw_name
-            # is_company remains as determined by IsPerson or default
-    else: # CompanyName or "FirstName LastName"
-        odoo_payload["name"] = raw_name
-        # is_company remains as determined by IsPerson or default
 
-    # If ParentRef_ListID exists, this is a contact (child), so it's not a company itself. This overrides previous.
-    if qb_customer_data.get("ParentRef_ListID"):
-        is_company = False
-    
     odoo_payload["is_company"] = is_company
     if not is_company:
         odoo_payload["type"] = "contact"
@@ -439,7 +686,7 @@ def create_or_update_odoo_partner(qb_customer_data: Dict[str, Any], is_supplier:
         
         # Skip if QB value is None or an empty string after stripping
         if qb_value is None or (isinstance(qb_value, str) and not qb_value.strip()):
-            logger.debug(f"Skipping QB field '{qb_field}' for Odoo field '{odoo_field}' due to empty/None value.")
+            logger.debug("Skipping QB field '%s' for Odoo field '%s' due to empty/None value.", qb_field, odoo_field)
             continue
 
         # Skip complex relational fields that require creating other records (e.g., child_ids.street for shipping addresses)
@@ -451,11 +698,14 @@ def create_or_update_odoo_partner(qb_customer_data: Dict[str, Any], is_supplier:
         if odoo_field == "parent_id": # qb_field is typically "ParentRef_ListID"
             parent_list_id = str(qb_value) 
             if parent_list_id:
-                parent_partner_data = find_partner_by_ref(parent_list_id)
-                if parent_partner_data:
-                    odoo_payload[odoo_field] = parent_partner_data["id"]
+                parent_partner_id = resolve_external_id("res.partner", "partner", parent_list_id)
+                if not parent_partner_id:
+                    parent_partner_data = find_partner_by_ref(parent_list_id)
+                    parent_partner_id = parent_partner_data["id"] if parent_partner_data else None
+                if parent_partner_id:
+                    odoo_payload[odoo_field] = parent_partner_id
                 else:
-                    logger.warning(f"Parent partner with QB ListID {parent_list_id} not found in Odoo for child {odoo_payload.get('name')}. Cannot set parent_id.")
+                    logger.warning("Parent partner with QB ListID %s not found in Odoo for child %s. Cannot set parent_id.", parent_list_id, odoo_payload.get('name'))
             continue 
 
         elif odoo_field == "country_id": # qb_field is typically "BillAddress_Country"
@@ -463,7 +713,7 @@ def create_or_update_odoo_partner(qb_customer_data: Dict[str, Any], is_supplier:
             if country_odoo_id: 
                 odoo_payload[odoo_field] = country_odoo_id
             else:
-                logger.warning(f"Country '{qb_value}' not found in Odoo. Skipping country_id for partner {odoo_payload.get('name')}.")
+                logger.warning("Country '%s' not found in Odoo. Skipping country_id for partner %s.", qb_value, odoo_payload.get('name'))
             continue
 
         elif odoo_field == "state_id": # qb_field is typically "BillAddress_State"
@@ -481,7 +731,7 @@ def create_or_update_odoo_partner(qb_customer_data: Dict[str, Any], is_supplier:
             if state_odoo_id: 
                 odoo_payload[odoo_field] = state_odoo_id
             else:
-                logger.warning(f"State '{qb_value}' (Country: {country_code_for_state or 'any'}) not found in Odoo. Skipping state_id for partner {odoo_payload.get('name')}.")
+                logger.warning("State '%s' (Country: %s) not found in Odoo. Skipping state_id for partner %s.", qb_value, country_code_for_state or 'any', odoo_payload.get('name'))
             continue
             
         elif odoo_field == "category_id": # qb_field is "CustomerTypeRef_FullName"
@@ -538,24 +788,33 @@ def create_or_update_odoo_partner(qb_customer_data: Dict[str, Any], is_supplier:
     # 5. Ensure 'ref' is set for linking with QB ListID
     odoo_payload["ref"] = qb_list_id
     
-    logger.debug(f"Final Odoo partner payload for '{odoo_payload.get('name')}' (ListID: {qb_list_id}): {odoo_payload}")
+    logger.debug("Final Odoo partner payload for '%s' (ListID: %s): %s", odoo_payload.get('name'), qb_list_id, truncated(odoo_payload))
 
     # 6. Perform Odoo RPC Call (Create or Update)
     if odoo_partner_id: # Update existing partner
-        # Odoo's 'write' method takes a list of IDs and a dict of values.
-        # 'ref' can be included; Odoo handles it.
+        # Only write fields that differ from Odoo: every res.partner write triggers
+        # recomputes and mail tracking. Values not already fetched by ref are read once.
+        current = existing_partner_data or {}
+        missing_fields = [field for field in odoo_payload if field not in current]
+        if missing_fields:
+            current_rows = _odoo_rpc_call("res.partner", "read", args_list=[[odoo_partner_id]], kwargs_dict={"fields": missing_fields})
+            if current_rows:
+                current = {**current, **current_rows[0]}
+        if current:
+            odoo_payload = {field: value for field, value in odoo_payload.items()
+                            if field not in current or _values_differ(current[field], value)}
         if not odoo_payload: 
-            logger.info(f"No changes to update for partner {odoo_payload.get('name')} (ID: {odoo_partner_id}).")
+            logger.info("No changes to update for partner %s (ID: %s).", current.get('name'), odoo_partner_id)
             return odoo_partner_id
 
-        logger.info(f"Attempting to update Odoo partner ID: {odoo_partner_id} with data: {odoo_payload}")
+        logger.info("Attempting to update Odoo partner ID: %s with data: %s", odoo_partner_id, truncated(odoo_payload))
         success = _odoo_rpc_call("res.partner", "write", args_list=[[odoo_partner_id], odoo_payload])
         
         if success: # Odoo's write usually returns True on success
-            logger.info(f"Successfully updated Odoo partner ID: {odoo_partner_id}")
+            logger.info("Successfully updated Odoo partner ID: %s", odoo_partner_id)
             return odoo_partner_id
         else:
-            logger.error(f"Failed to update Odoo partner ID: {odoo_partner_id}. Payload: {odoo_payload}")
+            logger.error("Failed to update Odoo partner ID: %s. Payload: %s", odoo_partner_id, truncated(odoo_payload))
             return None 
     else: # Create new partner
         # Optional: Check for duplicates by name/parent before creating if ListID is new
@@ -567,22 +826,31 @@ def create_or_update_odoo_partner(qb_customer_data: Dict[str, Any], is_supplier:
             existing_by_name_no_ref = _odoo_rpc_call("res.partner", "search", args_list=[search_domain_dup], kwargs_dict={'limit': 1})
             if existing_by_name_no_ref:
                 logger.warning(
-                    f"A partner with name '{odoo_payload.get('name')}' "
-                    f"{('and parent ID ' + str(odoo_payload.get('parent_id'))) if odoo_payload.get('parent_id') else ''} "
-                    f"already exists in Odoo with ID {existing_by_name_no_ref[0]} but has no matching QB ListID '{qb_list_id}'. "
-                    f"Review for potential duplicates. Proceeding with creation for ListID: {qb_list_id}."
+                    "A partner with name '%s' "
+                    "%s "
+                    "already exists in Odoo with ID %s but has no matching QB ListID '%s'. "
+                    "Review for potential duplicates. Proceeding with creation for ListID: %s.",
+                    odoo_payload.get('name'),
+                    ('and parent ID ' + str(odoo_payload.get('parent_id'))) if odoo_payload.get('parent_id') else '',
+                    existing_by_name_no_ref[0], qb_list_id, qb_list_id,
                 )
 
-        logger.info(f"Attempting to create new Odoo partner with data: {odoo_payload}")
+        logger.info("Attempting to create new Odoo partner with data: %s", truncated(odoo_payload))
         new_partner_id_result = _odoo_rpc_call("res.partner", "create", args_list=[odoo_payload]) 
         
         if new_partner_id_result and isinstance(new_partner_id_result, int):
-            logger.info(f"Successfully created new Odoo partner with ID: {new_partner_id_result} for QB ListID: {qb_list_id}")
+            logger.info("Successfully created new Odoo partner with ID: %s for QB ListID: %s", new_partner_id_result, qb_list_id)
+            register_external_id("res.partner", "partner", qb_list_id, new_partner_id_result)
+            if not odoo_payload.get("parent_id"):
+                partner_index.put(odoo_payload["name"], new_partner_id_result)
             return new_partner_id_result
         else:
-            logger.error(f"Failed to create new Odoo partner for QB ListID: {qb_list_id}, Name: {odoo_payload.get('name')}. Payload: {odoo_payload}. Result: {new_partner_id_result}")
+            logger.error("Failed to create new Odoo partner for QB ListID: %s, Name: %s. Payload: %s. Result: %s", qb_list_id, odoo_payload.get('name'), truncated(odoo_payload), truncated(new_partner_id_result))
             return None
 
+# default_codes whose product.template is known to carry its qb.product_* external id
+_product_external_ids_checked = set()
+
 def ensure_product_exists(model_code: str, description: str, 
                           sales_price: Optional[float] = None, 
                           purchase_cost: Optional[float] = None,
@@ -597,6 +865,12 @@ def ensure_product_exists(model_code: str, description: str,
         
     model_code = model_code.strip()
     description = description.strip() if description else model_code
+
+    if sales_price is None and purchase_cost is None and not odoo_product_type:
+        # Nothing to update, so an indexed product needs no Odoo call at all
+        product_id = product_index.get(model_code)
+        if product_id:
+            return product_id
     
     products = _odoo_rpc_call(
         "product.product",
@@ -614,39 +888,46 @@ def ensure_product_exists(model_code: str, description: str,
         template_id_tuple = product_record.get("product_tmpl_id")
         template_id_to_update = template_id_tuple[0] if template_id_tuple else None
         
-        logger.info(f"Product '{model_code}' found with ID: {product_id} (Template ID: {template_id_to_update})")
+        logger.info("Product '%s' found with ID: %s (Template ID: %s)", model_code, product_id, template_id_to_update)
+        product_index.put(model_code, product_id)
+        if template_id_to_update and model_code not in _product_external_ids_checked:
+            # Products created before external ids existed get one now, so the
+            # item sync and the load backfill update them instead of duplicating
+            if not resolve_external_id("product.template", "product", model_code):
+                register_external_id("product.template", "product", model_code, template_id_to_update)
+            _product_external_ids_checked.add(model_code)
 
         if template_id_to_update: 
             if sales_price is not None:
                 current_template_data = _odoo_rpc_call("product.template", "read", args_list=[[template_id_to_update]], kwargs_dict={"fields": ["lst_price"]})
                 current_sales_price = current_template_data[0]['lst_price'] if current_template_data and current_template_data[0] else None
                 if sales_price != current_sales_price:
-                    logger.info(f"Updating Odoo product '{model_code}' (Template ID: {template_id_to_update}) sales price from {current_sales_price} to {sales_price}")
+                    logger.info("Updating Odoo product '%s' (Template ID: %s) sales price from %s to %s", model_code, template_id_to_update, current_sales_price, sales_price)
                     update_values_template["lst_price"] = sales_price
             
             if purchase_cost is not None:
                 current_template_data_cost = _odoo_rpc_call("product.template", "read", args_list=[[template_id_to_update]], kwargs_dict={"fields": ["standard_price"]})
                 current_cost_price = current_template_data_cost[0]['standard_price'] if current_template_data_cost and current_template_data_cost[0] else None
                 if purchase_cost != current_cost_price:
-                    logger.info(f"Updating Odoo product '{model_code}' (Template ID: {template_id_to_update}) cost price from {current_cost_price} to {purchase_cost}")
+                    logger.info("Updating Odoo product '%s' (Template ID: %s) cost price from %s to %s", model_code, template_id_to_update, current_cost_price, purchase_cost)
                     update_values_template["standard_price"] = purchase_cost
             
             if odoo_product_type:
                 current_template_data_type = _odoo_rpc_call("product.template", "read", args_list=[[template_id_to_update]], kwargs_dict={"fields": ["type"]})
                 current_type = current_template_data_type[0]['type'] if current_template_data_type and current_template_data_type[0] else None
                 if odoo_product_type != current_type:
-                    logger.info(f"Updating Odoo product '{model_code}' (Template ID: {template_id_to_update}) type from {current_type} to {odoo_product_type}")
+                    logger.info("Updating Odoo product '%s' (Template ID: %s) type from %s to %s", model_code, template_id_to_update, current_type, odoo_product_type)
                     update_values_template["type"] = odoo_product_type
             
             if update_values_template:
                 _odoo_rpc_call("product.template", "write", args_list=[[template_id_to_update], update_values_template])
-                logger.info(f"Updated product.template {template_id_to_update} for '{model_code}'.")
+                logger.info("Updated product.template %s for '%s'.", template_id_to_update, model_code)
         else:
-            logger.warning(f"Product '{model_code}' (ID: {product_id}) found but has no associated product.template. Cannot update price/cost/type. Check data integrity in Odoo.")
+            logger.warning("Product '%s' (ID: %s) found but has no associated product.template. Cannot update price/cost/type. Check data integrity in Odoo.", model_code, product_id)
 
         return product_id
     
-    logger.info(f"Product '{model_code}' not found. Creating...")
+    logger.info("Product '%s' not found. Creating...", model_code)
     
     product_template_data = {
         "name": description,
@@ -663,10 +944,11 @@ def ensure_product_exists(model_code: str, description: str,
     new_template_id = _odoo_rpc_call("product.template", "create", args_list=[product_template_data])
     
     if not new_template_id:
-        logger.error(f"Failed to create product.template for '{model_code}'.")
+        logger.error("Failed to create product.template for '%s'.", model_code)
         return None
     
-    logger.info(f"Product template for '{model_code}' created with ID: {new_template_id}")
+    logger.info("Product template for '%s' created with ID: %s", model_code, new_template_id)
+    register_external_id("product.template", "product", model_code, new_template_id)
 
     created_products = _odoo_rpc_call(
         "product.product",
@@ -677,10 +959,11 @@ def ensure_product_exists(model_code: str, description: str,
 
     if created_products:
         new_product_id = created_products[0]["id"]
-        logger.info(f"Product '{model_code}' (product.product) created with ID: {new_product_id} linked to template {new_template_id}")
+        logger.info("Product '%s' (product.product) created with ID: %s linked to template %s", model_code, new_product_id, new_template_id)
+        product_index.put(model_code, new_product_id)
         return new_product_id
     else:
-        logger.error(f"Failed to find the auto-created product.product for template ID {new_template_id} and code '{model_code}'. This can happen with variants or if creation is delayed. Manual check in Odoo might be needed.")
+        logger.error("Failed to find the auto-created product.product for template ID %s and code '%s'. This can happen with variants or if creation is delayed. Manual check in Odoo might be needed.", new_template_id, model_code)
         fallback_products = _odoo_rpc_call(
             "product.product", "search_read",
             args_list=[[("product_tmpl_id", "=", new_template_id)]],
@@ -688,11 +971,104 @@ def ensure_product_exists(model_code: str, description: str,
         )
         if fallback_products:
             new_product_id = fallback_products[0]["id"]
-            logger.info(f"Product '{model_code}' (product.product) created with ID: {new_product_id} (found via fallback search) linked to template {new_template_id}")
+            logger.info("Product '%s' (product.product) created with ID: %s (found via fallback search) linked to template %s", model_code, new_product_id, new_template_id)
             return new_product_id
         else:
-            logger.error(f"Fallback search also failed to find product.product for template ID {new_template_id}.")
+            logger.error("Fallback search also failed to find product.product for template ID %s.", new_template_id)
             return None
+# QB item type -> Odoo product type
+QB_ITEM_PRODUCT_TYPES = {
+    "ItemInventory": "product",
+    "ItemNonInventory": "consu",
+    "ItemService": "service",
+    "ItemOtherCharge": "service",
+}
+
+def _load_product_index() -> Optional[Dict[str, int]]:
+    """default_code -> product.product id for every product with an internal reference."""
+    products = _odoo_rpc_call("product.product", "search_read",
+                              args_list=[[("default_code", "!=", False)]],
+                              kwargs_dict={"fields": ["id", "default_code"]})
+    if products is None:
+        return None
+    return {product["default_code"]: product["id"] for product in products}
+
+# Products by default_code (the QB item FullName invoice lines reference)
+product_index = LookupIndex("products", _load_product_index)
+
+def create_or_update_odoo_item(qb_item_data: Dict[str, Any]) -> Optional[int]:
+    """
+    Upsert a QB inventory, non-inventory, service or other-charge item as a
+    product with its real description, price, cost and accounts, so invoice
+    lines later resolve to a complete product instead of creating one from a
+    line description. Matched by external id, then default_code (the item's
+    FullName). Returns the product.product id.
+    """
+    code = qb_item_data.get("FullName") or qb_item_data.get("Name")
+    if not code:
+        logger.error("QB item %s has no name. Cannot create product.", qb_item_data.get('ListID'))
+        return None
+
+    vals = {
+        "name": qb_item_data.get("SalesDesc") or qb_item_data.get("Name") or code,
+        "default_code": code,
+        "type": QB_ITEM_PRODUCT_TYPES.get(qb_item_data.get("item_type"), "product"),
+        "sale_ok": True,
+        "purchase_ok": True,
+        "active": qb_item_data.get("IsActive", True),
+    }
+    if qb_item_data.get("SalesPrice") is not None:
+        vals["list_price"] = qb_item_data["SalesPrice"]
+    if qb_item_data.get("PurchaseCost") is not None:
+        vals["standard_price"] = qb_item_data["PurchaseCost"]
+    if qb_item_data.get("PurchaseDesc"):
+        vals["description_purchase"] = qb_item_data["PurchaseDesc"]
+    if qb_item_data.get("IncomeAccount"):
+        income_account_id = ensure_account_exists(qb_item_data["IncomeAccount"], account_type_hint="income")
+        if income_account_id:
+            vals["property_account_income_id"] = income_account_id
+    if qb_item_data.get("ExpenseAccount"):
+        expense_account_id = ensure_account_exists(qb_item_data["ExpenseAccount"], account_type_hint="expense")
+        if expense_account_id:
+            vals["property_account_expense_id"] = expense_account_id
+
+    fields = list(vals) + ["product_variant_id"]
+    template_id = resolve_external_id("product.template", "product", code)
+    if template_id:
+        templates = _odoo_rpc_call("product.template", "read", args_list=[[template_id]], kwargs_dict={"fields": fields})
+    else:
+        templates = _odoo_rpc_call(
+            "product.template", "search_read",
+            args_list=[[("default_code", "=", code), ("active", "in", [True, False])]],
+            kwargs_dict={"fields": fields, "limit": 1},
+        )
+        if templates:
+            template_id = templates[0]["id"]
+            register_external_id("product.template", "product", code, template_id)
+
+    if templates:
+        current = templates[0]
+        changes = {field: value for field, value in vals.items() if _values_differ(current.get(field), value)}
+        if changes:
+            logger.info("Updating Odoo product '%s' (template %s): %s", code, template_id, truncated(changes))
+            if not _odoo_rpc_call("product.template", "write", args_list=[[template_id], changes]):
+                logger.error("Failed to update Odoo product template %s for QB item '%s'.", template_id, code)
+                return None
+        product_id = _odoo_value(current.get("product_variant_id"))
+    else:
+        template_id = _odoo_rpc_call("product.template", "create", args_list=[vals])
+        if not template_id:
+            logger.error("Failed to create Odoo product for QB item '%s'.", code)
+            return None
+        register_external_id("product.template", "product", code, template_id)
+        created = _odoo_rpc_call("product.template", "read", args_list=[[template_id]], kwargs_dict={"fields": ["product_variant_id"]})
+        product_id = _odoo_value(created[0].get("product_variant_id")) if created else None
+        logger.info("Created Odoo product '%s' (template %s, product %s).", code, template_id, product_id)
+
+    if product_id:
+        product_index.put(code, product_id)
+    return product_id
+
 # --- END OF REORGANIZED AND FIXED PARTNER AND PRODUCT LOGIC ---
 
 # --- Account Crosswalk Helper ---
@@ -765,6 +1141,30 @@ load_account_crosswalk() # Call this to ensure data_loader loads it on module im
 # --- End Account Crosswalk Helper ---
 
 
+def _load_account_index() -> Optional[Dict[str, int]]:
+    """code -> account.account id."""
+    accounts = _odoo_rpc_call("account.account", "search_read", args_list=[[]], kwargs_dict={"fields": ["id", "code"]})
+    if accounts is None:
+        return None
+    index = {}
+    for account in accounts:
+        index.setdefault(account["code"], account["id"])
+    return index
+
+def _load_journal_index() -> Optional[Dict[tuple, int]]:
+    """(name, type) -> account.journal id."""
+    journals = _odoo_rpc_call("account.journal", "search_read", args_list=[[]], kwargs_dict={"fields": ["id", "name", "type"]})
+    if journals is None:
+        return None
+    index = {}
+    for journal in journals:
+        index.setdefault((journal["name"], journal["type"]), journal["id"])
+    return index
+
+# Accounts by code (as given by the account crosswalk) and journals by (name, type)
+account_index = LookupIndex("accounts", _load_account_index)
+journal_index = LookupIndex("journals", _load_journal_index)
+
 def ensure_account_exists(qb_account_full_name: str, account_type_hint: Optional[str] = None) -> Optional[int]:
     """
     Ensure an account exists in Odoo based on QB account crosswalk.
@@ -784,7 +1184,7 @@ def ensure_account_exists(qb_account_full_name: str, account_type_hint: Optional
         
     odoo_account_map = get_account_map(qb_account_full_name)
     if not odoo_account_map:
-        logger.warning(f"QuickBooks account '{qb_account_full_name}' not found in crosswalk. Account type hint: {account_type_hint}")
+        logger.warning("QuickBooks account '%s' not found in crosswalk. Account type hint: %s", qb_account_full_name, account_type_hint)
         return None
 
     odoo_account_code = odoo_account_map.get("code")
@@ -793,9 +1193,13 @@ def ensure_account_exists(qb_account_full_name: str, account_type_hint: Optional
     odoo_account_type_name = odoo_account_map.get("type") or account_type_hint 
 
     if not odoo_account_code:
-        logger.warning(f"Odoo account code missing for QB account '{qb_account_full_name}' in crosswalk")
+        logger.warning("Odoo account code missing for QB account '%s' in crosswalk", qb_account_full_name)
         return None
 
+    account_id = account_index.get(odoo_account_code)
+    if account_id:
+        return account_id
+
     accounts = _odoo_rpc_call(
         model="account.account",
         method="search_read",
@@ -805,13 +1209,14 @@ def ensure_account_exists(qb_account_full_name: str, account_type_hint: Optional
 
     if accounts:
         account_id = accounts[0]["id"]
-        logger.info(f"Odoo Account '{odoo_account_code} - {accounts[0]['name']}' found with ID: {account_id}")
+        logger.info("Odoo Account '%s - %s' found with ID: %s", odoo_account_code, accounts[0]['name'], account_id)
+        account_index.put(odoo_account_code, account_id)
         return account_id
     
-    logger.info(f"Odoo Account with code '{odoo_account_code}' not found. Attempting to create")
+    logger.info("Odoo Account with code '%s' not found. Attempting to create", odoo_account_code)
     
     if not odoo_account_type_name:
-        logger.error(f"Odoo account type name not specified for QB account '{qb_account_full_name}' (from crosswalk or hint). Cannot create account.")
+        logger.error("Odoo account type name not specified for QB account '%s' (from crosswalk or hint). Cannot create account.", qb_account_full_name)
         return None
         
     account_types = _odoo_rpc_call(
@@ -822,11 +1227,11 @@ def ensure_account_exists(qb_account_full_name: str, account_type_hint: Optional
     )
 
     if not account_types:
-        logger.error(f"Odoo account type '{odoo_account_type_name}' not found. Cannot create account '{odoo_account_code}'")
+        logger.error("Odoo account type '%s' not found. Cannot create account '%s'", odoo_account_type_name, odoo_account_code)
         return None
 
     user_type_id = account_types[0]["id"]
-    logger.info(f"Found Odoo account type '{account_types[0]['name']}' with ID {user_type_id} for creating account '{odoo_account_code}'")
+    logger.info("Found Odoo account type '%s' with ID %s for creating account '%s'", account_types[0]['name'], user_type_id, odoo_account_code)
 
     account_data = {
         "code": odoo_account_code,
@@ -837,9 +1242,10 @@ def ensure_account_exists(qb_account_full_name: str, account_type_hint: Optional
     
     new_account_id = _odoo_rpc_call("account.account", "create", args_list=[account_data])
     if new_account_id:
-        logger.info(f"Odoo Account '{odoo_account_code}' created with ID: {new_account_id}")
+        logger.info("Odoo Account '%s' created with ID: %s", odoo_account_code, new_account_id)
+        account_index.put(odoo_account_code, new_account_id)
     else:
-        logger.error(f"Failed to create Odoo account '{odoo_account_code}'.")
+        logger.error("Failed to create Odoo account '%s'.", odoo_account_code)
     
     return new_account_id
 
@@ -859,12 +1265,13 @@ def ensure_journal_exists(journal_name: str, journal_type_list: Optional[List[st
         logger.warning("Empty journal name provided to ensure_journal_exists")
         return None
     
-    domain = [("name", "=", journal_name)] # Corrected
-    
-    if journal_type_list:
-        domain.append(("type", "in", journal_type_list)) # Corrected
-    else:
-        domain.append(("type", "in", ["general", "sale", "purchase", "bank", "cash"])) # Corrected
+    journal_types = journal_type_list or ["general", "sale", "purchase", "bank", "cash"]
+    for journal_type in journal_types:
+        journal_id = journal_index.get((journal_name, journal_type))
+        if journal_id:
+            return journal_id
+
+    domain = [("name", "=", journal_name), ("type", "in", journal_types)]
         
     journals = _odoo_rpc_call(
         model="account.journal",
@@ -875,10 +1282,11 @@ def ensure_journal_exists(journal_name: str, journal_type_list: Optional[List[st
     
     if journals:
         journal_id = journals[0]["id"]
-        logger.info(f"Odoo Journal '{journal_name}' (Type: {journals[0]['type']}) found with ID: {journal_id}")
+        logger.info("Odoo Journal '%s' (Type: %s) found with ID: %s", journal_name, journals[0]['type'], journal_id)
+        journal_index.put((journal_name, journals[0]["type"]), journal_id)
         return journal_id
     
-    logger.warning(f"Odoo Journal '{journal_name}' (Types searched: {journal_type_list or 'default'}) not found")
+    logger.warning("Odoo Journal '%s' (Types searched: %s) not found", journal_name, journal_type_list or 'default')
     return None
 
 def create_odoo_journal_entry(entry_data: Dict[str, Any]) -> Optional[int]:
@@ -901,7 +1309,7 @@ def create_odoo_journal_entry(entry_data: Dict[str, Any]) -> Optional[int]:
     """
     required_fields = ['ref', 'journal_id', 'date', 'line_ids']
     if not all(field in entry_data for field in required_fields):
-        logger.error(f"Missing required fields for journal entry creation. Provided: {entry_data.keys()}")
+        logger.error("Missing required fields for journal entry creation. Provided: %s", entry_data.keys())
         return None
     
     if not entry_data['line_ids']:
@@ -912,7 +1320,7 @@ def create_odoo_journal_entry(entry_data: Dict[str, Any]) -> Optional[int]:
     total_debit = sum(line[2].get('debit', 0) for line in entry_data['line_ids'] if len(line) > 2 and isinstance(line[2], dict))
     total_credit = sum(line[2].get('credit', 0) for line in entry_data['line_ids'] if len(line) > 2 and isinstance(line[2], dict))
     if round(total_debit, 2) != round(total_credit, 2):
-        logger.warning(f"Journal entry lines are not balanced. Debit: {total_debit}, Credit: {total_credit}. Odoo might reject.")
+        logger.warning("Journal entry lines are not balanced. Debit: %s, Credit: %s. Odoo might reject.", total_debit, total_credit)
 
     move_data = {
         'ref': entry_data['ref'],
@@ -921,7 +1329,7 @@ def create_odoo_journal_entry(entry_data: Dict[str, Any]) -> Optional[int]:
         'line_ids': entry_data['line_ids']
     }
     
-    logger.info(f"Attempting to create Odoo journal entry: {move_data}")
+    logger.info("Attempting to create Odoo journal entry: %s", truncated(move_data))
     move_id = _odoo_rpc_call(
         model="account.move",
         method="create",
@@ -929,7 +1337,7 @@ def create_odoo_journal_entry(entry_data: Dict[str, Any]) -> Optional[int]:
     )
     
     if move_id:
-        logger.info(f"Successfully created Odoo journal entry with ID: {move_id}")
+        logger.info("Successfully created Odoo journal entry with ID: %s", move_id)
         # Optionally, post the journal entry
         # _odoo_rpc_call(model="account.move", method="action_post", args=[[move_id]])
         # logger.info(f"Posted journal entry {move_id}")
@@ -939,12 +1347,180 @@ def create_odoo_journal_entry(entry_data: Dict[str, Any]) -> Optional[int]:
     return move_id
 
 
+# --- Deferred posting ---
+ODOO_POST_BATCH_SIZE = 50  # Moves posted per action_post call
+
+class MovePostingQueue:
+    """
+    Created account.move ids waiting for action_post. Posting is one of the
+    slowest Odoo operations and takes the journal's sequence lock, so moves
+    are posted in batches, one batch at a time, when a batch fills up and
+    when the caller flushes (end of a page, end of a session). A batch that
+    fails is retried id by id so one bad move does not leave the rest in draft.
+
+    Queued ids are persisted (utils.move_posts) until their post succeeds: a
+    failed post is retried with backoff, and ids left queued while Odoo is
+    unavailable or by a process that exited are posted by the next flush of
+    any worker.
+    """
+
+    def __init__(self, batch_size: int = ODOO_POST_BATCH_SIZE):
+        self.batch_size = batch_size
+        self._added = 0
+        self._lock = threading.Lock()
+        self._post_lock = threading.Lock()
+
+    def add(self, move_id: int) -> None:
+        move_posts.enqueue(move_id)
+        with self._lock:
+            self._added += 1
+            full = self._added >= self.batch_size
+        if full:
+            self.flush()
+
+    def pending(self) -> int:
+        """Queued moves due for posting now."""
+        try:
+            return move_posts.count_due()
+        except Exception as e:
+            logger.error("Could not count Odoo moves awaiting posting: %s", e)
+            return 0
+
+    def flush(self) -> Dict[str, List[int]]:
+        """Post every due move. Returns the posted and failed ids; ids left while Odoo is unavailable stay queued."""
+        outcome = {"posted": [], "failed": []}
+        with self._post_lock:
+            with self._lock:
+                self._added = 0
+            while True:
+                if odoo_breaker.is_open():
+                    logger.warning("Odoo is unavailable; %s move(s) stay queued for posting.", move_posts.count_due())
+                    break
+                batch = move_posts.claim_due(self.batch_size)
+                if not batch:
+                    break
+                if _odoo_rpc_call("account.move", "action_post", args_list=[batch]) is not None:
+                    move_posts.mark_posted(batch)
+                    outcome["posted"].extend(batch)
+                    continue
+                for index, move_id in enumerate(batch):
+                    if odoo_breaker.is_open():
+                        move_posts.release(batch[index:])
+                        break
+                    if _odoo_rpc_call("account.move", "action_post", args_list=[[move_id]]) is not None:
+                        move_posts.mark_posted([move_id])
+                        outcome["posted"].append(move_id)
+                    else:
+                        move_posts.mark_failed(move_id, "action_post failed")
+                        outcome["failed"].append(move_id)
+                        logger.error("Failed to post Odoo move %s; it remains in draft and will be retried.", move_id)
+        ODOO_MOVES_POSTED.inc(len(outcome["posted"]), outcome="posted")
+        ODOO_MOVES_POSTED.inc(len(outcome["failed"]), outcome="failed")
+        if outcome["posted"]:
+            logger.info("Posted %s Odoo move(s).", len(outcome['posted']))
+        return outcome
+
+odoo_posting_queue = MovePostingQueue()
+
+# --- Move update diffs ---
+# Invoice/credit memo lines are matched to QB lines by TxnLineID, stored in the
+# custom x_qb_txn_line_id field on account.move.line (like x_qb_txn_id on the
+# move). The field is an optional Odoo customization: without it lines are
+# compared in order and replaced as a whole when any of them changed.
+MOVE_LINE_KEY = "x_qb_txn_line_id"
+MOVE_LINE_DIFF_FIELDS = ["product_id", "name", "quantity", "price_unit", "account_id"]
+_move_line_key_supported = None
+
+def move_line_key_supported() -> bool:
+    """Whether account.move.line has MOVE_LINE_KEY; asked once per process via fields_get."""
+    global _move_line_key_supported
+    if _move_line_key_supported is None:
+        fields = _odoo_rpc_call("account.move.line", "fields_get", args_list=[[MOVE_LINE_KEY]],
+                                kwargs_dict={"attributes": ["type"]})
+        if fields is None:
+            return False  # Could not ask; leave the key out and ask again next time
+        _move_line_key_supported = isinstance(fields, dict) and MOVE_LINE_KEY in fields
+        if not _move_line_key_supported:
+            logger.warning("account.move.line has no %s field; invoice and credit memo lines "
+                           "are matched by position and replaced when they change.", MOVE_LINE_KEY)
+    return _move_line_key_supported
+
+def _move_update_payload(move_id: int, payload: Dict[str, Any], line_vals: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    Only what changed between an existing account.move and the payload built
+    from QB: differing header fields, plus (1, id, vals) / (0, 0, vals) /
+    (2, id) line commands keyed by MOVE_LINE_KEY (lines without a key are
+    matched by content, then position), or without that field a (5, 0, 0)
+    replacement when any line differs in order. An empty dict means nothing to
+    write. Returns None when the current move could not be read.
+    """
+    keyed = move_line_key_supported()
+    header_fields = [field for field in payload if field not in ("move_type", "invoice_line_ids")]
+    moves = _odoo_rpc_call("account.move", "read", args_list=[[move_id]],
+                           kwargs_dict={"fields": header_fields + ["invoice_line_ids"]})
+    if not moves:
+        return None
+    move = moves[0]
+    changes = {field: payload[field] for field in header_fields if _values_differ(move.get(field), payload[field])}
+
+    current_lines = []
+    if move.get("invoice_line_ids"):
+        current_lines = _odoo_rpc_call("account.move.line", "read", args_list=[move["invoice_line_ids"]],
+                                       kwargs_dict={"fields": ([MOVE_LINE_KEY] if keyed else []) + MOVE_LINE_DIFF_FIELDS})
+        if current_lines is None:
+            return None
+    if not keyed:
+        if len(current_lines) != len(line_vals) or any(
+                _values_differ(line.get(field), vals[field])
+                for line, vals in zip(current_lines, line_vals) for field in MOVE_LINE_DIFF_FIELDS if field in vals):
+            changes["invoice_line_ids"] = [(5, 0, 0)] + [(0, 0, vals) for vals in line_vals]
+        return changes
+    by_key = {line[MOVE_LINE_KEY]: line for line in current_lines if line.get(MOVE_LINE_KEY)}
+
+    matches = {}  # index in line_vals -> current line
+    for index, vals in enumerate(line_vals):
+        line = by_key.pop(vals.get(MOVE_LINE_KEY), None) if vals.get(MOVE_LINE_KEY) else None
+        if line is not None:
+            matches[index] = line
+    # QB lines without a TxnLineID, or without a counterpart carrying it, take
+    # the Odoo lines that have none (written before the field existed): first
+    # an identical one, then the next one in order.
+    spare = [line for line in current_lines if not line.get(MOVE_LINE_KEY)]
+    unmatched = [index for index in range(len(line_vals)) if index not in matches]
+    for index in unmatched:
+        same = next((line for line in spare if not _move_line_changes(line, line_vals[index], MOVE_LINE_DIFF_FIELDS)), None)
+        if same is not None:
+            matches[index] = same
+            spare.remove(same)
+    for index, line in zip([index for index in unmatched if index not in matches], spare):
+        matches[index] = line
+
+    commands = []
+    for index, vals in enumerate(line_vals):
+        line = matches.get(index)
+        if line is None:
+            commands.append((0, 0, vals))
+            continue
+        changed = _move_line_changes(line, vals, MOVE_LINE_DIFF_FIELDS + [MOVE_LINE_KEY])
+        if changed:
+            commands.append((1, line["id"], changed))
+    # Lines gone from QB
+    kept = {line["id"] for line in matches.values()}
+    commands.extend((2, line["id"], 0) for line in current_lines if line["id"] not in kept)
+    if commands:
+        changes["invoice_line_ids"] = commands
+    return changes
+
+def _move_line_changes(line: Dict[str, Any], vals: Dict[str, Any], fields: List[str]) -> Dict[str, Any]:
+    """Values of `fields` in vals that differ from the account.move.line read from Odoo."""
+    return {field: value for field, value in vals.items() if field in fields and _values_differ(line.get(field), value)}
+
 def create_or_update_odoo_invoice(qb_invoice_data: Dict[str, Any]) -> Optional[int]:
     """
     Creates or updates an invoice in Odoo from QuickBooks data using field_mapping.json.
     """
-    logger.info(f"Processing QB Invoice: Ref {qb_invoice_data.get('ref_number')}, Customer: {qb_invoice_data.get('customer_name')}, TxnID: {qb_invoice_data.get('qb_txn_id')}")
-    logger.debug(f"Full QB Invoice data: {qb_invoice_data}")
+    logger.info("Processing QB Invoice: Ref %s, Customer: %s, TxnID: %s", qb_invoice_data.get('ref_number'), qb_invoice_data.get('customer_name'), qb_invoice_data.get('qb_txn_id'))
+    logger.debug("Full QB Invoice data: %s", truncated(qb_invoice_data))
 
     invoice_mapping = FIELD_MAPPING.get("entities", {}).get("Invoices")
     if not invoice_mapping:
@@ -959,7 +1535,7 @@ def create_or_update_odoo_invoice(qb_invoice_data: Dict[str, Any]) -> Optional[i
     
     odoo_partner_id = ensure_partner_exists(name=customer_name, is_customer=True, is_supplier=False)
     if not odoo_partner_id:
-        logger.error(f"Failed to ensure Odoo partner for customer: {customer_name}. Invoice will be skipped. Please check Odoo partner creation logic and logs for details.")
+        logger.error("Failed to ensure Odoo partner for customer: %s. Invoice will be skipped. Please check Odoo partner creation logic and logs for details.", customer_name)
         return None
 
     # Determine Odoo journal
@@ -969,7 +1545,7 @@ def create_or_update_odoo_invoice(qb_invoice_data: Dict[str, Any]) -> Optional[i
     sales_journal_id = ensure_journal_exists(default_journal_name)
     if not sales_journal_id:
         # Fallback: Try to find any sales journal if the default one is not found
-        logger.warning(f"Default sales journal '{default_journal_name}' not found. Trying to find any sales journal.")
+        logger.warning("Default sales journal '%s' not found. Trying to find any sales journal.", default_journal_name)
         journals = _odoo_rpc_call(
             "account.journal",
             "search_read",
@@ -978,9 +1554,9 @@ def create_or_update_odoo_invoice(qb_invoice_data: Dict[str, Any]) -> Optional[i
         )
         if journals:
             sales_journal_id = journals[0]["id"]
-            logger.info(f"Found sales journal '{journals[0].get('name', 'ID: '+str(sales_journal_id))}' to use.") # Log the name
+            logger.info("Found sales journal '%s' to use.", journals[0].get('name', 'ID: ' + str(sales_journal_id))) # Log the name
         else:
-            logger.error(f"Sales journal '{default_journal_name}' not found in Odoo, and no other sales journal available. Cannot create invoice.")
+            logger.error("Sales journal '%s' not found in Odoo, and no other sales journal available. Cannot create invoice.", default_journal_name)
             return None
 
     # Prepare invoice lines
@@ -993,7 +1569,7 @@ def create_or_update_odoo_invoice(qb_invoice_data: Dict[str, Any]) -> Optional[i
             # Attempt to find product by name (or default_code if mapping implies that)
             product_id = ensure_product_exists(model_code=item_name, description=qb_line.get("description", item_name))
             if not product_id:
-                logger.warning(f"Could not ensure Odoo product for QB item '{item_name}'. Line description: '{qb_line.get('description')}'. Invoice line may be incomplete or use a generic product.")
+                logger.warning("Could not ensure Odoo product for QB item '%s'. Line description: '%s'. Invoice line may be incomplete or use a generic product.", item_name, qb_line.get('description'))
                 # TODO: Fallback to a generic "Sales" product or similar if configured
 
         # Determine account for the line. This is crucial.
@@ -1022,11 +1598,11 @@ def create_or_update_odoo_invoice(qb_invoice_data: Dict[str, Any]) -> Optional[i
             # Fallback to a default income account if no specific account found
             # This default should ideally be configurable or derived from journal
             default_income_account_name = "Sales" # Placeholder, should be from config or account_crosswalk
-            logger.warning(f"Income account for line '{qb_line.get('description', item_name)}' not determined. Falling back to default '{default_income_account_name}'.")
+            logger.warning("Income account for line '%s' not determined. Falling back to default '%s'.", qb_line.get('description', item_name), default_income_account_name)
             odoo_line_account_id = ensure_account_exists(default_income_account_name, account_type_hint="income")
 
         if not odoo_line_account_id:
-            logger.error(f"Failed to determine or create income account for invoice line: '{qb_line.get('description', item_name)}'. Skipping line.")
+            logger.error("Failed to determine or create income account for invoice line: '%s'. Skipping line.", qb_line.get('description', item_name))
             continue # Skip this line if account cannot be resolved
 
         line_data = {
@@ -1037,6 +1613,8 @@ def create_or_update_odoo_invoice(qb_invoice_data: Dict[str, Any]) -> Optional[i
             "account_id": odoo_line_account_id,
             # "tax_ids": [] # Placeholder for tax mapping - complex, requires tax service
         }
+        if qb_line.get("txn_line_id") and move_line_key_supported():
+            line_data[MOVE_LINE_KEY] = qb_line["txn_line_id"]
         
         # TODO: Tax mapping. This is highly dependent on how taxes are set up in QB and Odoo.
         # qb_tax_code_ref = qb_line.get("tax_code_ref_full_name")
@@ -1048,7 +1626,7 @@ def create_or_update_odoo_invoice(qb_invoice_data: Dict[str, Any]) -> Optional[i
         invoice_lines_for_odoo.append((0, 0, line_data))
 
     if not invoice_lines_for_odoo and qb_invoice_data.get("lines"): # Only warn if there were lines to process
-        logger.warning(f"No lines could be processed for QB Invoice Ref {qb_invoice_data.get('ref_number')}. Invoice will not be created/updated if it has no lines.")
+        logger.warning("No lines could be processed for QB Invoice Ref %s. Invoice will not be created/updated if it has no lines.", qb_invoice_data.get('ref_number'))
         # Depending on Odoo rules, an invoice with no lines might not be allowed.
         # For now, we'll let it try, Odoo will reject if invalid.
 
@@ -1076,7 +1654,7 @@ def create_or_update_odoo_invoice(qb_invoice_data: Dict[str, Any]) -> Optional[i
                     # Assuming QB dates are YYYY-MM-DD. If not, parse and reformat.
                     datetime.strptime(value, "%Y-%m-%d") 
                 except ValueError:
-                    logger.warning(f"Date field {qbd_field_name} ('{value}') is not in YYYY-MM-DD format. Odoo might reject.")
+                    logger.warning("Date field %s ('%s') is not in YYYY-MM-DD format. Odoo might reject.", qbd_field_name, value)
                 # Add a pass statement here if no other action is needed in the try block after strptime
                 # or if the intention was just to validate. If strptime fails, the except block handles it.
                 pass 
@@ -1093,7 +1671,9 @@ def create_or_update_odoo_invoice(qb_invoice_data: Dict[str, Any]) -> Optional[i
     # Search for existing invoice in Odoo using QB TxnID
     existing_invoice_id = None
     if qb_invoice_data.get("qb_txn_id"):
-        logger.info(f"Searching for existing Odoo invoice with x_qb_txn_id: {qb_invoice_data.get('qb_txn_id')}")
+        existing_invoice_id = resolve_external_id("account.move", "invoice", qb_invoice_data["qb_txn_id"])
+    if qb_invoice_data.get("qb_txn_id") and not existing_invoice_id:
+        logger.info("Searching for existing Odoo invoice with x_qb_txn_id: %s", qb_invoice_data.get('qb_txn_id'))
         # Fix: domain must be a list of lists, not multiple lists
         domain = [["x_qb_txn_id", "=", qb_invoice_data.get("qb_txn_id")], ["move_type", "=", "out_invoice"]]
         existing_invoices = _odoo_rpc_call(
@@ -1104,24 +1684,28 @@ def create_or_update_odoo_invoice(qb_invoice_data: Dict[str, Any]) -> Optional[i
         )
         if existing_invoices:
             existing_invoice_id = existing_invoices[0]["id"]
-            logger.info(f"Found existing Odoo invoice ID: {existing_invoice_id} for QB TxnID: {qb_invoice_data.get('qb_txn_id')}")
+            logger.info("Found existing Odoo invoice ID: %s for QB TxnID: %s", existing_invoice_id, qb_invoice_data.get('qb_txn_id'))
+            register_external_id("account.move", "invoice", qb_invoice_data["qb_txn_id"], existing_invoice_id)
 
     if existing_invoice_id:
-        update_payload = {k: v for k, v in odoo_invoice_payload.items() if k != "move_type"} # move_type cannot be changed
-
-        # For lines, to replace all:
-        if "invoice_line_ids" in update_payload:
+        update_payload = _move_update_payload(existing_invoice_id, odoo_invoice_payload, [vals for _, _, vals in invoice_lines_for_odoo])
+        if update_payload is None:
+            # Current invoice could not be read: fall back to replacing every line
+            update_payload = {k: v for k, v in odoo_invoice_payload.items() if k != "move_type"} # move_type cannot be changed
             update_payload["invoice_line_ids"] = [(5, 0, 0)] + invoice_lines_for_odoo
+        elif not update_payload:
+            logger.info("Odoo invoice ID %s already matches QB TxnID %s; nothing to update.", existing_invoice_id, qb_invoice_data.get('qb_txn_id'))
+            return existing_invoice_id
 
-        logger.info(f"Attempting to update Odoo invoice ID: {existing_invoice_id}")
-        logger.debug(f"Odoo Invoice Update Payload: {update_payload}")
+        logger.info("Attempting to update Odoo invoice ID: %s", existing_invoice_id)
+        logger.debug("Odoo Invoice Update Payload: %s", truncated(update_payload))
         success = _odoo_rpc_call(
             model="account.move",
             method="write",
             args_list=[[existing_invoice_id], update_payload]
         )
         if success:
-            logger.info(f"Successfully updated Odoo invoice ID: {existing_invoice_id}")
+            logger.info("Successfully updated Odoo invoice ID: %s", existing_invoice_id)
             # Optionally, re-post the invoice if its state changed to 'draft'
             # current_state = _odoo_rpc_call("account.move", "read", args=[existing_invoice_id], kwargs_rpc={"fields": ["state"]})
             # if current_state and current_state[0]['state'] == 'draft':
@@ -1129,19 +1713,19 @@ def create_or_update_odoo_invoice(qb_invoice_data: Dict[str, Any]) -> Optional[i
             #    logger.info(f"Posted updated invoice {existing_invoice_id}")
             return existing_invoice_id
         else:
-            logger.error(f"Failed to update Odoo invoice ID: {existing_invoice_id}")
+            logger.error("Failed to update Odoo invoice ID: %s", existing_invoice_id)
             return None
     else:
         # Create new invoice
         logger.info("Attempting to create new Odoo invoice.")
-        logger.debug(f"Odoo Invoice Create Payload: {odoo_invoice_payload}")
+        logger.debug("Odoo Invoice Create Payload: %s", truncated(odoo_invoice_payload))
 
         # Check if there are any lines, as Odoo might require lines for an invoice
         if not invoice_lines_for_odoo and qb_invoice_data.get("lines"): # If QB had lines but we processed none
-            logger.error(f"No processable lines for new QB Invoice Ref {qb_invoice_data.get('ref_number')}. Creation aborted.")
+            logger.error("No processable lines for new QB Invoice Ref %s. Creation aborted.", qb_invoice_data.get('ref_number'))
             return None
         if not odoo_invoice_payload.get("invoice_line_ids"): # If payload has no lines at all
-            logger.warning(f"Creating invoice {qb_invoice_data.get('ref_number')} with no lines. Odoo may reject this.")
+            logger.warning("Creating invoice %s with no lines. Odoo may reject this.", qb_invoice_data.get('ref_number'))
 
         new_invoice_id = _odoo_rpc_call(
             model="account.move",
@@ -1149,13 +1733,14 @@ def create_or_update_odoo_invoice(qb_invoice_data: Dict[str, Any]) -> Optional[i
             args_list=[odoo_invoice_payload]
         )
         if new_invoice_id:
-            logger.info(f"Successfully created Odoo invoice with ID: {new_invoice_id} for QB TxnID: {qb_invoice_data.get('qb_txn_id')}")
-            # Post the newly created invoice
-            _odoo_rpc_call(model="account.move", method="action_post", args=[[new_invoice_id]])
-            logger.info(f"Posted newly created invoice {new_invoice_id}")
+            logger.info("Successfully created Odoo invoice with ID: %s for QB TxnID: %s", new_invoice_id, qb_invoice_data.get('qb_txn_id'))
+            if qb_invoice_data.get("qb_txn_id"):
+                register_external_id("account.move", "invoice", qb_invoice_data["qb_txn_id"], new_invoice_id)
+            # Posted in a batch with the page's other new moves
+            odoo_posting_queue.add(new_invoice_id)
             return new_invoice_id
         else:
-            logger.error(f"Failed to create Odoo invoice for QB Ref: {qb_invoice_data.get('ref_number')}")
+            logger.error("Failed to create Odoo invoice for QB Ref: %s", qb_invoice_data.get('ref_number'))
             return None
 
 def create_or_update_odoo_payment(qb_payment_data: Dict[str, Any]) -> Optional[int]:
@@ -1163,7 +1748,7 @@ def create_or_update_odoo_payment(qb_payment_data: Dict[str, Any]) -> Optional[i
     Placeholder for creating or updating an Odoo payment from QuickBooks payment data.
     This function needs to be fully implemented.
     """
-    logger.info(f"Placeholder: Processing QB Payment: {qb_payment_data}")
+    logger.info("Placeholder: Processing QB Payment: %s", truncated(qb_payment_data))
     # TODO: Implement full logic for payment creation/update
     # 1. Load payment mapping from field_mapping.json
     # 2. Find related partner (customer)
@@ -1180,7 +1765,7 @@ def create_or_update_odoo_sales_order(qb_sales_order_data: Dict[str, Any]) -> Op
     Placeholder for creating or updating an Odoo sales order from QuickBooks sales order data.
     This function needs to be fully implemented.
     """
-    logger.info(f"Placeholder: Processing QB Sales Order: {qb_sales_order_data}")
+    logger.info("Placeholder: Processing QB Sales Order: %s", truncated(qb_sales_order_data))
     # TODO: Implement full logic for sales order creation/update
     # 1. Load sales order mapping from field_mapping.json
     # 2. Find related partner (customer)
@@ -1196,7 +1781,7 @@ def create_or_update_odoo_bill(qb_bill_data: Dict[str, Any]) -> Optional[int]:
     Placeholder for creating or updating an Odoo bill (vendor bill) from QuickBooks bill data.
     This function needs to be fully implemented.
     """
-    logger.info(f"Placeholder: Processing QB Bill: {qb_bill_data}")
+    logger.info("Placeholder: Processing QB Bill: %s", truncated(qb_bill_data))
     # TODO: Implement full logic for bill creation/update
     # 1. Load bill mapping from field_mapping.json
     # 2. Find related partner (vendor)
@@ -1212,7 +1797,7 @@ def create_or_update_odoo_purchase_order(qb_purchase_order_data: Dict[str, Any])
     Placeholder for creating or updating an Odoo purchase order from QuickBooks purchase order data.
     This function needs to be fully implemented.
     """
-    logger.info(f"Placeholder: Processing QB Purchase Order: {qb_purchase_order_data}")
+    logger.info("Placeholder: Processing QB Purchase Order: %s", truncated(qb_purchase_order_data))
     # TODO: Implement full logic for purchase order creation/update
     # 1. Load purchase order mapping from field_mapping.json
     # 2. Find related partner (vendor)
@@ -1233,8 +1818,8 @@ def create_or_update_odoo_credit_memo(qb_credit_memo_data: Dict[str, Any]) -> Op
     Creates or updates a credit memo in Odoo from QuickBooks data using field_mapping.json.
     Credit Memos are 'out_refund' in Odoo.
     """
-    logger.info(f"Processing QB Credit Memo: Ref {qb_credit_memo_data.get('ref_number')}, Customer: {qb_credit_memo_data.get('customer_name')}, TxnID: {qb_credit_memo_data.get('qb_txn_id')}")
-    logger.debug(f"Full QB Credit Memo data: {qb_credit_memo_data}")
+    logger.info("Processing QB Credit Memo: Ref %s, Customer: %s, TxnID: %s", qb_credit_memo_data.get('ref_number'), qb_credit_memo_data.get('customer_name'), qb_credit_memo_data.get('qb_txn_id'))
+    logger.debug("Full QB Credit Memo data: %s", truncated(qb_credit_memo_data))
 
     credit_memo_mapping = FIELD_MAPPING.get("entities", {}).get("CreditMemos")
     if not credit_memo_mapping:
@@ -1249,14 +1834,14 @@ def create_or_update_odoo_credit_memo(qb_credit_memo_data: Dict[str, Any]) -> Op
     
     odoo_partner_id = ensure_partner_exists(name=customer_name, is_customer=True, is_supplier=False)
     if not odoo_partner_id:
-        logger.error(f"Failed to ensure Odoo partner for customer: {customer_name}. Credit memo will be skipped. Please check Odoo partner creation logic and logs for details.")
+        logger.error("Failed to ensure Odoo partner for customer: %s. Credit memo will be skipped. Please check Odoo partner creation logic and logs for details.", customer_name)
         return None
 
     # Determine Odoo journal (typically the same sales journal as invoices)
     default_journal_name = credit_memo_mapping.get("default_values", {}).get("journal_name", "Customer Invoices") # Or a specific credit note journal
     sales_journal_id = ensure_journal_exists(default_journal_name, journal_type_list=['sale'])
     if not sales_journal_id:
-        logger.warning(f"Default sales/credit journal '{default_journal_name}' not found. Trying to find any sales journal.")
+        logger.warning("Default sales/credit journal '%s' not found. Trying to find any sales journal.", default_journal_name)
         journals = _odoo_rpc_call(
             "account.journal",
             "search_read",
@@ -1265,9 +1850,9 @@ def create_or_update_odoo_credit_memo(qb_credit_memo_data: Dict[str, Any]) -> Op
         )
         if journals:
             sales_journal_id = journals[0]["id"]
-            logger.info(f"Found sales journal '{journals[0].get('name', 'ID: '+str(sales_journal_id))}' to use for credit memo.")
+            logger.info("Found sales journal '%s' to use for credit memo.", journals[0].get('name', 'ID: ' + str(sales_journal_id)))
         else:
-            logger.error(f"Sales journal for credit memos not found in Odoo. Cannot create credit memo.")
+            logger.error("Sales journal for credit memos not found in Odoo. Cannot create credit memo.")
             return None
     # Prepare credit memo lines
     credit_memo_lines_for_odoo = []
@@ -1279,7 +1864,7 @@ def create_or_update_odoo_credit_memo(qb_credit_memo_data: Dict[str, Any]) -> Op
             # Attempt to find product by name (or default_code if mapping implies that)
             product_id = ensure_product_exists(model_code=item_name, description=qb_line.get("description", item_name))
             if not product_id:
-                logger.warning(f"Could not ensure Odoo product for QB item '{item_name}'. Line description: '{qb_line.get('description')}'. Credit memo line may be incomplete or use a generic product.")
+                logger.warning("Could not ensure Odoo product for QB item '%s'. Line description: '%s'. Credit memo line may be incomplete or use a generic product.", item_name, qb_line.get('description'))
                 # TODO: Fallback to a generic "Sales" product or similar if configured
 
         # Determine account for the line. This is crucial.
@@ -1308,11 +1893,11 @@ def create_or_update_odoo_credit_memo(qb_credit_memo_data: Dict[str, Any]) -> Op
             # Fallback to a default income account if no specific account found
             # This default should ideally be configurable or derived from journal
             default_income_account_name = "Sales" # Placeholder, should be from config or account_crosswalk
-            logger.warning(f"Income account for line '{qb_line.get('description', item_name)}' not determined. Falling back to default '{default_income_account_name}'.")
+            logger.warning("Income account for line '%s' not determined. Falling back to default '%s'.", qb_line.get('description', item_name), default_income_account_name)
             odoo_line_account_id = ensure_account_exists(default_income_account_name, account_type_hint="income")
 
         if not odoo_line_account_id:
-            logger.error(f"Failed to determine or create income account for credit memo line: '{qb_line.get('description', item_name)}'. Skipping line.")
+            logger.error("Failed to determine or create income account for credit memo line: '%s'. Skipping line.", qb_line.get('description', item_name))
             continue # Skip this line if account cannot be resolved
 
         line_data = {
@@ -1323,6 +1908,8 @@ def create_or_update_odoo_credit_memo(qb_credit_memo_data: Dict[str, Any]) -> Op
             "account_id": odoo_line_account_id,
             # "tax_ids": [] # Placeholder for tax mapping - complex, requires tax service
         }
+        if qb_line.get("txn_line_id") and move_line_key_supported():
+            line_data[MOVE_LINE_KEY] = qb_line["txn_line_id"]
         
         # TODO: Tax mapping. This is highly dependent on how taxes are set up in QB and Odoo.
         # qb_tax_code_ref = qb_line.get("tax_code_ref_full_name")
@@ -1334,7 +1921,7 @@ def create_or_update_odoo_credit_memo(qb_credit_memo_data: Dict[str, Any]) -> Op
         credit_memo_lines_for_odoo.append((0, 0, line_data))
 
     if not credit_memo_lines_for_odoo and qb_credit_memo_data.get("lines"): # Only warn if there were lines to process
-        logger.warning(f"No lines could be processed for QB Credit Memo Ref {qb_credit_memo_data.get('ref_number')}. Credit Memo will not be created/updated if it has no lines.")
+        logger.warning("No lines could be processed for QB Credit Memo Ref %s. Credit Memo will not be created/updated if it has no lines.", qb_credit_memo_data.get('ref_number'))
         # Depending on Odoo rules, a credit memo with no lines might not be allowed.
         # For now, we'll let it try, Odoo will reject if invalid.
 
@@ -1360,7 +1947,7 @@ def create_or_update_odoo_credit_memo(qb_credit_memo_data: Dict[str, Any]) -> Op
                     # Assuming QB dates are YYYY-MM-DD. If not, parse and reformat.
                     datetime.strptime(value, "%Y-%m-%d") 
                 except ValueError:
-                    logger.warning(f"Date field {qbd_field_name} ('{value}') is not in YYYY-MM-DD format. Odoo might reject.")
+                    logger.warning("Date field %s ('%s') is not in YYYY-MM-DD format. Odoo might reject.", qbd_field_name, value)
                 pass 
             
             elif odoo_field_name not in ["partner_id", "journal_id", "invoice_line_ids", "move_type", "x_qb_txn_id"]:
@@ -1369,50 +1956,56 @@ def create_or_update_odoo_credit_memo(qb_credit_memo_data: Dict[str, Any]) -> Op
     # Search for existing credit memo in Odoo using QB TxnID
     existing_credit_memo_id = None
     if qb_credit_memo_data.get("qb_txn_id"):
-        logger.info(f"Searching for existing Odoo credit memo with x_qb_txn_id: {qb_credit_memo_data.get('qb_txn_id')}")
+        existing_credit_memo_id = resolve_external_id("account.move", "credit_memo", qb_credit_memo_data["qb_txn_id"])
+    if qb_credit_memo_data.get("qb_txn_id") and not existing_credit_memo_id:
+        logger.info("Searching for existing Odoo credit memo with x_qb_txn_id: %s", qb_credit_memo_data.get('qb_txn_id'))
         existing_credit_memos = _odoo_rpc_call(
             model="account.move",
             method="search_read",
-            args_list=[["x_qb_txn_id", "=", qb_credit_memo_data.get("qb_txn_id")], ["move_type", "=", "out_refund"]],
+            args_list=[[["x_qb_txn_id", "=", qb_credit_memo_data.get("qb_txn_id")], ["move_type", "=", "out_refund"]]],
             kwargs_dict={"fields": ["id"], "limit": 1}
         )
         if existing_credit_memos:
             existing_credit_memo_id = existing_credit_memos[0]["id"]
-            logger.info(f"Found existing Odoo credit memo ID: {existing_credit_memo_id} for QB TxnID: {qb_credit_memo_data.get('qb_txn_id')}")
+            logger.info("Found existing Odoo credit memo ID: %s for QB TxnID: %s", existing_credit_memo_id, qb_credit_memo_data.get('qb_txn_id'))
+            register_external_id("account.move", "credit_memo", qb_credit_memo_data["qb_txn_id"], existing_credit_memo_id)
 
     if existing_credit_memo_id:
-        update_payload = {k: v for k, v in odoo_credit_memo_payload.items() if k != "move_type"} # move_type cannot be changed
-
-        # For lines, to replace all:
-        if "invoice_line_ids" in update_payload:
+        update_payload = _move_update_payload(existing_credit_memo_id, odoo_credit_memo_payload, [vals for _, _, vals in credit_memo_lines_for_odoo])
+        if update_payload is None:
+            # Current credit memo could not be read: fall back to replacing every line
+            update_payload = {k: v for k, v in odoo_credit_memo_payload.items() if k != "move_type"} # move_type cannot be changed
             update_payload["invoice_line_ids"] = [(5, 0, 0)] + credit_memo_lines_for_odoo
+        elif not update_payload:
+            logger.info("Odoo credit memo ID %s already matches QB TxnID %s; nothing to update.", existing_credit_memo_id, qb_credit_memo_data.get('qb_txn_id'))
+            return existing_credit_memo_id
 
-        logger.info(f"Attempting to update Odoo credit memo ID: {existing_credit_memo_id}")
-        logger.debug(f"Odoo Credit Memo Update Payload: {update_payload}")
+        logger.info("Attempting to update Odoo credit memo ID: %s", existing_credit_memo_id)
+        logger.debug("Odoo Credit Memo Update Payload: %s", truncated(update_payload))
         success = _odoo_rpc_call(
             model="account.move",
             method="write",
             args_list=[[existing_credit_memo_id], update_payload]
         )
         if success:
-            logger.info(f"Successfully updated Odoo credit memo ID: {existing_credit_memo_id}")
+            logger.info("Successfully updated Odoo credit memo ID: %s", existing_credit_memo_id)
             return existing_credit_memo_id
         else:
-            logger.error(f"Failed to update Odoo credit memo ID: {existing_credit_memo_id}")
+            logger.error("Failed to update Odoo credit memo ID: %s", existing_credit_memo_id)
             return None
     else:
         # Create new credit memo
         logger.info("Attempting to create new Odoo credit memo.")
-        logger.debug(f"Odoo Credit Memo Create Payload: {odoo_credit_memo_payload}")
+        logger.debug("Odoo Credit Memo Create Payload: %s", truncated(odoo_credit_memo_payload))
 
 
 
         # Check if there are any lines, as Odoo might require lines for a credit memo
         if not credit_memo_lines_for_odoo and qb_credit_memo_data.get("lines"): # If QB had lines but we processed none
-            logger.error(f"No processable lines for new QB Credit Memo Ref {qb_credit_memo_data.get('ref_number')}. Creation aborted.")
+            logger.error("No processable lines for new QB Credit Memo Ref %s. Creation aborted.", qb_credit_memo_data.get('ref_number'))
             return None
         if not odoo_credit_memo_payload.get("invoice_line_ids"): # If payload has no lines at all
-            logger.warning(f"Creating credit memo {qb_credit_memo_data.get('ref_number')} with no lines. Odoo may reject this.")
+            logger.warning("Creating credit memo %s with no lines. Odoo may reject this.", qb_credit_memo_data.get('ref_number'))
 
         new_credit_memo_id = _odoo_rpc_call(
             model="account.move",
@@ -1420,13 +2013,14 @@ def create_or_update_odoo_credit_memo(qb_credit_memo_data: Dict[str, Any]) -> Op
             args_list=[odoo_credit_memo_payload]
         )
         if new_credit_memo_id:
-            logger.info(f"Successfully created Odoo credit memo with ID: {new_credit_memo_id} for QB TxnID: {qb_credit_memo_data.get('qb_txn_id')}")
-            # Post the newly created credit memo
-            _odoo_rpc_call(model="account.move", method="action_post", args=[[new_credit_memo_id]])
-            logger.info(f"Posted newly created credit memo {new_credit_memo_id}")
+            logger.info("Successfully created Odoo credit memo with ID: %s for QB TxnID: %s", new_credit_memo_id, qb_credit_memo_data.get('qb_txn_id'))
+            if qb_credit_memo_data.get("qb_txn_id"):
+                register_external_id("account.move", "credit_memo", qb_credit_memo_data["qb_txn_id"], new_credit_memo_id)
+            # Posted in a batch with the page's other new moves
+            odoo_posting_queue.add(new_credit_memo_id)
             return new_credit_memo_id
         else:
-            logger.error(f"Failed to create Odoo credit memo for QB Ref: {qb_credit_memo_data.get('ref_number')}")
+            logger.error("Failed to create Odoo credit memo for QB Ref: %s", qb_credit_memo_data.get('ref_number'))
             return None
 
 def create_or_update_odoo_sales_receipt(qb_sales_receipt_data: dict) -> int:
@@ -0,0 +1,205 @@
+"""
+Wire transports for Odoo RPC.
+
+``_odoo_rpc_call`` talks to Odoo through one of two interchangeable transports:
+
+- ``xmlrpc``: Odoo's ``/xmlrpc/2/<service>`` endpoints via ``xmlrpc.client``
+- ``jsonrpc``: Odoo's ``/jsonrpc`` endpoint, a lighter encoding for large payloads
+
+Both expose ``call(service, method, *args)`` and count request/response bytes
+on the wire. Both ask for gzip-compressed responses and decompress them
+transparently; request bodies above ODOO_GZIP_REQUEST_THRESHOLD are sent
+gzip-compressed when that threshold is set. JSON-RPC errors are raised as ``xmlrpc.client.Fault`` with the
+same ``faultString`` shape Odoo gives over XML-RPC, so callers classify and
+log failures identically whichever transport is in use.
+"""
+import gzip
+import http.client
+import io
+import itertools
+import json
+import os
+import xmlrpc.client
+from typing import Any
+from urllib.parse import urlsplit
+
+from ..logging_config import logger
+
+# "xmlrpc" (default) or "jsonrpc"
+ODOO_RPC_PROTOCOL = os.getenv("QB_SYNC_ODOO_PROTOCOL", "xmlrpc").lower()
+# Compress request bodies larger than this many bytes; 0 disables it. Only enable when the
+# server (or the proxy in front of it) accepts Content-Encoding: gzip on requests.
+ODOO_GZIP_REQUEST_THRESHOLD = int(os.getenv("QB_SYNC_ODOO_GZIP_REQUEST_THRESHOLD", "0"))
+ODOO_MAX_RESPONSE_BYTES = 100 * 1024 * 1024  # Refuse to decompress responses beyond this size
+
+
+class _CountingResponse:
+    """Wraps an HTTP response so the bytes read from it are counted."""
+    def __init__(self, response, transport):
+        self._response = response
+        self._transport = transport
+
+    def read(self, amt=-1):
+        data = self._response.read(amt)
+        self._transport.response_bytes += len(data)
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self._response, name)
+
+
+class _CountingConnection:
+    """Wraps an HTTP connection so the Content-Length finally sent is counted."""
+    def __init__(self, connection, transport):
+        self._connection = connection
+        self._transport = transport
+
+    def putheader(self, header, *values):
+        if header.lower() == "content-length":
+            self._transport.request_bytes += int(values[0])
+        return self._connection.putheader(header, *values)
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+
+class _MeteredTransportMixin:
+    """
+    Counts request and response body bytes on the wire for one ServerProxy.
+    xmlrpc.client itself sends Accept-Encoding: gzip, decodes gzip responses
+    and gzips request bodies above ``encode_threshold`` in send_content, so
+    request bytes are taken from the Content-Length it finally sends.
+    """
+    request_bytes = 0
+    response_bytes = 0
+    timeout = None
+
+    def make_connection(self, host):
+        connection = super().make_connection(host)
+        connection.timeout = self.timeout
+        return connection
+
+    def send_content(self, connection, request_body):
+        super().send_content(_CountingConnection(connection, self), request_body)
+
+    def parse_response(self, response):
+        return super().parse_response(_CountingResponse(response, self))
+
+
+class _MeteredTransport(_MeteredTransportMixin, xmlrpc.client.Transport):
+    pass
+
+
+class _MeteredSafeTransport(_MeteredTransportMixin, xmlrpc.client.SafeTransport):
+    pass
+
+
+class XmlRpcTransport:
+    """Calls Odoo over XML-RPC."""
+
+    protocol = "xmlrpc"
+
+    def __init__(self, url: str, timeout: float = None):
+        self.url = url.rstrip("/")
+        self._transport = _MeteredSafeTransport() if self.url.startswith("https") else _MeteredTransport()
+        self._transport.timeout = timeout
+        self._transport.encode_threshold = ODOO_GZIP_REQUEST_THRESHOLD or None
+
+    @property
+    def request_bytes(self) -> int:
+        return self._transport.request_bytes
+
+    @property
+    def response_bytes(self) -> int:
+        return self._transport.response_bytes
+
+    def call(self, service: str, method: str, *args) -> Any:
+        proxy = xmlrpc.client.ServerProxy(f"{self.url}/xmlrpc/2/{service}", transport=self._transport, allow_none=True)
+        return getattr(proxy, method)(*args)
+
+
+class JsonRpcTransport:
+    """Calls Odoo over its ``/jsonrpc`` endpoint."""
+
+    protocol = "jsonrpc"
+    _ids = itertools.count(1)
+
+    def __init__(self, url: str, timeout: float = None):
+        parts = urlsplit(url)
+        self.url = url.rstrip("/")
+        self._https = parts.scheme == "https"
+        self._host = parts.netloc
+        self._path = parts.path.rstrip("/") + "/jsonrpc"
+        self._timeout = timeout
+        self.request_bytes = 0
+        self.response_bytes = 0
+
+    def call(self, service: str, method: str, *args) -> Any:
+        body = json.dumps({
+            "jsonrpc": "2.0", "method": "call", "id": next(self._ids),
+            "params": {"service": service, "method": method, "args": list(args)},
+        }, default=str).encode("utf-8")
+        headers = {"Content-Type": "application/json", "Accept-Encoding": "gzip"}
+        if ODOO_GZIP_REQUEST_THRESHOLD and len(body) > ODOO_GZIP_REQUEST_THRESHOLD:
+            body = gzip.compress(body, compresslevel=5)
+            headers["Content-Encoding"] = "gzip"
+        connection_class = http.client.HTTPSConnection if self._https else http.client.HTTPConnection
+        connection = connection_class(self._host, timeout=self._timeout)
+        try:
+            connection.request("POST", self._path, body, headers)
+            self.request_bytes += len(body)
+            response = connection.getresponse()
+            payload = response.read()
+            self.response_bytes += len(payload)
+            if response.status != 200:
+                raise xmlrpc.client.ProtocolError(f"{self._host}{self._path}", response.status, response.reason,
+                                                  dict(response.getheaders()))
+            if response.getheader("Content-Encoding", "") == "gzip":
+                payload = _gunzip(payload)
+        finally:
+            connection.close()
+
+        reply = json.loads(payload)
+        error = reply.get("error")
+        if error:
+            raise _fault_from_json_error(error)
+        return reply.get("result")
+
+
+def _gunzip(payload: bytes) -> bytes:
+    with gzip.GzipFile(fileobj=io.BytesIO(payload)) as stream:
+        data = stream.read(ODOO_MAX_RESPONSE_BYTES + 1)
+    if len(data) > ODOO_MAX_RESPONSE_BYTES:
+        raise ValueError(f"Odoo response exceeds {ODOO_MAX_RESPONSE_BYTES} bytes once decompressed")
+    return data
+
+
+def _fault_from_json_error(error: dict) -> xmlrpc.client.Fault:
+    """Build the Fault Odoo would have returned over XML-RPC for the same server error."""
+    data = error.get("data") or {}
+    name = data.get("name") or ""
+    message = data.get("message") or error.get("message") or "Odoo Server Error"
+    fault_string = f"{name}: {message}" if name else message
+    if data.get("debug"):
+        fault_string = f"{fault_string}\n{data['debug']}"
+    return xmlrpc.client.Fault(error.get("code", 1), fault_string)
+
+
+TRANSPORTS = {
+    XmlRpcTransport.protocol: XmlRpcTransport,
+    JsonRpcTransport.protocol: JsonRpcTransport,
+}
+
+
+if ODOO_RPC_PROTOCOL not in TRANSPORTS:
+    logger.warning("Unknown QB_SYNC_ODOO_PROTOCOL %r; using xmlrpc", ODOO_RPC_PROTOCOL)
+    ODOO_RPC_PROTOCOL = XmlRpcTransport.protocol
+
+
+def new_transport(url: str, timeout: float = None, protocol: str = None):
+    """Transport for one logical call; `protocol` defaults to ODOO_RPC_PROTOCOL."""
+    protocol = protocol or ODOO_RPC_PROTOCOL
+    try:
+        return TRANSPORTS[protocol](url, timeout)
+    except KeyError:
+        raise ValueError(f"Unknown Odoo RPC protocol {protocol!r}; expected one of {', '.join(TRANSPORTS)}") from None
@@ -0,0 +1,209 @@
+"""
+Pipelined Odoo pushes for QBWC sessions.
+
+QBWC is strictly request/response: while receiveResponseXML pushes a page to
+Odoo, QuickBooks waits, and while QuickBooks runs the next query, Odoo is
+idle. With the pipeline enabled, receiveResponseXML hands each parsed page to
+a per-session worker thread and returns at once, so QBWC already asks for the
+next iterator page while the previous one is still being pushed.
+
+Pages are pushed by one worker per session in the order they arrived, so
+customers and items still land before the transactions that reference them.
+At most PUSH_PIPELINE_MAX_PAGES pages are queued or being pushed per session;
+submitting another blocks until one finishes, which holds QBWC back when Odoo
+is the slower side.
+
+When a page fails because Odoo is unavailable (CircuitOpenError), the pages
+queued behind it are dropped unpushed (nothing is checkpointed for them, so
+the next session picks them up) and the failure is raised by the session's
+next ``raise_failure`` so the session ends the same way it does without the
+pipeline. Other errors are logged and the worker moves on to the next page,
+but the page's task is remembered as failed (``task_failed``) so its last page
+does not mark it complete.
+
+With PUSH_PIPELINE_THROTTLE on, sendRequestXML does not let QBWC fetch a page
+the pipeline has no room for: it waits briefly for a slot and otherwise
+answers "NoOp", which makes QBWC pause and ask again a few seconds later
+instead of holding a receiveResponseXML call open while a slot frees up.
+
+Pipelines live in process memory, and consecutive SOAP calls of one session
+may reach different server processes, which could neither drain nor throttle
+each other's pipelines. The pipeline is therefore only used when a single
+process serves the app (threads are fine) and is turned off whenever
+WEB_CONCURRENCY runs several processes.
+"""
+import os
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Set
+
+from ..config import MULTI_PROCESS
+from ..logging_config import logger
+from ..utils.metrics import registry
+from ..utils.resilience import CircuitOpenError
+from ..utils.tracing import trace_round_trip
+
+PUSH_PIPELINE_ENABLED = os.getenv("QB_SYNC_PIPELINE", "1") == "1"
+PUSH_PIPELINE_MAX_PAGES = int(os.getenv("QB_SYNC_PIPELINE_MAX_PAGES", "2"))  # Pages queued or being pushed per session
+PUSH_PIPELINE_DRAIN_SECONDS = 600  # A closed session's pages are drained in the background for at most this long
+PUSH_PIPELINE_IDLE_SECONDS = 300  # A worker with nothing to push exits after this long
+PUSH_PIPELINE_THROTTLE = os.getenv("QB_SYNC_PIPELINE_THROTTLE", "1") == "1"
+PUSH_PIPELINE_THROTTLE_WAIT_SECONDS = 5  # sendRequestXML waits this long for a free slot before answering NoOp
+
+if PUSH_PIPELINE_ENABLED and MULTI_PROCESS:
+    logger.warning("Push pipeline disabled: it is per process and WEB_CONCURRENCY runs several processes")
+    PUSH_PIPELINE_ENABLED = False
+
+
+class PushPipeline:
+    """Ordered background pushes for one QBWC session."""
+
+    def __init__(self, ticket: str, max_pages: int = PUSH_PIPELINE_MAX_PAGES):
+        self.ticket = ticket
+        self.max_pages = max(1, max_pages)
+        self._slots = threading.BoundedSemaphore(self.max_pages)
+        self._jobs: "queue.Queue" = queue.Queue()
+        self._in_flight = 0
+        self._records_in_flight: Dict[Any, int] = {}
+        self._idle = threading.Condition()
+        self._failure: Optional[CircuitOpenError] = None
+        self._failed_tasks: Set[Any] = set()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def depth(self) -> int:
+        """Pages queued or being pushed."""
+        return self._in_flight
+
+    @property
+    def records_in_flight(self) -> int:
+        """Records in the pages queued or being pushed."""
+        return sum(self._records_in_flight.values())
+
+    def records_in_flight_by_task(self) -> Dict[Any, int]:
+        """Records in the pages queued or being pushed, by the `task` they were submitted for."""
+        with self._idle:
+            return dict(self._records_in_flight)
+
+    @property
+    def full(self) -> bool:
+        return self._in_flight >= self.max_pages
+
+    def wait_for_slot(self, timeout: float) -> bool:
+        """Wait up to `timeout` seconds until another page can be submitted without blocking."""
+        deadline = time.monotonic() + timeout
+        with self._idle:
+            while self.full:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+        return True
+
+    def submit(self, job: Callable[[], None], label: str, records: int = 0, task: Any = None) -> float:
+        """
+        Queue `job` (a page of `records` records of `task`) behind the pages
+        already submitted, blocking while the pipeline is full. Returns the
+        seconds spent waiting for a free slot.
+        """
+        started = time.perf_counter()
+        self._slots.acquire()
+        waited = time.perf_counter() - started
+        with self._idle:
+            self._in_flight += 1
+            self._records_in_flight[task] = self._records_in_flight.get(task, 0) + records
+        with self._lock:
+            self._jobs.put((job, label, records, task))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f"push-{self.ticket[-8:]}", daemon=True)
+                self._thread.start()
+        if waited >= 1:
+            logger.info("Waited %.1fs for the push pipeline of %s before queuing %s", waited, self.ticket, label)
+        return waited
+
+    def task_failed(self, task: Any) -> bool:
+        """Whether a page submitted for `task` failed with an unexpected error."""
+        return task in self._failed_tasks
+
+    def raise_failure(self) -> None:
+        """Raise the CircuitOpenError that stopped the pipeline, if any."""
+        if self._failure is not None:
+            raise self._failure
+
+    def drain(self, timeout: float = PUSH_PIPELINE_DRAIN_SECONDS) -> bool:
+        """Wait until every submitted page is pushed or dropped. Returns False on timeout."""
+        deadline = time.monotonic() + timeout
+        with self._idle:
+            while self._in_flight:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+        return True
+
+    def _run(self) -> None:
+        while True:
+            try:
+                job, label, records, task = self._jobs.get(timeout=PUSH_PIPELINE_IDLE_SECONDS)
+            except queue.Empty:
+                with self._lock:
+                    if self._jobs.empty():
+                        self._thread = None
+                        return
+                continue
+            try:
+                if self._failure is not None:
+                    logger.warning("Dropping %s for %s: %s", label, self.ticket, self._failure)
+                else:
+                    with trace_round_trip(self.ticket, "push_page", page=label):
+                        job()
+            except CircuitOpenError as e:
+                self._failure = e
+                logger.warning("Push pipeline for %s stopped at %s: %s", self.ticket, label, e)
+            except Exception as e:
+                self._failed_tasks.add(task)
+                logger.error("Unexpected error pushing %s for %s: %s; its task is left unfinished",
+                             label, self.ticket, e, exc_info=True)
+            finally:
+                self._slots.release()
+                with self._idle:
+                    self._in_flight -= 1
+                    self._records_in_flight[task] -= records
+                    if not self._records_in_flight[task]:
+                        del self._records_in_flight[task]
+                    self._idle.notify_all()
+
+
+_pipelines: Dict[str, PushPipeline] = {}
+_pipelines_lock = threading.Lock()
+
+registry.gauge("qb_push_pipeline_pages", "Pages queued or being pushed to Odoo across QBWC sessions",
+               callback=lambda: [({}, sum(pipeline.depth for pipeline in list(_pipelines.values())))])
+
+
+def get_pipeline(ticket: str) -> PushPipeline:
+    with _pipelines_lock:
+        pipeline = _pipelines.get(ticket)
+        if pipeline is None:
+            pipeline = _pipelines[ticket] = PushPipeline(ticket)
+        return pipeline
+
+
+def find_pipeline(ticket: str) -> Optional[PushPipeline]:
+    """The session's pipeline if it has submitted pages, without creating one."""
+    return _pipelines.get(ticket)
+
+
+def close_pipeline(ticket: str, timeout: float = PUSH_PIPELINE_DRAIN_SECONDS) -> None:
+    """Wait for a closing session's pages to be pushed, then forget its pipeline."""
+    with _pipelines_lock:
+        pipeline = _pipelines.pop(ticket, None)
+    if pipeline is None:
+        return
+    if pipeline.depth:
+        logger.info("Waiting for %s page(s) still being pushed for %s", pipeline.depth, ticket)
+    if not pipeline.drain(timeout):
+        logger.error("Push pipeline for %s did not finish within %.0fs; "
+                     "records it had not pushed yet will sync on the next run.", ticket, timeout)
@@ -5,12 +5,15 @@ Implements the QBWC web service interface for communicating with QuickBooks
 via the QuickBooks Web Connector application.
 """
 from spyne import rpc, ServiceBase, Unicode, Iterable
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import xml.etree.ElementTree as ET
-from xml.sax.saxutils import escape
 import logging
-from typing import Dict, Any, Optional
-import json
+from typing import Callable, Dict, Any, Optional
+import uuid
+from functools import partial
+import threading
+import time
+from contextlib import contextmanager
 
 # Remove import of MAX_JOURNAL_ENTRIES_PER_REQUEST from config
 MAX_JOURNAL_ENTRIES_PER_REQUEST = 10  # Default value previously in config
@@ -30,7 +33,7 @@ CREDITMEMO_QUERY = "CreditMemoQuery" # New
 SALESORDER_QUERY = "SalesOrderQuery" # New
 PURCHASEORDER_QUERY = "PurchaseOrderQuery" # New
 JOURNALENTRY_QUERY = "JournalEntryQuery" # New
-# ITEM_QUERY = "ItemQuery" # Example for future expansion
+ITEM_QUERY = "ItemQuery"
 
 # Import Odoo service functions that will be used
 from .odoo_service import (
@@ -50,9 +53,34 @@ from .odoo_service import (
     create_or_update_odoo_check, # New
     create_or_update_odoo_deposit, # New
     create_or_update_odoo_estimate, # New
-    create_or_update_odoo_bill_payment_check # New
+    create_or_update_odoo_bill_payment_check, # New
+    create_or_update_odoo_item,
+    odoo_breaker,
+    odoo_posting_queue,
+    prefetch_external_ids
 )
+from .lookup_indexes import warm_indexes_in_background
+from .push_pipeline import (
+    PUSH_PIPELINE_ENABLED, PUSH_PIPELINE_THROTTLE, PUSH_PIPELINE_THROTTLE_WAIT_SECONDS,
+    close_pipeline, find_pipeline, get_pipeline,
+)
+from .odoo_backfill import ODOO_BACKFILL_ENABLED, backfill_invoices, backfill_items, backfill_partners
 # from ..utils.data_loader import is_record_changed, update_sync_cache # Import cache functions
+from ..utils.state_store import session_store, SessionLockTimeout
+from ..utils.checkpoints import load_committed, mark_committed
+from ..utils import dead_letters
+from ..utils.txn_windows import (
+    TXN_WINDOWS_ENABLED, mark_modified_synced, mark_window_done, mark_window_started, modified_since,
+    schedule_windows,
+)
+from ..logging_config import truncated
+from ..utils.tracing import span, trace_round_trip, summarize_session
+from ..utils.profiling import profiled
+from ..utils.resilience import CircuitOpenError
+from ..utils.metrics import (
+    QBWC_ROUND_TRIPS, QBWC_ROUND_TRIP_SECONDS, QBWC_NOOPS, QB_RECORDS, QB_ITERATOR_REMAINING, QB_DEAD_LETTERS,
+    record_cache_lookup, mark_sync_complete
+)
 
 logger = logging.getLogger(__name__)
 
@@ -60,39 +88,117 @@ logger = logging.getLogger(__name__)
 QBWC_USERNAME = "admin"
 QBWC_PASSWORD = "odoo123"
 
-# QBWC Service State (for iterator management)
-qbwc_session_state: Dict[str, Dict[str, Any]] = {}
-
-SESSION_STATE_FILE = 'qbwc_session_state.json'
-
-def load_qbwc_session_state():
-    global qbwc_session_state
+def save_qbwc_session_state(ticket: str, session_data: Dict[str, Any]):
+    """Persist one session's state; only the header/tasks that changed are written."""
     try:
-        with open(SESSION_STATE_FILE, 'r') as f:
-            qbwc_session_state.clear()
-            qbwc_session_state.update(json.load(f))
-    except Exception:
-        qbwc_session_state.clear()
-
-def save_qbwc_session_state():
+        with span("save_session", "persist"):
+            session_store.put(ticket, session_data)
+    except Exception as e:
+        logger.error("Failed to save QBWC session state for ticket %s: %s", ticket, e)
+
+# Entity of the task handled by the SOAP call running on this thread
+_round_trip = threading.local()
+# time.monotonic() when this process last finished a QBWC SOAP call
+_last_round_trip_at = None
+
+def seconds_since_last_round_trip() -> Optional[float]:
+    """How long this process has been without QBWC traffic; None if it has served none."""
+    return None if _last_round_trip_at is None else time.monotonic() - _last_round_trip_at
+
+@contextmanager
+def _round_trip_metrics(method: str, ticket: str):
+    """Count, time and trace one QBWC SOAP call, labelled with the task entity it served."""
+    _round_trip.entity = "none"
+    started = time.perf_counter()
+    try:
+        with trace_round_trip(ticket, method) as trace_args:
+            try:
+                yield
+            finally:
+                trace_args["entity"] = _round_trip.entity
+    finally:
+        global _last_round_trip_at
+        _last_round_trip_at = time.monotonic()
+        QBWC_ROUND_TRIPS.inc(method=method, entity=_round_trip.entity)
+        QBWC_ROUND_TRIP_SECONDS.observe(time.perf_counter() - started, method=method, entity=_round_trip.entity)
+
+def _log_trace_summary(ticket: str) -> None:
+    """Log where a closed session spent its server-side time, from its trace file."""
+    summary = summarize_session(ticket)
+    if not summary:
+        return
+    breakdown = ", ".join(f"{name}={stats['self_ms']:.0f}ms/{stats['count']}"
+                          for name, stats in summary["by_category"].items())
+    logger.info("Session %s timing: %s round trip(s), %.0fms server-side; %s",
+                ticket, summary['round_trips'], summary['round_trip_ms'], breakdown)
+    for top in summary["top_spans"][:5]:
+        logger.info("  %s: %s call(s), %.1fms total, %.1fms avg, %.1fms max",
+                    top['span'], top['count'], top['total_ms'], top['avg_ms'], top['max_ms'])
+
+def _finish_closed_session(ticket: str) -> None:
+    """
+    Background end of a closed session: drain its push pipeline, post the
+    moves it created and log its timing. Moves still queued if the process
+    exits first are posted by a later flush; pages not pushed yet leave their
+    tasks unfinished, so their records are queried again next session.
+    """
     try:
-        with open(SESSION_STATE_FILE, 'w') as f:
-            json.dump(qbwc_session_state, f, default=str)
+        close_pipeline(ticket)
+        if odoo_posting_queue.pending():
+            odoo_posting_queue.flush()
+        _log_trace_summary(ticket)
     except Exception as e:
-        logger.error(f"Failed to save QBWC session state: {e}")
+        logger.error("Finishing closed session %s failed: %s", ticket, e, exc_info=True)
 
-# Load the session state from the file when the service module is loaded.
-# This helps persist sessions across server restarts.
-load_qbwc_session_state()
+def _get_active_task(session_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Return the task at the session's current index, or None when the queue is exhausted."""
+    task_queue = session_data.get("task_queue", [])
+    current_task_index = session_data.get("current_task_index", 0)
+    if current_task_index < len(task_queue):
+        return task_queue[current_task_index]
+    return None
 
-def _compute_overall_progress(session_data):
-    """Overall sync percentage, capped at 99 until last task."""
-    total = session_data.get("total_tasks") or len(session_data.get("task_queue", [])) or 1
+def _compute_overall_progress(session_data, records_in_flight: Optional[Dict[int, int]] = None):
+    """
+    Overall sync percentage, between 1 and 99 until the last task. The active
+    task counts by the share of its records received (from QuickBooks'
+    iteratorRemainingCount). `records_in_flight` maps task indexes to records
+    still waiting in the push pipeline; they are not counted as done yet,
+    whether they belong to the active task or to one QuickBooks has finished.
+    """
+    task_queue = session_data.get("task_queue", [])
+    total = session_data.get("total_tasks") or len(task_queue) or 1
     done = session_data.get("current_task_index", 0)
     if done >= total:
         return 100
-    pct = int(done * 100 / total)
-    return min(pct, 99)
+    records_in_flight = records_in_flight or {}
+    progress = float(done)
+    for index, in_flight in records_in_flight.items():
+        if index < min(done, len(task_queue)):
+            received = task_queue[index].get("records_received", 0)
+            if received:
+                progress -= min(in_flight, received) / received
+    if done < len(task_queue):
+        received = task_queue[done].get("records_received", 0)
+        remaining = task_queue[done].get("records_remaining", 0)
+        if received + remaining:
+            progress += max(received - records_in_flight.get(done, 0), 0) / (received + remaining)
+    pct = int(progress * 100 / total)
+    return max(1, min(pct, 99))
+
+def _records_in_flight(ticket: str) -> Dict[int, int]:
+    """Records still in the session's push pipeline, by task index."""
+    pipeline = find_pipeline(ticket)
+    return pipeline.records_in_flight_by_task() if pipeline else {}
+
+def _wait_for_pipeline_slot(ticket: str) -> bool:
+    """
+    Whether the session's push pipeline has room for another page, waiting up
+    to PUSH_PIPELINE_THROTTLE_WAIT_SECONDS for one. Called before the ticket
+    lock is taken so the wait never holds up the session's other calls.
+    """
+    pipeline = find_pipeline(ticket) if PUSH_PIPELINE_ENABLED and PUSH_PIPELINE_THROTTLE else None
+    return pipeline is None or pipeline.wait_for_slot(PUSH_PIPELINE_THROTTLE_WAIT_SECONDS)
 
 def _get_xml_text(element: Optional[ET.Element], default: Optional[str] = None) -> Optional[str]:
     """Safely get text from an XML element."""
@@ -119,6 +225,7 @@ def _extract_customer_data_from_ret(customer_ret_xml: ET.Element) -> Dict[str, A
     """Extracts detailed customer data from a CustomerRet XML element."""
     data = {
         "ListID": _get_xml_text(customer_ret_xml.find('ListID')),
+        "EditSequence": _get_xml_text(customer_ret_xml.find('EditSequence')),
         "Name": _get_xml_text(customer_ret_xml.find('Name')),
         "FullName": _get_xml_text(customer_ret_xml.find('FullName')),
         "CompanyName": _get_xml_text(customer_ret_xml.find('CompanyName')),
@@ -170,6 +277,7 @@ def _extract_vendor_data_from_ret(vendor_ret_xml: ET.Element) -> Dict[str, Any]:
     """Extracts detailed vendor data from a VendorRet XML element."""
     data = {
         "ListID": _get_xml_text(vendor_ret_xml.find('ListID')),
+        "EditSequence": _get_xml_text(vendor_ret_xml.find('EditSequence')),
         "TimeModifiedQB": _get_xml_text(vendor_ret_xml.find('TimeModified')),
         "Name": _get_xml_text(vendor_ret_xml.find('Name')),
         "FullName": _get_xml_text(vendor_ret_xml.find('FullName')),
@@ -185,33 +293,60 @@ def _extract_vendor_data_from_ret(vendor_ret_xml: ET.Element) -> Dict[str, Any]:
     # Filter out None values to keep the payload clean
     return {k: v for k, v in data.items() if v is not None}
 
+# Item types synced as Odoo products; groups, subtotals, discounts, payments and sales tax items are not products
+ITEM_RET_TAGS = ("ItemInventoryRet", "ItemNonInventoryRet", "ItemServiceRet", "ItemOtherChargeRet")
+
+def _extract_item_data_from_ret(item_ret_xml: ET.Element) -> Dict[str, Any]:
+    """
+    Extracts product data from an ItemInventoryRet, ItemNonInventoryRet,
+    ItemServiceRet or ItemOtherChargeRet element. Non-inventory, service and
+    other-charge items carry prices in SalesOrPurchase or SalesAndPurchase.
+    """
+    def text(*paths):
+        for path in paths:
+            value = _get_xml_text(item_ret_xml.find(path))
+            if value:
+                return value
+        return None
+
+    def amount(*paths):
+        value = text(*paths)
+        try:
+            return float(value) if value is not None else None
+        except ValueError:
+            return None
+
+    data = {
+        "ListID": text('ListID'),
+        "EditSequence": text('EditSequence'),
+        "Name": text('Name'),
+        "FullName": text('FullName'),
+        "IsActive": text('IsActive') != 'false',
+        "item_type": item_ret_xml.tag[:-len("Ret")],
+        "SalesDesc": text('SalesDesc', 'SalesAndPurchase/SalesDesc', 'SalesOrPurchase/Desc'),
+        "PurchaseDesc": text('PurchaseDesc', 'SalesAndPurchase/PurchaseDesc'),
+        "SalesPrice": amount('SalesPrice', 'SalesAndPurchase/SalesPrice', 'SalesOrPurchase/Price'),
+        "PurchaseCost": amount('PurchaseCost', 'SalesAndPurchase/PurchaseCost'),
+        "IncomeAccount": text('IncomeAccountRef/FullName', 'SalesAndPurchase/IncomeAccountRef/FullName',
+                              'SalesOrPurchase/AccountRef/FullName'),
+        "ExpenseAccount": text('COGSAccountRef/FullName', 'SalesAndPurchase/ExpenseAccountRef/FullName'),
+    }
+    return {k: v for k, v in data.items() if v is not None}
+
 # Helper function to extract text from XML element, with logging
 def _extract_text(xml_element: ET.Element, xpath: str) -> str:
     try:
         result = xml_element.findtext(xpath)
         return result.strip() if result else ""
     except Exception as e:
-        logger.warning(f"Error extracting text for xpath '{xpath}': {e}")
-        return ""
-
-def _get_customer_filter_xml(self):
-        """Builds XML for customer name filter based on config."""
-        customer_name_filter = self.config.get("CUSTOMER_NAME_FILTER")
-        if customer_name_filter:
-            logging.info(f"Filtering customers with name starting with: {customer_name_filter}")
-            return f"<NameFilter><MatchCriterion>StartsWith</MatchCriterion><Name>{escape(customer_name_filter)}</Name></NameFilter>"
-        return ""
-
-def _get_vendor_filter_xml(self):
-        """Builds XML for vendor name filter based on config."""
-        vendor_name_filter = self.config.get("VENDOR_NAME_FILTER")
-        if vendor_name_filter:
-            logging.info(f"Filtering vendors with name starting with: {vendor_name_filter}")
-            return f"<NameFilter><MatchCriterion>StartsWith</MatchCriterion><Name>{escape(vendor_name_filter)}</Name></NameFilter>"
+        logger.warning("Error extracting text for xpath '%s': %s", xpath, e)
         return ""
 
 def _get_txn_date_filter_xml(params: Dict[str, Any]) -> str:
-    """Helper to build TxnDateRangeFilter XML."""
+    """Helper to build TxnDateRangeFilter XML, or the ModifiedDateRangeFilter that replaces it."""
+    if "ModifiedDateRangeFilter" in params and params["ModifiedDateRangeFilter"].get("FromModifiedDate"):
+        from_modified = params["ModifiedDateRangeFilter"]["FromModifiedDate"]
+        return f"<ModifiedDateRangeFilter><FromModifiedDate>{from_modified}</FromModifiedDate></ModifiedDateRangeFilter>"
     if "TxnDateRangeFilter" in params and params["TxnDateRangeFilter"].get("FromTxnDate"):
         from_date = params["TxnDateRangeFilter"]["FromTxnDate"]
         to_date = params["TxnDateRangeFilter"].get("ToTxnDate")
@@ -232,6 +367,7 @@ def _get_include_line_items_xml(params: Dict[str, Any]) -> str:
 def _extract_transaction_data(txn_xml_element: ET.Element, txn_type: str) -> Dict[str, Any]:
     data = {
         "qb_txn_id": _extract_text(txn_xml_element, 'TxnID'),
+        "edit_sequence": _extract_text(txn_xml_element, 'EditSequence'),
         "ref_number": _extract_text(txn_xml_element, 'RefNumber'),
         "txn_date": _extract_text(txn_xml_element, 'TxnDate'),
         "memo": _extract_text(txn_xml_element, 'Memo'),
@@ -266,6 +402,7 @@ def _extract_transaction_data(txn_xml_element: ET.Element, txn_type: str) -> Dic
     if line_ret_name:
         for line_xml in txn_xml_element.findall(f'.//{line_ret_name}'):
             line_data = {
+                "txn_line_id": _extract_text(line_xml, 'TxnLineID'),
                 "item_name": _extract_text(line_xml, 'ItemRef/FullName'),
                 "description": _extract_text(line_xml, 'Desc'),
                 "quantity": float(_extract_text(line_xml, 'Quantity') or 0.0),
@@ -298,13 +435,14 @@ def _extract_transaction_data(txn_xml_element: ET.Element, txn_type: str) -> Dic
             })
 
 
-    logger.debug(f"Extracted QB {txn_type} Data for TxnID {data.get('qb_txn_id')}: {data}")
+    logger.debug("Extracted QB %s Data for TxnID %s: %s", txn_type, data.get('qb_txn_id'), truncated(data))
     return data
 
 # New specific extractor for Journal Entries
 def _extract_journal_entry_data(je_xml_element: ET.Element) -> Dict[str, Any]:
     data = {
         "qb_txn_id": _extract_text(je_xml_element, 'TxnID'),
+        "edit_sequence": _extract_text(je_xml_element, 'EditSequence'),
         "ref_number": _extract_text(je_xml_element, 'RefNumber'),
         "txn_date": _extract_text(je_xml_element, 'TxnDate'),
         "memo": _extract_text(je_xml_element, 'Memo'), # Top-level memo
@@ -334,13 +472,14 @@ def _extract_journal_entry_data(je_xml_element: ET.Element) -> Dict[str, Any]:
         }
         data["lines"].append(line_data)
     
-    logger.debug(f"Extracted QB Journal Entry Data for TxnID {data.get('qb_txn_id')}: {data}")
+    logger.debug("Extracted QB Journal Entry Data for TxnID %s: %s", data.get('qb_txn_id'), truncated(data))
     return data
 
 def _extract_payment_data(payment_xml_element: ET.Element) -> Dict[str, Any]:
     """Extracts detailed payment data from a ReceivePaymentRet XML element."""
     data = {
         "qb_txn_id": _get_xml_text(payment_xml_element.find('TxnID')),
+        "edit_sequence": _get_xml_text(payment_xml_element.find('EditSequence')),
         "customer_name": _get_xml_text(payment_xml_element.find('CustomerRef/FullName')),
         "txn_date": _get_xml_text(payment_xml_element.find('TxnDate')),
         "ref_number": _get_xml_text(payment_xml_element.find('RefNumber')),
@@ -362,19 +501,788 @@ def _extract_payment_data(payment_xml_element: ET.Element) -> Dict[str, Any]:
 
 def build_invoice_query_xml(params, qbxml_version, request_id_str, iterator_id=None):
     """
-    Build a simple InvoiceQueryRq QBXML with only IncludeLineItems.
+    Build an InvoiceQueryRq QBXML page: the first request starts an iterator
+    (filtered by TxnDateRangeFilter when given), later ones continue it.
     """
+    if iterator_id:
+        request = f'<InvoiceQueryRq requestID="{request_id_str}" iterator="Continue" iteratorID="{iterator_id}">'
+        filters = ""
+    else:
+        request = f'<InvoiceQueryRq requestID="{request_id_str}" iterator="Start">'
+        filters = _get_txn_date_filter_xml(params)
     qbxml = f'''<?xml version="1.0" encoding="utf-8"?>
 <?qbxml version="{qbxml_version}"?>
 <QBXML>
   <QBXMLMsgsRq onError="stopOnError">
-    <InvoiceQueryRq requestID="{request_id_str}">
+    {request}
+      <MaxReturned>50</MaxReturned>
+      {filters}
       <IncludeLineItems>true</IncludeLineItems>
     </InvoiceQueryRq>
   </QBXMLMsgsRq>
 </QBXML>'''
     return qbxml
 
+# --- Response handling -------------------------------------------------------
+#
+# Every QB query response is processed the same way: extract each *Ret record,
+# skip the ones that cannot be pushed, push the rest to Odoo and follow the
+# iterator. The per-entity differences live in QUERY_HANDLERS.
+#
+# Each successfully pushed record is checkpointed by ListID/TxnID and
+# EditSequence. If a worker dies half-way through a page, QBWC aborts the
+# session and the next session queries the entity again; the records that
+# were already applied (and not edited in QuickBooks since) are then skipped
+# instead of being written to Odoo a second time.
+
+def _txn_extractor(txn_type: str):
+    return lambda txn_xml: _extract_transaction_data(txn_xml, txn_type)
+
+def _require_field(field: str, description: str):
+    def prepare(data: Dict[str, Any]) -> Optional[str]:
+        return None if data.get(field) else f"has no {description}"
+    return prepare
+
+def _prepare_customer(data: Dict[str, Any]) -> Optional[str]:
+    # Jobs (sub-customers) are not created as Odoo partners
+    if data.get('ParentRef_ListID'):
+        return f"is a job ('{data.get('FullName', data.get('ListID'))}'). Skipping Odoo partner creation"
+    return None
+
+def _prepare_invoice(data: Dict[str, Any]) -> Optional[str]:
+    customer_name = data.get("customer_name")
+    if customer_name and ':' in customer_name:
+        parent_customer_name = customer_name.split(':')[0].strip()
+        logger.info("Invoice %s is for job '%s'. Attempting to assign to parent customer '%s'.", data['qb_txn_id'], customer_name, parent_customer_name)
+        data["customer_name"] = parent_customer_name
+    if not data.get("customer_name"):
+        return "has no customer name"
+    return None
+
+# entity -> how to extract, validate and push its records. "implemented" is
+# False for entities whose Odoo side is still a stub: their pages are counted
+# but not pushed, checkpointed or dead-lettered, so the records are pushed
+# once a real implementation exists. "load" pushes a whole page through
+# Odoo's import API instead of "push" when QB_SYNC_BACKFILL is enabled.
+# "external_id" is the (Odoo model, external id kind) a page's ids are
+# resolved against in one call before its records are pushed. "ret_tags" lists
+# the response elements to read when they are not all named <object>Ret.
+QUERY_HANDLERS: Dict[str, Dict[str, Any]] = {
+    CUSTOMER_QUERY: {
+        "object": "Customer", "id_key": "ListID", "extract": _extract_customer_data_from_ret,
+        "prepare": _prepare_customer, "push": lambda data: create_or_update_odoo_partner(data, is_supplier=False),
+        "load": lambda records: backfill_partners(records, is_supplier=False),
+        "external_id": ("res.partner", "partner"),
+    },
+    ITEM_QUERY: {
+        "object": "Item", "ret_tags": ITEM_RET_TAGS, "id_key": "ListID", "extract": _extract_item_data_from_ret,
+        "prepare": _require_field("FullName", "name"), "push": create_or_update_odoo_item, "load": backfill_items,
+    },
+    VENDOR_QUERY: {
+        "object": "Vendor", "id_key": "ListID", "extract": _extract_vendor_data_from_ret,
+        "prepare": _require_field("Name", "name"), "push": lambda data: create_or_update_odoo_partner(data, is_supplier=True),
+        "load": lambda records: backfill_partners(records, is_supplier=True),
+        "external_id": ("res.partner", "partner"),
+    },
+    INVOICE_QUERY: {
+        "object": "Invoice", "id_key": "qb_txn_id", "extract": _txn_extractor("Invoice"),
+        "prepare": _prepare_invoice, "push": create_or_update_odoo_invoice, "load": backfill_invoices,
+        "external_id": ("account.move", "invoice"),
+    },
+    BILL_QUERY: {
+        "object": "Bill", "id_key": "qb_txn_id", "extract": _txn_extractor("Bill"),
+        "prepare": _require_field("vendor_name", "vendor name"), "push": create_or_update_odoo_bill,
+        "implemented": False,
+    },
+    RECEIVEPAYMENT_QUERY: {
+        "object": "ReceivePayment", "id_key": "qb_txn_id", "extract": _extract_payment_data,
+        "prepare": _require_field("customer_name", "customer name"), "push": create_or_update_odoo_payment,
+        "implemented": False,
+    },
+    CREDITMEMO_QUERY: {
+        "object": "CreditMemo", "id_key": "qb_txn_id", "extract": _txn_extractor("CreditMemo"),
+        "push": create_or_update_odoo_credit_memo, "external_id": ("account.move", "credit_memo"),
+    },
+    SALESORDER_QUERY: {
+        "object": "SalesOrder", "id_key": "qb_txn_id", "extract": _txn_extractor("SalesOrder"),
+        "push": create_or_update_odoo_sales_order, "implemented": False,
+    },
+    PURCHASEORDER_QUERY: {
+        "object": "PurchaseOrder", "id_key": "qb_txn_id", "extract": _txn_extractor("PurchaseOrder"),
+        "push": create_or_update_odoo_purchase_order, "implemented": False,
+    },
+    JOURNALENTRY_QUERY: {
+        "object": "JournalEntry", "id_key": "qb_txn_id", "extract": _extract_journal_entry_data,
+        "push": create_or_update_odoo_journal_entry, "implemented": False,
+    },
+    "SalesReceiptQuery": {
+        "object": "SalesReceipt", "id_key": "qb_txn_id", "extract": _txn_extractor("SalesReceipt"),
+        "push": create_or_update_odoo_sales_receipt, "implemented": False,
+    },
+    "CheckQuery": {
+        "object": "Check", "id_key": "qb_txn_id", "extract": _txn_extractor("Check"),
+        "push": create_or_update_odoo_check, "implemented": False,
+    },
+    "DepositQuery": {
+        "object": "Deposit", "id_key": "qb_txn_id", "extract": _txn_extractor("Deposit"),
+        "push": create_or_update_odoo_deposit, "implemented": False,
+    },
+    "EstimateQuery": {
+        "object": "Estimate", "id_key": "qb_txn_id", "extract": _txn_extractor("Estimate"),
+        "push": create_or_update_odoo_estimate, "implemented": False,
+    },
+    "BillPaymentCheckQuery": {
+        "object": "BillPaymentCheck", "id_key": "qb_txn_id", "extract": _txn_extractor("BillPaymentCheck"),
+        "push": create_or_update_odoo_bill_payment_check, "implemented": False,
+    },
+}
+
+def record_version(data: Dict[str, Any]) -> Optional[str]:
+    """EditSequence of an extracted record; QuickBooks bumps it on every modification."""
+    return data.get("EditSequence") or data.get("edit_sequence") or None
+
+def _dead_letter(qb_object: str, record_id: str, data: Dict[str, Any], error_class: str, error: str) -> None:
+    if odoo_breaker.is_open():
+        # Failed because Odoo went down; the page raises CircuitOpenError (see _raise_if_odoo_down) so
+        # its task stays unfinished and the record is queried and pushed again next session
+        return
+    QB_DEAD_LETTERS.inc(entity=qb_object, outcome="queued")
+    dead_letters.record_failure(qb_object, record_id, data, error_class, error)
+
+def _raise_if_odoo_down(unpushed: int) -> None:
+    """
+    End the page with CircuitOpenError when some of its records were not
+    pushed and the breaker is now open: they were not dead-lettered, so the
+    task (a date window, the modified-date query) must not be marked complete.
+    """
+    if unpushed and odoo_breaker.is_open():
+        raise CircuitOpenError(odoo_breaker.name, odoo_breaker.retry_in())
+
+def push_record(handler: Dict[str, Any], record_id: str, data: Dict[str, Any], version: Optional[str]) -> bool:
+    """
+    Push one extracted record and checkpoint it; failures go to the
+    dead-letter queue. Returns whether it reached Odoo.
+    """
+    qb_object = handler["object"]
+    label = data.get("Name") or data.get("ref_number") or ""
+    logger.info("  Processing %s %s %s", qb_object, record_id, label)
+    try:
+        with span(f"push {qb_object}", "record", record_id=record_id):
+            odoo_id = handler["push"](data)
+    except Exception as e:
+        QB_RECORDS.inc(entity=qb_object, outcome="failed")
+        logger.error("    Error processing %s %s for Odoo: %s", qb_object, record_id, e, exc_info=True)
+        _dead_letter(qb_object, record_id, data, type(e).__name__, str(e))
+        return False
+    if odoo_id:
+        QB_RECORDS.inc(entity=qb_object, outcome="pushed")
+        logger.info("    Successfully processed %s %s for Odoo (Odoo ID: %s).", qb_object, record_id, odoo_id)
+        mark_committed(qb_object, record_id, version, odoo_id)
+        return True
+    QB_RECORDS.inc(entity=qb_object, outcome="failed")
+    logger.warning("    %s %s processed for Odoo but no Odoo ID returned.", qb_object, record_id)
+    _dead_letter(qb_object, record_id, data, "no_odoo_id", "push returned no Odoo ID")
+    return False
+
+def _load_page(handler: Dict[str, Any], pending) -> int:
+    """
+    Backfill mode: push a page through the handler's "load" (Odoo import) in
+    a few calls. Returns how many of its records were not loaded.
+    """
+    qb_object = handler["object"]
+    if not pending:
+        return 0
+    if odoo_breaker.is_open():
+        QB_RECORDS.inc(len(pending), entity=qb_object, outcome="deferred")
+        raise CircuitOpenError(odoo_breaker.name, odoo_breaker.retry_in())
+
+    logger.info("  Backfilling %s %s record(s) through Odoo's import API", len(pending), qb_object)
+    try:
+        with span(f"load {qb_object}", "record", records=len(pending)) as span_args:
+            result = handler["load"]([(record_id, data) for record_id, data, _ in pending])
+            span_args.update(rpc_calls=result.calls)
+    except Exception as e:
+        QB_RECORDS.inc(len(pending), entity=qb_object, outcome="failed")
+        logger.error("    Error backfilling %s %s record(s) into Odoo: %s", len(pending), qb_object, e, exc_info=True)
+        for record_id, data, _ in pending:
+            _dead_letter(qb_object, record_id, data, type(e).__name__, str(e))
+        return len(pending)
+
+    for record_id, data, version in pending:
+        odoo_id = result.ids.get(record_id)
+        if odoo_id:
+            QB_RECORDS.inc(entity=qb_object, outcome="pushed")
+            mark_committed(qb_object, record_id, version, odoo_id)
+        else:
+            QB_RECORDS.inc(entity=qb_object, outcome="failed")
+            error = result.errors.get(record_id, 'no Odoo ID returned')
+            logger.warning("    %s %s was not loaded into Odoo: %s", qb_object, record_id, error)
+            _dead_letter(qb_object, record_id, data, "load_rejected", error)
+    dead_letters.resolve(qb_object, list(result.ids))
+    logger.info("Backfilled %s of %s %s record(s) in %s Odoo call(s).", len(result.ids), len(pending), qb_object, result.calls)
+    return len(pending) - len(result.ids)
+
+def _push_records(handler: Dict[str, Any], record_elements) -> None:
+    """
+    Push one page of *Ret elements to Odoo, skipping records already applied.
+    Raises CircuitOpenError when Odoo went down before every record was
+    pushed or dead-lettered.
+    """
+    qb_object = handler["object"]
+    id_key = handler["id_key"]
+    prepare = handler.get("prepare")
+    if not handler.get("implemented", True):
+        QB_RECORDS.inc(len(record_elements), entity=qb_object, outcome="unsupported")
+        logger.info("Not pushing %s %s record(s): their Odoo side is not implemented yet.", len(record_elements), qb_object)
+        return
+
+    records = []
+    with span(f"extract {qb_object}", "extract", records=len(record_elements)):
+        for record_xml in record_elements:
+            try:
+                data = handler["extract"](record_xml)
+            except Exception as e:
+                logger.error("    Error extracting data from %s XML: %s", qb_object, e, exc_info=True)
+                continue
+            record_id = data.get(id_key)
+            if not record_id:
+                logger.warning("%s record found with no %s. Skipping.", qb_object, 'ListID' if id_key == 'ListID' else 'TxnID')
+                continue
+            skip_reason = prepare(data) if prepare else None
+            if skip_reason:
+                logger.info("  %s %s %s. Skipping Odoo processing.", qb_object, record_id, skip_reason)
+                continue
+            records.append((record_id, data))
+    QB_RECORDS.inc(len(record_elements), entity=qb_object, outcome="extracted")
+    QB_RECORDS.inc(len(record_elements) - len(records), entity=qb_object, outcome="skipped")
+
+    with span("load_checkpoints", "lookup", entity=qb_object):
+        committed = load_committed(qb_object, [record_id for record_id, _ in records])
+    pending = []
+    for record_id, data in records:
+        version = record_version(data)
+        if not (version and committed.get(record_id) == version):
+            pending.append((record_id, data, version))
+    already_applied = len(records) - len(pending)
+
+    if ODOO_BACKFILL_ENABLED and handler.get("load"):
+        unpushed = _load_page(handler, pending)
+    else:
+        if handler.get("external_id") and pending and not odoo_breaker.is_open():
+            with span("resolve_external_ids", "lookup", entity=qb_object):
+                prefetch_external_ids(*handler["external_id"], [record_id for record_id, _, _ in pending])
+        pushed = []
+        try:
+            for position, (record_id, data, version) in enumerate(pending):
+                if odoo_breaker.is_open():
+                    # Odoo is down: stop here instead of failing every remaining record. Nothing is
+                    # checkpointed for them, so the next session's query picks them up again.
+                    QB_RECORDS.inc(len(pending) - position, entity=qb_object, outcome="deferred")
+                    raise CircuitOpenError(odoo_breaker.name, odoo_breaker.retry_in())
+                if push_record(handler, record_id, data, version):
+                    pushed.append(record_id)
+        finally:
+            dead_letters.resolve(qb_object, pushed)
+        unpushed = len(pending) - len(pushed)
+
+    QB_RECORDS.inc(already_applied, entity=qb_object, outcome="already_applied")
+    record_cache_lookup("record_checkpoints", hit=True, count=already_applied)
+    record_cache_lookup("record_checkpoints", hit=False, count=len(records) - already_applied)
+    if already_applied:
+        logger.info("Skipped %s %s record(s) already applied to Odoo at their current EditSequence.", already_applied, qb_object)
+    _raise_if_odoo_down(unpushed)
+
+def _push_page(handler: Dict[str, Any], record_elements, iteration_complete: bool,
+               on_complete: Optional[Callable[[], None]] = None) -> None:
+    """
+    Push one page, post the moves it created and, after a task's last page,
+    mark the entity synced and run `on_complete` (which records a finished
+    date window or modified-date query) unless its handler is a stub.
+    """
+    with profiled("push", f"{handler['object']} x{len(record_elements)}"):
+        _push_records(handler, record_elements)
+    if odoo_posting_queue.pending():
+        with span("post_moves", "post", entity=handler["object"]):
+            odoo_posting_queue.flush()
+    if iteration_complete and handler.get("implemented", True):
+        # Stub entities are neither marked synced nor their windows done, so
+        # their history is still queried once a real handler lands
+        mark_sync_complete(handler["object"])
+        if on_complete:
+            on_complete()
+
+def _process_query_response(ticket: str, root: ET.Element, entity: str, handler: Dict[str, Any],
+                            session_data: Dict[str, Any], active_task: Dict[str, Any]) -> int:
+    """
+    Handle one <entity>Rs page and advance the task's iterator. With the push
+    pipeline enabled the page is pushed in the background and this returns
+    as soon as it is queued.
+
+    Returns:
+        Whether the iterator has more pages for this task.
+    """
+    query_rs = root.find(f'.//{entity}Rs')
+    if query_rs is None:
+        logger.warning("Could not find %sRs in the response.", entity)
+        active_task["iteratorID"] = None
+        session_data["current_task_index"] += 1
+        return False
+
+    status_code = query_rs.get('statusCode', 'unknown')
+    status_message = query_rs.get('statusMessage', 'N/A')
+    logger.info("%sRs status: %s - %s", entity, status_code, status_message)
+    if status_code == '1':
+        # "A query request did not find a matching object": an empty page, not an error
+        logger.info("%sRs matched no records.", entity)
+    elif status_code != '0':
+        logger.error("%sRs failed with statusCode: %s, message: %s", entity, status_code, status_message)
+        session_data["last_error"] = f"{entity} Error: {status_message}"
+        active_task["iteratorID"] = None
+        session_data["current_task_index"] += 1
+        return False
+
+    ret_tags = handler.get("ret_tags", (f'{handler["object"]}Ret',))
+    record_elements = [element for element in query_rs if element.tag in ret_tags]
+    logger.info("Received %s %s records in this response.", len(record_elements), handler['object'])
+    iterator_id = query_rs.get("iteratorID")
+    iterator_remaining_count = query_rs.get("iteratorRemainingCount")
+    QB_ITERATOR_REMAINING.set(int(iterator_remaining_count or '0'), entity=handler["object"])
+    iteration_continues = bool(iterator_id and int(iterator_remaining_count or '0') > 0)
+    active_task["records_received"] = active_task.get("records_received", 0) + len(record_elements)
+    active_task["records_remaining"] = int(iterator_remaining_count or '0') if iteration_continues else 0
+    company_file = session_data.get("company_file_name") or ""
+    on_complete = None
+    if active_task.get("window"):
+        on_complete = partial(mark_window_done, company_file, entity, tuple(active_task["window"]),
+                              active_task["records_received"])
+    elif active_task.get("modified_cursor"):
+        on_complete = partial(mark_modified_synced, company_file, entity, active_task["modified_cursor"])
+    task_index = session_data["current_task_index"]
+
+    if PUSH_PIPELINE_ENABLED:
+        pipeline = get_pipeline(ticket)
+        pipeline.raise_failure()
+        with span("queue_push", "queue", entity=handler["object"], depth=pipeline.depth):
+            # A task whose earlier page failed is not completed by its last one
+            pipeline.submit(lambda: _push_page(handler, record_elements,
+                                               not iteration_continues and not pipeline.task_failed(task_index),
+                                               on_complete),
+                            f"{handler['object']} page of {len(record_elements)}", records=len(record_elements),
+                            task=task_index)
+    else:
+        _push_page(handler, record_elements, not iteration_continues, on_complete)
+
+    if iteration_continues:
+        active_task["iteratorID"] = iterator_id
+        active_task["requestID"] = str(int(active_task.get("requestID", "0")) + 1)
+        logger.info("%s iteration continues. IteratorID: %s, Remaining: %s", handler['object'], iterator_id, iterator_remaining_count)
+        return True
+
+    logger.info("%s iteration complete or no iterator.", handler['object'])
+    active_task["iteratorID"] = None
+    session_data["current_task_index"] += 1
+    return False
+
+# Transaction queries whose request builders take a TxnDateRangeFilter
+TXN_WINDOW_ENTITIES = (INVOICE_QUERY, BILL_QUERY, RECEIVEPAYMENT_QUERY, CREDITMEMO_QUERY,
+                       SALESORDER_QUERY, PURCHASEORDER_QUERY, JOURNALENTRY_QUERY)
+
+def _shard_transaction_tasks(tasks, company_file: str):
+    """
+    Windowed backfill: replace each transaction query task by one task per
+    date window scheduled for the company file, or, once its history is
+    covered, by one query for what was modified since the entity's cursor.
+    Entities whose handler is a stub keep their plain query and plan no
+    windows until they are implemented.
+    """
+    sharded = []
+    for task in tasks:
+        if task["entity"] not in TXN_WINDOW_ENTITIES or not QUERY_HANDLERS[task["entity"]].get("implemented", True):
+            sharded.append(task)
+            continue
+        windows = schedule_windows(company_file, task["entity"])
+        if windows:
+            logger.info("Scheduling %s windows: %s", task["entity"],
+                        ", ".join(f"{from_date}..{to_date}" for from_date, to_date in windows))
+        for from_date, to_date in windows:
+            sharded.append({**task, "params": {**task["params"],
+                                               "TxnDateRangeFilter": {"FromTxnDate": from_date, "ToTxnDate": to_date}},
+                            "window": [from_date, to_date]})
+        since = modified_since(company_file, task["entity"])
+        if since:
+            logger.info("Querying %s modified since %s", task["entity"], since)
+            sharded.append({**task, "params": {**task["params"],
+                                               "ModifiedDateRangeFilter": {"FromModifiedDate": f"{since}T00:00:00"}},
+                            "modified_cursor": (date.today() - timedelta(days=1)).isoformat()})
+    for position, task in enumerate(sharded, start=1):
+        task["requestID"] = str(position)
+    return sharded
+
+def _send_request_xml(ticket, strCompanyFileName, qbXMLMajorVers, qbXMLMinorVers, pipeline_ready: bool = True):
+    """
+    Build the next QBXML request for a session. Caller must hold the ticket
+    lock; `pipeline_ready` is False when the push pipeline had no free slot.
+    """
+    logger.info("sendRequestXML invoked with ticket: %s", ticket)
+
+    session_data = session_store.get(ticket)
+    logger.info("sendRequestXML: Retrieved session_data exists: %s", session_data is not None)
+
+    if not session_data:
+        logger.error("sendRequestXML: Invalid ticket %s. No session data found.", ticket)
+        return ""
+
+    # Store company file and QBXML version info from QBWC
+    session_data["company_file_name"] = strCompanyFileName
+    session_data["qbxml_version"] = f"{qbXMLMajorVers}.{qbXMLMinorVers}"
+    logger.info("sendRequestXML: CompanyFileName='%s', QBXMLVersion='%s'", strCompanyFileName, session_data['qbxml_version'])
+    if session_data.pop("shard_txn_windows", False):
+        # Windows are tracked per company file, which QBWC only names from the first sendRequestXML on
+        session_data["task_queue"] = _shard_transaction_tasks(session_data.get("task_queue", []), strCompanyFileName or "")
+        session_data["total_tasks"] = len(session_data["task_queue"])
+
+    task_queue = session_data.get("task_queue", [])
+    current_task_index = session_data.get("current_task_index", 0)
+    logger.info("sendRequestXML: Task Queue length: %s", len(task_queue))
+    logger.info("sendRequestXML: Current Task Index: %s", current_task_index)
+
+    if current_task_index >= len(task_queue):
+        logger.info("sendRequestXML: All tasks completed for this session or task queue is empty initially.")
+        return ""
+
+    # Ensure we skip completed tasks (in case of logic error)
+    while current_task_index < len(task_queue) and task_queue[current_task_index].get("iteratorID") is None and session_data.get("current_task_index", 0) > current_task_index:
+        current_task_index += 1
+        session_data["current_task_index"] = current_task_index
+
+    if current_task_index >= len(task_queue):
+        logger.info("sendRequestXML: All tasks completed after skipping completed tasks.")
+        return ""
+
+    current_task = task_queue[current_task_index]
+    _round_trip.entity = current_task.get("entity", "none")
+
+    if not pipeline_ready:
+        # QBWC answers NoOp by pausing a few seconds and calling sendRequestXML again
+        QBWC_NOOPS.inc()
+        pipeline = find_pipeline(ticket)
+        logger.info("sendRequestXML: push pipeline for %s is full (%s page(s)); answering NoOp",
+                    ticket, pipeline.depth if pipeline else 0)
+        return "NoOp"
+    logger.info("sendRequestXML: Processing task: %s", truncated(current_task))
+    if current_task.get("window") and not current_task.get("window_started"):
+        # Only a window this session actually queries counts an attempt towards splitting or parking it
+        current_task["window_started"] = True
+        mark_window_started(session_data.get("company_file_name") or "", current_task["entity"],
+                            tuple(current_task["window"]))
+    save_qbwc_session_state(ticket, session_data)
+
+    xml_request = ""
+    request_id_str = current_task.get("requestID", "1") # Default to "1"
+
+    if current_task["type"] == QB_QUERY:
+        entity = current_task["entity"]
+        iterator_id = current_task.get("iteratorID")
+        qbxml_version = session_data.get("qbxml_version", "13.0") # Default to 13.0 if not set
+
+        if entity == CUSTOMER_QUERY:
+            if iterator_id:
+                logger.info("Continuing CustomerQueryRq with iteratorID: %s", iterator_id)
+                xml_request = f'''<?xml version="1.0" encoding="utf-8"?>
+<?qbxml version="{session_data["qbxml_version"]}"?>
+<QBXML>
+  <QBXMLMsgsRq onError="stopOnError">
+<CustomerQueryRq requestID="{request_id_str}" iterator="Continue" iteratorID="{iterator_id}">
+  <MaxReturned>50</MaxReturned>
+</CustomerQueryRq>
+  </QBXMLMsgsRq>
+</QBXML>'''
+            else:
+                logger.info("Starting new CustomerQueryRq.")
+                xml_request = f'''<?xml version="1.0" encoding="utf-8"?>
+<?qbxml version="{session_data["qbxml_version"]}"?>
+<QBXML>
+  <QBXMLMsgsRq onError="stopOnError">
+<CustomerQueryRq requestID="{request_id_str}">
+  <!-- <ActiveStatus>ActiveOnly</ActiveStatus> -->
+  <MaxReturned>50</MaxReturned>
+</CustomerQueryRq>
+  </QBXMLMsgsRq>
+</QBXML>'''
+        
+        elif entity == ITEM_QUERY:
+            if iterator_id:
+                logger.info("Continuing ItemQueryRq with iteratorID: %s", iterator_id)
+                iterator_attrs = f' iterator="Continue" iteratorID="{iterator_id}"'
+            else:
+                logger.info("Starting new ItemQueryRq.")
+                iterator_attrs = ' iterator="Start"'
+            # ItemQueryRq returns every item type; the ones that are not products are skipped on receipt
+            xml_request = f'''<?xml version="1.0" encoding="utf-8"?>
+<?qbxml version="{qbxml_version}"?>
+<QBXML>
+  <QBXMLMsgsRq onError="stopOnError">
+<ItemQueryRq requestID="{request_id_str}"{iterator_attrs}>
+  <MaxReturned>50</MaxReturned>
+  <ActiveStatus>All</ActiveStatus>
+</ItemQueryRq>
+  </QBXMLMsgsRq>
+</QBXML>'''
+
+        elif entity == VENDOR_QUERY:
+            params = current_task.get("params", {})
+            iterator_id = current_task.get("iteratorID")
+            qbxml_version = session_data.get("qbxml_version", "13.0")
+            request_id_str = current_task.get("requestID", "1")
+            # Build VendorQueryRq QBXML
+            if iterator_id:
+                logger.info("Continuing VendorQueryRq with iteratorID: %s", iterator_id)
+                xml_request = f'''<?xml version="1.0" encoding="utf-8"?>
+<?qbxml version="{qbxml_version}"?>
+<QBXML>
+  <QBXMLMsgsRq onError="stopOnError">
+<VendorQueryRq requestID="{request_id_str}" iterator="Continue" iteratorID="{iterator_id}">
+  <MaxReturned>50</MaxReturned>
+</VendorQueryRq>
+  </QBXMLMsgsRq>
+</QBXML>'''
+            else:
+                logger.info("Starting new VendorQueryRq.")
+                xml_request = f'''<?xml version="1.0" encoding="utf-8"?>
+<?qbxml version="{qbxml_version}"?>
+<QBXML>
+  <QBXMLMsgsRq onError="stopOnError">
+<VendorQueryRq requestID="{request_id_str}">
+  <MaxReturned>50</MaxReturned>
+</VendorQueryRq>
+  </QBXMLMsgsRq>
+</QBXML>'''
+
+        elif entity == INVOICE_QUERY:
+            params = current_task.get("params", {})
+            iterator_id = current_task.get("iteratorID")
+            qbxml_version = session_data.get("qbxml_version", "13.0")
+            request_id_str = current_task.get("requestID", "1")
+            
+            logger.info("Building InvoiceQuery XML with params: %s, qbxml_version: %s, request_id: %s, iterator_id: %s", params, qbxml_version, request_id_str, iterator_id)
+            
+            try:
+                # Only pass the expected arguments to the helper
+                xml_request = build_invoice_query_xml(
+                    params,
+                    qbxml_version,
+                    request_id_str,
+                    iterator_id
+                )
+                logger.info("Successfully built InvoiceQuery XML. Length: %s characters", len(xml_request))
+                logger.debug("Generated InvoiceQuery XML: %s", truncated(xml_request))
+            except Exception as e:
+                logger.error("Error building InvoiceQuery XML: %s", e, exc_info=True)
+                return ""
+        elif entity == BILL_QUERY:
+            params = current_task.get("params", {})
+            iterator_id = current_task.get("iteratorID")
+            qbxml_version = session_data.get("qbxml_version", "13.0")
+            request_id_str = current_task.get("requestID", "1")
+            txn_date_filter_xml = _get_txn_date_filter_xml(params)
+            include_line_items_xml = _get_include_line_items_xml(params)
+            if iterator_id:
+                logger.info("Continuing BillQueryRq with iteratorID: %s", iterator_id)
+                xml_request = f'''<?xml version="1.0" encoding="utf-8"?>
+<?qbxml version="{qbxml_version}"?>
+<QBXML>
+  <QBXMLMsgsRq onError="stopOnError">
+<BillQueryRq requestID="{request_id_str}" iterator="Continue" iteratorID="{iterator_id}">
+  <MaxReturned>50</MaxReturned>
+</BillQueryRq>
+  </QBXMLMsgsRq>
+</QBXML>'''
+            else:
+                logger.info("Starting new BillQueryRq.")
+                xml_request = f'''<?xml version="1.0" encoding="utf-8"?>
+<?qbxml version="{qbxml_version}"?>
+<QBXML>
+  <QBXMLMsgsRq onError="stopOnError">
+<BillQueryRq requestID="{request_id_str}" iterator="Start">
+  <MaxReturned>50</MaxReturned>
+  {txn_date_filter_xml}
+  {include_line_items_xml}
+</BillQueryRq>
+  </QBXMLMsgsRq>
+</QBXML>'''
+        elif entity == RECEIVEPAYMENT_QUERY:
+            params = current_task.get("params", {})
+            iterator_id = current_task.get("iteratorID")
+            qbxml_version = session_data.get("qbxml_version", "13.0")
+            request_id_str = current_task.get("requestID", "1")
+            txn_date_filter_xml = _get_txn_date_filter_xml(params)
+            if iterator_id:
+                logger.info("Continuing ReceivePaymentQueryRq with iteratorID: %s", iterator_id)
+                xml_request = f'''<?xml version="1.0" encoding="utf-8"?>\n<?qbxml version="{qbxml_version}"?>\n<QBXML>\n  <QBXMLMsgsRq onError="stopOnError">\n    <ReceivePaymentQueryRq requestID="{request_id_str}" iterator="Continue" iteratorID="{iterator_id}">\n      <MaxReturned>50</MaxReturned>\n    </ReceivePaymentQueryRq>\n  </QBXMLMsgsRq>\n</QBXML>'''
+            else:
+                logger.info("Starting new ReceivePaymentQueryRq.")
+                xml_request = f'''<?xml version="1.0" encoding="utf-8"?>\n<?qbxml version="{qbxml_version}"?>\n<QBXML>\n  <QBXMLMsgsRq onError="stopOnError">\n    <ReceivePaymentQueryRq requestID="{request_id_str}" iterator="Start">\n      <MaxReturned>50</MaxReturned>\n      {txn_date_filter_xml}\n    </ReceivePaymentQueryRq>\n  </QBXMLMsgsRq>\n</QBXML>'''
+        elif entity == CREDITMEMO_QUERY:
+            params = current_task.get("params", {})
+            iterator_id = current_task.get("iteratorID")
+            qbxml_version = session_data.get("qbxml_version", "13.0")
+            request_id_str = current_task.get("requestID", "1")
+            txn_date_filter_xml = _get_txn_date_filter_xml(params)
+            include_line_items_xml = _get_include_line_items_xml(params)
+            if iterator_id:
+                logger.info("Continuing CreditMemoQueryRq with iteratorID: %s", iterator_id)
+                xml_request = f'''<?xml version="1.0" encoding="utf-8"?>\n<?qbxml version="{qbxml_version}"?>\n<QBXML>\n  <QBXMLMsgsRq onError="stopOnError">\n    <CreditMemoQueryRq requestID="{request_id_str}" iterator="Continue" iteratorID="{iterator_id}">\n      <MaxReturned>50</MaxReturned>\n    </CreditMemoQueryRq>\n  </QBXMLMsgsRq>\n</QBXML>'''
+            else:
+                logger.info("Starting new CreditMemoQueryRq.")
+                xml_request = f'''<?xml version="1.0" encoding="utf-8"?>\n<?qbxml version="{qbxml_version}"?>\n<QBXML>\n  <QBXMLMsgsRq onError="stopOnError">\n    <CreditMemoQueryRq requestID="{request_id_str}" iterator="Start">\n      <MaxReturned>50</MaxReturned>\n      {txn_date_filter_xml}\n      {include_line_items_xml}\n    </CreditMemoQueryRq>\n  </QBXMLMsgsRq>\n</QBXML>'''
+        elif entity == SALESORDER_QUERY:
+            params = current_task.get("params", {})
+            iterator_id = current_task.get("iteratorID")
+            qbxml_version = session_data.get("qbxml_version", "13.0")
+            request_id_str = current_task.get("requestID", "1")
+            txn_date_filter_xml = _get_txn_date_filter_xml(params)
+            include_line_items_xml = _get_include_line_items_xml(params)
+            if iterator_id:
+                logger.info("Continuing SalesOrderQueryRq with iteratorID: %s", iterator_id)
+                xml_request = f'''<?xml version="1.0" encoding="utf-8"?>\n<?qbxml version="{qbxml_version}"?>\n<QBXML>\n  <QBXMLMsgsRq onError="stopOnError">\n    <SalesOrderQueryRq requestID="{request_id_str}" iterator="Continue" iteratorID="{iterator_id}">\n      <MaxReturned>50</MaxReturned>\n    </SalesOrderQueryRq>\n  </QBXMLMsgsRq>\n</QBXML>'''
+            else:
+                logger.info("Starting new SalesOrderQueryRq.")
+                xml_request = f'''<?xml version="1.0" encoding="utf-8"?>\n<?qbxml version="{qbxml_version}"?>\n<QBXML>\n  <QBXMLMsgsRq onError="stopOnError">\n    <SalesOrderQueryRq requestID="{request_id_str}" iterator="Start">\n      <MaxReturned>50</MaxReturned>\n      {txn_date_filter_xml}\n      {include_line_items_xml}\n    </SalesOrderQueryRq>\n  </QBXMLMsgsRq>\n</QBXML>'''
+        elif entity == PURCHASEORDER_QUERY:
+            params = current_task.get("params", {})
+            iterator_id = current_task.get("iteratorID")
+            qbxml_version = session_data.get("qbxml_version", "13.0")
+            request_id_str = current_task.get("requestID", "1")
+            txn_date_filter_xml = _get_txn_date_filter_xml(params)
+            include_line_items_xml = _get_include_line_items_xml(params)
+            if iterator_id:
+                logger.info("Continuing PurchaseOrderQueryRq with iteratorID: %s", iterator_id)
+                xml_request = f'''<?xml version="1.0" encoding="utf-8"?>\n<?qbxml version="{qbxml_version}"?>\n<QBXML>\n  <QBXMLMsgsRq onError="stopOnError">\n    <PurchaseOrderQueryRq requestID="{request_id_str}" iterator="Continue" iteratorID="{iterator_id}">\n      <MaxReturned>50</MaxReturned>\n    </PurchaseOrderQueryRq>\n  </QBXMLMsgsRq>\n</QBXML>'''
+            else:
+                logger.info("Starting new PurchaseOrderQueryRq.")
+                xml_request = f'''<?xml version="1.0" encoding="utf-8"?>\n<?qbxml version="{qbxml_version}"?>\n<QBXML>\n  <QBXMLMsgsRq onError="stopOnError">\n    <PurchaseOrderQueryRq requestID="{request_id_str}" iterator="Start">\n      <MaxReturned>50</MaxReturned>\n      {txn_date_filter_xml}\n      {include_line_items_xml}\n    </PurchaseOrderQueryRq>\n  </QBXMLMsgsRq>\n</QBXML>'''
+        elif entity == JOURNALENTRY_QUERY:
+            params = current_task.get("params", {})
+            iterator_id = current_task.get("iteratorID")
+            qbxml_version = session_data.get("qbxml_version", "13.0")
+            request_id_str = current_task.get("requestID", "1")
+            txn_date_filter_xml = _get_txn_date_filter_xml(params)
+            max_entries = 50
+            if iterator_id:
+                logger.info("Continuing JournalEntryQueryRq with iteratorID: %s", iterator_id)
+                xml_request = f'''<?xml version="1.0" encoding="utf-8"?>\n<?qbxml version="{qbxml_version}"?>\n<QBXML>\n  <QBXMLMsgsRq onError="stopOnError">\n    <JournalEntryQueryRq requestID="{request_id_str}" iterator="Continue" iteratorID="{iterator_id}">\n      <MaxReturned>{max_entries}</MaxReturned>\n    </JournalEntryQueryRq>\n  </QBXMLMsgsRq>\n</QBXML>'''
+            else:
+                logger.info("Starting new JournalEntryQueryRq.")
+                xml_request = f'''<?xml version="1.0" encoding="utf-8"?>\n<?qbxml version="{qbxml_version}"?>\n<QBXML>\n  <QBXMLMsgsRq onError="stopOnError">\n    <JournalEntryQueryRq requestID="{request_id_str}" iterator="Start">\n      <MaxReturned>{max_entries}</MaxReturned>\n      {txn_date_filter_xml}\n    </JournalEntryQueryRq>\n  </QBXMLMsgsRq>\n</QBXML>'''
+
+    # Add other QB_QUERY entity types (Vendor, Item, etc.) here in the future
+    # Add QB_ADD, QB_MOD task types here in the future for Odoo to QB sync
+
+    logger.debug("Sending QBXML request for task type %s, entity %s", current_task['type'], current_task.get('entity', 'N/A'))
+    logger.info("Generated XML request (first 500 chars): %s", truncated(xml_request, 500) if xml_request else 'EMPTY REQUEST')
+    return xml_request
+
+def _receive_response_xml(ticket, response, hresult, message):
+    """Process a QBXML response for a session. Caller must hold the ticket lock."""
+    logger.info("QBWC Service: receiveResponseXML called. Ticket: %s", ticket)
+
+    session_data = session_store.get(ticket)
+    if not session_data:
+        logger.error("receiveResponseXML: Invalid ticket %s. No session data found.", ticket)
+        return "0"  # Error
+
+    # Resolve the task from the queue itself so iterator updates are persisted with it
+    active_task = _get_active_task(session_data)
+    if not active_task:
+        logger.error("receiveResponseXML: No active task found for ticket %s.", ticket)
+        return "0"  # Error
+    _round_trip.entity = active_task.get("entity", "none")
+
+    logger.debug("Received QBXML response (first 1000 chars): %s", truncated(response, 1000) if response else 'Empty response')
+
+    if hresult:
+        logger.error("receiveResponseXML received an error from QBWC. HRESULT: %s, Message: %s", hresult, message)
+        session_data["last_error"] = f"QBWC Error: {message}"
+        session_data["current_task_index"] += 1
+        save_qbwc_session_state(ticket, session_data)
+        return "0"
+
+    iterating = False
+    try:
+        if not response:
+            logger.warning("Received empty response for task: %s. This may be normal if the query returned no data.", active_task)
+            session_data["current_task_index"] += 1
+            logger.info("Incremented current_task_index to %s after empty response.", session_data['current_task_index'])
+            progress = _compute_overall_progress(session_data, _records_in_flight(ticket))
+            save_qbwc_session_state(ticket, session_data)
+            return str(progress)
+
+        logger.debug("Parsing XML response for entity: %s", active_task.get('entity', 'Unknown'))
+        try:
+            with span("parse_response", "parse", bytes=len(response)):
+                root = ET.fromstring(response)
+            logger.debug("XML response parsed successfully")
+        except ET.ParseError as parse_error:
+            logger.error("XML Parse Error in receiveResponseXML: %s", parse_error)
+            logger.error("Response content (first 1000 chars): %s", truncated(response, 1000))
+            session_data["last_error"] = f"XML Parse Error: {str(parse_error)}"
+            session_data["current_task_index"] += 1
+            save_qbwc_session_state(ticket, session_data)
+            return "0"
+
+        if active_task["type"] == QB_QUERY:
+            handler = QUERY_HANDLERS.get(active_task["entity"])
+            if handler:
+                iterating = _process_query_response(ticket, root, active_task["entity"], handler, session_data, active_task)
+            else:
+                logger.warning("No response handler for %s. Skipping task.", active_task['entity'])
+                active_task["iteratorID"] = None
+                session_data["current_task_index"] += 1
+
+    except CircuitOpenError as e:
+        logger.warning("Ending session %s early: %s. Unprocessed records will sync on the next run.", ticket, e)
+        session_data["last_error"] = f"Odoo is unavailable ({e}); remaining records will sync on the next run"
+        save_qbwc_session_state(ticket, session_data)
+        return "-1"  # Negative progress makes QBWC fetch getLastError and end the session
+    except ET.ParseError as e:
+        logger.error("Error parsing XML response for task %s: %s. Response snippet: %s", active_task, e, truncated(response, 500) if response else 'Empty')
+        entity_name_for_error = active_task.get('entity', 'unknown task') if active_task else 'unknown task'
+        session_data["last_error"] = f"XML Parse Error in receiveResponseXML for {entity_name_for_error}"
+        if active_task:
+            active_task["iteratorID"] = None
+        session_data["current_task_index"] += 1
+        save_qbwc_session_state(ticket, session_data)
+        return "0"
+    except Exception as e:
+        logger.error("Unexpected error processing response for task %s: %s", active_task, e, exc_info=True)
+        entity_name_for_error = active_task.get('entity', 'unknown task') if active_task else 'unknown task'
+        session_data["last_error"] = f"Unexpected error in receiveResponseXML for {entity_name_for_error}"
+        if active_task:
+            active_task["iteratorID"] = None
+        session_data["current_task_index"] += 1
+        save_qbwc_session_state(ticket, session_data)
+        return "0"
+        
+    # --- Refactored Progress Calculation ---
+    progress_to_return = 0
+    
+    # Completed tasks plus the pushed share of the active task's records
+    records_in_flight = _records_in_flight(ticket)
+    progress_to_return = _compute_overall_progress(session_data, records_in_flight)
+    logger.info("**PROGRESS_LOGIC: %s, %s record(s) still being pushed. Calculated progress is %s%%.",
+                'Iterator continues' if iterating else 'No iterator', sum(records_in_flight.values()), progress_to_return)
+
+    # Final check: if the index is at the end, it's 100%.
+    if session_data["current_task_index"] >= len(session_data.get("task_queue", [])):
+        progress_to_return = 100
+        logger.info("**PROGRESS_LOGIC: Task queue is now complete. Overriding progress to 100%.")
+
+    save_qbwc_session_state(ticket, session_data)
+    logger.info("receiveResponseXML: Task index is now: %s/%s", session_data['current_task_index'], len(session_data.get('task_queue', [])))
+    logger.info("receiveResponseXML FINAL return value: %s%% for task: %s", progress_to_return, active_task.get('entity', 'N/A') if active_task else 'N/A')
+    return str(progress_to_return)
+
+
 class QBWCService(ServiceBase):
     """QuickBooks Web Connector SOAP service implementation."""
 
@@ -392,12 +1300,17 @@ class QBWCService(ServiceBase):
         Returns:
             List containing [ticket, company_file_name] or ["", error_code]
         """
-        logger.info(f"QBWC Service: authenticate called. UserName: {strUserName}")
+        logger.info("QBWC Service: authenticate called. UserName: %s", strUserName)
         
         if strUserName == QBWC_USERNAME and strPassword == QBWC_PASSWORD:
             logger.info("Authentication successful")
+            if odoo_breaker.is_open():
+                logger.warning("Odoo circuit breaker is open; telling QBWC there is no work for this run "
+                               "(retrying Odoo in %.0fs)", odoo_breaker.retry_in())
+                return ["", "none"]
             
-            session_key = f"ticket_{int(datetime.now().timestamp())}_{strUserName}"
+            # The random suffix keeps tickets unique when several QBWC clients connect in the same second
+            session_key = f"ticket_{int(datetime.now().timestamp())}_{strUserName}_{uuid.uuid4().hex[:8]}"
             
             initial_tasks = [
                 {
@@ -412,10 +1325,19 @@ class QBWCService(ServiceBase):
                     }
                 },
                 {
+                    # Items before any transactions, so invoice lines resolve to products that
+                    # already carry QB's prices and accounts
                     "type": QB_QUERY,
-                    "entity": INVOICE_QUERY,
+                    "entity": ITEM_QUERY,
                     "requestID": "2",
                     "iteratorID": None,
+                    "params": {}
+                },
+                {
+                    "type": QB_QUERY,
+                    "entity": INVOICE_QUERY,
+                    "requestID": "3",
+                    "iteratorID": None,
                     "params": {
                         "IncludeLineItems": "true"
                     }
@@ -423,7 +1345,7 @@ class QBWCService(ServiceBase):
                 {
                     "type": QB_QUERY,
                     "entity": "SalesReceiptQuery",
-                    "requestID": "3",
+                    "requestID": "4",
                     "iteratorID": None,
                     "params": {
                         "IncludeLineItems": "true"
@@ -432,7 +1354,7 @@ class QBWCService(ServiceBase):
                 {
                     "type": QB_QUERY,
                     "entity": "BillQuery",
-                    "requestID": "4",
+                    "requestID": "5",
                     "iteratorID": None,
                     "params": {
                         "IncludeLineItems": "true"
@@ -441,7 +1363,7 @@ class QBWCService(ServiceBase):
                 {
                     "type": QB_QUERY,
                     "entity": "CheckQuery",
-                    "requestID": "5",
+                    "requestID": "6",
                     "iteratorID": None,
                     "params": {
                         "IncludeLineItems": "true"
@@ -450,7 +1372,7 @@ class QBWCService(ServiceBase):
                 {
                     "type": QB_QUERY,
                     "entity": "JournalEntryQuery",
-                    "requestID": "6",
+                    "requestID": "7",
                     "iteratorID": None,
                     "params": {
                         "IncludeLineItems": "true"
@@ -459,7 +1381,7 @@ class QBWCService(ServiceBase):
                 {
                     "type": QB_QUERY,
                     "entity": "PurchaseOrderQuery",
-                    "requestID": "7",
+                    "requestID": "8",
                     "iteratorID": None,
                     "params": {
                         "IncludeLineItems": "true"
@@ -468,7 +1390,7 @@ class QBWCService(ServiceBase):
                 {
                     "type": QB_QUERY,
                     "entity": "SalesOrderQuery",
-                    "requestID": "8",
+                    "requestID": "9",
                     "iteratorID": None,
                     "params": {
                         "IncludeLineItems": "true"
@@ -477,7 +1399,7 @@ class QBWCService(ServiceBase):
                 {
                     "type": QB_QUERY,
                     "entity": "CreditMemoQuery",
-                    "requestID": "9",
+                    "requestID": "10",
                     "iteratorID": None,
                     "params": {
                         "IncludeLineItems": "true"
@@ -486,7 +1408,7 @@ class QBWCService(ServiceBase):
                 {
                     "type": QB_QUERY,
                     "entity": "EstimateQuery",
-                    "requestID": "10",
+                    "requestID": "11",
                     "iteratorID": None,
                     "params": {
                         "IncludeLineItems": "true"
@@ -495,7 +1417,7 @@ class QBWCService(ServiceBase):
                 {
                     "type": QB_QUERY,
                     "entity": "DepositQuery",
-                    "requestID": "11",
+                    "requestID": "12",
                     "iteratorID": None,
                     "params": {
                         "IncludeLineItems": "true"
@@ -504,7 +1426,7 @@ class QBWCService(ServiceBase):
                 {
                     "type": QB_QUERY,
                     "entity": "ReceivePaymentQuery",
-                    "requestID": "12",
+                    "requestID": "13",
                     "iteratorID": None,
                     "params": {
                         "IncludeLineItems": "true"
@@ -513,7 +1435,7 @@ class QBWCService(ServiceBase):
                 {
                     "type": QB_QUERY,
                     "entity": "BillPaymentCheckQuery",
-                    "requestID": "13",
+                    "requestID": "14",
                     "iteratorID": None,
                     "params": {
                         "IncludeLineItems": "true"
@@ -521,1024 +1443,56 @@ class QBWCService(ServiceBase):
                 }
             ]
 
-            qbwc_session_state[session_key] = {
+            session_data = {
                 "task_queue": initial_tasks,
                 "current_task_index": 0, # Pointer to the current task in the queue
                 "total_tasks": len(initial_tasks),  # NEW: Store total task count
                 "last_error": "No error",
-                "created_at": datetime.now(),
+                "created_at": datetime.now().isoformat(),
                 "company_file_name": None, # Will be set by QBWC
-                "qbxml_version": None # Will be set by QBWC
+                "qbxml_version": None, # Will be set by QBWC
+                "shard_txn_windows": TXN_WINDOWS_ENABLED  # Done by the first sendRequestXML, which names the company file
             }
-            save_qbwc_session_state()
+            save_qbwc_session_state(session_key, session_data)
+            # Partner/product/account/journal indexes load while QuickBooks runs the first query
+            warm_indexes_in_background()
             
             return [session_key, ""] # Empty string for company file path, QBWC will fill it
         else:
-            logger.warning(f"Authentication failed for user: {strUserName}")
+            logger.warning("Authentication failed for user: %s", strUserName)
             return ["", "nvu"]
 
     @rpc(Unicode, Unicode, Unicode, Unicode, Unicode, Unicode, _returns=Unicode)
     def sendRequestXML(self, ticket, strHCPResponse, strCompanyFileName, 
                       qbXMLCountry, qbXMLMajorVers, qbXMLMinorVers):
-        
         logger.debug("Method sendRequestXML called")
-        logger.info(f"sendRequestXML invoked with ticket: {ticket}")
-
-        session_data = qbwc_session_state.get(ticket)
-        logger.info(f"sendRequestXML: Retrieved session_data exists: {session_data is not None}")
-
-        if not session_data:
-            logger.error(f"sendRequestXML: Invalid ticket {ticket}. No session data found.")
-            return ""
-
-        # Store company file and QBXML version info from QBWC
-        session_data["company_file_name"] = strCompanyFileName
-        session_data["qbxml_version"] = f"{qbXMLMajorVers}.{qbXMLMinorVers}"
-        logger.info(f"sendRequestXML: CompanyFileName='{strCompanyFileName}', QBXMLVersion='{session_data['qbxml_version']}'")
-
-        task_queue = session_data.get("task_queue", [])
-        current_task_index = session_data.get("current_task_index", 0)
-        logger.info(f"sendRequestXML: Task Queue length: {len(task_queue)}")
-        logger.info(f"sendRequestXML: Current Task Index: {current_task_index}")
-
-        if current_task_index >= len(task_queue):
-            logger.info("sendRequestXML: All tasks completed for this session or task queue is empty initially.")
-            return ""
-
-        # Ensure we skip completed tasks (in case of logic error)
-        while current_task_index < len(task_queue) and task_queue[current_task_index].get("iteratorID") is None and session_data.get("current_task_index", 0) > current_task_index:
-            current_task_index += 1
-            session_data["current_task_index"] = current_task_index
-
-        if current_task_index >= len(task_queue):
-            logger.info("sendRequestXML: All tasks completed after skipping completed tasks.")
+        try:
+            with _round_trip_metrics("sendRequestXML", ticket):
+                pipeline_ready = _wait_for_pipeline_slot(ticket)
+                with session_store.lock(ticket):
+                    return _send_request_xml(ticket, strCompanyFileName, qbXMLMajorVers, qbXMLMinorVers,
+                                             pipeline_ready)
+        except SessionLockTimeout as e:
+            logger.error("sendRequestXML: %s", e)
             return ""
 
-        current_task = task_queue[current_task_index]
-        logger.info(f"sendRequestXML: Processing task: {current_task}")
-        session_data["active_task"] = current_task
-        save_qbwc_session_state()
-
-        xml_request = ""
-        request_id_str = current_task.get("requestID", "1") # Default to "1"
-
-        if current_task["type"] == QB_QUERY:
-            entity = current_task["entity"]
-            iterator_id = current_task.get("iteratorID")
-            qbxml_version = session_data.get("qbxml_version", "13.0") # Default to 13.0 if not set
-
-            if entity == CUSTOMER_QUERY:
-                if iterator_id:
-                    logger.info(f"Continuing CustomerQueryRq with iteratorID: {iterator_id}")
-                    xml_request = f'''<?xml version="1.0" encoding="utf-8"?>
-<?qbxml version="{session_data["qbxml_version"]}"?>
-<QBXML>
-  <QBXMLMsgsRq onError="stopOnError">
-    <CustomerQueryRq requestID="{request_id_str}" iterator="Continue" iteratorID="{iterator_id}">
-      <MaxReturned>50</MaxReturned>
-    </CustomerQueryRq>
-  </QBXMLMsgsRq>
-</QBXML>'''
-                else:
-                    logger.info("Starting new CustomerQueryRq.")
-                    xml_request = f'''<?xml version="1.0" encoding="utf-8"?>
-<?qbxml version="{session_data["qbxml_version"]}"?>
-<QBXML>
-  <QBXMLMsgsRq onError="stopOnError">
-    <CustomerQueryRq requestID="{request_id_str}">
-      <!-- <ActiveStatus>ActiveOnly</ActiveStatus> -->
-      <MaxReturned>50</MaxReturned>
-    </CustomerQueryRq>
-  </QBXMLMsgsRq>
-</QBXML>'''
-            
-            elif entity == VENDOR_QUERY:
-                params = current_task.get("params", {})
-                iterator_id = current_task.get("iteratorID")
-                qbxml_version = session_data.get("qbxml_version", "13.0")
-                request_id_str = current_task.get("requestID", "1")
-                # Build VendorQueryRq QBXML
-                if iterator_id:
-                    logger.info(f"Continuing VendorQueryRq with iteratorID: {iterator_id}")
-                    xml_request = f'''<?xml version="1.0" encoding="utf-8"?>
-<?qbxml version="{qbxml_version}"?>
-<QBXML>
-  <QBXMLMsgsRq onError="stopOnError">
-    <VendorQueryRq requestID="{request_id_str}" iterator="Continue" iteratorID="{iterator_id}">
-      <MaxReturned>50</MaxReturned>
-    </VendorQueryRq>
-  </QBXMLMsgsRq>
-</QBXML>'''
-                else:
-                    logger.info("Starting new VendorQueryRq.")
-                    xml_request = f'''<?xml version="1.0" encoding="utf-8"?>
-<?qbxml version="{qbxml_version}"?>
-<QBXML>
-  <QBXMLMsgsRq onError="stopOnError">
-    <VendorQueryRq requestID="{request_id_str}">
-      <MaxReturned>50</MaxReturned>
-    </VendorQueryRq>
-  </QBXMLMsgsRq>
-</QBXML>'''
-
-            elif entity == INVOICE_QUERY:
-                params = current_task.get("params", {})
-                iterator_id = current_task.get("iteratorID")
-                qbxml_version = session_data.get("qbxml_version", "13.0")
-                request_id_str = current_task.get("requestID", "1")
-                
-                logger.info(f"Building InvoiceQuery XML with params: {params}, qbxml_version: {qbxml_version}, request_id: {request_id_str}, iterator_id: {iterator_id}")
-                
-                try:
-                    # Only pass the expected arguments to the helper
-                    xml_request = build_invoice_query_xml(
-                        params,
-                        qbxml_version,
-                        request_id_str,
-                        iterator_id
-                    )
-                    logger.info(f"Successfully built InvoiceQuery XML. Length: {len(xml_request)} characters")
-                    logger.debug(f"Generated InvoiceQuery XML: {xml_request}")
-                except Exception as e:
-                    logger.error(f"Error building InvoiceQuery XML: {e}", exc_info=True)
-                    return ""
-            elif entity == BILL_QUERY:
-                params = current_task.get("params", {})
-                iterator_id = current_task.get("iteratorID")
-                qbxml_version = session_data.get("qbxml_version", "13.0")
-                request_id_str = current_task.get("requestID", "1")
-                txn_date_filter_xml = _get_txn_date_filter_xml(params)
-                include_line_items_xml = _get_include_line_items_xml(params)
-                if iterator_id:
-                    logger.info(f"Continuing BillQueryRq with iteratorID: {iterator_id}")
-                    xml_request = f'''<?xml version="1.0" encoding="utf-8"?>
-<?qbxml version="{qbxml_version}"?>
-<QBXML>
-  <QBXMLMsgsRq onError="stopOnError">
-    <BillQueryRq requestID="{request_id_str}" iterator="Continue" iteratorID="{iterator_id}">
-      <MaxReturned>50</MaxReturned>
-    </BillQueryRq>
-  </QBXMLMsgsRq>
-</QBXML>'''
-                else:
-                    logger.info("Starting new BillQueryRq.")
-                    xml_request = f'''<?xml version="1.0" encoding="utf-8"?>
-<?qbxml version="{qbxml_version}"?>
-<QBXML>
-  <QBXMLMsgsRq onError="stopOnError">
-    <BillQueryRq requestID="{request_id_str}">
-      {txn_date_filter_xml}
-      {include_line_items_xml}
-      <MaxReturned>50</MaxReturned>
-    </BillQueryRq>
-  </QBXMLMsgsRq>
-</QBXML>'''
-            elif entity == RECEIVEPAYMENT_QUERY:
-                params = current_task.get("params", {})
-                iterator_id = current_task.get("iteratorID")
-                qbxml_version = session_data.get("qbxml_version", "13.0")
-                request_id_str = current_task.get("requestID", "1")
-                txn_date_filter_xml = _get_txn_date_filter_xml(params)
-                if iterator_id:
-                    logger.info(f"Continuing ReceivePaymentQueryRq with iteratorID: {iterator_id}")
-                    xml_request = f'''<?xml version="1.0" encoding="utf-8"?>\n<?qbxml version="{qbxml_version}"?>\n<QBXML>\n  <QBXMLMsgsRq onError="stopOnError">\n    <ReceivePaymentQueryRq requestID="{request_id_str}" iterator="Continue" iteratorID="{iterator_id}">\n      <MaxReturned>50</MaxReturned>\n    </ReceivePaymentQueryRq>\n  </QBXMLMsgsRq>\n</QBXML>'''
-                else:
-                    logger.info("Starting new ReceivePaymentQueryRq.")
-                    xml_request = f'''<?xml version="1.0" encoding="utf-8"?>\n<?qbxml version="{qbxml_version}"?>\n<QBXML>\n  <QBXMLMsgsRq onError="stopOnError">\n    <ReceivePaymentQueryRq requestID="{request_id_str}">\n      {txn_date_filter_xml}\n      <MaxReturned>50</MaxReturned>\n    </ReceivePaymentQueryRq>\n  </QBXMLMsgsRq>\n</QBXML>'''
-            elif entity == CREDITMEMO_QUERY:
-                params = current_task.get("params", {})
-                iterator_id = current_task.get("iteratorID")
-                qbxml_version = session_data.get("qbxml_version", "13.0")
-                request_id_str = current_task.get("requestID", "1")
-                txn_date_filter_xml = _get_txn_date_filter_xml(params)
-                include_line_items_xml = _get_include_line_items_xml(params)
-                if iterator_id:
-                    logger.info(f"Continuing CreditMemoQueryRq with iteratorID: {iterator_id}")
-                    xml_request = f'''<?xml version="1.0" encoding="utf-8"?>\n<?qbxml version="{qbxml_version}"?>\n<QBXML>\n  <QBXMLMsgsRq onError="stopOnError">\n    <CreditMemoQueryRq requestID="{request_id_str}" iterator="Continue" iteratorID="{iterator_id}">\n      <MaxReturned>50</MaxReturned>\n    </CreditMemoQueryRq>\n  </QBXMLMsgsRq>\n</QBXML>'''
-                else:
-                    logger.info("Starting new CreditMemoQueryRq.")
-                    xml_request = f'''<?xml version="1.0" encoding="utf-8"?>\n<?qbxml version="{qbxml_version}"?>\n<QBXML>\n  <QBXMLMsgsRq onError="stopOnError">\n    <CreditMemoQueryRq requestID="{request_id_str}">\n      {txn_date_filter_xml}\n      {include_line_items_xml}\n      <MaxReturned>50</MaxReturned>\n    </CreditMemoQueryRq>\n  </QBXMLMsgsRq>\n</QBXML>'''
-            elif entity == SALESORDER_QUERY:
-                params = current_task.get("params", {})
-                iterator_id = current_task.get("iteratorID")
-                qbxml_version = session_data.get("qbxml_version", "13.0")
-                request_id_str = current_task.get("requestID", "1")
-                txn_date_filter_xml = _get_txn_date_filter_xml(params)
-                include_line_items_xml = _get_include_line_items_xml(params)
-                if iterator_id:
-                    logger.info(f"Continuing SalesOrderQueryRq with iteratorID: {iterator_id}")
-                    xml_request = f'''<?xml version="1.0" encoding="utf-8"?>\n<?qbxml version="{qbxml_version}"?>\n<QBXML>\n  <QBXMLMsgsRq onError="stopOnError">\n    <SalesOrderQueryRq requestID="{request_id_str}" iterator="Continue" iteratorID="{iterator_id}">\n      <MaxReturned>50</MaxReturned>\n    </SalesOrderQueryRq>\n  </QBXMLMsgsRq>\n</QBXML>'''
-                else:
-                    logger.info("Starting new SalesOrderQueryRq.")
-                    xml_request = f'''<?xml version="1.0" encoding="utf-8"?>\n<?qbxml version="{qbxml_version}"?>\n<QBXML>\n  <QBXMLMsgsRq onError="stopOnError">\n    <SalesOrderQueryRq requestID="{request_id_str}">\n      {txn_date_filter_xml}\n      {include_line_items_xml}\n      <MaxReturned>50</MaxReturned>\n    </SalesOrderQueryRq>\n  </QBXMLMsgsRq>\n</QBXML>'''
-            elif entity == PURCHASEORDER_QUERY:
-                params = current_task.get("params", {})
-                iterator_id = current_task.get("iteratorID")
-                qbxml_version = session_data.get("qbxml_version", "13.0")
-                request_id_str = current_task.get("requestID", "1")
-                txn_date_filter_xml = _get_txn_date_filter_xml(params)
-                include_line_items_xml = _get_include_line_items_xml(params)
-                if iterator_id:
-                    logger.info(f"Continuing PurchaseOrderQueryRq with iteratorID: {iterator_id}")
-                    xml_request = f'''<?xml version="1.0" encoding="utf-8"?>\n<?qbxml version="{qbxml_version}"?>\n<QBXML>\n  <QBXMLMsgsRq onError="stopOnError">\n    <PurchaseOrderQueryRq requestID="{request_id_str}" iterator="Continue" iteratorID="{iterator_id}">\n      <MaxReturned>50</MaxReturned>\n    </PurchaseOrderQueryRq>\n  </QBXMLMsgsRq>\n</QBXML>'''
-                else:
-                    logger.info("Starting new PurchaseOrderQueryRq.")
-                    xml_request = f'''<?xml version="1.0" encoding="utf-8"?>\n<?qbxml version="{qbxml_version}"?>\n<QBXML>\n  <QBXMLMsgsRq onError="stopOnError">\n    <PurchaseOrderQueryRq requestID="{request_id_str}">\n      {txn_date_filter_xml}\n      {include_line_items_xml}\n      <MaxReturned>50</MaxReturned>\n    </PurchaseOrderQueryRq>\n  </QBXMLMsgsRq>\n</QBXML>'''
-            elif entity == JOURNALENTRY_QUERY:
-                params = current_task.get("params", {})
-                iterator_id = current_task.get("iteratorID")
-                qbxml_version = session_data.get("qbxml_version", "13.0")
-                request_id_str = current_task.get("requestID", "1")
-                txn_date_filter_xml = _get_txn_date_filter_xml(params)
-                max_entries = 50
-                if iterator_id:
-                    logger.info(f"Continuing JournalEntryQueryRq with iteratorID: {iterator_id}")
-                    xml_request = f'''<?xml version="1.0" encoding="utf-8"?>\n<?qbxml version="{qbxml_version}"?>\n<QBXML>\n  <QBXMLMsgsRq onError="stopOnError">\n    <JournalEntryQueryRq requestID="{request_id_str}" iterator="Continue" iteratorID="{iterator_id}">\n      <MaxReturned>{max_entries}</MaxReturned>\n    </JournalEntryQueryRq>\n  </QBXMLMsgsRq>\n</QBXML>'''
-                else:
-                    logger.info("Starting new JournalEntryQueryRq.")
-                    xml_request = f'''<?xml version="1.0" encoding="utf-8"?>\n<?qbxml version="{qbxml_version}"?>\n<QBXML>\n  <QBXMLMsgsRq onError="stopOnError">\n    <JournalEntryQueryRq requestID="{request_id_str}">\n      {txn_date_filter_xml}\n      <MaxReturned>{max_entries}</MaxReturned>\n    </JournalEntryQueryRq>\n  </QBXMLMsgsRq>\n</QBXML>'''
-
-        # Add other QB_QUERY entity types (Vendor, Item, etc.) here in the future
-        # Add QB_ADD, QB_MOD task types here in the future for Odoo to QB sync
-
-        logger.debug(f"Sending QBXML request for task type {current_task['type']}, entity {current_task.get('entity', 'N/A')}")
-        logger.info(f"Generated XML request (first 500 chars): {xml_request[:500] if xml_request else 'EMPTY REQUEST'}")
-        return xml_request
-
     @rpc(Unicode, Unicode, Unicode, Unicode, _returns=Unicode)
     def receiveResponseXML(self, ticket, response, hresult, message):
-        
         logger.debug("Method receiveResponseXML called")
-        logger.info(f"QBWC Service: receiveResponseXML called. Ticket: {ticket}")
-
-        session_data = qbwc_session_state.get(ticket)
-        if not session_data:
-            logger.error(f"receiveResponseXML: Invalid ticket {ticket}. No session data found.")
-            return "0"  # Error
-
-        active_task = session_data.get("active_task")
-        if not active_task:
-            logger.error(f"receiveResponseXML: No active task found for ticket {ticket}.")
-            return "0"  # Error
-
-        logger.debug(f"Received QBXML response (first 1000 chars): {response[:1000] if response else 'Empty response'}")
-
-        if hresult:
-            logger.error(f"receiveResponseXML received an error from QBWC. HRESULT: {hresult}, Message: {message}")
-            session_data["last_error"] = f"QBWC Error: {message}"
-            session_data["current_task_index"] += 1
-            save_qbwc_session_state()
-            return "0"
-
-        progress = 0
         try:
-            if not response:
-                logger.warning(f"Received empty response for task: {active_task}. This may be normal if the query returned no data.")
-                session_data["current_task_index"] += 1
-                logger.info(f"Incremented current_task_index to {session_data['current_task_index']} after empty response.")
-                progress = _compute_overall_progress(session_data)
-                save_qbwc_session_state()
-                return str(progress)
-
-            logger.debug(f"Parsing XML response for entity: {active_task.get('entity', 'Unknown')}")
-            try:
-                root = ET.fromstring(response)
-                logger.debug("XML response parsed successfully")
-            except ET.ParseError as parse_error:
-                logger.error(f"XML Parse Error in receiveResponseXML: {parse_error}")
-                logger.error(f"Response content (first 1000 chars): {response[:1000]}")
-                session_data["last_error"] = f"XML Parse Error: {str(parse_error)}"
-                session_data["current_task_index"] += 1
-                save_qbwc_session_state()
-                return "0"
-
-            if active_task["type"] == QB_QUERY:
-                entity = active_task["entity"]
-                
-                if entity == CUSTOMER_QUERY:
-                    customer_query_rs = root.find('.//CustomerQueryRs')
-                    if customer_query_rs is not None:
-                        status_code = customer_query_rs.get('statusCode', 'unknown')
-                        status_message = customer_query_rs.get('statusMessage', 'N/A')
-                        logger.info(f"CustomerQueryRs status: {status_code} - {status_message}")
-
-                        if status_code == '0':
-                            customers = customer_query_rs.findall('.//CustomerRet')
-                            logger.info(f"Received {len(customers)} customers in this response.")
-                            for cust_xml in customers:
-                                qb_customer_data = _extract_customer_data_from_ret(cust_xml)
-                                customer_list_id = qb_customer_data.get('ListID')
-                                
-                                if not customer_list_id:
-                                    logger.warning("Customer record found with no ListID. Skipping.")
-                                    continue
-
-                                # Check if the customer is a job (sub-customer)
-                                if qb_customer_data.get('ParentRef_ListID'):
-                                    job_full_name = qb_customer_data.get('FullName', customer_list_id)
-                                    logger.info(f"QB record '{job_full_name}' (ListID: {customer_list_id}) is a job. Skipping Odoo partner creation.")
-                                    continue
-
-                                customer_name_for_log = qb_customer_data.get("Name", qb_customer_data.get("FullName", f"ListID: {customer_list_id}"))
-
-                                if qb_customer_data:
-                                    logger.info(f"  Processing Customer: {customer_name_for_log} (ListID: {customer_list_id})")
-                                    logger.debug(f"    Extracted QB Customer Data: {qb_customer_data}")
-                                    try:
-                                        odoo_partner_id = create_or_update_odoo_partner(qb_customer_data, is_supplier=False)
-                                        if odoo_partner_id:
-                                            logger.info(f"    Successfully processed customer '{customer_name_for_log}' for Odoo. Odoo Partner ID: {odoo_partner_id}")
-                                        else:
-                                            logger.warning(f"    Could not create or update Odoo partner for '{customer_name_for_log}' (it might have been skipped if it's a job, or an error occurred).")
-                                    except Exception as e:
-                                        logger.error(f"    Error processing customer '{customer_name_for_log}' for Odoo: {e}", exc_info=True)
-                                else:
-                                    logger.warning(f"  Skipping customer with missing/empty data (ListID: {customer_list_id}).")
-
-                            iterator_id = customer_query_rs.get("iteratorID")
-                            iterator_remaining_count = customer_query_rs.get("iteratorRemainingCount")
-                            
-                            if iterator_id and int(iterator_remaining_count or '0') > 0:
-                                active_task["iteratorID"] = iterator_id
-                                active_task["requestID"] = str(int(active_task.get("requestID", "0")) + 1)
-                                progress = 50 
-                                logger.info(f"Customer iteration continues. IteratorID: {iterator_id}, Remaining: {iterator_remaining_count}")
-                            else:
-                                logger.info("Customer iteration complete or no iterator.")
-                                active_task["iteratorID"] = None
-                                session_data["current_task_index"] += 1
-                        else:
-                            logger.error(f"CustomerQueryRs failed with statusCode: {status_code}, message: {status_message}")
-                            session_data["last_error"] = f"CustomerQuery Error: {status_message}"
-                            active_task["iteratorID"] = None
-                            session_data["current_task_index"] += 1
-                    else:
-                        logger.warning("Could not find CustomerQueryRs in the response.")
-                        active_task["iteratorID"] = None
-                        session_data["current_task_index"] += 1
-
-                elif entity == VENDOR_QUERY:
-                    vendor_query_rs = root.find('.//VendorQueryRs')
-                    if vendor_query_rs is not None:
-                        status_code = vendor_query_rs.get('statusCode', 'unknown')
-                        status_message = vendor_query_rs.get('statusMessage', 'N/A')
-                        logger.info(f"VendorQueryRs status: {status_code} - {status_message}")
-
-                        if status_code == '0':
-                            vendors = vendor_query_rs.findall('.//VendorRet')
-                            logger.info(f"Received {len(vendors)} vendors in this response.")
-                            for vend_xml in vendors:
-                                qb_vendor_data = _extract_vendor_data_from_ret(vend_xml)
-                                vendor_list_id = qb_vendor_data.get('ListID')
-                                vendor_name = qb_vendor_data.get('Name')
-
-                                if not vendor_list_id:
-                                    logger.warning("Vendor record found with no ListID. Skipping.")
-                                    continue
-
-                                if vendor_name:
-                                    logger.info(f"  Processing Vendor: {vendor_name} (ListID: {vendor_list_id})")
-                                    try:
-                                        odoo_vendor_id = create_or_update_odoo_partner(qb_vendor_data, is_supplier=True)
-
-                                        if odoo_vendor_id:
-                                            logger.info(f"    Successfully processed vendor '{vendor_name}' for Odoo. Odoo Partner ID: {odoo_vendor_id}")
-                                        else:
-                                            logger.warning(f"    Could not create or update Odoo partner (vendor) for '{vendor_name}'.")
-                                    except Exception as e:
-                                        logger.error(f"    Error processing vendor '{vendor_name}' for Odoo: {e}", exc_info=True)
-                                else:
-                                    logger.warning(f"  Skipping vendor with missing name (ListID: {vendor_list_id}).")
-                            
-
-                            iterator_id = vendor_query_rs.get("iteratorID")
-                            iterator_remaining_count = vendor_query_rs.get("iteratorRemainingCount")
-                            
-                            if iterator_id and int(iterator_remaining_count or '0') > 0:
-                                active_task["iteratorID"] = iterator_id
-                                active_task["requestID"] = str(int(active_task.get("requestID", "0")) + 1)
-                                progress = 50 
-                                logger.info(f"Vendor iteration continues. IteratorID: {iterator_id}, Remaining: {iterator_remaining_count}")
-                            else:
-                                logger.info("Vendor iteration complete or no iterator.")
-                                active_task["iteratorID"] = None
-                                session_data["current_task_index"] += 1 
-                        else:
-                            logger.error(f"VendorQueryRs failed with statusCode: {status_code}, message: {status_message}")
-                            session_data["last_error"] = f"VendorQuery Error: {status_message}"
-                            active_task["iteratorID"] = None
-                            session_data["current_task_index"] += 1 
-                    else:
-                        logger.warning("Could not find VendorQueryRs in the response.")
-                        active_task["iteratorID"] = None
-                        session_data["current_task_index"] += 1
-
-                elif entity == INVOICE_QUERY:
-                    try:
-                        logger.info("Processing InvoiceQuery response...")
-                        invoice_query_rs = root.find('.//InvoiceQueryRs')
-                        if invoice_query_rs is not None:
-                            status_code = invoice_query_rs.get('statusCode', 'unknown')
-                            status_message = invoice_query_rs.get('statusMessage', 'N/A')
-                            logger.info(f"InvoiceQueryRs status: {status_code} - {status_message}")
-
-                            if status_code == '0':
-                                invoices = invoice_query_rs.findall('.//InvoiceRet')
-                                logger.info(f"Received {len(invoices)} invoices in this response.")
-                                
-                                for inv_xml in invoices:
-                                    try:
-                                        qb_invoice_data = _extract_transaction_data(inv_xml, "Invoice")
-                                        
-                                        if not qb_invoice_data.get("qb_txn_id"):
-                                            logger.warning("Invoice record found with no TxnID. Skipping.")
-                                            continue
-
-                                        original_qb_customer_name = _get_xml_text(inv_xml.find('CustomerRef/FullName'))
-                                        if original_qb_customer_name and ':' in original_qb_customer_name:
-                                            parent_customer_name_from_job_string = original_qb_customer_name.split(':')[0].strip()
-                                            logger.info(f"Invoice {qb_invoice_data['qb_txn_id']} is for job '{original_qb_customer_name}'. Attempting to assign to parent customer '{parent_customer_name_from_job_string}'.")
-                                            qb_invoice_data["customer_name"] = parent_customer_name_from_job_string
-                                        
-                                        logger.info(f"  Processing Invoice TxnID: {qb_invoice_data['qb_txn_id']}, Ref: {qb_invoice_data.get('ref_number')}")
-
-                                        if not qb_invoice_data.get("customer_name"):
-                                            logger.warning(f"    Invoice {qb_invoice_data['qb_txn_id']} has no customer name. Skipping Odoo processing for this invoice.")
-                                            continue
-                                        
-                                        try:
-                                            odoo_invoice_id = create_or_update_odoo_invoice(qb_invoice_data)
-                                            if odoo_invoice_id:
-                                                logger.info(f"    Successfully processed Invoice {qb_invoice_data['qb_txn_id']} for Odoo (Odoo ID: {odoo_invoice_id}).")
-                                            else:
-                                                logger.warning(f"    Invoice {qb_invoice_data['qb_txn_id']} processed for Odoo but no Odoo ID returned (may indicate create/update issue or placeholder).")
-                                        except Exception as e:
-                                            logger.error(f"    Error processing Invoice {qb_invoice_data['qb_txn_id']} for Odoo: {e}", exc_info=True)
-                                    except Exception as e:
-                                        logger.error(f"    Error extracting data from invoice XML: {e}", exc_info=True)
-                                        continue
-
-                                iterator_id = invoice_query_rs.get("iteratorID")
-                                iterator_remaining_count = invoice_query_rs.get("iteratorRemainingCount")
-                                
-                                if iterator_id and int(iterator_remaining_count or '0') > 0:
-                                    active_task["iteratorID"] = iterator_id
-                                    active_task["requestID"] = str(int(active_task.get("requestID", "0")) + 1)
-                                    progress = 50 
-                                    logger.info(f"Invoice iteration continues. IteratorID: {iterator_id}, Remaining: {iterator_remaining_count}")
-                                else:
-                                    logger.info("Invoice iteration complete or no iterator.")
-                                    active_task["iteratorID"] = None
-                                    session_data["current_task_index"] += 1
-                            else:
-                                logger.error(f"InvoiceQueryRs failed with statusCode: {status_code}, message: {status_message}")
-                                session_data["last_error"] = f"InvoiceQuery Error: {status_message}"
-                                active_task["iteratorID"] = None
-                                session_data["current_task_index"] += 1
-                        else:
-                            logger.warning("Could not find InvoiceQueryRs in the response.")
-                            active_task["iteratorID"] = None
-                            session_data["current_task_index"] += 1
-                    except Exception as e:
-                        logger.error(f"Error processing InvoiceQuery response: {e}", exc_info=True)
-                        session_data["last_error"] = f"InvoiceQuery Processing Error: {str(e)}"
-                        active_task["iteratorID"] = None
-                        session_data["current_task_index"] += 1
-                elif entity == BILL_QUERY:
-                    bill_query_rs = root.find('.//BillQueryRs')
-                    if bill_query_rs is not None:
-                        status_code = bill_query_rs.get('statusCode', 'unknown')
-                        status_message = bill_query_rs.get('statusMessage', 'N/A')
-                        logger.info(f"BillQueryRs status: {status_code} - {status_message}")
-
-                        if status_code == '0':
-                            bills = bill_query_rs.findall('.//BillRet')
-                            logger.info(f"Received {len(bills)} bills in this response.")
-                            for bill_xml in bills:
-                                qb_bill_data = _extract_transaction_data(bill_xml, "Bill")
-
-                                if not qb_bill_data.get("qb_txn_id"):
-                                    logger.warning("Bill record found with no TxnID. Skipping.")
-                                    continue
-
-                                logger.info(f"  Processing Bill TxnID: {qb_bill_data['qb_txn_id']}, Ref: {qb_bill_data.get('ref_number')}")
-
-                                if not qb_bill_data.get("vendor_name"):
-                                    logger.warning(f"    Bill {qb_bill_data['qb_txn_id']} has no vendor name. Skipping Odoo processing.")
-                                    continue
-                                
-                                try:
-                                    odoo_bill_id = create_or_update_odoo_bill(qb_bill_data)
-                                    if odoo_bill_id:
-                                        logger.info(f"    Successfully processed Bill {qb_bill_data['qb_txn_id']} for Odoo (Odoo ID: {odoo_bill_id}).")
-                                    else:
-                                        logger.warning(f"    Bill {qb_bill_data['qb_txn_id']} processed for Odoo but no Odoo ID returned.")
-                                except Exception as e:
-                                    logger.error(f"    Error processing Bill {qb_bill_data['qb_txn_id']} for Odoo: {e}", exc_info=True)
-
-                            iterator_id = bill_query_rs.get("iteratorID")
-                            iterator_remaining_count = bill_query_rs.get("iteratorRemainingCount")
-                            if iterator_id and int(iterator_remaining_count or '0') > 0:
-                                active_task["iteratorID"] = iterator_id
-                                active_task["requestID"] = str(int(active_task.get("requestID", "0")) + 1)
-                                progress = 50
-                                logger.info(f"Bill iteration continues. IteratorID: {iterator_id}, Remaining: {iterator_remaining_count}")
-                            else:
-                                logger.info("Bill iteration complete or no iterator.")
-                                active_task["iteratorID"] = None
-                                session_data["current_task_index"] += 1
-                        else:
-                            logger.error(f"BillQueryRs failed: {status_message}")
-                            active_task["iteratorID"] = None
-                            session_data["current_task_index"] += 1
-                    else:
-                        logger.warning("Could not find BillQueryRs in response.")
-                        active_task["iteratorID"] = None
-                        session_data["current_task_index"] += 1
-
-                elif entity == RECEIVEPAYMENT_QUERY:
-                    payment_query_rs = root.find('.//ReceivePaymentQueryRs')
-                    if payment_query_rs is not None:
-                        status_code = payment_query_rs.get('statusCode', 'unknown')
-                        status_message = payment_query_rs.get('statusMessage', 'N/A')
-                        logger.info(f"ReceivePaymentQueryRs status: {status_code} - {status_message}")
-
-                        if status_code == '0':
-                            payments = payment_query_rs.findall('.//ReceivePaymentRet')
-                            logger.info(f"Received {len(payments)} payments in this response.")
-                            for payment_xml in payments:
-                                qb_payment_data = _extract_payment_data(payment_xml)
-
-                                if not qb_payment_data.get("qb_txn_id"):
-                                    logger.warning("Payment record found with no TxnID. Skipping.")
-                                    continue
-                                
-                                logger.info(f"  Processing Payment TxnID: {qb_payment_data['qb_txn_id']}, Ref: {qb_payment_data.get('ref_number')}")
-
-                                if not qb_payment_data.get("customer_name"):
-                                    logger.warning(f"    Payment {qb_payment_data['qb_txn_id']} has no customer name. Skipping Odoo processing.")
-                                    continue
-                                
-                                try:
-                                    odoo_payment_id = create_or_update_odoo_payment(qb_payment_data)
-                                    if odoo_payment_id:
-                                        logger.info(f"    Successfully processed Payment {qb_payment_data['qb_txn_id']} for Odoo (Odoo ID: {odoo_payment_id}).")
-                                    else:
-                                        logger.warning(f"    Payment {qb_payment_data['qb_txn_id']} processed for Odoo but no Odoo ID returned.")
-                                except Exception as e:
-                                    logger.error(f"    Error processing Payment {qb_payment_data['qb_txn_id']} for Odoo: {e}", exc_info=True)
-                            
-
-                            iterator_id = payment_query_rs.get("iteratorID")
-                            iterator_remaining_count = payment_query_rs.get("iteratorRemainingCount")
-                            if iterator_id and int(iterator_remaining_count or '0') > 0:
-                                active_task["iteratorID"] = iterator_id
-                                active_task["requestID"] = str(int(active_task.get("requestID", "0")) + 1)
-                                progress = 50
-                            else:
-                                active_task["iteratorID"] = None
-                                session_data["current_task_index"] += 1
-                        else:
-                            logger.error(f"ReceivePaymentQueryRs failed: {status_message}")
-                            active_task["iteratorID"] = None
-                            session_data["current_task_index"] += 1
-                    else:
-                        logger.warning("Could not find ReceivePaymentQueryRs in response.")
-                        active_task["iteratorID"] = None
-                        session_data["current_task_index"] += 1
-
-                elif entity == CREDITMEMO_QUERY:
-                    credit_memo_query_rs = root.find('.//CreditMemoQueryRs')
-                    if credit_memo_query_rs is not None:
-                        status_code = credit_memo_query_rs.get('statusCode', 'unknown')
-                        status_message = credit_memo_query_rs.get('statusMessage', 'N/A')
-                        logger.info(f"CreditMemoQueryRs status: {status_code} - {status_message}")
-
-                        if status_code == '0':
-                            credit_memos = credit_memo_query_rs.findall('.//CreditMemoRet')
-                            logger.info(f"Received {len(credit_memos)} credit memos in this response.")
-                            for cm_xml in credit_memos:
-                                qb_cm_data = _extract_transaction_data(cm_xml, "CreditMemo")
-
-                                if not qb_cm_data.get("qb_txn_id"):
-                                    logger.warning("Credit Memo record found with no TxnID. Skipping.")
-                                    continue
-                                
-                                logger.info(f"  Processing Credit Memo TxnID: {qb_cm_data.get('qb_txn_id')}, Ref: {qb_cm_data.get('ref_number')}")
-                                try:
-                                    odoo_cm_id = create_or_update_odoo_credit_memo(qb_cm_data)
-                                    if odoo_cm_id:
-                                        logger.info(f"    Successfully processed Credit Memo {qb_cm_data.get('qb_txn_id')} for Odoo (Odoo ID: {odoo_cm_id}).")
-                                    else:
-                                        logger.warning(f"    Credit Memo {qb_cm_data.get('qb_txn_id')} processed for Odoo but no Odoo ID returned.")
-                                except Exception as e:
-                                    logger.error(f"    Error processing Credit Memo {qb_cm_data.get('qb_txn_id')} for Odoo: {e}", exc_info=True)
-                            
-
-                            iterator_id = credit_memo_query_rs.get("iteratorID")
-                            iterator_remaining_count = credit_memo_query_rs.get("iteratorRemainingCount")
-                            if iterator_id and int(iterator_remaining_count or '0') > 0:
-                                active_task["iteratorID"] = iterator_id
-                                active_task["requestID"] = str(int(active_task.get("requestID", "0")) + 1)
-                                progress = 50
-                            else:
-                                active_task["iteratorID"] = None
-                                session_data["current_task_index"] += 1
-                        else:
-                            logger.error(f"CreditMemoQueryRs failed: {status_message}")
-                            active_task["iteratorID"] = None
-                            session_data["current_task_index"] += 1
-                    else:
-                        logger.warning("Could not find CreditMemoQueryRs in response.")
-                        active_task["iteratorID"] = None
-                        session_data["current_task_index"] += 1
-                
-                elif entity == SALESORDER_QUERY:
-                    sales_order_query_rs = root.find('.//SalesOrderQueryRs')
-                    if sales_order_query_rs is not None:
-                        status_code = sales_order_query_rs.get('statusCode', 'unknown')
-                        status_message = sales_order_query_rs.get('statusMessage', 'N/A')
-                        logger.info(f"SalesOrderQueryRs status: {status_code} - {status_message}")
-
-                        if status_code == '0': 
-                            sales_orders = sales_order_query_rs.findall('.//SalesOrderRet')
-                            logger.info(f"Received {len(sales_orders)} sales orders in this response.")
-                            for so_xml in sales_orders:
-                                qb_so_data = _extract_transaction_data(so_xml, "SalesOrder")
-
-                                if not qb_so_data.get("qb_txn_id"):
-                                    logger.warning("Sales Order record found with no TxnID. Skipping.")
-                                    continue
-                                
-                                logger.info(f"  Processing Sales Order TxnID: {qb_so_data.get('qb_txn_id')}, Ref: {qb_so_data.get('ref_number')}")
-                                try:
-                                    odoo_so_id = create_or_update_odoo_sales_order(qb_so_data)
-                                    if odoo_so_id:
-                                        logger.info(f"    Successfully processed Sales Order {qb_so_data.get('qb_txn_id')} for Odoo (Odoo ID: {odoo_so_id}).")
-                                    else:
-                                        logger.warning(f"    Sales Order {qb_so_data.get('qb_txn_id')} processed for Odoo but no Odoo ID returned.")
-                                except Exception as e:
-                                    logger.error(f"    Error processing Sales Order {qb_so_data.get('qb_txn_id')} for Odoo: {e}", exc_info=True)
-                            
-
-                            iterator_id = sales_order_query_rs.get("iteratorID")
-                            iterator_remaining_count = sales_order_query_rs.get("iteratorRemainingCount")
-                            if iterator_id and int(iterator_remaining_count or '0') > 0:
-                                active_task["iteratorID"] = iterator_id
-                                active_task["requestID"] = str(int(active_task.get("requestID", "0")) + 1)
-                                progress = 50
-                            else:
-                                active_task["iteratorID"] = None
-                                session_data["current_task_index"] += 1
-                        else:
-                            logger.error(f"SalesOrderQueryRs failed with statusCode: {status_code}, message: {status_message}")
-                            active_task["iteratorID"] = None
-                            session_data["current_task_index"] += 1
-                    else:
-                        logger.warning("Could not find SalesOrderQueryRs in response.")
-                        active_task["iteratorID"] = None
-                        session_data["current_task_index"] += 1
-
-                elif entity == PURCHASEORDER_QUERY:
-                    purchase_order_query_rs = root.find('.//PurchaseOrderQueryRs')
-                    if purchase_order_query_rs is not None:
-                        status_code = purchase_order_query_rs.get('statusCode', 'unknown')
-                        status_message = purchase_order_query_rs.get('statusMessage', 'N/A')
-                        logger.info(f"PurchaseOrderQueryRs status: {status_code} - {status_message}")
-
-                        if status_code == '0':
-                            purchase_orders = purchase_order_query_rs.findall('.//PurchaseOrderRet')
-                            logger.info(f"Received {len(purchase_orders)} purchase orders in this response.")
-                            for po_xml in purchase_orders:
-                                qb_po_data = _extract_transaction_data(po_xml, "PurchaseOrder")
-
-                                if not qb_po_data.get("qb_txn_id"):
-                                    logger.warning("Purchase Order record found with no TxnID. Skipping.")
-                                    continue
-                                
-                                logger.info(f"  Processing Purchase Order TxnID: {qb_po_data.get('qb_txn_id')}, Ref: {qb_po_data.get('ref_number')}")
-                                try:
-                                    odoo_po_id = create_or_update_odoo_purchase_order(qb_po_data)
-                                    if odoo_po_id:
-                                        logger.info(f"    Successfully processed Purchase Order {qb_po_data.get('qb_txn_id')} for Odoo (Odoo ID: {odoo_po_id}).")
-                                    else:
-                                        logger.warning(f"    Purchase Order {qb_po_data.get('qb_txn_id')} processed for Odoo but no Odoo ID returned.")
-                                except Exception as e:
-                                    logger.error(f"    Error processing Purchase Order {qb_po_data.get('qb_txn_id')} for Odoo: {e}", exc_info=True)
-                            
-
-                            iterator_id = purchase_order_query_rs.get("iteratorID")
-                            iterator_remaining_count = purchase_order_query_rs.get("iteratorRemainingCount")
-                            if iterator_id and int(iterator_remaining_count or '0') > 0:
-                                active_task["iteratorID"] = iterator_id
-                                active_task["requestID"] = str(int(active_task.get("requestID", "0")) + 1)
-                                progress = 50
-                            else:
-                                active_task["iteratorID"] = None
-                                session_data["current_task_index"] += 1
-                        else:
-                            logger.error(f"PurchaseOrderQueryRs failed: {status_message}")
-                            active_task["iteratorID"] = None
-                            session_data["current_task_index"] += 1
-                    else:
-                        logger.warning("Could not find PurchaseOrderQueryRs in response.")
-                        active_task["iteratorID"] = None
-                        session_data["current_task_index"] += 1
-
-                elif entity == JOURNALENTRY_QUERY: # New
-                    journal_entry_query_rs = root.find('.//JournalEntryQueryRs')
-                    if journal_entry_query_rs is not None:
-                        status_code = journal_entry_query_rs.get('statusCode', 'unknown')
-                        status_message = journal_entry_query_rs.get('statusMessage', 'N/A')
-                        logger.info(f"JournalEntryQueryRs status: {status_code} - {status_message}")
-
-                        if status_code == '0':
-                            journal_entries = journal_entry_query_rs.findall('.//JournalEntryRet')
-                            logger.info(f"Received {len(journal_entries)} journal entries in this response.")
-                            for je_xml in journal_entries:
-                                qb_je_data = _extract_journal_entry_data(je_xml)
-
-                                if not qb_je_data.get("qb_txn_id"):
-                                    logger.warning("Journal Entry record found with no TxnID. Skipping.")
-                                    continue
-                                
-                                logger.info(f"  Processing Journal Entry TxnID: {qb_je_data.get('qb_txn_id')}, Ref: {qb_je_data.get('ref_number')}")
-                                try:
-                                    odoo_je_id = create_or_update_odoo_journal_entry(qb_je_data)
-                                    if odoo_je_id:
-                                        logger.info(f"    Successfully processed Journal Entry {qb_je_data.get('qb_txn_id')} for Odoo (Odoo ID: {odoo_je_id}).")
-                                    else:
-                                        logger.warning(f"    Journal Entry {qb_je_data.get('qb_txn_id')} processed for Odoo but no Odoo ID returned.")
-                                except Exception as e:
-                                    logger.error(f"    Error processing Journal Entry {qb_je_data.get('qb_txn_id')} for Odoo: {e}", exc_info=True)
-                            
-
-                            iterator_id = journal_entry_query_rs.get("iteratorID")
-                            iterator_remaining_count = journal_entry_query_rs.get("iteratorRemainingCount")
-                            if iterator_id and int(iterator_remaining_count or '0') > 0:
-                                active_task["iteratorID"] = iterator_id
-                                active_task["requestID"] = str(int(active_task.get("requestID", "0")) + 1)
-                                progress = 50
-                            else:
-                                active_task["iteratorID"] = None
-                                session_data["current_task_index"] += 1
-                        else:
-                            logger.error(f"JournalEntryQueryRs failed: {status_message}")
-                            active_task["iteratorID"] = None
-                            session_data["current_task_index"] += 1
-                    else:
-                        logger.warning("Could not find JournalEntryQueryRs in response.")
-                        active_task["iteratorID"] = None
-                        session_data["current_task_index"] += 1
-
-                elif entity == "SalesReceiptQuery":
-                    sales_receipt_query_rs = root.find('.//SalesReceiptQueryRs')
-                    if sales_receipt_query_rs is not None:
-                        status_code = sales_receipt_query_rs.get('statusCode', 'unknown')
-                        status_message = sales_receipt_query_rs.get('statusMessage', 'N/A')
-                        logger.info(f"SalesReceiptQueryRs status: {status_code} - {status_message}")
-                        if status_code == '0':
-                            sales_receipts = sales_receipt_query_rs.findall('.//SalesReceiptRet')
-                            logger.info(f"Received {len(sales_receipts)} sales receipts in this response.")
-                            for sr_xml in sales_receipts:
-                                qb_sr_data = _extract_transaction_data(sr_xml, "SalesReceipt")
-                                if not qb_sr_data.get("qb_txn_id"):
-                                    logger.warning("SalesReceipt record found with no TxnID. Skipping.")
-                                    continue
-                                logger.info(f"  Processing SalesReceipt TxnID: {qb_sr_data.get('qb_txn_id')}, Ref: {qb_sr_data.get('ref_number')}")
-                                try:
-                                    odoo_sr_id = create_or_update_odoo_sales_receipt(qb_sr_data)
-                                    if odoo_sr_id:
-                                        logger.info(f"    Successfully processed SalesReceipt {qb_sr_data.get('qb_txn_id')} for Odoo (Odoo ID: {odoo_sr_id}).")
-                                    else:
-                                        logger.warning(f"    SalesReceipt {qb_sr_data.get('qb_txn_id')} processed for Odoo but no Odoo ID returned.")
-                                except Exception as e:
-                                    logger.error(f"    Error processing SalesReceipt {qb_sr_data.get('qb_txn_id')} for Odoo: {e}", exc_info=True)
-                            iterator_id = sales_receipt_query_rs.get("iteratorID")
-                            iterator_remaining_count = sales_receipt_query_rs.get("iteratorRemainingCount")
-                            if iterator_id and int(iterator_remaining_count or '0') > 0:
-                                active_task["iteratorID"] = iterator_id
-                                active_task["requestID"] = str(int(active_task.get("requestID", "0")) + 1)
-                                progress = 50
-                            else:
-                                active_task["iteratorID"] = None
-                                session_data["current_task_index"] += 1
-                        else:
-                            logger.error(f"SalesReceiptQueryRs failed: {status_message}")
-                            active_task["iteratorID"] = None
-                            session_data["current_task_index"] += 1
-                    else:
-                        logger.warning("Could not find SalesReceiptQueryRs in response.")
-                        active_task["iteratorID"] = None
-                        session_data["current_task_index"] += 1
-                elif entity == "CheckQuery":
-                    check_query_rs = root.find('.//CheckQueryRs')
-                    if check_query_rs is not None:
-                        status_code = check_query_rs.get('statusCode', 'unknown')
-                        status_message = check_query_rs.get('statusMessage', 'N/A')
-                        logger.info(f"CheckQueryRs status: {status_code} - {status_message}")
-                        if status_code == '0':
-                            checks = check_query_rs.findall('.//CheckRet')
-                            logger.info(f"Received {len(checks)} checks in this response.")
-                            for check_xml in checks:
-                                qb_check_data = _extract_transaction_data(check_xml, "Check")
-                                if not qb_check_data.get("qb_txn_id"):
-                                    logger.warning("Check record found with no TxnID. Skipping.")
-                                    continue
-                                logger.info(f"  Processing Check TxnID: {qb_check_data.get('qb_txn_id')}, Ref: {qb_check_data.get('ref_number')}")
-                                try:
-                                    odoo_check_id = create_or_update_odoo_check(qb_check_data)
-                                    if odoo_check_id:
-                                        logger.info(f"    Successfully processed Check {qb_check_data.get('qb_txn_id')} for Odoo (Odoo ID: {odoo_check_id}).")
-                                    else:
-                                        logger.warning(f"    Check {qb_check_data.get('qb_txn_id')} processed for Odoo but no Odoo ID returned.")
-                                except Exception as e:
-                                    logger.error(f"    Error processing Check {qb_check_data.get('qb_txn_id')} for Odoo: {e}", exc_info=True)
-                            iterator_id = check_query_rs.get("iteratorID")
-                            iterator_remaining_count = check_query_rs.get("iteratorRemainingCount")
-                            if iterator_id and int(iterator_remaining_count or '0') > 0:
-                                active_task["iteratorID"] = iterator_id
-                                active_task["requestID"] = str(int(active_task.get("requestID", "0")) + 1)
-                                progress = 50
-                            else:
-                                active_task["iteratorID"] = None
-                                session_data["current_task_index"] += 1
-                        else:
-                            logger.error(f"CheckQueryRs failed: {status_message}")
-                            active_task["iteratorID"] = None
-                            session_data["current_task_index"] += 1
-                    else:
-                        logger.warning("Could not find CheckQueryRs in response.")
-                        active_task["iteratorID"] = None
-                        session_data["current_task_index"] += 1
-                elif entity == "DepositQuery":
-                    deposit_query_rs = root.find('.//DepositQueryRs')
-                    if deposit_query_rs is not None:
-                        status_code = deposit_query_rs.get('statusCode', 'unknown')
-                        status_message = deposit_query_rs.get('statusMessage', 'N/A')
-                        logger.info(f"DepositQueryRs status: {status_code} - {status_message}")
-                        if status_code == '0':
-                            deposits = deposit_query_rs.findall('.//DepositRet')
-                            logger.info(f"Received {len(deposits)} deposits in this response.")
-                            for deposit_xml in deposits:
-                                qb_deposit_data = _extract_transaction_data(deposit_xml, "Deposit")
-                                if not qb_deposit_data.get("qb_txn_id"):
-                                    logger.warning("Deposit record found with no TxnID. Skipping.")
-                                    continue
-                                logger.info(f"  Processing Deposit TxnID: {qb_deposit_data.get('qb_txn_id')}, Ref: {qb_deposit_data.get('ref_number')}")
-                                try:
-                                    odoo_deposit_id = create_or_update_odoo_deposit(qb_deposit_data)
-                                    if odoo_deposit_id:
-                                        logger.info(f"    Successfully processed Deposit {qb_deposit_data.get('qb_txn_id')} for Odoo (Odoo ID: {odoo_deposit_id}).")
-                                    else:
-                                        logger.warning(f"    Deposit {qb_deposit_data.get('qb_txn_id')} processed for Odoo but no Odoo ID returned.")
-                                except Exception as e:
-                                    logger.error(f"    Error processing Deposit {qb_deposit_data.get('qb_txn_id')} for Odoo: {e}", exc_info=True)
-                            iterator_id = deposit_query_rs.get("iteratorID")
-                            iterator_remaining_count = deposit_query_rs.get("iteratorRemainingCount")
-                            if iterator_id and int(iterator_remaining_count or '0') > 0:
-                                active_task["iteratorID"] = iterator_id
-                                active_task["requestID"] = str(int(active_task.get("requestID", "0")) + 1)
-                                progress = 50
-                            else:
-                                active_task["iteratorID"] = None
-                                session_data["current_task_index"] += 1
-                        else:
-                            logger.error(f"DepositQueryRs failed: {status_message}")
-                            active_task["iteratorID"] = None
-                            session_data["current_task_index"] += 1
-                    else:
-                        logger.warning("Could not find DepositQueryRs in response.")
-                        active_task["iteratorID"] = None
-                        session_data["current_task_index"] += 1
-                elif entity == "EstimateQuery":
-                    estimate_query_rs = root.find('.//EstimateQueryRs')
-                    if estimate_query_rs is not None:
-                        status_code = estimate_query_rs.get('statusCode', 'unknown')
-                        status_message = estimate_query_rs.get('statusMessage', 'N/A')
-                        logger.info(f"EstimateQueryRs status: {status_code} - {status_message}")
-                        if status_code == '0':
-                            estimates = estimate_query_rs.findall('.//EstimateRet')
-                            logger.info(f"Received {len(estimates)} estimates in this response.")
-                            for estimate_xml in estimates:
-                                qb_estimate_data = _extract_transaction_data(estimate_xml, "Estimate")
-                                if not qb_estimate_data.get("qb_txn_id"):
-                                    logger.warning("Estimate record found with no TxnID. Skipping.")
-                                    continue
-                                logger.info(f"  Processing Estimate TxnID: {qb_estimate_data.get('qb_txn_id')}, Ref: {qb_estimate_data.get('ref_number')}")
-                                try:
-                                    odoo_estimate_id = create_or_update_odoo_estimate(qb_estimate_data)
-                                    if odoo_estimate_id:
-                                        logger.info(f"    Successfully processed Estimate {qb_estimate_data.get('qb_txn_id')} for Odoo (Odoo ID: {odoo_estimate_id}).")
-                                    else:
-                                        logger.warning(f"    Estimate {qb_estimate_data.get('qb_txn_id')} processed for Odoo but no Odoo ID returned.")
-                                except Exception as e:
-                                    logger.error(f"    Error processing Estimate {qb_estimate_data.get('qb_txn_id')} for Odoo: {e}", exc_info=True)
-                            iterator_id = estimate_query_rs.get("iteratorID")
-                            iterator_remaining_count = estimate_query_rs.get("iteratorRemainingCount")
-                            if iterator_id and int(iterator_remaining_count or '0') > 0:
-                                active_task["iteratorID"] = iterator_id
-                                active_task["requestID"] = str(int(active_task.get("requestID", "0")) + 1)
-                                progress = 50
-                            else:
-                                active_task["iteratorID"] = None
-                                session_data["current_task_index"] += 1
-                        else:
-                            logger.error(f"EstimateQueryRs failed: {status_message}")
-                            active_task["iteratorID"] = None
-                            session_data["current_task_index"] += 1
-                    else:
-                        logger.warning("Could not find EstimateQueryRs in response.")
-                        active_task["iteratorID"] = None
-                        session_data["current_task_index"] += 1
-                elif entity == "BillPaymentCheckQuery":
-                    bill_payment_query_rs = root.find('.//BillPaymentCheckQueryRs')
-                    if bill_payment_query_rs is not None:
-                        status_code = bill_payment_query_rs.get('statusCode', 'unknown')
-                        status_message = bill_payment_query_rs.get('statusMessage', 'N/A')
-                        logger.info(f"BillPaymentCheckQueryRs status: {status_code} - {status_message}")
-                        if status_code == '0':
-                            bill_payments = bill_payment_query_rs.findall('.//BillPaymentCheckRet')
-                            logger.info(f"Received {len(bill_payments)} bill payments in this response.")
-                            for bp_xml in bill_payments:
-                                qb_bp_data = _extract_transaction_data(bp_xml, "BillPaymentCheck")
-                                if not qb_bp_data.get("qb_txn_id"):
-                                    logger.warning("BillPaymentCheck record found with no TxnID. Skipping.")
-                                    continue
-                                logger.info(f"  Processing BillPaymentCheck TxnID: {qb_bp_data.get('qb_txn_id')}, Ref: {qb_bp_data.get('ref_number')}")
-                                try:
-                                    odoo_bp_id = create_or_update_odoo_bill_payment_check(qb_bp_data)
-                                    if odoo_bp_id:
-                                        logger.info(f"    Successfully processed BillPaymentCheck {qb_bp_data.get('qb_txn_id')} for Odoo (Odoo ID: {odoo_bp_id}).")
-                                    else:
-                                        logger.warning(f"    BillPaymentCheck {qb_bp_data.get('qb_txn_id')} processed for Odoo but no Odoo ID returned.")
-                                except Exception as e:
-                                    logger.error(f"    Error processing BillPaymentCheck {qb_bp_data.get('qb_txn_id')} for Odoo: {e}", exc_info=True)
-                            iterator_id = bill_payment_query_rs.get("iteratorID")
-                            iterator_remaining_count = bill_payment_query_rs.get("iteratorRemainingCount")
-                            if iterator_id and int(iterator_remaining_count or '0') > 0:
-                                active_task["iteratorID"] = iterator_id
-                                active_task["requestID"] = str(int(active_task.get("requestID", "0")) + 1)
-                                progress = 50
-                            else:
-                                active_task["iteratorID"] = None
-                                session_data["current_task_index"] += 1
-                        else:
-                            logger.error(f"BillPaymentCheckQueryRs failed: {status_message}")
-                            active_task["iteratorID"] = None
-                            session_data["current_task_index"] += 1
-                    else:
-                        logger.warning("Could not find BillPaymentCheckQueryRs in response.")
-                        active_task["iteratorID"] = None
-                        session_data["current_task_index"] += 1
-
-        except ET.ParseError as e:
-            logger.error(f"Error parsing XML response for task {active_task}: {e}. Response snippet: {response[:500] if response else 'Empty'}")
-            entity_name_for_error = active_task.get('entity', 'unknown task') if active_task else 'unknown task'
-            session_data["last_error"] = f"XML Parse Error in receiveResponseXML for {entity_name_for_error}"
-            if active_task:
-                active_task["iteratorID"] = None
-            session_data["current_task_index"] += 1
-            save_qbwc_session_state()
-            return "0"
-        except Exception as e:
-            logger.error(f"Unexpected error processing response for task {active_task}: {e}", exc_info=True)
-            entity_name_for_error = active_task.get('entity', 'unknown task') if active_task else 'unknown task'
-            session_data["last_error"] = f"Unexpected error in receiveResponseXML for {entity_name_for_error}"
-            if active_task:
-                active_task["iteratorID"] = None
-            session_data["current_task_index"] += 1
-            save_qbwc_session_state()
-            return "0"
-            
-        # --- Refactored Progress Calculation ---
-        progress_to_return = 0
-        
-        # If we are in the middle of an iteration for the current task, report 50% for this task
-        if progress == 50:
-            progress_to_return = 50
-            logger.info(f"**PROGRESS_LOGIC: Continuation of an iterator detected. Progress set to 50%.")
-        else:
-            # If not iterating, calculate progress based on completed tasks.
-            progress_to_return = _compute_overall_progress(session_data)
-            logger.info(f"**PROGRESS_LOGIC: No iterator. Calculated progress is {progress_to_return}%.");
-
-        # Final check: if the index is at the end, it's 100%.
-        if session_data["current_task_index"] >= len(session_data.get("task_queue", [])):
-            progress_to_return = 100
-            logger.info(f"**PROGRESS_LOGIC: Task queue is now complete. Overriding progress to 100%.");
-
-        save_qbwc_session_state()
-        logger.info(f"receiveResponseXML: Task index is now: {session_data['current_task_index']}/{len(session_data.get('task_queue', []))}")
-        logger.info(f"receiveResponseXML FINAL return value: {progress_to_return}% for task: {active_task.get('entity', 'N/A') if active_task else 'N/A'}")
-        return str(progress_to_return)
+            with _round_trip_metrics("receiveResponseXML", ticket), session_store.lock(ticket), \
+                    profiled("receiveResponseXML", ticket):
+                return _receive_response_xml(ticket, response, hresult, message)
+        except SessionLockTimeout as e:
+            logger.error("receiveResponseXML: %s", e)
+            return "-1"
 
     @rpc(Unicode, _returns=Unicode)
     def getLastError(self, ticket):
         logger.debug("Method getLastError called")
         """Get the last error message for a session."""
-        logger.info(f"QBWC Service: getLastError called. Ticket: {ticket}")
-        session_data = qbwc_session_state.get(ticket)
+        logger.info("QBWC Service: getLastError called. Ticket: %s", ticket)
+        session_data = session_store.get(ticket)
         if session_data:
             return session_data.get("last_error", "No error")
         return "Error: Invalid session ticket"
@@ -1547,11 +1501,17 @@ class QBWCService(ServiceBase):
     def connectionError(self, ticket, hresult, message):
         logger.debug("Method connectionError called")
         """Handle connection errors."""
-        logger.error(f"QBWC Service: connectionError called. Ticket: {ticket}, Error: {message}")
+        logger.error("QBWC Service: connectionError called. Ticket: %s, Error: %s", ticket, message)
         
         # Update session state
-        if ticket in qbwc_session_state:
-            qbwc_session_state[ticket]["last_error"] = f"Connection error: {message}"
+        try:
+            with session_store.lock(ticket):
+                session_data = session_store.get(ticket)
+                if session_data:
+                    session_data["last_error"] = f"Connection error: {message}"
+                    save_qbwc_session_state(ticket, session_data)
+        except SessionLockTimeout as e:
+            logger.error("connectionError: %s", e)
         
         return "done"
 
@@ -1559,16 +1519,26 @@ class QBWCService(ServiceBase):
     def closeConnection(self, ticket):
         logger.debug("Method closeConnection called")
         """Close and cleanup a QBWC session."""
-        logger.info(f"QBWC Service: closeConnection called. Ticket: {ticket}")
+        logger.info("QBWC Service: closeConnection called. Ticket: %s", ticket)
         
-        if ticket in qbwc_session_state:
-            session_info = qbwc_session_state[ticket]
-            duration = datetime.now() - session_info.get("created_at", datetime.now())
-            logger.info(f"Session {ticket} closed after {duration}")
-            del qbwc_session_state[ticket]
-            save_qbwc_session_state()
-        else:
-            logger.warning(f"closeConnection: Ticket {ticket} not found")
+        try:
+            with session_store.lock(ticket):
+                session_info = session_store.get(ticket)
+                if session_info:
+                    created_at = session_info.get("created_at")
+                    duration = datetime.now() - datetime.fromisoformat(created_at) if created_at else "unknown"
+                    logger.info("Session %s closed after %s", ticket, duration)
+                    session_store.delete(ticket)
+                else:
+                    logger.warning("closeConnection: Ticket %s not found", ticket)
+        except SessionLockTimeout as e:
+            logger.error("closeConnection: %s", e)
+            return "OK"
+
+        # Pushing the last pages can take minutes, far beyond QBWC's HTTP timeout: answer now
+        if session_info:
+            threading.Thread(target=_finish_closed_session, args=(ticket,),
+                             name=f"close-{ticket[-8:]}", daemon=True).start()
         
         return "OK"
 
@@ -1582,5 +1552,5 @@ class QBWCService(ServiceBase):
     def clientVersion(ctx, strVersion):
         """Return client version as a plain string for QBWC schema compliance."""
         logger.debug("Method clientVersion called")
-        logger.info(f"QBWC Service: clientVersion called with version: {strVersion}")
+        logger.info("QBWC Service: clientVersion called with version: %s", strVersion)
         return "2.0.0"
\ No newline at end of file
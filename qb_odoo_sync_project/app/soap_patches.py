@@ -13,6 +13,8 @@ from lxml import etree
 from spyne.protocol.soap import soap11
 from spyne.util.xml import get_xml_as_object
 
+from .logging_config import truncated
+
 logger = logging.getLogger(__name__)
 
 class LxmlFriendlyXmlDocument:
@@ -58,7 +60,7 @@ class LxmlFriendlyXmlDocument:
             logger.debug("LXML_PATCH: Input is bytes, converting to string")
             xml_string = xml_string.decode('utf-8', errors='replace')
         
-        logger.debug(f"LXML_PATCH: XML content preview: {xml_string[:200] if len(xml_string) > 200 else xml_string}...")
+        logger.debug("LXML_PATCH: XML content preview: %s", truncated(xml_string, 200))
         
         try:
             # First attempt: try parsing as-is
@@ -75,7 +77,7 @@ class LxmlFriendlyXmlDocument:
                 
                 if fixed_xml != xml_string:
                     logger.debug("LXML_PATCH: Removed encoding declaration, retrying parse")
-                    logger.debug(f"LXML_PATCH: Fixed XML preview: {fixed_xml[:200]}...")
+                    logger.debug("LXML_PATCH: Fixed XML preview: %s", truncated(fixed_xml, 200))
                     
                     try:
                         return get_xml_as_object(fixed_xml, validator)
@@ -154,12 +156,12 @@ class PatchedSoap11(soap11.Soap11):
         
         if isinstance(S, bytes):
             logger.debug(f"PATCHED_SOAP11_CREATE_IN_DOC: S (bytes) length: {len(S)}")
-            logger.debug(f"PATCHED_SOAP11_CREATE_IN_DOC: S (bytes) preview: {S[:150]}")
+            logger.debug("PATCHED_SOAP11_CREATE_IN_DOC: S (bytes) preview: %s", truncated(S, 150))
         elif isinstance(S, six_spyne.string_types):
             logger.debug(f"PATCHED_SOAP11_CREATE_IN_DOC: S (string) length: {len(S)}")
-            logger.debug(f"PATCHED_SOAP11_CREATE_IN_DOC: S (string) preview: {S[:150]}")
+            logger.debug("PATCHED_SOAP11_CREATE_IN_DOC: S (string) preview: %s", truncated(S, 150))
         else:
-            logger.debug(f"PATCHED_SOAP11_CREATE_IN_DOC: S (unknown type) preview: {str(S)[:150]}")
+            logger.debug("PATCHED_SOAP11_CREATE_IN_DOC: S (unknown type) preview: %s", truncated(S, 150))
         
         # Ensure xml_document_type is available
         if not hasattr(self, 'xml_document_type') or self.xml_document_type is None:
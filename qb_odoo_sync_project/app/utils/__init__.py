@@ -3,4 +3,15 @@ Utilities package for QB Odoo Sync application.
 
 This package contains utility modules for common operations:
 - data_loader: Handles loading and managing crosswalk data
+- state_store: SQLite-backed shared session state with per-ticket locking
+- checkpoints: Per-record sync checkpoints (ListID/TxnID + EditSequence)
+- txn_windows: TxnDate windows for sharded historical backfill of transactions
+- dead_letters: Dead-letter queue of records that failed to reach Odoo, with retry backoff
+- move_posts: Persisted queue of created Odoo moves waiting to be posted
+- metrics: In-process counters/gauges/histograms exported at /metrics
+- tracing: Per-session trace spans (Chrome Trace Event JSON) and timing summaries
+- profiling: Admin-armed cProfile runs around SOAP calls and record pushes
+- rpc_stats: Odoo RPC latency, payload size, retry and fault accounting per model.method
+- resilience: Retry backoff with jitter, a circuit breaker and an AIMD limiter for remote calls
+- auth_cache: Persisted, TTL-bounded Odoo login (UID) cache shared with CLI tools
 """
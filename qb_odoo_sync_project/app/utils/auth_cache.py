@@ -0,0 +1,84 @@
+"""
+Persisted Odoo authentication cache.
+
+Odoo UIDs obtained by logging in are stored in a small JSON file with an
+expiry, so a restarted server (including every FLASK_DEBUG reloader restart)
+and the command-line tools skip the login round trip while the entry is
+fresh. Entries are keyed by URL, database and login, plus a fingerprint of
+the API key so a rotated key never reuses an old entry; the key itself is
+never written. Callers invalidate an entry when Odoo answers AccessDenied.
+
+This module only uses the standard library so standalone scripts can load it
+by path without importing the Flask application.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+AUTH_CACHE_PATH = Path(os.getenv("QB_SYNC_AUTH_CACHE",
+                                 str(Path(__file__).resolve().parent.parent.parent / "data" / "odoo_auth_cache.json")))
+AUTH_CACHE_TTL_SECONDS = int(os.getenv("QB_SYNC_AUTH_CACHE_TTL", str(12 * 3600)))
+
+
+def _entry_key(url: str, db: str, login: str, api_key: str) -> str:
+    fingerprint = hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+    return f"{url.rstrip('/')}|{db}|{login}|{fingerprint}"
+
+
+def _read() -> dict:
+    try:
+        with open(AUTH_CACHE_PATH, encoding="utf-8") as f:
+            entries = json.load(f)
+        return entries if isinstance(entries, dict) else {}
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logger.warning("Ignoring unreadable Odoo auth cache %s: %s", AUTH_CACHE_PATH, e)
+        return {}
+
+
+def _write(entries: dict) -> None:
+    # Write-then-rename so concurrent readers never see a partial file
+    try:
+        AUTH_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=".odoo_auth_", dir=str(AUTH_CACHE_PATH.parent))
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(entries, f, indent=2)
+            os.chmod(tmp_path, 0o600)
+            os.replace(tmp_path, AUTH_CACHE_PATH)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    except OSError as e:
+        logger.warning("Could not write Odoo auth cache %s: %s", AUTH_CACHE_PATH, e)
+
+
+def get_cached_uid(url: str, db: str, login: str, api_key: str) -> Optional[int]:
+    """UID from a fresh cache entry, or None when there is none."""
+    entry = _read().get(_entry_key(url, db, login, api_key))
+    if not entry or entry.get("expires_at", 0) <= time.time():
+        return None
+    return entry.get("uid")
+
+
+def store_uid(url: str, db: str, login: str, api_key: str, uid: int, ttl: int = AUTH_CACHE_TTL_SECONDS) -> None:
+    now = time.time()
+    entries = {key: entry for key, entry in _read().items() if entry.get("expires_at", 0) > now}
+    entries[_entry_key(url, db, login, api_key)] = {"uid": uid, "stored_at": now, "expires_at": now + ttl}
+    _write(entries)
+
+
+def invalidate(url: str, db: str, login: str, api_key: str) -> None:
+    """Drop the entry for these credentials, e.g. after Odoo answered AccessDenied."""
+    entries = _read()
+    if entries.pop(_entry_key(url, db, login, api_key), None) is not None:
+        _write(entries)
+        logger.info("Invalidated cached Odoo login for %s on %s", login, db)
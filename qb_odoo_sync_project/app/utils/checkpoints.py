@@ -0,0 +1,91 @@
+"""
+Record-level sync checkpoints for QB Odoo Sync application.
+
+Every QuickBooks record that is successfully pushed to Odoo is recorded with
+its ListID/TxnID and EditSequence in the shared state database. When a page is
+delivered again (after a crash, a deploy or simply the next session), records
+whose EditSequence is unchanged are skipped instead of being rewritten in Odoo.
+"""
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+from ..logging_config import logger
+from .state_store import connect
+
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+
+def _ensure_schema():
+    global _schema_ready
+    conn = connect()
+    if _schema_ready:
+        return conn
+    with _schema_lock:
+        if not _schema_ready:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS record_checkpoints (
+                    entity TEXT NOT NULL,
+                    record_id TEXT NOT NULL,
+                    edit_sequence TEXT,
+                    odoo_id INTEGER,
+                    committed_at REAL NOT NULL,
+                    PRIMARY KEY (entity, record_id)
+                )
+                """
+            )
+            _schema_ready = True
+    return conn
+
+
+def load_committed(entity: str, record_ids: Iterable[str]) -> Dict[str, Optional[str]]:
+    """
+    Look up the committed EditSequence for a page of records in one query.
+
+    Args:
+        entity: QuickBooks object type (e.g. 'Customer', 'Invoice').
+        record_ids: ListIDs/TxnIDs of the records on the page.
+
+    Returns:
+        dict: record_id -> EditSequence that was last pushed to Odoo.
+    """
+    record_ids = [record_id for record_id in record_ids if record_id]
+    if not record_ids:
+        return {}
+    conn = _ensure_schema()
+    committed = {}
+    # Stay well below SQLite's bound-parameter limit
+    for start in range(0, len(record_ids), 500):
+        chunk = record_ids[start:start + 500]
+        placeholders = ",".join("?" * len(chunk))
+        rows = conn.execute(
+            f"SELECT record_id, edit_sequence FROM record_checkpoints WHERE entity = ? AND record_id IN ({placeholders})",
+            [entity, *chunk],
+        )
+        committed.update(rows.fetchall())
+    return committed
+
+
+def mark_committed(entity: str, record_id: str, edit_sequence: Optional[str], odoo_id: Optional[int]) -> None:
+    """Record that a QuickBooks record version has been applied to Odoo."""
+    try:
+        conn = _ensure_schema()
+        conn.execute(
+            "INSERT INTO record_checkpoints (entity, record_id, edit_sequence, odoo_id, committed_at) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(entity, record_id) DO UPDATE SET edit_sequence = excluded.edit_sequence, "
+            "odoo_id = excluded.odoo_id, committed_at = excluded.committed_at",
+            (entity, record_id, edit_sequence, odoo_id if isinstance(odoo_id, int) else None, time.time()),
+        )
+    except Exception as e:
+        # A missing checkpoint only means the record is pushed again next time
+        logger.error("Failed to checkpoint %s %s: %s", entity, record_id, e)
+
+
+def clear_checkpoints(entity: Optional[str] = None) -> int:
+    """Forget checkpoints (for one entity or all) so re-queried records are pushed again. Returns how many were removed."""
+    conn = _ensure_schema()
+    if entity:
+        return conn.execute("DELETE FROM record_checkpoints WHERE entity = ?", (entity,)).rowcount
+    return conn.execute("DELETE FROM record_checkpoints").rowcount
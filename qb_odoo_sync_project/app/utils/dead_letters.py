@@ -0,0 +1,167 @@
+"""
+Dead-letter queue for QuickBooks records that failed to reach Odoo.
+
+When pushing an extracted record raises or returns no Odoo id, the record is
+stored here with the error and an attempt count instead of only being logged.
+Each failure schedules the next attempt with exponential backoff (capped at
+DEAD_LETTER_MAX_DELAY_SECONDS); after DEAD_LETTER_MAX_ATTEMPTS the record is
+parked and only retried when an admin asks for it. A record leaves the queue
+as soon as a push of it succeeds, whether from a retry or a later session.
+
+Rows are claimed before they are retried, so several workers sharing the
+state database never retry the same record at the same time.
+"""
+import json
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from ..logging_config import logger
+from .state_store import connect, transaction
+
+DEAD_LETTER_BASE_DELAY_SECONDS = 300
+DEAD_LETTER_MAX_DELAY_SECONDS = 24 * 3600
+DEAD_LETTER_MAX_ATTEMPTS = 8  # Failures after which a record waits for an admin retry
+DEAD_LETTER_CLAIM_SECONDS = 600  # A claimed row becomes due again if its retry never reports back
+
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+
+def _ensure_schema():
+    global _schema_ready
+    conn = connect()
+    if _schema_ready:
+        return conn
+    with _schema_lock:
+        if not _schema_ready:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS dead_letters (
+                    entity TEXT NOT NULL,
+                    record_id TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    error_class TEXT NOT NULL,
+                    error TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    first_failed_at REAL NOT NULL,
+                    last_failed_at REAL NOT NULL,
+                    next_attempt_at REAL,
+                    PRIMARY KEY (entity, record_id)
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS dead_letters_due ON dead_letters (next_attempt_at)")
+            _schema_ready = True
+    return conn
+
+
+def next_attempt_at(attempts: int, now: float) -> Optional[float]:
+    if attempts >= DEAD_LETTER_MAX_ATTEMPTS:
+        return None
+    return now + min(DEAD_LETTER_BASE_DELAY_SECONDS * 2 ** (attempts - 1), DEAD_LETTER_MAX_DELAY_SECONDS)
+
+
+def record_failure(entity: str, record_id: str, payload: Dict[str, Any], error_class: str, error: str) -> None:
+    """Store (or update) a failed record and schedule its next retry."""
+    now = time.time()
+    try:
+        _ensure_schema()
+        with transaction() as conn:
+            row = conn.execute("SELECT attempts FROM dead_letters WHERE entity = ? AND record_id = ?",
+                               (entity, record_id)).fetchone()
+            attempts = (row[0] if row else 0) + 1
+            conn.execute(
+                "INSERT INTO dead_letters (entity, record_id, payload, error_class, error, attempts, "
+                "first_failed_at, last_failed_at, next_attempt_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(entity, record_id) DO UPDATE SET payload = excluded.payload, "
+                "error_class = excluded.error_class, error = excluded.error, attempts = excluded.attempts, "
+                "last_failed_at = excluded.last_failed_at, next_attempt_at = excluded.next_attempt_at",
+                (entity, record_id, json.dumps(payload, default=str), error_class, (error or "")[:2000],
+                 attempts, now, now, next_attempt_at(attempts, now)),
+            )
+        if attempts >= DEAD_LETTER_MAX_ATTEMPTS:
+            logger.error("%s %s failed %s times; parked in the dead-letter queue until retried by hand",
+                         entity, record_id, attempts)
+    except Exception as e:
+        logger.error("Failed to dead-letter %s %s: %s", entity, record_id, e)
+
+
+def resolve(entity: str, record_ids: Iterable[str]) -> None:
+    """Drop records that have now been pushed successfully."""
+    record_ids = [record_id for record_id in record_ids if record_id]
+    if not record_ids:
+        return
+    try:
+        conn = _ensure_schema()
+        for start in range(0, len(record_ids), 500):
+            chunk = record_ids[start:start + 500]
+            conn.execute(f"DELETE FROM dead_letters WHERE entity = ? AND record_id IN ({','.join('?' * len(chunk))})",
+                         [entity, *chunk])
+    except Exception as e:
+        logger.error("Failed to clear dead letters for %s: %s", entity, e)
+
+
+def claim_due(limit: int) -> List[Dict[str, Any]]:
+    """Due records, oldest first, claimed for DEAD_LETTER_CLAIM_SECONDS; payloads are decoded."""
+    now = time.time()
+    _ensure_schema()
+    with transaction() as conn:
+        rows = conn.execute(
+            "SELECT entity, record_id, payload, attempts FROM dead_letters "
+            "WHERE next_attempt_at IS NOT NULL AND next_attempt_at <= ? ORDER BY next_attempt_at LIMIT ?",
+            (now, limit),
+        ).fetchall()
+        for entity, record_id, _, _ in rows:
+            conn.execute("UPDATE dead_letters SET next_attempt_at = ? WHERE entity = ? AND record_id = ?",
+                         (now + DEAD_LETTER_CLAIM_SECONDS, entity, record_id))
+    return [{"entity": entity, "record_id": record_id, "payload": json.loads(payload), "attempts": attempts}
+            for entity, record_id, payload, attempts in rows]
+
+
+def list_dead_letters(entity: Optional[str] = None, limit: int = 100, include_payload: bool = False) -> Dict[str, Any]:
+    """Queued records (newest failure first) and counts per entity, for the admin listing."""
+    conn = _ensure_schema()
+    where, params = ("WHERE entity = ?", [entity]) if entity else ("", [])
+    rows = conn.execute(
+        f"SELECT entity, record_id, payload, error_class, error, attempts, first_failed_at, last_failed_at, "
+        f"next_attempt_at FROM dead_letters {where} ORDER BY last_failed_at DESC LIMIT ?", [*params, limit],
+    ).fetchall()
+    counts = dict(conn.execute(f"SELECT entity, COUNT(*) FROM dead_letters {where} GROUP BY entity", params).fetchall())
+    records = []
+    for (row_entity, record_id, payload, error_class, error, attempts,
+         first_failed_at, last_failed_at, next_attempt_at) in rows:
+        record = {
+            "entity": row_entity, "record_id": record_id, "error_class": error_class, "error": error,
+            "attempts": attempts, "first_failed_at": first_failed_at, "last_failed_at": last_failed_at,
+            "next_attempt_at": next_attempt_at, "parked": next_attempt_at is None,
+        }
+        if include_payload:
+            record["payload"] = json.loads(payload)
+        records.append(record)
+    return {"counts": counts, "total": sum(counts.values()), "records": records}
+
+
+def schedule_retry(entity: Optional[str] = None, record_id: Optional[str] = None) -> int:
+    """Make matching records (parked ones included) due now. Returns how many were rescheduled."""
+    conn = _ensure_schema()
+    where, params = _match(entity, record_id)
+    return conn.execute(f"UPDATE dead_letters SET next_attempt_at = ? {where}", [time.time(), *params]).rowcount
+
+
+def discard(entity: Optional[str] = None, record_id: Optional[str] = None) -> int:
+    """Forget matching records without retrying them. Returns how many were removed."""
+    conn = _ensure_schema()
+    where, params = _match(entity, record_id)
+    return conn.execute(f"DELETE FROM dead_letters {where}", params).rowcount
+
+
+def _match(entity: Optional[str], record_id: Optional[str]):
+    clauses, params = [], []
+    if entity:
+        clauses.append("entity = ?")
+        params.append(entity)
+    if record_id:
+        clauses.append("record_id = ?")
+        params.append(record_id)
+    return ("WHERE " + " AND ".join(clauses) if clauses else ""), params
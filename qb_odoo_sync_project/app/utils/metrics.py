@@ -0,0 +1,280 @@
+"""
+In-process metrics for QB Odoo Sync application.
+
+A small, dependency-free registry of counters, gauges and histograms rendered
+in the Prometheus text exposition format by the ``/metrics`` endpoint. Metrics
+are per process; when running several worker processes, scrape each one.
+"""
+import bisect
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from ..logging_config import get_log_queue_stats
+from . import move_posts
+from .state_store import session_store
+
+# Default latency buckets (seconds), from a fast local call to a slow Odoo write
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Payload size buckets (bytes), from a small search to a many-line invoice or catalog read
+BYTE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """
+    Monotonically increasing count, optionally split by labels, or read at
+    scrape time from a callback over a count kept elsewhere.
+    """
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=(),
+                 callback: Optional[Callable[[], Iterable[Tuple[Dict[str, str], float]]]] = None):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._callback = callback
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self):
+        return _callback_or_values_samples(self)
+
+
+class Gauge(_Metric):
+    """Value that can go up and down, or is computed by a callback at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(),
+                 callback: Optional[Callable[[], Iterable[Tuple[Dict[str, str], float]]]] = None):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._callback = callback
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def _samples(self):
+        return _callback_or_values_samples(self)
+
+
+def _callback_or_values_samples(metric) -> List[str]:
+    if metric._callback is not None:
+        try:
+            items = sorted((metric._key(labels), value) for labels, value in metric._callback())
+        except Exception:
+            items = []
+    else:
+        with metric._lock:
+            items = sorted(metric._values.items())
+    return [f"{metric.name}{_label_text(metric.labelnames, key)} {value}" for key, value in items]
+
+
+class Histogram(_Metric):
+    """Distribution of observations (typically durations) in cumulative buckets."""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], List[float]] = {}  # bucket counts..., +Inf count, sum
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def time(self, **labels) -> "_Timer":
+        """Context manager observing the duration of the enclosed block."""
+        return _Timer(self, labels)
+
+    def _samples(self):
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        lines = []
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                bucket_labels = _label_text(self.labelnames, key, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_count{_label_text(self.labelnames, key)} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_text(self.labelnames, key)} {series[-1]}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labels: Dict[str, str]):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class Registry:
+    """Holds every metric and renders them for scraping."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=(), callback=None) -> Counter:
+        return self.register(Counter(name, documentation, labelnames, callback))
+
+    def gauge(self, name, documentation, labelnames=(), callback=None) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, callback))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# --- Metrics shared across the application ----------------------------------
+
+QBWC_ROUND_TRIPS = registry.counter(
+    "qbwc_round_trips_total", "QBWC SOAP calls handled, by method and task entity", ("method", "entity"))
+QBWC_ROUND_TRIP_SECONDS = registry.histogram(
+    "qbwc_round_trip_seconds", "Server-side time spent in a QBWC SOAP call", ("method", "entity"))
+QB_RECORDS = registry.counter(
+    "qb_records_total",
+    "QuickBooks records by outcome (extracted, pushed, skipped, already_applied, failed, deferred, unsupported)",
+    ("entity", "outcome"))
+QBWC_NOOPS = registry.counter(
+    "qbwc_noop_responses_total", "sendRequestXML calls answered with NoOp because the session's push pipeline was full")
+QB_DEAD_LETTERS = registry.counter(
+    "qb_dead_letters_total", "Failed records entering and leaving the dead-letter queue, by outcome (queued, recovered)",
+    ("entity", "outcome"))
+QB_ITERATOR_REMAINING = registry.gauge(
+    "qb_iterator_remaining", "Records QuickBooks still has queued behind the current iterator", ("entity",))
+ODOO_RPC_SECONDS = registry.histogram(
+    "odoo_rpc_seconds", "Odoo RPC latency", ("model", "method"))
+ODOO_RPC_ERRORS = registry.counter(
+    "odoo_rpc_errors_total", "Odoo RPC calls that failed, by fault class", ("model", "method", "fault"))
+ODOO_RPC_REQUEST_BYTES = registry.histogram(
+    "odoo_rpc_request_bytes", "Odoo RPC request body size on the wire", ("model", "method"), buckets=BYTE_BUCKETS)
+ODOO_RPC_RESPONSE_BYTES = registry.histogram(
+    "odoo_rpc_response_bytes", "Odoo RPC response body size on the wire", ("model", "method"), buckets=BYTE_BUCKETS)
+ODOO_RPC_RETRIES = registry.counter(
+    "odoo_rpc_retries_total", "Extra attempts made for Odoo RPC calls", ("model", "method"))
+ODOO_MOVES_POSTED = registry.counter(
+    "odoo_moves_posted_total", "Created Odoo moves handled by the deferred posting queue, by outcome (posted, failed)",
+    ("outcome",))
+CACHE_LOOKUPS = registry.counter(
+    "cache_lookups_total", "Lookups per cache layer by result (hit/miss)", ("cache", "result"))
+SYNC_LAST_SUCCESS = registry.gauge(
+    "qb_sync_last_success_timestamp_seconds", "Unix time an entity's query task last completed", ("entity",))
+
+
+def record_cache_lookup(cache: str, hit: bool, count: int = 1) -> None:
+    """Count lookups against a cache layer."""
+    if count:
+        CACHE_LOOKUPS.inc(count, cache=cache, result="hit" if hit else "miss")
+
+
+def mark_sync_complete(entity: str) -> None:
+    SYNC_LAST_SUCCESS.set(time.time(), entity=entity)
+
+
+def _sync_lag():
+    now = time.time()
+    with SYNC_LAST_SUCCESS._lock:
+        items = list(SYNC_LAST_SUCCESS._values.items())
+    return [({"entity": key[0]}, round(now - value, 3)) for key, value in items]
+
+
+registry.gauge("qb_sync_lag_seconds", "Seconds since an entity's query task last completed", ("entity",),
+               callback=_sync_lag)
+registry.gauge("log_queue_depth", "Log records waiting for the logging listener thread",
+               callback=lambda: [({}, get_log_queue_stats()["depth"])])
+registry.counter("log_records_dropped_total", "Log records dropped because the logging queue was full",
+                 callback=lambda: [({}, get_log_queue_stats()["dropped"])])
+
+
+def _active_sessions():
+    return [({}, len(session_store.tickets()))]
+
+
+registry.gauge("qbwc_active_sessions", "QBWC sessions currently held in the state store", callback=_active_sessions)
+
+
+def _moves_awaiting_post():
+    return [({"state": state}, count) for state, count in move_posts.counts().items()]
+
+
+registry.gauge("odoo_moves_awaiting_post", "Created Odoo moves still in draft waiting to be posted, by state (pending, parked)",
+               ("state",), callback=_moves_awaiting_post)
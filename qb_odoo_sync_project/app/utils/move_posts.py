@@ -0,0 +1,131 @@
+"""
+Persisted queue of created Odoo moves waiting for action_post.
+
+A QuickBooks invoice or credit memo is checkpointed once its move is created,
+but the move is only posted later, in batches (see MovePostingQueue). The move
+ids are therefore written here when they are queued and removed only once the
+post succeeds, so a move whose post fails, or that was still queued when Odoo
+went away or the process exited, is posted by a later flush from any worker
+instead of staying in draft behind a checkpoint.
+
+Rows are claimed before they are posted, so two workers never post the same
+move. Failed posts are retried with the dead-letter backoff and parked after
+DEAD_LETTER_MAX_ATTEMPTS until an admin reschedules them.
+"""
+import threading
+import time
+from typing import Dict, Iterable, List
+
+from ..logging_config import logger
+from .dead_letters import DEAD_LETTER_CLAIM_SECONDS, DEAD_LETTER_MAX_ATTEMPTS, next_attempt_at
+from .state_store import connect, transaction
+
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+
+def _ensure_schema():
+    global _schema_ready
+    conn = connect()
+    if _schema_ready:
+        return conn
+    with _schema_lock:
+        if not _schema_ready:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS move_posts (
+                    move_id INTEGER PRIMARY KEY,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    error TEXT,
+                    queued_at REAL NOT NULL,
+                    next_attempt_at REAL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS move_posts_due ON move_posts (next_attempt_at)")
+            _schema_ready = True
+    return conn
+
+
+def enqueue(move_id: int) -> None:
+    """Queue a created move for posting (due at once)."""
+    now = time.time()
+    try:
+        conn = _ensure_schema()
+        conn.execute("INSERT OR IGNORE INTO move_posts (move_id, queued_at, next_attempt_at) VALUES (?, ?, ?)",
+                     (move_id, now, now))
+    except Exception as e:
+        logger.error("Failed to queue Odoo move %s for posting: %s", move_id, e)
+
+
+def claim_due(limit: int) -> List[int]:
+    """Due move ids, oldest first, claimed for DEAD_LETTER_CLAIM_SECONDS."""
+    now = time.time()
+    _ensure_schema()
+    with transaction() as conn:
+        move_ids = [row[0] for row in conn.execute(
+            "SELECT move_id FROM move_posts WHERE next_attempt_at IS NOT NULL AND next_attempt_at <= ? "
+            "ORDER BY next_attempt_at LIMIT ?", (now, limit),
+        )]
+        conn.executemany("UPDATE move_posts SET next_attempt_at = ? WHERE move_id = ?",
+                         [(now + DEAD_LETTER_CLAIM_SECONDS, move_id) for move_id in move_ids])
+    return move_ids
+
+
+def count_due() -> int:
+    conn = _ensure_schema()
+    return conn.execute("SELECT COUNT(*) FROM move_posts WHERE next_attempt_at IS NOT NULL AND next_attempt_at <= ?",
+                        (time.time(),)).fetchone()[0]
+
+
+def mark_posted(move_ids: Iterable[int]) -> None:
+    conn = _ensure_schema()
+    conn.executemany("DELETE FROM move_posts WHERE move_id = ?", [(move_id,) for move_id in move_ids])
+
+
+def mark_failed(move_id: int, error: str) -> None:
+    """Reschedule a move whose post failed, with backoff."""
+    now = time.time()
+    with transaction() as conn:
+        row = conn.execute("SELECT attempts FROM move_posts WHERE move_id = ?", (move_id,)).fetchone()
+        attempts = (row[0] if row else 0) + 1
+        conn.execute("UPDATE move_posts SET attempts = ?, error = ?, next_attempt_at = ? WHERE move_id = ?",
+                     (attempts, error, next_attempt_at(attempts, now), move_id))
+    if attempts >= DEAD_LETTER_MAX_ATTEMPTS:
+        logger.error("Odoo move %s failed to post %s times; parked in draft until retried by hand", move_id, attempts)
+
+
+def release(move_ids: Iterable[int]) -> None:
+    """Make claimed moves due again without counting an attempt (Odoo was unavailable)."""
+    conn = _ensure_schema()
+    now = time.time()
+    conn.executemany("UPDATE move_posts SET next_attempt_at = ? WHERE move_id = ?", [(now, move_id) for move_id in move_ids])
+
+
+def counts() -> Dict[str, int]:
+    """Queued moves still retried (pending) and given up on until rescheduled (parked)."""
+    conn = _ensure_schema()
+    total, parked = conn.execute(
+        "SELECT COUNT(*), COALESCE(SUM(next_attempt_at IS NULL), 0) FROM move_posts").fetchone()
+    return {"pending": total - parked, "parked": parked}
+
+
+def list_unposted(limit: int = 100) -> Dict[str, object]:
+    """Moves still waiting to be posted, parked ones first, for the admin listing."""
+    conn = _ensure_schema()
+    rows = conn.execute(
+        "SELECT move_id, attempts, error, queued_at, next_attempt_at FROM move_posts "
+        "ORDER BY next_attempt_at IS NOT NULL, attempts DESC, queued_at LIMIT ?", (limit,),
+    ).fetchall()
+    return {
+        **counts(),
+        "moves": [{"move_id": move_id, "attempts": attempts, "error": error, "queued_at": queued_at,
+                   "next_attempt_at": next_at, "parked": next_at is None}
+                  for move_id, attempts, error, queued_at, next_at in rows],
+    }
+
+
+def schedule_retry() -> int:
+    """Make every queued move (parked ones included) due now. Returns how many were rescheduled."""
+    conn = _ensure_schema()
+    return conn.execute("UPDATE move_posts SET next_attempt_at = ?", (time.time(),)).rowcount
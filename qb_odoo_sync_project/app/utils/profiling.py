@@ -0,0 +1,147 @@
+"""
+On-demand profiling for QB Odoo Sync application.
+
+An admin arms the profiler for the next N calls of a target (a
+``receiveResponseXML`` round trip, or one page of records pushed to Odoo).
+Each armed call runs under ``cProfile``; its stats are written to
+``logs/profiles/<target>-<timestamp>-<pid>-<n>.pstats`` together with a top-N text
+summary, which is also logged. Arming is per process.
+"""
+import cProfile
+import io
+import itertools
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, List
+
+from ..logging_config import logger, LOG_DIR
+
+PROFILE_DIR = Path(os.getenv("QB_SYNC_PROFILE_DIR", str(LOG_DIR / "profiles")))
+PROFILE_TARGETS = ("receiveResponseXML", "push")
+PROFILE_MAX_CALLS = 50  # Upper bound on calls one arm request may profile
+PROFILE_DEFAULT_TOP_N = 30
+PROFILE_RETENTION_FILES = 100  # Oldest .pstats/.txt files beyond this are removed
+
+_lock = threading.Lock()
+_armed: Dict[str, Dict[str, int]] = {}  # target -> {"remaining": n, "top": n}
+_local = threading.local()
+_sequence = itertools.count(1)
+
+
+def arm(target: str, calls: int = 1, top: int = PROFILE_DEFAULT_TOP_N) -> Dict[str, Any]:
+    """Profile the next `calls` calls of `target` in this process."""
+    if target not in PROFILE_TARGETS:
+        raise ValueError(f"unknown profiling target {target!r}; expected one of {', '.join(PROFILE_TARGETS)}")
+    calls, top = int(calls), int(top)
+    if not 1 <= calls <= PROFILE_MAX_CALLS:
+        raise ValueError(f"calls must be between 1 and {PROFILE_MAX_CALLS}")
+    if top < 1:
+        raise ValueError("top must be positive")
+    with _lock:
+        _armed[target] = {"remaining": calls, "top": top}
+    logger.info("Profiler armed for the next %s %s call(s)", calls, target)
+    return get_profiling_status()
+
+
+def disarm(target: str = None) -> Dict[str, Any]:
+    """Cancel pending profiling for one target, or for all of them."""
+    with _lock:
+        if target is None:
+            _armed.clear()
+        else:
+            _armed.pop(target, None)
+    return get_profiling_status()
+
+
+def get_profiling_status() -> Dict[str, Any]:
+    with _lock:
+        armed = {target: dict(settings) for target, settings in _armed.items()}
+    try:
+        recent = sorted(PROFILE_DIR.glob("*.pstats"), key=lambda path: path.stat().st_mtime, reverse=True)[:20]
+    except OSError:
+        recent = []
+    return {"pid": os.getpid(), "armed": armed, "profile_dir": str(PROFILE_DIR),
+            "recent": [path.name for path in recent]}
+
+
+def _take(target: str):
+    with _lock:
+        settings = _armed.get(target)
+        if not settings:
+            return None
+        settings["remaining"] -= 1
+        if settings["remaining"] <= 0:
+            del _armed[target]
+        return settings["top"]
+
+
+def _give_back(target: str, top: int) -> None:
+    with _lock:
+        settings = _armed.setdefault(target, {"remaining": 0, "top": top})
+        settings["remaining"] += 1
+
+
+@contextmanager
+def profiled(target: str, label: str = ""):
+    """Run the enclosed block under cProfile if `target` is armed; otherwise do nothing."""
+    if not _armed or getattr(_local, "active", False):
+        yield
+        return
+    top = _take(target)
+    if top is None:
+        yield
+        return
+
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError as e:
+        # Another profiler (e.g. a debugger or a concurrent request on 3.12+) owns the hook
+        _give_back(target, top)
+        logger.warning("Profiler for %s not started: %s", target, e)
+        yield
+        return
+    _local.active = True
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        _local.active = False
+        _write_profile(profiler, target, label, top, time.perf_counter() - started)
+
+
+def _write_profile(profiler: cProfile.Profile, target: str, label: str, top: int, elapsed: float) -> None:
+    stem = f"{target}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(_sequence)}"
+    summary = io.StringIO()
+    stats = pstats.Stats(profiler, stream=summary)
+    stats.sort_stats("cumulative").print_stats(top)
+    try:
+        PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+        stats.dump_stats(str(PROFILE_DIR / f"{stem}.pstats"))
+        (PROFILE_DIR / f"{stem}.txt").write_text(
+            f"{target} {label}".rstrip() + f" ({elapsed * 1000:.1f} ms)\n\n" + summary.getvalue(), encoding="utf-8")
+    except OSError as e:
+        logger.error("Could not write profile for %s: %s", target, e)
+        return
+    logger.info("Profiled %s %s in %.1f ms; stats written to %s.pstats", target, label, elapsed * 1000, stem)
+    logger.info("Profile summary for %s:\n%s", stem, summary.getvalue())
+    _prune_old_profiles()
+
+
+def _prune_old_profiles() -> None:
+    try:
+        files: List[Path] = sorted(
+            (path for path in PROFILE_DIR.iterdir() if path.suffix in (".pstats", ".txt")),
+            key=lambda path: path.stat().st_mtime)
+    except OSError:
+        return
+    for path in files[:max(0, len(files) - PROFILE_RETENTION_FILES)]:
+        try:
+            path.unlink()
+        except OSError:
+            pass
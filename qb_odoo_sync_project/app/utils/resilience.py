@@ -0,0 +1,229 @@
+"""
+Retry and circuit-breaker primitives for calls to remote services.
+
+``RetryPolicy`` computes exponential backoff delays with full jitter, so many
+workers retrying at once do not hit the server in lockstep. ``CircuitBreaker``
+stops calls to a service that keeps failing for availability reasons and
+lets a single probe through after a cool-down. ``AdaptiveLimiter`` bounds the
+calls in flight to a service and tunes that bound with AIMD (additive
+increase, multiplicative decrease) from observed latency and overload
+signals. All three are per process.
+"""
+import random
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict
+
+from ..logging_config import logger
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is refused because the service's circuit breaker is open."""
+
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"{name} circuit breaker is open; retrying in {retry_in:.0f}s")
+        self.name = name
+        self.retry_in = retry_in
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """Exponential backoff with full jitter: attempt n waits uniform(0, min(max_delay, base_delay * multiplier**n))."""
+
+    max_attempts: int = 4
+    base_delay: float = 0.5
+    max_delay: float = 10.0
+    multiplier: float = 2.0
+
+    def delay(self, retry_number: int) -> float:
+        """Seconds to wait before retry `retry_number` (0 for the first retry)."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * self.multiplier ** retry_number))
+
+
+class CircuitBreaker:
+    """
+    Closed: calls flow. After `failure_threshold` consecutive failures the
+    breaker opens and refuses calls for `reset_timeout` seconds, then lets one
+    probe through (half-open); the probe's outcome closes or re-opens it.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return HALF_OPEN
+            return self._state
+
+    def retry_in(self) -> float:
+        with self._lock:
+            if self._state != OPEN:
+                return 0.0
+            return max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+
+    def is_open(self) -> bool:
+        """True while calls are being refused (a half-open breaker awaiting its probe is not open)."""
+        return self.state == OPEN
+
+    def allow(self) -> bool:
+        """Whether a call may proceed now; in half-open state only one probe is admitted."""
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            if self._state == OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self._state = HALF_OPEN
+                self._probe_in_flight = False
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def check(self) -> None:
+        """Like allow(), but raises CircuitOpenError when the call is refused."""
+        if not self.allow():
+            raise CircuitOpenError(self.name, self.retry_in())
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._state != CLOSED:
+                logger.info("%s circuit breaker closed; service is responding again", self.name)
+            self._state = CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self._state == HALF_OPEN or (self._state == CLOSED and self._failures >= self.failure_threshold):
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+                logger.warning("%s circuit breaker opened after %s consecutive failure(s); "
+                               "refusing calls for %.0fs", self.name, self._failures, self.reset_timeout)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit. Each successful call adds ``1/limit`` (about +1 per
+    round of ``limit`` calls) while the recent p95 latency stays within
+    ``latency_tolerance`` times the baseline (best) p95; an overload signal
+    (timeout, 5xx, lock conflict) or a p95 above that band multiplies the limit
+    by ``backoff``, at most once per ``cooldown`` seconds.
+
+    Latency windows and baselines are kept per ``key`` (e.g. ``model.method``),
+    so a 500-row import is only compared with other imports, never with the
+    single-row writes that set a much lower baseline.
+    """
+
+    def __init__(self, name: str, initial_limit: float = 4, min_limit: int = 1, max_limit: int = 16,
+                 backoff: float = 0.7, latency_tolerance: float = 2.0, window: int = 50, cooldown: float = 1.0):
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self.cooldown = cooldown
+        self._limit = float(initial_limit)
+        self._in_flight = 0
+        self.window = window
+        self._latencies: Dict[str, deque] = {}
+        self._baselines: Dict[str, float] = {}
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        return max(self.min_limit, int(self._limit))
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def acquire(self, timeout: float = None) -> bool:
+        """Wait for a free slot; False if none freed up within `timeout` seconds."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while self._in_flight >= self.limit:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+            self._in_flight += 1
+            return True
+
+    def cancel(self) -> None:
+        """Free a slot whose call was never sent, without adjusting the limit."""
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+    def release(self, latency: float, overloaded: bool = False, key: str = "") -> None:
+        """Free a slot and adjust the limit from the call's latency (compared per `key`) and outcome."""
+        with self._condition:
+            self._in_flight -= 1
+            if overloaded:
+                self._decrease("overload signal")
+            else:
+                latencies = self._latencies.get(key)
+                if latencies is None:
+                    latencies = self._latencies[key] = deque(maxlen=self.window)
+                latencies.append(latency)
+                p95 = self._p95(latencies)
+                baseline = self._baselines.get(key)
+                if p95 is not None and baseline is not None and p95 > baseline * self.latency_tolerance:
+                    self._decrease(f"{key or 'call'} p95 {p95 * 1000:.0f}ms over baseline {baseline * 1000:.0f}ms")
+                    # Let the baseline follow a lasting slowdown so the limit does not collapse to the floor
+                    self._baselines[key] = (baseline + p95) / 2
+                else:
+                    if p95 is not None and (baseline is None or p95 < baseline):
+                        self._baselines[key] = p95
+                    self._limit = min(float(self.max_limit), self._limit + 1.0 / max(self._limit, 1.0))
+            self._condition.notify_all()
+
+    @staticmethod
+    def _p95(latencies: deque):
+        if len(latencies) < latencies.maxlen:
+            return None
+        ordered = sorted(latencies)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+    def _decrease(self, reason: str) -> None:
+        now = time.monotonic()
+        if now - self._last_decrease < self.cooldown:
+            return
+        self._last_decrease = now
+        previous = self.limit
+        self._limit = max(float(self.min_limit), self._limit * self.backoff)
+        # Latencies measured at the old concurrency no longer describe the new one
+        for latencies in self._latencies.values():
+            latencies.clear()
+        if self.limit != previous:
+            logger.info("%s concurrency limit %s -> %s (%s)", self.name, previous, self.limit, reason)
+
+    def snapshot(self):
+        with self._condition:
+            return {"limit": self.limit, "in_flight": self._in_flight,
+                    "baseline_p95_ms": {key: round(p95 * 1000, 3) for key, p95 in sorted(self._baselines.items())}}
@@ -0,0 +1,141 @@
+"""
+Odoo RPC accounting for QB Odoo Sync application.
+
+Every call made through ``_odoo_rpc_call`` is recorded here keyed by
+``(model, method)``: duration, request/response size on the wire, retries and
+the class of any fault. ``get_rpc_stats()`` returns the per-key aggregates in
+process, and the same observations feed the ``odoo_rpc_*`` metrics.
+"""
+import socket
+import threading
+import time
+import xmlrpc.client
+from collections import deque
+from typing import Any, Dict, Optional, Tuple
+
+from .metrics import ODOO_RPC_SECONDS, ODOO_RPC_ERRORS, ODOO_RPC_REQUEST_BYTES, ODOO_RPC_RESPONSE_BYTES, ODOO_RPC_RETRIES
+
+RPC_LATENCY_WINDOW = 256  # Recent durations kept per (model, method) for percentiles
+
+# Substrings of an Odoo fault string -> fault class, checked in order
+FAULT_CLASSES = (
+    ("AccessDenied", "access_denied"),
+    ("Session expired", "access_denied"),
+    ("Invalid user credentials", "access_denied"),
+    ("could not serialize access", "concurrency"),
+    ("concurrent update", "concurrency"),
+    ("deadlock detected", "concurrency"),
+    ("MissingError", "missing_record"),
+    ("AccessError", "access_error"),
+    ("ValidationError", "validation"),
+    ("UserError", "validation"),
+    ("ValueError", "validation"),
+)
+
+
+def classify_rpc_error(error: BaseException) -> str:
+    """Map an exception raised by an Odoo RPC call to a short fault class."""
+    if isinstance(error, xmlrpc.client.Fault):
+        fault_string = str(error.faultString)
+        for marker, fault_class in FAULT_CLASSES:
+            if marker in fault_string:
+                return fault_class
+        return "server_fault"
+    if isinstance(error, (socket.timeout, TimeoutError)):
+        return "timeout"
+    if isinstance(error, xmlrpc.client.ProtocolError):
+        return "server_unavailable" if error.errcode in (502, 503, 504) else "protocol"
+    if isinstance(error, ConnectionRefusedError):
+        return "connection_refused"
+    if isinstance(error, (ConnectionError, OSError)):
+        return "network"
+    return "unexpected"
+
+
+class _CallStats:
+    __slots__ = ("calls", "errors", "total_seconds", "max_seconds", "request_bytes", "response_bytes",
+                 "retries", "faults", "recent", "last_fault", "last_fault_at")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.retries = 0
+        self.faults: Dict[str, int] = {}
+        self.recent = deque(maxlen=RPC_LATENCY_WINDOW)
+        self.last_fault: Optional[str] = None
+        self.last_fault_at: Optional[float] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        recent = sorted(self.recent)
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "retries": self.retries,
+            "avg_ms": round(self.total_seconds / self.calls * 1000, 3) if self.calls else 0.0,
+            "p50_ms": round(_percentile(recent, 0.50) * 1000, 3),
+            "p95_ms": round(_percentile(recent, 0.95) * 1000, 3),
+            "max_ms": round(self.max_seconds * 1000, 3),
+            "request_bytes": self.request_bytes,
+            "response_bytes": self.response_bytes,
+            "faults": dict(self.faults),
+            "last_fault": self.last_fault,
+            "last_fault_at": self.last_fault_at,
+        }
+
+
+def _percentile(sorted_values, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+_lock = threading.Lock()
+_stats: Dict[Tuple[str, str], _CallStats] = {}
+
+
+def record_rpc_call(model: str, method: str, duration: float, request_bytes: int = 0, response_bytes: int = 0,
+                    retries: int = 0, fault_class: Optional[str] = None, fault: Optional[str] = None) -> None:
+    """Record one logical Odoo RPC call (including any retries it needed)."""
+    with _lock:
+        stats = _stats.get((model, method))
+        if stats is None:
+            stats = _stats[(model, method)] = _CallStats()
+        stats.calls += 1
+        stats.total_seconds += duration
+        stats.max_seconds = max(stats.max_seconds, duration)
+        stats.recent.append(duration)
+        stats.request_bytes += request_bytes
+        stats.response_bytes += response_bytes
+        stats.retries += retries
+        if fault_class:
+            stats.errors += 1
+            stats.faults[fault_class] = stats.faults.get(fault_class, 0) + 1
+            stats.last_fault = fault
+            stats.last_fault_at = time.time()
+
+    ODOO_RPC_SECONDS.observe(duration, model=model, method=method)
+    if request_bytes:
+        ODOO_RPC_REQUEST_BYTES.observe(request_bytes, model=model, method=method)
+    if response_bytes:
+        ODOO_RPC_RESPONSE_BYTES.observe(response_bytes, model=model, method=method)
+    if retries:
+        ODOO_RPC_RETRIES.inc(retries, model=model, method=method)
+    if fault_class:
+        ODOO_RPC_ERRORS.inc(model=model, method=method, fault=fault_class)
+
+
+def get_rpc_stats(model: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+    """Per ``model.method`` aggregates since process start (or the last reset), busiest first."""
+    with _lock:
+        items = [(key, stats.as_dict()) for key, stats in _stats.items() if model is None or key[0] == model]
+    items.sort(key=lambda item: -item[1]["avg_ms"] * item[1]["calls"])
+    return {f"{model_name}.{method}": stats for (model_name, method), stats in items}
+
+
+def reset_rpc_stats() -> None:
+    with _lock:
+        _stats.clear()
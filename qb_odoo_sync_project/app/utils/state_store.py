@@ -0,0 +1,304 @@
+"""
+Shared state store for QB Odoo Sync application.
+
+Keeps QBWC session state in a SQLite database instead of a process-global dict
+so that several worker threads or processes (e.g. under a production WSGI
+server) can serve QBWC clients concurrently. Each ticket is guarded by an
+in-process lock plus a short-lived lease row so that two workers never mutate
+the same session at the same time.
+
+A session is stored as one header row (cursor, errors, metadata) plus one row
+per task, and only the parts that changed since the last load are rewritten,
+so a QBWC round trip that advances one iterator writes a single small row
+instead of the whole session.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from ..logging_config import logger
+from .data_loader import DATA_DIR
+
+# Database file shared by every worker serving this project
+STATE_DB_PATH = os.getenv("QB_SYNC_STATE_DB", str(DATA_DIR / "qb_sync_state.db"))
+
+SQLITE_BUSY_TIMEOUT_SECONDS = 30
+LOCK_TIMEOUT_SECONDS = 60      # How long a request waits for another worker to release a ticket
+LOCK_LEASE_SECONDS = 300       # A crashed worker's lease expires after this long
+LOCK_RENEW_INTERVAL_SECONDS = LOCK_LEASE_SECONDS / 3  # A live holder extends its lease this often
+LOCK_POLL_INTERVAL_SECONDS = 0.05
+COMPACT_EVERY_WRITES = 500     # Run compaction after this many session writes
+STALE_SESSION_SECONDS = 48 * 3600  # Sessions untouched this long are considered abandoned
+
+_local = threading.local()
+
+
+class SessionLockTimeout(Exception):
+    """Raised when a ticket stays locked by another worker for too long."""
+
+
+def connect() -> sqlite3.Connection:
+    """
+    Return this thread's connection to the state database.
+
+    SQLite connections must not be shared between threads, so one connection
+    is opened lazily per thread and reused for the rest of its life.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        os.makedirs(os.path.dirname(STATE_DB_PATH) or ".", exist_ok=True)
+        conn = sqlite3.connect(STATE_DB_PATH, timeout=SQLITE_BUSY_TIMEOUT_SECONDS, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        _local.conn = conn
+    return conn
+
+
+@contextmanager
+def transaction() -> Iterator[sqlite3.Connection]:
+    """Run the enclosed statements in a single write transaction."""
+    conn = connect()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    else:
+        conn.execute("COMMIT")
+
+
+class SessionStore:
+    """SQLite-backed store for QBWC session state, keyed by ticket."""
+
+    def __init__(self):
+        self._schema_ready = False
+        self._schema_lock = threading.Lock()
+        self._ticket_locks: Dict[str, threading.Lock] = {}
+        self._ticket_locks_guard = threading.Lock()
+        # Serialized header/tasks as last read or written, per ticket. Callers
+        # hold the ticket lock between get() and put(), so the snapshot always
+        # reflects what is in the database when put() diffs against it.
+        self._snapshots: Dict[str, Dict[str, Any]] = {}
+        self._writes_since_compaction = 0
+
+    def _ensure_schema(self) -> sqlite3.Connection:
+        conn = connect()
+        if self._schema_ready:
+            return conn
+        with self._schema_lock:
+            if not self._schema_ready:
+                conn.executescript(
+                    """
+                    CREATE TABLE IF NOT EXISTS qbwc_session_headers (
+                        ticket TEXT PRIMARY KEY,
+                        header_json TEXT NOT NULL,
+                        updated_at REAL NOT NULL
+                    );
+                    CREATE TABLE IF NOT EXISTS qbwc_session_tasks (
+                        ticket TEXT NOT NULL,
+                        task_index INTEGER NOT NULL,
+                        task_json TEXT NOT NULL,
+                        PRIMARY KEY (ticket, task_index)
+                    );
+                    CREATE TABLE IF NOT EXISTS qbwc_session_locks (
+                        ticket TEXT PRIMARY KEY,
+                        owner TEXT NOT NULL,
+                        expires_at REAL NOT NULL
+                    );
+                    """
+                )
+                self._schema_ready = True
+        return conn
+
+    def get(self, ticket: str) -> Optional[Dict[str, Any]]:
+        """Load the session state for a ticket, or None if the ticket is unknown."""
+        if not ticket:
+            return None
+        conn = self._ensure_schema()
+        row = conn.execute("SELECT header_json FROM qbwc_session_headers WHERE ticket = ?", (ticket,)).fetchone()
+        if row is None:
+            self._snapshots.pop(ticket, None)
+            return None
+        task_rows = conn.execute(
+            "SELECT task_json FROM qbwc_session_tasks WHERE ticket = ? ORDER BY task_index", (ticket,)
+        ).fetchall()
+        self._snapshots[ticket] = {"header": row[0], "tasks": [task_row[0] for task_row in task_rows]}
+        session_data = json.loads(row[0])
+        session_data["task_queue"] = [json.loads(task_row[0]) for task_row in task_rows]
+        return session_data
+
+    def put(self, ticket: str, session_data: Dict[str, Any]) -> None:
+        """
+        Persist the parts of a session that changed since it was last loaded.
+
+        All changed rows are written in one transaction, so a crash leaves
+        either the previous or the new state, never a mix of both.
+        """
+        self._ensure_schema()
+        header = {k: v for k, v in session_data.items() if k != "task_queue"}
+        header_json = json.dumps(header, default=str, sort_keys=True)
+        task_jsons = [json.dumps(task, default=str, sort_keys=True) for task in session_data.get("task_queue", [])]
+
+        snapshot = self._snapshots.get(ticket)
+        old_header = snapshot["header"] if snapshot else None
+        old_tasks = snapshot["tasks"] if snapshot else []
+        changed_tasks = [
+            (ticket, index, task_json)
+            for index, task_json in enumerate(task_jsons)
+            if index >= len(old_tasks) or old_tasks[index] != task_json
+        ]
+        if snapshot and header_json == old_header and not changed_tasks and len(task_jsons) == len(old_tasks):
+            return  # Nothing changed; skip the write entirely
+
+        with transaction() as conn:
+            conn.execute(
+                "INSERT INTO qbwc_session_headers (ticket, header_json, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(ticket) DO UPDATE SET header_json = excluded.header_json, updated_at = excluded.updated_at",
+                (ticket, header_json, time.time()),
+            )
+            if changed_tasks:
+                conn.executemany(
+                    "INSERT INTO qbwc_session_tasks (ticket, task_index, task_json) VALUES (?, ?, ?) "
+                    "ON CONFLICT(ticket, task_index) DO UPDATE SET task_json = excluded.task_json",
+                    changed_tasks,
+                )
+            if snapshot is None or len(task_jsons) < len(old_tasks):
+                conn.execute(
+                    "DELETE FROM qbwc_session_tasks WHERE ticket = ? AND task_index >= ?", (ticket, len(task_jsons))
+                )
+        self._snapshots[ticket] = {"header": header_json, "tasks": task_jsons}
+        self._maybe_compact()
+
+    def delete(self, ticket: str) -> None:
+        """Remove a ticket's session state."""
+        self._ensure_schema()
+        with transaction() as conn:
+            conn.execute("DELETE FROM qbwc_session_tasks WHERE ticket = ?", (ticket,))
+            conn.execute("DELETE FROM qbwc_session_headers WHERE ticket = ?", (ticket,))
+        self._snapshots.pop(ticket, None)
+
+    def tickets(self) -> List[str]:
+        """List the tickets that currently have session state."""
+        conn = self._ensure_schema()
+        return [row[0] for row in conn.execute("SELECT ticket FROM qbwc_session_headers ORDER BY updated_at")]
+
+    def _maybe_compact(self) -> None:
+        self._writes_since_compaction += 1
+        if self._writes_since_compaction >= COMPACT_EVERY_WRITES:
+            self._writes_since_compaction = 0
+            try:
+                self.compact()
+            except sqlite3.Error as e:
+                logger.warning("Session store compaction failed: %s", e)
+
+    def compact(self, max_age_seconds: float = STALE_SESSION_SECONDS) -> int:
+        """
+        Drop abandoned sessions and expired lock leases, then fold the WAL back
+        into the main database file.
+
+        Returns:
+            Number of abandoned sessions removed.
+        """
+        self._ensure_schema()
+        cutoff = time.time() - max_age_seconds
+        with transaction() as conn:
+            stale = [row[0] for row in conn.execute(
+                "SELECT ticket FROM qbwc_session_headers WHERE updated_at < ?", (cutoff,)
+            )]
+            conn.executemany("DELETE FROM qbwc_session_tasks WHERE ticket = ?", [(t,) for t in stale])
+            conn.executemany("DELETE FROM qbwc_session_headers WHERE ticket = ?", [(t,) for t in stale])
+            conn.execute("DELETE FROM qbwc_session_locks WHERE expires_at < ?", (time.time(),))
+        # Also forget snapshots of tickets another worker closed or dropped
+        live = set(self.tickets())
+        for ticket in list(self._snapshots):
+            if ticket not in live:
+                self._snapshots.pop(ticket, None)
+        connect().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        if stale:
+            logger.info("Session store compaction removed %s abandoned session(s)", len(stale))
+        return len(stale)
+
+    def _local_lock(self, ticket: str) -> threading.Lock:
+        with self._ticket_locks_guard:
+            lock = self._ticket_locks.get(ticket)
+            if lock is None:
+                lock = self._ticket_locks[ticket] = threading.Lock()
+            return lock
+
+    def _try_acquire_lease(self, ticket: str, owner: str) -> bool:
+        conn = self._ensure_schema()
+        now = time.time()
+        cursor = conn.execute(
+            "INSERT INTO qbwc_session_locks (ticket, owner, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(ticket) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+            "WHERE qbwc_session_locks.expires_at < ?",
+            (ticket, owner, now + LOCK_LEASE_SECONDS, now),
+        )
+        return cursor.rowcount == 1
+
+    def _renew_lease(self, ticket: str, owner: str) -> bool:
+        conn = self._ensure_schema()
+        cursor = conn.execute(
+            "UPDATE qbwc_session_locks SET expires_at = ? WHERE ticket = ? AND owner = ?",
+            (time.time() + LOCK_LEASE_SECONDS, ticket, owner),
+        )
+        return cursor.rowcount == 1
+
+    def _keep_lease(self, ticket: str, owner: str, released: threading.Event) -> None:
+        """Extend a held lease until the lock is released, so long requests never lose it."""
+        while not released.wait(LOCK_RENEW_INTERVAL_SECONDS):
+            try:
+                if not self._renew_lease(ticket, owner):
+                    logger.error("Lease on ticket %s was lost while held by %s", ticket, owner)
+                    return
+            except sqlite3.Error as e:
+                logger.warning("Failed to renew the lease on ticket %s: %s", ticket, e)
+
+    def _release_lease(self, ticket: str, owner: str) -> None:
+        conn = self._ensure_schema()
+        conn.execute("DELETE FROM qbwc_session_locks WHERE ticket = ? AND owner = ?", (ticket, owner))
+
+    @contextmanager
+    def lock(self, ticket: str, timeout: float = LOCK_TIMEOUT_SECONDS) -> Iterator[None]:
+        """
+        Hold exclusive access to a ticket's session state.
+
+        The in-process lock serializes threads of this worker; the lease row
+        serializes separate worker processes sharing the same database. The
+        lease is renewed in the background for as long as the lock is held, so
+        it only expires when the holding worker has died.
+
+        Raises:
+            SessionLockTimeout: If the ticket could not be locked within ``timeout``.
+        """
+        deadline = time.monotonic() + timeout
+        local_lock = self._local_lock(ticket)
+        if not local_lock.acquire(timeout=timeout):
+            raise SessionLockTimeout(f"Ticket {ticket} is busy in this worker")
+        owner = f"{os.getpid()}:{threading.get_ident()}"
+        try:
+            while not self._try_acquire_lease(ticket, owner):
+                if time.monotonic() >= deadline:
+                    raise SessionLockTimeout(f"Ticket {ticket} is locked by another worker")
+                time.sleep(LOCK_POLL_INTERVAL_SECONDS)
+            released = threading.Event()
+            renewer = threading.Thread(target=self._keep_lease, args=(ticket, owner, released),
+                                       name=f"lease-{ticket}", daemon=True)
+            renewer.start()
+            try:
+                yield
+            finally:
+                released.set()
+                renewer.join()
+                self._release_lease(ticket, owner)
+        finally:
+            local_lock.release()
+
+
+# Shared instance used by the QBWC service
+session_store = SessionStore()
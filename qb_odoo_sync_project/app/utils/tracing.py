@@ -0,0 +1,190 @@
+"""
+Lightweight trace spans for QBWC sessions.
+
+Each SOAP call of a session collects timed spans (parse, extract, per-record
+push, Odoo lookup/write/post RPCs, state persistence) in memory. At the end of
+the call they are appended to ``logs/traces/<ticket>.trace.json`` in the Chrome
+Trace Event format, which chrome://tracing and https://ui.perfetto.dev open
+directly. When the session closes, the file is summarized per span category
+and per span name. Spans nest (a record push contains its lookup and write
+RPCs), so category totals count self time, i.e. time not spent in a child
+span, and add up to the round-trip time.
+
+Spans opened outside a traced SOAP call (or with tracing disabled) are no-ops.
+"""
+import json
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from ..logging_config import logger, LOG_DIR
+
+TRACING_ENABLED = os.getenv("QB_SYNC_TRACING", "1") == "1"
+TRACE_DIR = Path(os.getenv("QB_SYNC_TRACE_DIR", str(LOG_DIR / "traces")))
+TRACE_RETENTION_FILES = 200  # Oldest trace/summary files beyond this are removed at session close
+
+_local = threading.local()
+_write_lock = threading.Lock()
+
+
+def _trace_path(ticket: str, suffix: str) -> Path:
+    return TRACE_DIR / f"{re.sub(r'[^A-Za-z0-9_.-]', '_', ticket)}.{suffix}"
+
+
+@contextmanager
+def span(name: str, category: str = "app", **args) -> Iterator[Dict[str, Any]]:
+    """
+    Time the enclosed block as a span of the current trace.
+
+    Yields the span's args dict so callers can attach details discovered
+    inside the block.
+    """
+    events = getattr(_local, "events", None)
+    if events is None:
+        yield args
+        return
+    ts = time.time_ns() // 1000
+    started = time.perf_counter()
+    try:
+        yield args
+    finally:
+        events.append({
+            "name": name, "cat": category, "ph": "X", "ts": ts,
+            "dur": round((time.perf_counter() - started) * 1_000_000),
+            "pid": os.getpid(), "tid": threading.get_ident(), "args": args,
+        })
+
+
+@contextmanager
+def trace_round_trip(ticket: Optional[str], name: str, **args) -> Iterator[Dict[str, Any]]:
+    """Collect the spans of one SOAP call and append them to the session's trace file."""
+    if not TRACING_ENABLED or not ticket or getattr(_local, "events", None) is not None:
+        yield args
+        return
+    _local.events = []
+    try:
+        with span(name, "round_trip", **args) as round_trip_args:
+            yield round_trip_args
+    finally:
+        events, _local.events = _local.events, None
+        _append_events(ticket, events)
+
+
+def _append_events(ticket: str, events: List[Dict[str, Any]]) -> None:
+    # JSON Array Format: the closing bracket is optional, so every worker can
+    # simply append its events to the same file
+    try:
+        TRACE_DIR.mkdir(parents=True, exist_ok=True)
+        path = _trace_path(ticket, "trace.json")
+        lines = "".join(json.dumps(event, default=str) + ",\n" for event in events)
+        with _write_lock:
+            with open(path, "a", encoding="utf-8") as f:
+                if f.tell() == 0:
+                    f.write("[\n")
+                f.write(lines)
+    except OSError as e:
+        logger.warning("Could not write trace events for %s: %s", ticket, e)
+
+
+def _load_events(ticket: str) -> List[Dict[str, Any]]:
+    path = _trace_path(ticket, "trace.json")
+    if not path.exists():
+        return []
+    text = path.read_text(encoding="utf-8").strip().rstrip(",")
+    if not text.endswith("]"):
+        text += "]"
+    return json.loads(text)
+
+
+def summarize_session(ticket: str) -> Optional[Dict[str, Any]]:
+    """
+    Aggregate a session's trace by span category and by span name, write it
+    next to the trace as ``<ticket>.summary.json`` and return it.
+    """
+    if not TRACING_ENABLED:
+        return None
+    try:
+        events = _load_events(ticket)
+    except (OSError, ValueError) as e:
+        logger.warning("Could not read trace for %s: %s", ticket, e)
+        return None
+    if not events:
+        return None
+
+    self_us = _self_times(events)
+    by_category = defaultdict(lambda: {"count": 0, "self_ms": 0.0})
+    by_name = defaultdict(lambda: {"count": 0, "total_ms": 0.0, "self_ms": 0.0, "max_ms": 0.0})
+    round_trips, round_trip_ms = 0, 0.0
+    for index, event in enumerate(events):
+        duration_ms = event.get("dur", 0) / 1000.0
+        if event.get("cat") == "round_trip":
+            round_trips += 1
+            round_trip_ms += duration_ms
+        category = by_category[event.get("cat", "app")]
+        category["count"] += 1
+        category["self_ms"] += self_us[index] / 1000.0
+        named = by_name[f"{event.get('cat', 'app')}:{event.get('name')}"]
+        named["count"] += 1
+        named["total_ms"] += duration_ms
+        named["self_ms"] += self_us[index] / 1000.0
+        named["max_ms"] = max(named["max_ms"], duration_ms)
+
+    summary = {
+        "ticket": ticket,
+        "round_trips": round_trips,
+        "round_trip_ms": round(round_trip_ms, 3),
+        "by_category": {
+            name: {"count": stats["count"], "self_ms": round(stats["self_ms"], 3)}
+            for name, stats in sorted(by_category.items(), key=lambda item: -item[1]["self_ms"])
+        },
+        "top_spans": [
+            {"span": name, "count": stats["count"], "total_ms": round(stats["total_ms"], 3),
+             "self_ms": round(stats["self_ms"], 3),
+             "avg_ms": round(stats["total_ms"] / stats["count"], 3), "max_ms": round(stats["max_ms"], 3)}
+            for name, stats in sorted(by_name.items(), key=lambda item: -item[1]["total_ms"])[:20]
+            if not name.startswith("round_trip:")
+        ],
+    }
+    try:
+        _trace_path(ticket, "summary.json").write_text(json.dumps(summary, indent=2), encoding="utf-8")
+    except OSError as e:
+        logger.warning("Could not write trace summary for %s: %s", ticket, e)
+    _prune_old_traces()
+    return summary
+
+
+def _self_times(events: List[Dict[str, Any]]) -> List[float]:
+    """Each event's duration minus that of its direct children (spans of the same thread nested inside it)."""
+    self_us = [float(event.get("dur", 0)) for event in events]
+    by_thread = defaultdict(list)
+    for index, event in enumerate(events):
+        by_thread[(event.get("pid"), event.get("tid"))].append(index)
+    for indexes in by_thread.values():
+        # Parents start first; of two spans starting together the longer one is the parent
+        indexes.sort(key=lambda index: (events[index].get("ts", 0), -events[index].get("dur", 0)))
+        open_spans: List[int] = []
+        for index in indexes:
+            start = events[index].get("ts", 0)
+            while open_spans and events[open_spans[-1]].get("ts", 0) + events[open_spans[-1]].get("dur", 0) <= start:
+                open_spans.pop()
+            if open_spans:
+                self_us[open_spans[-1]] -= events[index].get("dur", 0)
+            open_spans.append(index)
+    return [max(0.0, value) for value in self_us]
+
+
+def _prune_old_traces() -> None:
+    try:
+        files = sorted(TRACE_DIR.glob("*.json"), key=lambda path: path.stat().st_mtime)
+    except OSError:
+        return
+    for path in files[:max(0, len(files) - TRACE_RETENTION_FILES)]:
+        try:
+            path.unlink()
+        except OSError:
+            pass
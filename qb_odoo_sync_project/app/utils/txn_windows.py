@@ -0,0 +1,267 @@
+"""
+Date-window sharding of historical transaction queries.
+
+A single InvoiceQuery iterator over all of history is fragile: QBWC iterators
+do not survive the session, so when one dies half-way the next session starts
+again from the first invoice. With windowed backfill enabled, each transaction
+entity of a company file is instead queried in TxnDateRangeFilter windows that
+are tracked in the shared state database:
+
+- the backfill covers TXN_HISTORY_START up to the day before it started;
+- a window is planned from the end of the last one, sized so it should hold
+  about TXN_WINDOW_TARGET_RECORDS records given the density observed in the
+  entity's most recently completed window;
+- a session takes at most TXN_WINDOWS_PER_SESSION windows per entity, oldest
+  unfinished first, so a failed window costs only itself;
+- a window counts an attempt when a session starts querying it; one still
+  unfinished after TXN_WINDOW_SPLIT_AFTER attempts is split in half (down to
+  TXN_WINDOW_MIN_DAYS), and a minimal one still unfinished after
+  TXN_WINDOW_MAX_ATTEMPTS attempts is parked until an admin retries it;
+- a window is marked done once all of its pages were pushed and is never
+  queried again.
+
+Once history is covered no more windows are planned. The entity is then
+queried with a ModifiedDateRangeFilter from a per-entity cursor, starting at
+the day the backfill began, so new transactions and edits to old ones are
+both picked up; the cursor moves to the session's day (less one day, which
+absorbs clock and time zone differences with the QuickBooks host) each time
+that query completes.
+"""
+import os
+import threading
+import time
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from ..logging_config import logger
+from .state_store import connect, transaction
+
+TXN_WINDOWS_ENABLED = os.getenv("QB_SYNC_TXN_WINDOWS", "").lower() in ("1", "true", "yes")
+TXN_HISTORY_START = os.getenv("QB_SYNC_HISTORY_START", "2000-01-01")  # TxnDate the first window starts at
+TXN_WINDOWS_PER_SESSION = int(os.getenv("QB_SYNC_TXN_WINDOWS_PER_SESSION", "4"))
+TXN_WINDOW_TARGET_RECORDS = 500  # Records a window is sized to hold (ten 50-record pages)
+TXN_WINDOW_INITIAL_DAYS = 90
+TXN_WINDOW_MIN_DAYS = 7
+TXN_WINDOW_MAX_DAYS = 366
+TXN_WINDOW_SPLIT_AFTER = 2  # A window still unfinished after this many attempts is split in half
+TXN_WINDOW_MAX_ATTEMPTS = 6  # A minimal window still unfinished after this many attempts is parked
+
+# (FromTxnDate, ToTxnDate) as ISO dates
+Window = Tuple[str, str]
+
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+
+def _ensure_schema():
+    global _schema_ready
+    conn = connect()
+    if _schema_ready:
+        return conn
+    with _schema_lock:
+        if not _schema_ready:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS txn_windows (
+                    company_file TEXT NOT NULL,
+                    entity TEXT NOT NULL,
+                    from_date TEXT NOT NULL,
+                    to_date TEXT NOT NULL,
+                    done INTEGER NOT NULL DEFAULT 0,
+                    records INTEGER,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (company_file, entity, from_date)
+                )
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS txn_backfills (
+                    company_file TEXT NOT NULL,
+                    entity TEXT NOT NULL,
+                    history_end TEXT NOT NULL,
+                    modified_since TEXT NOT NULL,
+                    PRIMARY KEY (company_file, entity)
+                )
+                """
+            )
+            _schema_ready = True
+    return conn
+
+
+def _days(from_date: str, to_date: str) -> int:
+    return (date.fromisoformat(to_date) - date.fromisoformat(from_date)).days + 1
+
+
+def _history_end(conn, company_file: str, entity: str) -> date:
+    """Last TxnDate the backfill covers, fixed (with the initial cursor) when it starts."""
+    row = conn.execute("SELECT history_end FROM txn_backfills WHERE company_file = ? AND entity = ?",
+                       (company_file, entity)).fetchone()
+    if row:
+        return date.fromisoformat(row[0])
+    history_end = date.today() - timedelta(days=1)
+    conn.execute("INSERT INTO txn_backfills (company_file, entity, history_end, modified_since) VALUES (?, ?, ?, ?)",
+                 (company_file, entity, history_end.isoformat(), history_end.isoformat()))
+    return history_end
+
+
+def _window_days(conn, company_file: str, entity: str) -> int:
+    """Days the next window should span, from the density of the entity's last completed window."""
+    row = conn.execute(
+        "SELECT from_date, to_date, records FROM txn_windows WHERE company_file = ? AND entity = ? AND done = 1 "
+        "ORDER BY from_date DESC LIMIT 1", (company_file, entity),
+    ).fetchone()
+    if not row:
+        return TXN_WINDOW_INITIAL_DAYS
+    from_date, to_date, records = row
+    if not records:
+        return TXN_WINDOW_MAX_DAYS
+    days = _days(from_date, to_date)
+    return max(TXN_WINDOW_MIN_DAYS, min(TXN_WINDOW_MAX_DAYS, days * TXN_WINDOW_TARGET_RECORDS // records))
+
+
+def _split_window(conn, company_file: str, entity: str, from_date: str, to_date: str) -> List[Window]:
+    """Replace an unfinished window by its two halves, each with a fresh attempt count."""
+    middle = date.fromisoformat(from_date) + timedelta(days=_days(from_date, to_date) // 2 - 1)
+    second_half = (middle + timedelta(days=1)).isoformat()
+    conn.execute("UPDATE txn_windows SET to_date = ?, attempts = 0, updated_at = ? "
+                 "WHERE company_file = ? AND entity = ? AND from_date = ?",
+                 (middle.isoformat(), time.time(), company_file, entity, from_date))
+    conn.execute("INSERT INTO txn_windows (company_file, entity, from_date, to_date, updated_at) VALUES (?, ?, ?, ?, ?)",
+                 (company_file, entity, second_half, to_date, time.time()))
+    logger.warning("%s window %s..%s keeps failing; split at %s", entity, from_date, to_date, middle.isoformat())
+    return [(from_date, middle.isoformat()), (second_half, to_date)]
+
+
+def schedule_windows(company_file: str, entity: str, limit: int = TXN_WINDOWS_PER_SESSION) -> List[Window]:
+    """
+    Windows of `entity` to query in this session: unfinished ones first (split
+    when they keep failing, parked ones skipped), then newly planned ones until
+    history is covered.
+    """
+    _ensure_schema()
+    windows: List[Window] = []
+    with transaction() as conn:
+        history_end = _history_end(conn, company_file, entity)
+        unfinished = conn.execute(
+            "SELECT from_date, to_date, attempts FROM txn_windows "
+            "WHERE company_file = ? AND entity = ? AND done = 0 AND attempts < ? ORDER BY from_date",
+            (company_file, entity, TXN_WINDOW_MAX_ATTEMPTS),
+        ).fetchall()
+        for from_date, to_date, attempts in unfinished:
+            if len(windows) >= limit:
+                break
+            if attempts >= TXN_WINDOW_SPLIT_AFTER and _days(from_date, to_date) > TXN_WINDOW_MIN_DAYS:
+                windows.extend(_split_window(conn, company_file, entity, from_date, to_date))
+            else:
+                windows.append((from_date, to_date))
+        windows = windows[:limit]
+
+        row = conn.execute("SELECT MAX(to_date) FROM txn_windows WHERE company_file = ? AND entity = ?",
+                           (company_file, entity)).fetchone()
+        frontier = date.fromisoformat(row[0]) + timedelta(days=1) if row[0] else date.fromisoformat(TXN_HISTORY_START)
+        days = _window_days(conn, company_file, entity)
+        while len(windows) < limit and frontier <= history_end:
+            window_end = min(frontier + timedelta(days=days - 1), history_end)
+            conn.execute(
+                "INSERT INTO txn_windows (company_file, entity, from_date, to_date, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (company_file, entity, frontier.isoformat(), window_end.isoformat(), time.time()),
+            )
+            windows.append((frontier.isoformat(), window_end.isoformat()))
+            frontier = window_end + timedelta(days=1)
+        parked = conn.execute(
+            "SELECT COUNT(*) FROM txn_windows WHERE company_file = ? AND entity = ? AND done = 0 AND attempts >= ?",
+            (company_file, entity, TXN_WINDOW_MAX_ATTEMPTS),
+        ).fetchone()[0]
+    if parked:
+        logger.warning("%s %s window(s) parked after %s unfinished attempts; "
+                       "POST /admin/txn-windows/retry to query them again", parked, entity, TXN_WINDOW_MAX_ATTEMPTS)
+    return windows
+
+
+def modified_since(company_file: str, entity: str) -> Optional[str]:
+    """
+    Date from which `entity` is queried by ModifiedDateRangeFilter once every
+    window up to the backfill's history end is done or parked; None while the
+    backfill is still running.
+    """
+    conn = _ensure_schema()
+    row = conn.execute("SELECT history_end, modified_since FROM txn_backfills WHERE company_file = ? AND entity = ?",
+                       (company_file, entity)).fetchone()
+    if not row:
+        return None
+    history_end, since = row
+    frontier, unfinished = conn.execute(
+        "SELECT MAX(to_date), COALESCE(SUM(done = 0 AND attempts < ?), 0) FROM txn_windows "
+        "WHERE company_file = ? AND entity = ?", (TXN_WINDOW_MAX_ATTEMPTS, company_file, entity),
+    ).fetchone()
+    covered_through = frontier or (date.fromisoformat(TXN_HISTORY_START) - timedelta(days=1)).isoformat()
+    if unfinished or covered_through < history_end:
+        return None
+    return since
+
+
+def mark_window_started(company_file: str, entity: str, window: Window) -> None:
+    """Count an attempt at a window, when a session sends its first query."""
+    try:
+        conn = _ensure_schema()
+        conn.execute(
+            "UPDATE txn_windows SET attempts = attempts + 1, updated_at = ? "
+            "WHERE company_file = ? AND entity = ? AND from_date = ?",
+            (time.time(), company_file, entity, window[0]),
+        )
+    except Exception as e:
+        # The window just gets one more try before it is split or parked
+        logger.error("Failed to count an attempt at %s window %s..%s: %s", entity, window[0], window[1], e)
+
+
+def mark_window_done(company_file: str, entity: str, window: Window, records: int) -> None:
+    """Record that every page of a window was pushed."""
+    from_date, to_date = window
+    try:
+        conn = _ensure_schema()
+        conn.execute(
+            "UPDATE txn_windows SET done = 1, records = ?, updated_at = ? "
+            "WHERE company_file = ? AND entity = ? AND from_date = ?",
+            (records, time.time(), company_file, entity, from_date),
+        )
+        logger.info("%s window %s..%s complete (%s record(s))", entity, from_date, to_date, records)
+    except Exception as e:
+        # The window is simply queried again next session
+        logger.error("Failed to mark %s window %s..%s done: %s", entity, from_date, to_date, e)
+
+
+def mark_modified_synced(company_file: str, entity: str, since: str) -> None:
+    """Move the entity's ModifiedDateRangeFilter cursor once a query from the previous cursor completed."""
+    try:
+        conn = _ensure_schema()
+        conn.execute("UPDATE txn_backfills SET modified_since = ? WHERE company_file = ? AND entity = ?",
+                     (since, company_file, entity))
+    except Exception as e:
+        # The same modifications are simply queried again next session
+        logger.error("Failed to advance the %s modified-date cursor to %s: %s", entity, since, e)
+
+
+def retry_parked(entity: Optional[str] = None) -> int:
+    """Give parked windows (for one entity or all) a fresh attempt count. Returns how many were retried."""
+    conn = _ensure_schema()
+    sql = "UPDATE txn_windows SET attempts = 0, updated_at = ? WHERE done = 0 AND attempts >= ?"
+    params = [time.time(), TXN_WINDOW_MAX_ATTEMPTS]
+    if entity:
+        sql += " AND entity = ?"
+        params.append(entity)
+    return conn.execute(sql, params).rowcount
+
+
+def clear_windows(entity: Optional[str] = None) -> Dict[str, int]:
+    """
+    Forget window progress and the modified-date cursor (for one entity or
+    all), restarting the backfill from TXN_HISTORY_START.
+    """
+    _ensure_schema()
+    where, params = (" WHERE entity = ?", (entity,)) if entity else ("", ())
+    with transaction() as conn:
+        windows = conn.execute(f"DELETE FROM txn_windows{where}", params).rowcount
+        backfills = conn.execute(f"DELETE FROM txn_backfills{where}", params).rowcount
+    return {"windows": windows, "backfills": backfills}
@@ -0,0 +1,169 @@
+"""
+Benchmark the XML-RPC and JSON-RPC Odoo transports.
+
+Measures, for payloads shaped like the sync's real traffic (an invoice create
+with many lines, a partner create, a partner search_read page):
+
+- encode/decode CPU time and body size for each wire format, and
+- full client round trips through ``app.services.odoo_transport`` against a
+  local stub server that answers both endpoints with a canned result,
+  gzip-compressing large responses like a hosted Odoo's proxy does.
+
+Usage (from qb_odoo_sync_project/):
+    python benchmarks/bench_odoo_transport.py [--rounds 200] [--lines 40]
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import xmlrpc.client
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Importing the app package sets up its file logging; keep benchmark runs out of the tracked logs/
+os.environ.setdefault("QB_SYNC_LOG_DIR", tempfile.mkdtemp(prefix="qb_sync_bench_"))
+
+from app.services.odoo_transport import new_transport  # noqa: E402
+
+
+def invoice_payload(lines: int):
+    vals = {
+        "move_type": "out_invoice", "partner_id": 1234, "invoice_date": "2024-03-15",
+        "invoice_date_due": "2024-04-14", "ref": "INV-10482", "x_qb_txn_id": "1A2B3C-1700000000",
+        "journal_id": 1, "narration": "Imported from QuickBooks",
+        "invoice_line_ids": [
+            (0, 0, {"product_id": 5000 + i, "name": f"Line item {i} - Speaker cable 25ft, black",
+                    "quantity": 2.0 + i, "price_unit": 19.95 + i, "account_id": 400,
+                    "tax_ids": [(6, 0, [1])]})
+            for i in range(lines)
+        ],
+    }
+    return "account.move", "create", [[vals]], {}
+
+
+def partner_payload():
+    vals = {"name": "Sound Decision Customer, LLC", "ref": "80000001-1234567890", "customer_rank": 1,
+            "email": "ap@example.com", "phone": "555-0100", "street": "100 Main St", "city": "Springfield",
+            "zip": "12345", "is_company": True, "comment": "Imported from QuickBooks"}
+    return "res.partner", "create", [[vals]], {}
+
+
+def search_read_result(rows: int):
+    return [{"id": i, "name": f"Customer {i}", "ref": f"8000{i:04d}-1234567890", "email": f"c{i}@example.com",
+             "customer_rank": 1, "active": True, "parent_id": False} for i in range(rows)]
+
+
+def _execute_kw_args(model, method, args, kwargs):
+    return ("db", 2, "api-key", model, method, args, kwargs)
+
+
+def _xml_request(params):
+    return xmlrpc.client.dumps(params, "execute_kw", allow_none=True).encode("utf-8")
+
+
+def _json_request(params):
+    return json.dumps({"jsonrpc": "2.0", "method": "call", "id": 1,
+                       "params": {"service": "object", "method": "execute_kw", "args": list(params)}}).encode("utf-8")
+
+
+def _time(fn, rounds):
+    started = time.process_time()
+    for _ in range(rounds):
+        fn()
+    return (time.process_time() - started) / rounds * 1000
+
+
+def bench_encoding(name, params, result, rounds):
+    xml_req, json_req = _xml_request(params), _json_request(params)
+    xml_resp = xmlrpc.client.dumps((result,), methodresponse=True, allow_none=True).encode("utf-8")
+    json_resp = json.dumps({"jsonrpc": "2.0", "id": 1, "result": result}).encode("utf-8")
+    rows = [
+        ("xmlrpc", len(xml_req), len(xml_resp),
+         _time(lambda: _xml_request(params), rounds), _time(lambda: xmlrpc.client.loads(xml_resp), rounds)),
+        ("jsonrpc", len(json_req), len(json_resp),
+         _time(lambda: _json_request(params), rounds), _time(lambda: json.loads(json_resp), rounds)),
+    ]
+    print(f"\n{name}")
+    print(f"  {'protocol':<8} {'req bytes':>10} {'resp bytes':>11} {'encode ms':>10} {'decode ms':>10}")
+    for protocol, req, resp, enc, dec in rows:
+        print(f"  {protocol:<8} {req:>10} {resp:>11} {enc:>10.3f} {dec:>10.3f}")
+
+
+GZIP_MIN_BYTES = 1024  # Smallest response the stub compresses
+
+
+class _StubOdoo(BaseHTTPRequestHandler):
+    result = None
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path == "/jsonrpc":
+            body = json.dumps({"jsonrpc": "2.0", "id": 1, "result": self.result}).encode("utf-8")
+            content_type = "application/json"
+        else:
+            body = xmlrpc.client.dumps((self.result,), methodresponse=True, allow_none=True).encode("utf-8")
+            content_type = "text/xml"
+        compress = len(body) > GZIP_MIN_BYTES and "gzip" in self.headers.get("Accept-Encoding", "")
+        if compress:
+            body = gzip.compress(body, compresslevel=5)
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        if compress:
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def bench_round_trips(name, params, result, rounds):
+    _StubOdoo.result = result
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubOdoo)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        print(f"\n{name}: {rounds} round trips against a local stub")
+        # CPU time covers the whole process, so it includes the stub server's encoding
+        print(f"  {'protocol':<8} {'wall ms':>9} {'process cpu ms':>14} {'wire bytes':>11}")
+        for protocol in ("xmlrpc", "jsonrpc"):
+            wire = 0
+            wall, cpu = time.perf_counter(), time.process_time()
+            for _ in range(rounds):
+                transport = new_transport(url, timeout=30, protocol=protocol)
+                transport.call("object", "execute_kw", *params)
+                wire += transport.request_bytes + transport.response_bytes
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            print(f"  {protocol:<8} {wall / rounds * 1000:>9.3f} {cpu / rounds * 1000:>14.3f} {wire // rounds:>11}")
+    finally:
+        server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--lines", type=int, default=40, help="invoice lines in the invoice payload")
+    parser.add_argument("--rows", type=int, default=500, help="rows in the search_read result")
+    options = parser.parse_args()
+
+    cases = [
+        (f"account.move create ({options.lines} lines)", _execute_kw_args(*invoice_payload(options.lines)), 98765),
+        ("res.partner create", _execute_kw_args(*partner_payload()), 4321),
+        (f"res.partner search_read ({options.rows} rows)",
+         _execute_kw_args("res.partner", "search_read", [[["customer_rank", ">", 0]]],
+                          {"fields": ["name", "ref", "email", "customer_rank", "active", "parent_id"]}),
+         search_read_result(options.rows)),
+    ]
+    for name, params, result in cases:
+        bench_encoding(name, params, result, options.rounds)
+    for name, params, result in cases:
+        bench_round_trips(name, params, result, max(1, options.rounds // 4))
+
+
+if __name__ == "__main__":
+    main()
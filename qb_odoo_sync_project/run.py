@@ -2,7 +2,8 @@
 Main entry point for the QB Odoo Sync application.
 
 This script initializes the Flask application using the app factory pattern
-and runs the development server.
+and runs the development server, or a multi-threaded waitress server when
+started with --production (or QB_SYNC_PRODUCTION=1).
 """
 import logging
 import sys
@@ -21,18 +22,30 @@ ODOO_API_KEY = "e8188dcec4b36dbc1e89e4da17b989c7aae8e568" # Directly use the pro
 SERVER_HOST = "0.0.0.0"
 SERVER_PORT = 5000  # Back to original working port
 FLASK_DEBUG = True
+PRODUCTION_MODE = "--production" in sys.argv or os.getenv("QB_SYNC_PRODUCTION") == "1"
+SERVER_THREADS = int(os.getenv("QB_SYNC_SERVER_THREADS", "8"))
 
 def main():
     """Main application entry point."""
     try:
         # Create the Flask app instance using the factory
-        flask_app = create_app()
+        flask_app = create_app(production=PRODUCTION_MODE)
         
         # Get logger after app creation (logging is set up in create_app)
         logger = logging.getLogger("qb_odoo_sync")
         
         logger.info(f"QuickBooks sync server starting on http://{SERVER_HOST}:{SERVER_PORT}/quickbooks")
         logger.info(f"Using Odoo URL: {ODOO_URL}")
+
+        if PRODUCTION_MODE:
+            # Production: multi-threaded WSGI server, no debugger or reloader.
+            # Session state is shared through the SQLite state store, so
+            # concurrent QBWC clients do not clobber each other.
+            from waitress import serve
+            logger.info(f"Production mode: serving with waitress ({SERVER_THREADS} threads)")
+            serve(flask_app, host=SERVER_HOST, port=SERVER_PORT, threads=SERVER_THREADS)
+            return
+
         logger.info(f"Flask DEBUG mode: {FLASK_DEBUG}")
         
         # Run the Flask development server
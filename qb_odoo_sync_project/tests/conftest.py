@@ -0,0 +1,17 @@
+"""
+Shared setup for the unit tests.
+
+The state database and the log directory are pointed at a temporary
+directory before the app is imported, so tests never touch
+data/qb_sync_state.db or logs/. Tests that share the database
+use their own keys (entities, company files, tickets) instead of cleaning up.
+"""
+import os
+import sys
+import tempfile
+
+_scratch = tempfile.mkdtemp(prefix="qb_sync_tests_")
+os.environ["QB_SYNC_STATE_DB"] = os.path.join(_scratch, "state.db")
+os.environ["QB_SYNC_LOG_DIR"] = _scratch
+os.environ.setdefault("QB_SYNC_DEAD_LETTER_RETRY", "0")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
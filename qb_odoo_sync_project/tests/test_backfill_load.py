@@ -0,0 +1,72 @@
+from app.services import odoo_backfill
+from app.services.odoo_backfill import load_records
+
+
+class FakeLoad:
+    """model.load that rejects rows whose name is in `bad_names`, reporting them by row like Odoo does."""
+
+    def __init__(self, bad_names=(), unattributed=False):
+        self.bad_names = set(bad_names)
+        self.unattributed = unattributed
+        self.calls = []
+
+    def __call__(self, model, method, args_list=None, kwargs_dict=None):
+        columns, matrix = args_list
+        self.calls.append([row[0] for row in matrix])
+        name = columns.index("name")
+        messages = [
+            {"type": "error", "message": "bad name", "field": "name", "rows": {"from": index, "to": index}}
+            for index, row in enumerate(matrix) if row[name] in self.bad_names
+        ]
+        if self.unattributed:
+            return {"ids": False, "messages": [{"type": "error", "message": "constraint failed"}]}
+        if messages:
+            return {"ids": False, "messages": messages}
+        return {"ids": [100 + index for index, row in enumerate(matrix) if row[0]], "messages": []}
+
+
+def _records(*names):
+    return [(f"QB{index}", f"__import__.qb_{index}", [{"name": name}]) for index, name in enumerate(names)]
+
+
+def test_clean_chunk_loads_in_one_call(monkeypatch):
+    fake = FakeLoad()
+    monkeypatch.setattr(odoo_backfill, "_odoo_rpc_call", fake)
+    result = load_records("res.partner", _records("a", "b", "c"))
+    assert result.ids == {"QB0": 100, "QB1": 101, "QB2": 102}
+    assert not result.errors and result.calls == 1
+
+
+def test_rejected_rows_are_split_out_and_the_rest_reloaded(monkeypatch):
+    fake = FakeLoad(bad_names={"b"})
+    monkeypatch.setattr(odoo_backfill, "_odoo_rpc_call", fake)
+    result = load_records("res.partner", _records("a", "b", "c"))
+    assert result.errors == {"QB1": "name: bad name"}
+    assert set(result.ids) == {"QB0", "QB2"}
+    assert fake.calls == [["__import__.qb_0", "__import__.qb_1", "__import__.qb_2"],
+                          ["__import__.qb_0", "__import__.qb_2"]]
+
+
+def test_multi_row_records_are_split_by_their_first_row(monkeypatch):
+    fake = FakeLoad(bad_names={"bad line"})
+    monkeypatch.setattr(odoo_backfill, "_odoo_rpc_call", fake)
+    records = [("QB0", "__import__.qb_0", [{"name": "ok"}, {"name": "bad line"}]),
+               ("QB1", "__import__.qb_1", [{"name": "ok"}])]
+    result = load_records("account.move", records)
+    assert result.errors == {"QB0": "name: bad name"}
+    assert set(result.ids) == {"QB1"}
+
+
+def test_errors_without_rows_fail_the_whole_chunk(monkeypatch):
+    fake = FakeLoad(unattributed=True)
+    monkeypatch.setattr(odoo_backfill, "_odoo_rpc_call", fake)
+    result = load_records("res.partner", _records("a", "b"))
+    assert not result.ids
+    assert result.errors == {"QB0": "constraint failed", "QB1": "constraint failed"}
+    assert result.calls == 1
+
+
+def test_failed_call_marks_the_chunk_failed(monkeypatch):
+    monkeypatch.setattr(odoo_backfill, "_odoo_rpc_call", lambda *args, **kwargs: None)
+    result = load_records("res.partner", _records("a"))
+    assert result.errors == {"QB0": "load call failed"}
@@ -0,0 +1,44 @@
+import time
+
+from app.utils import dead_letters
+from app.utils.dead_letters import (
+    DEAD_LETTER_BASE_DELAY_SECONDS, DEAD_LETTER_MAX_ATTEMPTS, DEAD_LETTER_MAX_DELAY_SECONDS, next_attempt_at,
+)
+
+
+def test_backoff_doubles_up_to_the_cap_then_parks():
+    now = 1000.0
+    assert next_attempt_at(1, now) == now + DEAD_LETTER_BASE_DELAY_SECONDS
+    assert next_attempt_at(2, now) == now + 2 * DEAD_LETTER_BASE_DELAY_SECONDS
+    assert next_attempt_at(3, now) == now + 4 * DEAD_LETTER_BASE_DELAY_SECONDS
+    assert next_attempt_at(DEAD_LETTER_MAX_ATTEMPTS - 1, now) <= now + DEAD_LETTER_MAX_DELAY_SECONDS
+    assert next_attempt_at(DEAD_LETTER_MAX_ATTEMPTS, now) is None
+
+
+def test_failures_are_counted_and_parked_until_rescheduled():
+    for _ in range(DEAD_LETTER_MAX_ATTEMPTS):
+        dead_letters.record_failure("TestParked", "R1", {"id": "R1"}, "ValueError", "boom")
+    listing = dead_letters.list_dead_letters("TestParked")
+    record = listing["records"][0]
+    assert record["attempts"] == DEAD_LETTER_MAX_ATTEMPTS and record["parked"]
+    assert not [row for row in dead_letters.claim_due(100) if row["entity"] == "TestParked"]
+
+    assert dead_letters.schedule_retry("TestParked") == 1
+    claimed = [row for row in dead_letters.claim_due(100) if row["entity"] == "TestParked"]
+    assert [row["payload"] for row in claimed] == [{"id": "R1"}]
+
+
+def test_claimed_records_are_not_due_again_until_the_claim_expires():
+    dead_letters.record_failure("TestClaim", "R1", {}, "ValueError", "boom")
+    dead_letters.schedule_retry("TestClaim")
+    assert [row["record_id"] for row in dead_letters.claim_due(100) if row["entity"] == "TestClaim"] == ["R1"]
+    assert not [row for row in dead_letters.claim_due(100) if row["entity"] == "TestClaim"]
+    dead_letters.resolve("TestClaim", ["R1"])
+    assert dead_letters.list_dead_letters("TestClaim")["total"] == 0
+
+
+def test_first_retry_waits_for_the_base_delay():
+    before = time.time()
+    dead_letters.record_failure("TestDelay", "R1", {}, "ValueError", "boom")
+    next_at = dead_letters.list_dead_letters("TestDelay")["records"][0]["next_attempt_at"]
+    assert before + DEAD_LETTER_BASE_DELAY_SECONDS <= next_at <= time.time() + DEAD_LETTER_BASE_DELAY_SECONDS
@@ -0,0 +1,54 @@
+from app.utils.metrics import Registry
+
+
+def test_counter_and_gauge_render_one_sample_per_label_set():
+    registry = Registry()
+    counter = registry.counter("test_records_total", "Records seen.", ["outcome"])
+    counter.inc(outcome="pushed")
+    counter.inc(2, outcome="pushed")
+    counter.inc(outcome="failed")
+    registry.gauge("test_in_flight", "Requests in flight.").set(3)
+    assert registry.render().splitlines() == [
+        "# HELP test_records_total Records seen.",
+        "# TYPE test_records_total counter",
+        'test_records_total{outcome="failed"} 1',
+        'test_records_total{outcome="pushed"} 3',
+        "# HELP test_in_flight Requests in flight.",
+        "# TYPE test_in_flight gauge",
+        "test_in_flight 3",
+    ]
+
+
+def test_registering_a_name_twice_returns_the_first_metric():
+    registry = Registry()
+    first = registry.counter("test_total", "First.")
+    assert registry.counter("test_total", "Second.") is first
+
+
+def test_callback_metrics_are_read_at_scrape_time_and_survive_errors():
+    registry = Registry()
+    values = {"pending": 2}
+    registry.gauge("test_queue", "Queued items.", ["state"],
+                   callback=lambda: [({"state": state}, count) for state, count in values.items()])
+    assert 'test_queue{state="pending"} 2' in registry.render()
+    values["pending"] = 5
+    assert 'test_queue{state="pending"} 5' in registry.render()
+
+    def broken():
+        raise RuntimeError("source unavailable")
+    registry.gauge("test_broken", "Unavailable source.", callback=broken)
+    assert registry.render().splitlines()[-2:] == ["# HELP test_broken Unavailable source.", "# TYPE test_broken gauge"]
+
+
+def test_histogram_buckets_are_cumulative_with_count_and_sum():
+    registry = Registry()
+    histogram = registry.histogram("test_seconds", "Durations.", ["method"], buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        histogram.observe(value, method="write")
+    assert registry.render().splitlines()[2:] == [
+        'test_seconds_bucket{method="write",le="0.1"} 1',
+        'test_seconds_bucket{method="write",le="1.0"} 2',
+        'test_seconds_bucket{method="write",le="+Inf"} 3',
+        'test_seconds_count{method="write"} 3',
+        'test_seconds_sum{method="write"} 5.55',
+    ]
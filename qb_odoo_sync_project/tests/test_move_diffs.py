@@ -0,0 +1,106 @@
+import pytest
+
+from app.services import odoo_service
+from app.services.odoo_service import MOVE_LINE_KEY, _move_update_payload, _values_differ
+
+
+@pytest.mark.parametrize("current, wanted, differ", [
+    ([7, "Acme"], 7, False),  # many2one read as [id, name]
+    ([7, "Acme"], 8, True),
+    (False, "", False),
+    (False, None, False),
+    (False, "memo", True),
+    (10.0, 10.000000001, False),
+    (10.0, 10.01, True),
+    ("10.5", 10.5, False),
+    ([1, 2], [(6, 0, [2, 1])], False),  # many2many replace against the ids read
+    ([1, 2], [(6, 0, [1, 3])], True),
+    ("INV-1", "INV-1", False),
+])
+def test_values_differ(current, wanted, differ):
+    assert _values_differ(current, wanted) is differ
+
+
+class FakeOdoo:
+    """Answers the reads _move_update_payload makes for one move."""
+
+    def __init__(self, move, lines):
+        self.move = move
+        self.lines = lines
+
+    def __call__(self, model, method, args_list=None, kwargs_dict=None):
+        assert method == "read"
+        if model == "account.move":
+            return [self.move]
+        return [line for line in self.lines if line["id"] in args_list[0]]
+
+
+@pytest.fixture
+def odoo(monkeypatch):
+    def install(move, lines, keyed):
+        monkeypatch.setattr(odoo_service, "_odoo_rpc_call", FakeOdoo(move, lines))
+        monkeypatch.setattr(odoo_service, "_move_line_key_supported", keyed)
+    return install
+
+
+def _line(line_id, key, name, price):
+    return {"id": line_id, MOVE_LINE_KEY: key, "product_id": [5, "Widget"], "name": name, "quantity": 1.0,
+            "price_unit": price, "account_id": [9, "Sales"]}
+
+
+def _vals(key, name, price):
+    return {MOVE_LINE_KEY: key, "product_id": 5, "name": name, "quantity": 1.0, "price_unit": price, "account_id": 9}
+
+
+MOVE = {"id": 1, "ref": "INV-1", "invoice_date": "2024-01-01", "invoice_line_ids": [11, 12]}
+PAYLOAD = {"move_type": "out_invoice", "ref": "INV-1", "invoice_date": "2024-01-01"}
+
+
+def test_unchanged_move_needs_no_write(odoo):
+    odoo(MOVE, [_line(11, "L1", "A", 5.0), _line(12, "L2", "B", 7.0)], keyed=True)
+    assert _move_update_payload(1, PAYLOAD, [_vals("L1", "A", 5.0), _vals("L2", "B", 7.0)]) == {}
+
+
+def test_keyed_lines_are_updated_created_and_removed(odoo):
+    odoo(MOVE, [_line(11, "L1", "A", 5.0), _line(12, "L2", "B", 7.0)], keyed=True)
+    changes = _move_update_payload(1, {**PAYLOAD, "ref": "INV-2"}, [_vals("L1", "A", 6.0), _vals("L3", "C", 1.0)])
+    assert changes == {
+        "ref": "INV-2",
+        "invoice_line_ids": [(1, 11, {"price_unit": 6.0}), (0, 0, _vals("L3", "C", 1.0)), (2, 12, 0)],
+    }
+
+
+def test_without_the_line_key_changed_lines_are_replaced(odoo):
+    lines = [_line(11, None, "A", 5.0), _line(12, None, "B", 7.0)]
+    odoo(MOVE, lines, keyed=False)
+    new_lines = [{k: v for k, v in _vals(None, "A", 5.0).items() if k != MOVE_LINE_KEY},
+                 {k: v for k, v in _vals(None, "B", 8.0).items() if k != MOVE_LINE_KEY}]
+    changes = _move_update_payload(1, PAYLOAD, new_lines)
+    assert changes == {"invoice_line_ids": [(5, 0, 0)] + [(0, 0, vals) for vals in new_lines]}
+    assert _move_update_payload(1, PAYLOAD, new_lines[:1] + [{**new_lines[1], "price_unit": 7.0}]) == {}
+
+
+def test_unreadable_move_returns_none(odoo, monkeypatch):
+    odoo(MOVE, [], keyed=True)
+    monkeypatch.setattr(odoo_service, "_odoo_rpc_call", lambda *args, **kwargs: None)
+    assert _move_update_payload(1, PAYLOAD, []) is None
+
+
+def _unkeyed(name, price):
+    return {k: v for k, v in _vals(None, name, price).items() if k != MOVE_LINE_KEY}
+
+
+def test_lines_without_a_key_are_matched_by_content_then_position(odoo):
+    odoo(MOVE, [_line(11, None, "A", 5.0), _line(12, None, "B", 7.0)], keyed=True)
+    assert _move_update_payload(1, PAYLOAD, [_unkeyed("B", 7.0), _unkeyed("A", 5.0)]) == {}
+    changes = _move_update_payload(1, PAYLOAD, [_unkeyed("A", 5.0), _unkeyed("B", 8.0)])
+    assert changes == {"invoice_line_ids": [(1, 12, {"price_unit": 8.0})]}
+
+
+def test_lines_written_before_the_key_existed_are_adopted(odoo):
+    odoo(MOVE, [_line(11, None, "A", 5.0), _line(12, "L2", "B", 7.0)], keyed=True)
+    changes = _move_update_payload(1, PAYLOAD, [_vals("L1", "A", 5.0), _vals("L2", "B", 7.0)])
+    assert changes == {"invoice_line_ids": [(1, 11, {MOVE_LINE_KEY: "L1"})]}
+    # Once every line carries its key, nothing is rewritten
+    odoo(MOVE, [_line(11, "L1", "A", 5.0), _line(12, "L2", "B", 7.0)], keyed=True)
+    assert _move_update_payload(1, PAYLOAD, [_vals("L1", "A", 5.0), _vals("L2", "B", 7.0)]) == {}
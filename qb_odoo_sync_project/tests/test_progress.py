@@ -0,0 +1,31 @@
+import pytest
+
+from app.services.qbwc_service import _compute_overall_progress
+
+
+def _session(done, tasks):
+    return {"current_task_index": done, "total_tasks": len(tasks), "task_queue": tasks}
+
+
+def test_progress_counts_finished_tasks_and_the_active_task_share():
+    tasks = [{"records_received": 100}, {"records_received": 50, "records_remaining": 50}, {}, {}]
+    assert _compute_overall_progress(_session(1, tasks)) == 37
+
+
+@pytest.mark.parametrize("done, expected", [(0, 1), (4, 100)])
+def test_progress_stays_between_1_and_99_until_the_last_task(done, expected):
+    assert _compute_overall_progress(_session(done, [{}, {}, {}, {}])) == expected
+
+
+def test_records_in_flight_only_count_against_their_own_task():
+    tasks = [{"records_received": 100}, {"records_received": 50, "records_remaining": 50}]
+    assert _compute_overall_progress(_session(1, tasks)) == 75
+    # Pages of the previous task still being pushed hold back that task, not the active one
+    assert _compute_overall_progress(_session(1, tasks), {0: 50}) == 50
+    assert _compute_overall_progress(_session(1, tasks), {1: 50}) == 50
+    assert _compute_overall_progress(_session(1, tasks), {0: 100, 1: 50}) == 1
+
+
+def test_in_flight_records_never_push_progress_below_zero():
+    tasks = [{"records_received": 10, "records_remaining": 0}, {}]
+    assert _compute_overall_progress(_session(0, tasks), {0: 500}) == 1
@@ -0,0 +1,35 @@
+import threading
+
+from app.services import qbwc_service
+from app.services.push_pipeline import PushPipeline, find_pipeline, get_pipeline
+from app.services.qbwc_service import QBWCService
+from app.utils.state_store import session_store
+
+
+def test_a_failed_page_marks_only_its_task_failed():
+    pipeline = PushPipeline("ticket-failed-page")
+
+    def fail():
+        raise ValueError("bad page")
+    pipeline.submit(fail, "page 1", records=1, task=0)
+    pipeline.submit(lambda: None, "page 2", records=1, task=1)
+    assert pipeline.drain(5)
+    assert pipeline.task_failed(0) and not pipeline.task_failed(1)
+
+
+def test_close_connection_answers_before_the_pipeline_drains(monkeypatch):
+    ticket = "ticket-background-close"
+    session_store.put(ticket, {"task_queue": []})
+    release, finished = threading.Event(), threading.Event()
+    monkeypatch.setattr(qbwc_service, "_log_trace_summary", lambda ticket: finished.set())
+    pipeline = get_pipeline(ticket)
+    pipeline.submit(lambda: release.wait(5), "slow page", records=1, task=0)
+
+    assert QBWCService.closeConnection(None, ticket) == "OK"
+    assert session_store.get(ticket) is None
+    assert pipeline.depth == 1
+    assert not finished.is_set()
+
+    release.set()
+    assert finished.wait(5)
+    assert pipeline.depth == 0 and find_pipeline(ticket) is None
@@ -0,0 +1,81 @@
+import time
+
+import pytest
+
+from app.utils.resilience import (
+    CLOSED, HALF_OPEN, OPEN, AdaptiveLimiter, CircuitBreaker, CircuitOpenError, RetryPolicy,
+)
+
+
+def test_retry_delay_is_jittered_below_the_capped_exponential():
+    policy = RetryPolicy(base_delay=0.5, max_delay=3.0, multiplier=2.0)
+    for retry_number, cap in [(0, 0.5), (1, 1.0), (2, 2.0), (3, 3.0), (10, 3.0)]:
+        delays = [policy.delay(retry_number) for _ in range(200)]
+        assert all(0 <= delay <= cap for delay in delays)
+        assert max(delays) > cap / 2
+
+
+def test_breaker_opens_after_threshold_and_admits_one_probe():
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=0.05)
+    breaker.record_failure()
+    assert breaker.state == CLOSED and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN and breaker.is_open()
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+
+    time.sleep(0.06)
+    assert breaker.state == HALF_OPEN and not breaker.is_open()
+    assert breaker.allow()
+    assert not breaker.allow()  # Only one probe at a time
+    breaker.record_success()
+    assert breaker.state == CLOSED and breaker.allow()
+
+
+def test_failed_probe_reopens_the_breaker():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert breaker.retry_in() > 0
+
+
+def test_limiter_blocks_when_full_and_cancel_frees_a_slot():
+    limiter = AdaptiveLimiter("test", initial_limit=1)
+    assert limiter.acquire(timeout=0)
+    assert not limiter.acquire(timeout=0.01)
+    limiter.cancel()
+    assert limiter.in_flight == 0
+    assert limiter.acquire(timeout=0)
+
+
+def test_limiter_grows_additively_and_backs_off_on_overload():
+    limiter = AdaptiveLimiter("test", initial_limit=4, max_limit=16, backoff=0.5, window=4, cooldown=0)
+    for _ in range(8):
+        limiter.acquire()
+        limiter.release(0.01)
+    assert limiter.limit == 5
+    limiter.acquire()
+    limiter.release(0.01, overloaded=True)
+    assert limiter.limit == 2
+
+
+def test_limiter_compares_latency_per_key():
+    limiter = AdaptiveLimiter("test", initial_limit=8, backoff=0.5, window=4, cooldown=0)
+    for _ in range(4):
+        limiter.acquire()
+        limiter.release(0.01, key="res.partner.write")
+    # Imports are much slower than single writes but only measured against other imports
+    for _ in range(8):
+        limiter.acquire()
+        limiter.release(1.0, key="account.move.load")
+    assert limiter.limit >= 8
+    snapshot = limiter.snapshot()["baseline_p95_ms"]
+    assert snapshot == {"account.move.load": 1000.0, "res.partner.write": 10.0}
+
+    for _ in range(4):
+        limiter.acquire()
+        limiter.release(0.1, key="res.partner.write")
+    assert limiter.limit < 8
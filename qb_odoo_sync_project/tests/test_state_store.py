@@ -0,0 +1,74 @@
+import time
+
+from app.utils import state_store
+from app.utils.state_store import SessionStore, connect
+
+
+def _session(tasks=3):
+    return {
+        "current_task_index": 0,
+        "last_error": "No error",
+        "task_queue": [{"entity": f"Entity{index}Query", "iteratorID": None} for index in range(tasks)],
+    }
+
+
+def _changes(store, ticket, session_data):
+    conn = connect()
+    before = conn.total_changes
+    store.put(ticket, session_data)
+    return conn.total_changes - before
+
+
+def test_round_trip_keeps_header_and_tasks():
+    store = SessionStore()
+    store.put("ticket-roundtrip", _session())
+    loaded = store.get("ticket-roundtrip")
+    assert loaded == _session()
+    assert store.get("ticket-unknown") is None
+
+
+def test_unchanged_session_is_not_written():
+    store = SessionStore()
+    store.put("ticket-unchanged", _session())
+    session_data = store.get("ticket-unchanged")
+    assert _changes(store, "ticket-unchanged", session_data) == 0
+
+
+def test_only_changed_tasks_are_written():
+    store = SessionStore()
+    store.put("ticket-diff", _session(tasks=5))
+    session_data = store.get("ticket-diff")
+    session_data["task_queue"][3]["iteratorID"] = "it-1"
+    # The header row (updated_at) and the one changed task
+    assert _changes(store, "ticket-diff", session_data) == 2
+    assert store.get("ticket-diff")["task_queue"][3]["iteratorID"] == "it-1"
+
+
+def test_shrinking_task_queue_deletes_the_extra_rows():
+    store = SessionStore()
+    store.put("ticket-shrink", _session(tasks=4))
+    session_data = store.get("ticket-shrink")
+    session_data["task_queue"] = session_data["task_queue"][:2]
+    store.put("ticket-shrink", session_data)
+    rows = connect().execute("SELECT COUNT(*) FROM qbwc_session_tasks WHERE ticket = ?", ("ticket-shrink",)).fetchone()
+    assert rows[0] == 2
+    assert len(store.get("ticket-shrink")["task_queue"]) == 2
+
+
+def test_a_store_without_a_snapshot_rewrites_the_session():
+    store = SessionStore()
+    store.put("ticket-other-process", _session(tasks=4))
+    # Another process loaded nothing yet: it must not leave stale task rows behind
+    SessionStore().put("ticket-other-process", _session(tasks=1))
+    assert len(store.get("ticket-other-process")["task_queue"]) == 1
+
+
+def test_held_lease_is_renewed_past_its_length(monkeypatch):
+    monkeypatch.setattr(state_store, "LOCK_LEASE_SECONDS", 0.2)
+    monkeypatch.setattr(state_store, "LOCK_RENEW_INTERVAL_SECONDS", 0.05)
+    store = SessionStore()
+    with store.lock("ticket-long-request"):
+        time.sleep(0.5)
+        # Another worker still finds the ticket leased well after the first lease ran out
+        assert not store._try_acquire_lease("ticket-long-request", "other-worker")
+    assert store._try_acquire_lease("ticket-long-request", "other-worker")
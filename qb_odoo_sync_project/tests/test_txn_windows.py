@@ -0,0 +1,123 @@
+from datetime import date, timedelta
+
+import pytest
+
+from app.utils import txn_windows
+from app.utils.state_store import connect
+from app.utils.txn_windows import (
+    TXN_WINDOW_INITIAL_DAYS, TXN_WINDOW_MAX_ATTEMPTS, TXN_WINDOW_MAX_DAYS, TXN_WINDOW_MIN_DAYS,
+    TXN_WINDOW_SPLIT_AFTER, TXN_WINDOW_TARGET_RECORDS, mark_modified_synced, mark_window_done, mark_window_started,
+    modified_since, retry_parked, schedule_windows,
+)
+
+ENTITY = "InvoiceQuery"
+YESTERDAY = date.today() - timedelta(days=1)
+
+
+@pytest.fixture
+def history_start(monkeypatch):
+    def start(days_ago: int) -> date:
+        first_day = date.today() - timedelta(days=days_ago)
+        monkeypatch.setattr(txn_windows, "TXN_HISTORY_START", first_day.isoformat())
+        return first_day
+    return start
+
+
+def _span(window) -> int:
+    return (date.fromisoformat(window[1]) - date.fromisoformat(window[0])).days + 1
+
+
+def _query_session(company_file: str):
+    """Schedule one window and start querying it, like a session that then fails."""
+    windows = schedule_windows(company_file, ENTITY, limit=1)
+    for window in windows:
+        mark_window_started(company_file, ENTITY, window)
+    return windows
+
+
+def _window_days(company_file: str) -> int:
+    txn_windows._ensure_schema()
+    return txn_windows._window_days(connect(), company_file, ENTITY)
+
+
+def test_first_window_spans_the_initial_days(history_start):
+    first_day = history_start(1000)
+    windows = schedule_windows("density.qbw", ENTITY, limit=1)
+    assert windows == [(first_day.isoformat(), (first_day + timedelta(days=TXN_WINDOW_INITIAL_DAYS - 1)).isoformat())]
+    assert _window_days("density.qbw") == TXN_WINDOW_INITIAL_DAYS
+
+
+@pytest.mark.parametrize("records, expected", [
+    (TXN_WINDOW_TARGET_RECORDS * 2, TXN_WINDOW_INITIAL_DAYS // 2),
+    (TXN_WINDOW_TARGET_RECORDS * 1000, TXN_WINDOW_MIN_DAYS),
+    (1, TXN_WINDOW_MAX_DAYS),
+    (0, TXN_WINDOW_MAX_DAYS),
+])
+def test_next_window_is_sized_from_the_last_window_density(history_start, records, expected):
+    history_start(1000)
+    company_file = f"density-{records}.qbw"
+    window = schedule_windows(company_file, ENTITY, limit=1)[0]
+    mark_window_done(company_file, ENTITY, window, records)
+    assert _window_days(company_file) == expected
+    next_window = schedule_windows(company_file, ENTITY, limit=1)[0]
+    assert next_window[0] == (date.fromisoformat(window[1]) + timedelta(days=1)).isoformat()
+    assert _span(next_window) == expected
+
+
+def test_unfinished_windows_come_first(history_start):
+    history_start(1000)
+    first, second = schedule_windows("resume.qbw", ENTITY, limit=2)
+    mark_window_done("resume.qbw", ENTITY, second, 10)
+    assert schedule_windows("resume.qbw", ENTITY, limit=1) == [first]
+
+
+def test_windows_are_kept_per_company_file(history_start):
+    first_day = history_start(1000)
+    assert schedule_windows("one.qbw", ENTITY, limit=1)[0][0] == first_day.isoformat()
+    assert schedule_windows("two.qbw", ENTITY, limit=1)[0][0] == first_day.isoformat()
+
+
+def test_covered_history_switches_to_the_modified_date_cursor(history_start):
+    first_day = history_start(10)
+    windows = schedule_windows("covered.qbw", ENTITY)
+    assert windows == [(first_day.isoformat(), YESTERDAY.isoformat())]
+    assert modified_since("covered.qbw", ENTITY) is None
+
+    mark_window_done("covered.qbw", ENTITY, windows[0], 3)
+    assert modified_since("covered.qbw", ENTITY) == YESTERDAY.isoformat()
+    # No more one-day windows once history is covered
+    assert schedule_windows("covered.qbw", ENTITY) == []
+
+    mark_modified_synced("covered.qbw", ENTITY, "2099-01-01")
+    assert modified_since("covered.qbw", ENTITY) == "2099-01-01"
+
+
+def test_failing_windows_are_split_then_parked(history_start):
+    history_start(1000)
+    company_file = "failing.qbw"
+    window = _query_session(company_file)[0]
+    for _ in range(TXN_WINDOW_SPLIT_AFTER - 1):
+        assert _query_session(company_file) == [window]
+    halved = _query_session(company_file)[0]
+    assert halved[0] == window[0] and _span(halved) == _span(window) // 2
+
+    spans = [_span(halved)]
+    for _ in range(50):
+        scheduled = _query_session(company_file)
+        if scheduled[0][0] != window[0]:
+            break
+        spans.append(_span(scheduled[0]))
+    assert min(spans) <= TXN_WINDOW_MIN_DAYS
+    # The smallest first window was parked after TXN_WINDOW_MAX_ATTEMPTS attempts; later ones go ahead
+    assert spans.count(min(spans)) == TXN_WINDOW_MAX_ATTEMPTS
+    assert retry_parked(ENTITY) >= 1
+    assert schedule_windows(company_file, ENTITY, limit=1)[0][0] == window[0]
+
+
+def test_windows_a_session_never_reached_count_no_attempt(history_start):
+    history_start(1000)
+    company_file = "aborted.qbw"
+    window = schedule_windows(company_file, ENTITY, limit=1)[0]
+    # Sessions that end before they query the window (Odoo down, QBWC closed early) never split it
+    for _ in range(TXN_WINDOW_MAX_ATTEMPTS + 1):
+        assert schedule_windows(company_file, ENTITY, limit=1) == [window]
@@ -0,0 +1,100 @@
+import pytest
+
+from app.services import qbwc_service
+from app.services.qbwc_service import (
+    BILL_QUERY, CUSTOMER_QUERY, INVOICE_QUERY, QB_QUERY, QUERY_HANDLERS, _push_page, _send_request_xml,
+    _shard_transaction_tasks,
+)
+from app.utils import dead_letters
+from app.utils.resilience import CircuitBreaker, CircuitOpenError
+from app.utils.state_store import connect, session_store
+from app.utils.txn_windows import schedule_windows
+
+
+def _task(entity):
+    return {"type": QB_QUERY, "entity": entity, "params": {}, "requestID": "1", "iteratorID": None}
+
+
+def test_stub_entities_keep_their_plain_query():
+    tasks = _shard_transaction_tasks([_task(CUSTOMER_QUERY), _task(BILL_QUERY), _task(INVOICE_QUERY)], "stubs.qbw")
+    assert [task["entity"] for task in tasks[:2]] == [CUSTOMER_QUERY, BILL_QUERY]
+    assert "window" not in tasks[1] and "TxnDateRangeFilter" not in tasks[1]["params"]
+    assert tasks[2]["entity"] == INVOICE_QUERY and tasks[2]["window"]
+
+
+def test_last_page_of_a_stub_entity_completes_nothing(monkeypatch):
+    synced, completed = [], []
+    monkeypatch.setattr(qbwc_service, "mark_sync_complete", synced.append)
+    _push_page(QUERY_HANDLERS[BILL_QUERY], [], True, lambda: completed.append(True))
+    assert not synced and not completed
+
+    _push_page(QUERY_HANDLERS[INVOICE_QUERY], [], True, lambda: completed.append(True))
+    assert synced == ["Invoice"] and completed == [True]
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    breaker = CircuitBreaker("test-odoo", failure_threshold=1, reset_timeout=60)
+    monkeypatch.setattr(qbwc_service, "odoo_breaker", breaker)
+    monkeypatch.setattr(qbwc_service, "mark_sync_complete", lambda qb_object: None)
+    return breaker
+
+
+def _failing_handler(qb_object, breaker, fail_id):
+    def push(data):
+        if data["qb_txn_id"] == fail_id:
+            breaker.record_failure()
+            raise ConnectionError("Odoo went away")
+        return 1
+    return {"object": qb_object, "id_key": "qb_txn_id", "extract": dict, "push": push}
+
+
+def test_record_failing_as_odoo_goes_down_keeps_the_task_unfinished(breaker):
+    completed = []
+    handler = _failing_handler("TestBreakerLast", breaker, "T2")
+    records = [{"qb_txn_id": "T1", "EditSequence": "1"}, {"qb_txn_id": "T2", "EditSequence": "1"}]
+    with pytest.raises(CircuitOpenError):
+        _push_page(handler, records, True, lambda: completed.append(True))
+    assert not completed
+    # Not dead-lettered either: the next session queries the record again
+    assert dead_letters.list_dead_letters("TestBreakerLast")["total"] == 0
+
+
+def test_failed_load_as_odoo_goes_down_keeps_the_task_unfinished(breaker, monkeypatch):
+    completed = []
+    monkeypatch.setattr(qbwc_service, "ODOO_BACKFILL_ENABLED", True)
+
+    def load(records):
+        breaker.record_failure()
+        raise ConnectionError("Odoo went away")
+    handler = {**_failing_handler("TestBreakerLoad", breaker, None), "load": load}
+    with pytest.raises(CircuitOpenError):
+        _push_page(handler, [{"qb_txn_id": "T1", "EditSequence": "1"}], True, lambda: completed.append(True))
+    assert not completed
+    assert dead_letters.list_dead_letters("TestBreakerLoad")["total"] == 0
+
+
+def test_ordinary_failures_are_dead_lettered_and_the_task_completes(breaker):
+    completed = []
+    breaker.failure_threshold = 5
+    handler = _failing_handler("TestBreakerClosed", breaker, "T1")
+    _push_page(handler, [{"qb_txn_id": "T1", "EditSequence": "1"}], True, lambda: completed.append(True))
+    assert completed == [True]
+    assert dead_letters.list_dead_letters("TestBreakerClosed")["total"] == 1
+
+
+def test_a_window_counts_one_attempt_when_its_query_is_first_sent():
+    company_file = "started.qbw"
+    window = schedule_windows(company_file, INVOICE_QUERY, limit=1)[0]
+    task = {**_task(INVOICE_QUERY), "params": {"TxnDateRangeFilter": {"FromTxnDate": window[0], "ToTxnDate": window[1]}},
+            "window": list(window)}
+    session_store.put("ticket-window-start", {"current_task_index": 0, "task_queue": [task]})
+
+    def attempts():
+        return connect().execute("SELECT attempts FROM txn_windows WHERE company_file = ? AND entity = ?",
+                                 (company_file, INVOICE_QUERY)).fetchone()[0]
+    assert attempts() == 0
+    assert "InvoiceQueryRq" in _send_request_xml("ticket-window-start", company_file, "13", "0")
+    # The same session asking again (an error retried, the next page) does not count again
+    _send_request_xml("ticket-window-start", company_file, "13", "0")
+    assert attempts() == 1
@@ -0,0 +1,24 @@
+"""
+WSGI entry point for running QB Odoo Sync under a production server.
+
+Session state lives in the shared SQLite state store, so this module can be
+served by several threads or worker processes at once, e.g.:
+
+    waitress-serve --listen=0.0.0.0:5000 --threads=8 wsgi:app
+    WEB_CONCURRENCY=4 gunicorn --bind 0.0.0.0:5000 wsgi:app
+
+Give gunicorn its worker count through WEB_CONCURRENCY rather than --workers
+(and do not use --preload): the app reads the same variable to give each
+process its own debug log file and to turn off the push pipeline, which only
+works when one process serves every call of a session. Serve with threads in
+a single process (waitress, or gunicorn --threads) to keep the pipeline.
+"""
+import os
+import sys
+
+# Add the current directory to Python path for imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app
+
+app = create_app(production=True)
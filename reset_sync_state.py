@@ -1,5 +1,7 @@
+import argparse
 import os
 import shutil
+import sqlite3
 from pathlib import Path
 
 # Define paths relative to this script's location (project root)
@@ -12,6 +14,8 @@ LOG_DIR = APP_DIR / "logs" # Assuming logs are in qb_odoo_sync_project/logs
 QBWC_SESSION_STATE_FILE = PROJECT_ROOT / "qbwc_session_state.json"
 
 SYNC_CACHE_FILE = DATA_DIR / "sync_cache.json"
+# Shared state database used by the server (QB_SYNC_STATE_DB overrides it, as in the app)
+STATE_DB_FILE = Path(os.getenv("QB_SYNC_STATE_DB", str(DATA_DIR / "qb_sync_state.db")))
 QBWC_DEBUG_LOG_FILE = LOG_DIR / "qbwc_debug.log"
 QB_ODOO_SYNC_LOG_FILE = LOG_DIR / "qb_odoo_sync.log" # Main application log
 
@@ -26,12 +30,66 @@ def clear_file(file_path):
     else:
         print(f"File not found, skipping: {file_path}")
 
+# Tables of the state database, by what they hold. Only the QBWC sessions are
+# cleared by default: the others hold sync progress and work still owed to
+# Odoo, and are cleared only when asked for explicitly.
+SESSION_TABLES = ["qbwc_session_tasks", "qbwc_session_headers", "qbwc_session_locks"]
+OPTIONAL_TABLES = {
+    "checkpoints": (["record_checkpoints"], "record checkpoints (re-queried records are pushed again)"),
+    "txn_windows": (["txn_windows", "txn_backfills"], "date-window backfill progress (history is queried again)"),
+    "dead_letters": (["dead_letters"], "dead-lettered records (they are NOT retried any more)"),
+    "move_posts": (["move_posts"], "moves waiting to be posted (they stay in draft in Odoo)"),
+}
+
+def clear_tables(tables):
+    """Deletes every row of the given state database tables that exist."""
+    if not STATE_DB_FILE.exists():
+        print(f"File not found, skipping: {STATE_DB_FILE}")
+        return
+    try:
+        conn = sqlite3.connect(str(STATE_DB_FILE), timeout=30)
+        try:
+            with conn:
+                existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+                for table in tables:
+                    if table in existing:
+                        removed = conn.execute(f"DELETE FROM {table}").rowcount
+                        print(f"Cleared {removed} row(s) from {table}")
+                    else:
+                        print(f"Table not found, skipping: {table}")
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"Error clearing {', '.join(tables)} in {STATE_DB_FILE}: {e}")
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Clear QBWC session state (and, on request, other sync state) for QB Odoo Sync.")
+    for name, (_, what) in OPTIONAL_TABLES.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", action="store_true", help=f"Also clear {what}.")
+    parser.add_argument("--all", action="store_true",
+                        help="Delete the whole state database, including everything the options above clear.")
+    return parser.parse_args()
+
 def main():
+    args = parse_args()
     print("--- Starting Fresh: Clearing Sync State for QB Odoo Sync ---")
 
-    # 1. Clear the main session state file
-    print("\nStep 1: Clearing QBWC session state file...")
+    # 1. Clear the QBWC sessions (and only what else was asked for)
+    print("\nStep 1: Clearing QBWC session state...")
     clear_file(QBWC_SESSION_STATE_FILE)
+    if args.all:
+        for suffix in ("", "-wal", "-shm"):
+            clear_file(STATE_DB_FILE.with_name(STATE_DB_FILE.name + suffix))
+    else:
+        tables = list(SESSION_TABLES)
+        for name, (option_tables, _) in OPTIONAL_TABLES.items():
+            if getattr(args, name):
+                tables.extend(option_tables)
+        clear_tables(tables)
+        kept = [f"--{name.replace('_', '-')}" for name in OPTIONAL_TABLES if not getattr(args, name)]
+        if kept:
+            print(f"Other sync state kept; see --help for {', '.join(kept)}")
 
     # 2. Clear sync cache file
     print("\nStep 2: Clearing application sync cache...")